@@ -31,6 +31,12 @@ class ConnectionTimeoutError(ConnectionError):
     """
 
 
+class ConnectionEndOfStreamError(ConnectionError):
+    """
+    Exception raised when the remote end closes the connection before all requested bytes were received.
+    """
+
+
 def requires_active_connection(func):
     """
     Decorator that enforces calls on the :class:`~adbpy.connection.Connection` instance to only be allowed on
@@ -47,6 +53,13 @@ def requires_active_connection(func):
 class Connection(metaclass=abc.ABCMeta):
     """
     Abstract class that defines the interface a connection must implement.
+
+    The `session` attribute holds the :class:`~adbpy.protocol.adb.Session` negotiated by a handshake over the
+    connection, if any, so it can be reused by later wire protocols.
+
+    Every receive method reads exactly the number of bytes asked for and raises a
+    :class:`~adbpy.connection.ConnectionEndOfStreamError` if the remote end closes the connection first.
+    :meth:`recv` and :meth:`recv_exactly` return the :class:`~bytearray` the bytes were read into.
     """
 
     @classmethod
@@ -57,6 +70,7 @@ class Connection(metaclass=abc.ABCMeta):
     def __init__(self, transport, context):
         self._transport = transport
         self._context = context
+        self.session = None
 
     def __repr__(self):
         return '<{}(transport={}, context={})>'.format(self.__class__.__name__, self._transport, self._context)
@@ -65,8 +79,17 @@ class Connection(metaclass=abc.ABCMeta):
     def is_connected(self):
         return bool(self._transport) and bool(self._context)
 
+    def is_alive(self):
+        """
+        Cheaply check to see if the connection is still usable without blocking, See:
+        :meth:`~adbpy.transport.Transport.probe`.
+
+        :return: A :class:`bool` indicating if the connection is usable
+        """
+        return self.is_connected and self._transport.probe(self._context)
+
     @abc.abstractmethod
-    def disconnect(self, **args, **kwargs):
+    def disconnect(self, *args, **kwargs):
         pass
 
     @abc.abstractmethod
@@ -76,3 +99,11 @@ class Connection(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def recv(self, num_bytes, *args, **kwargs):
         pass
+
+    @abc.abstractmethod
+    def recv_into(self, buffer, *args, **kwargs):
+        pass
+
+    @abc.abstractmethod
+    def recv_exactly(self, num_bytes, *args, **kwargs):
+        pass
@@ -0,0 +1,117 @@
+"""
+    adbpy.connection.async
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for dealing with asynchronous (non-blocking) connections based on `asyncio`.
+"""
+
+import asyncio
+
+from adbpy import connection, exception, transport
+
+
+__all__ = ['Connection']
+
+
+class Connection(connection.Connection):
+    """
+    Connection that defines an asynchronous (non-blocking) interface and wraps an asynchronous transport.
+
+    All methods are coroutines.
+    """
+
+    @classmethod
+    @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportConnectTimeout, connection.ConnectionTimeoutError)
+    @asyncio.coroutine
+    def connect(cls, transport, *args, **kwargs):
+        """
+        Create a new connection based on the given transport.
+
+        :param transport: Transport to connect
+        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.connect` method
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.connect` method
+        :return: A :class:`~adbpy.connection.async.Connection` instance that wraps the newly connected transport
+        """
+        context = yield from transport.connect(*args, **kwargs)
+        return cls(transport, context)
+
+    @connection.requires_active_connection
+    @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportDisconnectTimeout, connection.ConnectionTimeoutError)
+    @asyncio.coroutine
+    def disconnect(self, *args, **kwargs):
+        """
+        Disconnect the connection.
+
+        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.disconnect` method
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.disconnect` method
+        :return: `None`
+        """
+        yield from self._transport.disconnect(self._context, *args, **kwargs)
+        self._transport = None
+        self._context = None
+
+    @connection.requires_active_connection
+    @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportSendTimeout, connection.ConnectionTimeoutError)
+    @asyncio.coroutine
+    def send(self, data, *args, **kwargs):
+        """
+        Send the given data buffer over the connection.
+
+        :param data: Buffer to send
+        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.send` method
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.send` method
+        :return: `None`
+        """
+        return (yield from self._transport.send(self._context, data, **kwargs))
+
+    @connection.requires_active_connection
+    @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportReceiveTimeout, connection.ConnectionTimeoutError)
+    @exception.rethrow(transport.TransportEndOfStreamError, connection.ConnectionEndOfStreamError)
+    @asyncio.coroutine
+    def recv(self, num_bytes, *args, **kwargs):
+        """
+        Read exactly the given number of bytes from the connection.
+
+        :param num_bytes: Number of bytes to read
+        :param args: Optional positional args to pass to the transport `recv_exactly` method
+        :param kwargs: Optional keyword args to pass to the transport `recv_exactly` method
+        :return: A :class:`~bytearray` of exactly `num_bytes` length
+        """
+        if not num_bytes:
+            return bytearray()
+
+        return bytearray((yield from self._transport.recv_exactly(self._context, num_bytes, **kwargs)))
+
+    @connection.requires_active_connection
+    @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportReceiveTimeout, connection.ConnectionTimeoutError)
+    @exception.rethrow(transport.TransportEndOfStreamError, connection.ConnectionEndOfStreamError)
+    @asyncio.coroutine
+    def recv_into(self, buffer, *args, **kwargs):
+        """
+        Read bytes from the connection until the given buffer is full.
+
+        :param buffer: Writable buffer, e.g. :class:`~bytearray` or :class:`~memoryview`, to read into
+        :param args: Optional positional args to pass to the transport `recv_exactly` method
+        :param kwargs: Optional keyword args to pass to the transport `recv_exactly` method
+        :return: Number of bytes read, which is always `len(buffer)`
+        """
+        view = memoryview(buffer).cast('B')
+        view[:] = yield from self._transport.recv_exactly(self._context, len(view), **kwargs)
+        return len(view)
+
+    @asyncio.coroutine
+    def recv_exactly(self, num_bytes, *args, **kwargs):
+        """
+        Read exactly the given number of bytes from the connection.
+
+        :param num_bytes: Number of bytes to read
+        :param args: Optional positional args to pass to the transport `recv_exactly` method
+        :param kwargs: Optional keyword args to pass to the transport `recv_exactly` method
+        :return: A :class:`~bytearray` of exactly `num_bytes` length
+        """
+        return (yield from self.recv(num_bytes, *args, **kwargs))
@@ -0,0 +1,299 @@
+"""
+    adbpy.connection.group
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for running the same operation against many devices concurrently.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+
+import adbpy
+from adbpy import transport
+from adbpy.connection import async as async_connection, sync
+from adbpy.transport.async import tcp as async_tcp, usb as async_usb
+from adbpy.transport.sync import tcp, usb
+
+
+__all__ = ['DeviceGroup', 'AsyncDeviceGroup', 'DeviceResult']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: Default maximum number of devices operated on at the same time.
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class DeviceResult(collections.namedtuple('DeviceResult', 'target result error')):
+    """
+    Outcome of running an operation against a single device of a group.
+
+    Exactly one of `result` and `error` is meaningful; `error` is the exception raised while connecting, setting up
+    or running the operation, or `None` when it succeeded.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class DeviceGroup:
+    """
+    Group of devices that runs a function against each of them using a bounded pool of threads.
+
+    Targets are USB serial numbers, "host:port" strings of TCP devices or :class:`~adbpy.transport.Transport`
+    instances. Each device gets its own :class:`~adbpy.connection.sync.Connection`, which is passed to the optional
+    `setup` function (e.g. the ADB handshake) and then to the operation. The `connect_timeout` is in seconds for every
+    kind of target, e.g.
+
+    >>> group = DeviceGroup(['0123456789ABCDEF', '10.0.0.2:5555'], setup=handshake)
+    >>> for outcome in group.run(lambda conn: adb.WireProtocol(conn).send(...)):
+    ...     print(outcome.target, outcome.result if outcome.ok else outcome.error)
+    """
+
+    def __init__(self, targets, setup=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, connect_timeout=None):
+        self.targets = list(targets)
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self._setup = setup
+
+    def __repr__(self):
+        return '<{}(targets={}, max_concurrency={})>'.format(self.__class__.__name__, len(self.targets),
+                                                             self.max_concurrency)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Run the given function against every device, yielding each outcome as it completes.
+
+        Devices that have not started yet are skipped if the caller stops iterating early.
+
+        :param func: Function called with a connection followed by `args` and `kwargs`
+        :param args: Optional positional args to pass to the function
+        :param kwargs: Optional keyword args to pass to the function
+        :return: Generator of :class:`~adbpy.connection.group.DeviceResult` instances in completion order
+        """
+        if not self.targets:
+            return
+
+        executor, futures = self._submit(func, args, kwargs)
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def map(self, func, *args, **kwargs):
+        """
+        Run the given function against every device and wait for all of them to complete.
+
+        :param func: Function called with a connection followed by `args` and `kwargs`
+        :param args: Optional positional args to pass to the function
+        :param kwargs: Optional keyword args to pass to the function
+        :return: A :class:`list` of :class:`~adbpy.connection.group.DeviceResult` instances in target order
+        """
+        if not self.targets:
+            return []
+
+        executor, futures = self._submit(func, args, kwargs)
+        with executor:
+            return [future.result() for future in futures]
+
+    def _submit(self, func, args, kwargs):
+        """
+        Submit the function for every device to a new thread pool.
+
+        :param func: Function called with a connection followed by `args` and `kwargs`
+        :param args: Positional args to pass to the function
+        :param kwargs: Keyword args to pass to the function
+        :return: Tuple of the :class:`~concurrent.futures.ThreadPoolExecutor` and a future per target
+        """
+        max_workers = max(1, min(self.max_concurrency, len(self.targets)))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        return executor, [executor.submit(self._run_one, target, func, args, kwargs) for target in self.targets]
+
+    def _run_one(self, target, func, args, kwargs):
+        """
+        Connect to a single device, run the function against it and disconnect.
+
+        :param target: Device target
+        :param func: Function called with a connection followed by `args` and `kwargs`
+        :param args: Positional args to pass to the function
+        :param kwargs: Keyword args to pass to the function
+        :return: A :class:`~adbpy.connection.group.DeviceResult` instance
+        """
+        try:
+            target_transport = _transport(target, tcp, usb)
+            conn = sync.Connection.connect(target_transport,
+                                           timeout=_connect_timeout(target_transport, self.connect_timeout))
+        except Exception as e:
+            return DeviceResult(target, None, e)
+
+        try:
+            if self._setup is not None:
+                self._setup(conn)
+            return DeviceResult(target, func(conn, *args, **kwargs), None)
+        except Exception as e:
+            return DeviceResult(target, None, e)
+        finally:
+            try:
+                conn.disconnect()
+            except Exception as e:
+                LOGGER.debug('Error disconnecting from %s: %s', target, e)
+
+
+class AsyncDeviceGroup:
+    """
+    Group of devices that runs a coroutine function against each of them with bounded concurrency.
+
+    Targets are the same as :class:`~adbpy.connection.group.DeviceGroup` and each device gets its own
+    :class:`~adbpy.connection.async.Connection`. The `setup` function and operation may be plain functions or
+    coroutine functions, e.g.
+
+    >>> group = AsyncDeviceGroup(['0123456789ABCDEF', '10.0.0.2:5555'], setup=handshake)
+    >>> for future in group.run(operation):
+    ...     outcome = yield from future
+    """
+
+    def __init__(self, targets, setup=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, connect_timeout=None,
+                 loop=None):
+        self.targets = list(targets)
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.loop = loop or adbpy.get_event_loop()
+        self._setup = setup
+
+    def __repr__(self):
+        return '<{}(targets={}, max_concurrency={})>'.format(self.__class__.__name__, len(self.targets),
+                                                             self.max_concurrency)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Schedule the given coroutine function against every device.
+
+        :param func: Coroutine function called with a connection followed by `args` and `kwargs`
+        :param args: Optional positional args to pass to the function
+        :param kwargs: Optional keyword args to pass to the function
+        :return: Iterator of futures, See: :func:`~asyncio.as_completed`, each resolving to a
+            :class:`~adbpy.connection.group.DeviceResult` instance in completion order
+        """
+        return asyncio.as_completed(self._schedule(func, args, kwargs), loop=self.loop)
+
+    @asyncio.coroutine
+    def map(self, func, *args, **kwargs):
+        """
+        Run the given coroutine function against every device and wait for all of them to complete.
+
+        :param func: Coroutine function called with a connection followed by `args` and `kwargs`
+        :param args: Optional positional args to pass to the function
+        :param kwargs: Optional keyword args to pass to the function
+        :return: A :class:`list` of :class:`~adbpy.connection.group.DeviceResult` instances in target order
+        """
+        if not self.targets:
+            return []
+
+        outcomes = yield from asyncio.gather(*self._schedule(func, args, kwargs), loop=self.loop)
+        return list(outcomes)
+
+    def _schedule(self, func, args, kwargs):
+        """
+        Schedule a task running the coroutine function for every device.
+
+        :param func: Coroutine function called with a connection followed by `args` and `kwargs`
+        :param args: Positional args to pass to the function
+        :param kwargs: Keyword args to pass to the function
+        :return: A :class:`list` of :class:`~asyncio.Task` instances, one per target
+        """
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency), loop=self.loop)
+        return [self.loop.create_task(self._run_one(semaphore, target, func, args, kwargs))
+                for target in self.targets]
+
+    @asyncio.coroutine
+    def _run_one(self, semaphore, target, func, args, kwargs):
+        """
+        Connect to a single device, run the coroutine function against it and disconnect.
+
+        :param semaphore: A :class:`~asyncio.Semaphore` bounding the number of devices operated on at once
+        :param target: Device target
+        :param func: Coroutine function called with a connection followed by `args` and `kwargs`
+        :param args: Positional args to pass to the function
+        :param kwargs: Keyword args to pass to the function
+        :return: A :class:`~adbpy.connection.group.DeviceResult` instance
+        """
+        with (yield from semaphore):
+            try:
+                conn = yield from async_connection.Connection.connect(_transport(target, async_tcp, async_usb),
+                                                                      loop=self.loop, timeout=self.connect_timeout)
+            except Exception as e:
+                return DeviceResult(target, None, e)
+
+            try:
+                if self._setup is not None:
+                    yield from _maybe_coroutine(self._setup(conn))
+                result = yield from _maybe_coroutine(func(conn, *args, **kwargs))
+                return DeviceResult(target, result, None)
+            except Exception as e:
+                return DeviceResult(target, None, e)
+            finally:
+                try:
+                    yield from conn.disconnect()
+                except Exception as e:
+                    LOGGER.debug('Error disconnecting from %s: %s', target, e)
+
+
+@asyncio.coroutine
+def _maybe_coroutine(value):
+    """
+    Wait for the given value if it is a coroutine or future, otherwise return it as is.
+
+    :param value: Return value of a plain or coroutine function
+    :return: Result of the function
+    """
+    if asyncio.iscoroutine(value) or isinstance(value, asyncio.Future):
+        value = yield from value
+    return value
+
+
+def _connect_timeout(target_transport, timeout):
+    """
+    Convert the given connect timeout to the unit taken by the given transport.
+
+    The synchronous USB transport takes milliseconds while every other transport takes seconds.
+
+    :param target_transport: A :class:`~adbpy.transport.Transport` instance
+    :param timeout: Connect timeout in seconds or `None`
+    :return: Connect timeout to pass to the transport
+    """
+    if timeout is not None and isinstance(target_transport, usb.Transport):
+        return timeout * 1000
+    return timeout
+
+
+def _transport(target, tcp_module, usb_module):
+    """
+    Create the transport for the given device target.
+
+    :param target: USB serial number, "host:port" string or :class:`~adbpy.transport.Transport` instance
+    :param tcp_module: Module containing the TCP transport to use
+    :param usb_module: Module containing the USB transport to use
+    :return: A :class:`~adbpy.transport.Transport` instance
+    """
+    if isinstance(target, transport.Transport):
+        return target
+
+    host, sep, port = target.rpartition(':')
+    if sep and host and port.isdigit():
+        return tcp_module.Transport(host, int(port))
+    return usb_module.Transport(serial=target)
@@ -0,0 +1,266 @@
+"""
+    adbpy.connection.pool
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for pooling synchronous (blocking) TCP connections to remote systems.
+"""
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from adbpy import connection
+from adbpy.connection import sync
+from adbpy.transport.sync import tcp
+
+
+__all__ = ['ConnectionPool', 'ConnectionPoolTimeoutError']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: Default maximum number of connections, idle or in use, per host/port.
+DEFAULT_MAX_PER_HOST = 4
+
+#: Default number of seconds a connection may stay idle in the pool before it is closed.
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+
+class ConnectionPoolTimeoutError(connection.ConnectionTimeoutError):
+    """
+    Exception raised when no connection to a host/port becomes available within the acquire timeout.
+    """
+
+
+#: Idle connection along with the time it was returned to the pool.
+_IdleConnection = collections.namedtuple('_IdleConnection', 'connection released_at')
+
+
+class ConnectionPool:
+    """
+    Pool of :class:`~adbpy.connection.sync.Connection` instances keyed by (host, port).
+
+    New connections are passed to the optional `setup` function before being handed out, which is where the ADB
+    handshake belongs so pooled connections are already authenticated, e.g.
+
+    >>> pool = ConnectionPool(setup=lambda conn: adb.WireProtocol(conn).handshake(key_paths=keys))
+    >>> with pool.connection('localhost', 5555) as conn:
+    ...     wire = adb.WireProtocol(conn)
+
+    Idle connections are closed once they exceed `idle_timeout` and are probed with
+    :meth:`~adbpy.connection.Connection.is_alive` before being reused. At most `max_per_host` connections, idle or
+    in use, exist for each host/port; acquiring more waits for one to be released.
+    """
+
+    def __init__(self, setup=None, max_per_host=DEFAULT_MAX_PER_HOST, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 connect_timeout=None):
+        self._setup = setup
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._idle = collections.defaultdict(collections.deque)
+        self._counts = collections.Counter()
+        self._keys = {}
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def __repr__(self):
+        return '<{}(max_per_host={}, idle_timeout={}, hosts={})>'.format(self.__class__.__name__, self.max_per_host,
+                                                                         self.idle_timeout, len(self._counts))
+
+    def acquire(self, host, port, timeout=None):
+        """
+        Take an idle, live connection to the given host/port from the pool or open a new one.
+
+        :param host: Remote host
+        :param port: Remote port
+        :param timeout: Optional timeout in seconds to wait for a connection when `max_per_host` are in use
+        :return: A :class:`~adbpy.connection.sync.Connection` instance
+        """
+        key = (host, port)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stale = []
+
+        try:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise connection.ConnectionError('{} is closed'.format(self))
+
+                    conn = self._take_idle(key, stale)
+                    if conn is not None:
+                        return conn
+
+                    if self._counts[key] < self.max_per_host:
+                        self._counts[key] += 1
+                        break
+
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise ConnectionPoolTimeoutError('No connection to {}:{} available within {} seconds'.format(
+                            host, port, timeout))
+                    self._condition.wait(remaining)
+        finally:
+            # Close stale connections without holding the lock so a slow close does not block other callers.
+            for conn in stale:
+                _disconnect(conn)
+
+        # Open the connection without holding the lock so other hosts are not blocked by a slow handshake.
+        try:
+            conn = self._open(host, port)
+        except Exception:
+            with self._condition:
+                self._counts[key] -= 1
+                self._condition.notify_all()
+            raise
+
+        with self._condition:
+            self._keys[id(conn)] = key
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return the given connection to the pool.
+
+        :param conn: A :class:`~adbpy.connection.sync.Connection` acquired from this pool
+        :param discard: Close the connection instead of keeping it, e.g. when its state is unknown after an error
+        :return: `None`
+        """
+        with self._condition:
+            key = self._keys.get(id(conn))
+            if key is None:
+                raise ValueError('{} was not acquired from {}'.format(conn, self))
+
+            if discard or self._closed or not conn.is_connected:
+                self._forget(conn)
+            else:
+                self._idle[key].append(_IdleConnection(conn, time.monotonic()))
+                self._condition.notify_all()
+                return
+
+        _disconnect(conn)
+
+    @contextlib.contextmanager
+    def connection(self, host, port, timeout=None):
+        """
+        Context manager that acquires a connection and releases it on exit. The connection is discarded if the
+        block raises.
+
+        :param host: Remote host
+        :param port: Remote port
+        :param timeout: Optional timeout in seconds to wait for a connection
+        :return: A :class:`~adbpy.connection.sync.Connection` instance
+        """
+        conn = self.acquire(host, port, timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def evict_idle(self):
+        """
+        Close every idle connection that exceeded the idle timeout.
+
+        :return: A :class:`int` number of connections closed
+        """
+        expired = []
+        with self._condition:
+            cutoff = time.monotonic() - self.idle_timeout
+            for idle in self._idle.values():
+                while idle and idle[0].released_at < cutoff:
+                    expired.append(idle.popleft().connection)
+            for conn in expired:
+                self._forget(conn)
+
+        for conn in expired:
+            _disconnect(conn)
+        return len(expired)
+
+    def close(self):
+        """
+        Close every idle connection; connections in use are closed when released.
+
+        :return: `None`
+        """
+        with self._condition:
+            self._closed = True
+            conns = [idle.connection for queue in self._idle.values() for idle in queue]
+            self._idle.clear()
+            for conn in conns:
+                self._forget(conn)
+
+        for conn in conns:
+            _disconnect(conn)
+
+    def _take_idle(self, key, stale):
+        """
+        Pop the most recently used idle connection for the given key that is not expired and still alive. Expired
+        and dead connections found along the way are forgotten and added to `stale` for the caller to close once it
+        releases the pool lock, which must be held.
+
+        :param key: Tuple of host and port
+        :param stale: A :class:`list` to add expired and dead connections to
+        :return: A :class:`~adbpy.connection.sync.Connection` instance or `None`
+        """
+        idle = self._idle.get(key)
+        cutoff = time.monotonic() - self.idle_timeout
+        while idle:
+            conn, released_at = idle.pop()
+            if released_at >= cutoff and conn.is_alive():
+                return conn
+            LOGGER.debug('Closing stale pooled connection %s', conn)
+            self._forget(conn)
+            stale.append(conn)
+        return None
+
+    def _forget(self, conn):
+        """
+        Stop tracking the given connection. The pool lock must be held.
+
+        :param conn: A :class:`~adbpy.connection.sync.Connection` instance
+        :return: `None`
+        """
+        key = self._keys.pop(id(conn))
+        self._counts[key] -= 1
+        if not self._counts[key]:
+            del self._counts[key]
+        self._condition.notify_all()
+
+    def _open(self, host, port):
+        """
+        Open and set up a new connection to the given host/port.
+
+        :param host: Remote host
+        :param port: Remote port
+        :return: A :class:`~adbpy.connection.sync.Connection` instance
+        """
+        LOGGER.debug('Opening pooled connection to %s:%s', host, port)
+        conn = sync.Connection.connect(tcp.Transport(host, port), timeout=self.connect_timeout)
+        if self._setup is not None:
+            try:
+                self._setup(conn)
+            except Exception:
+                _disconnect(conn)
+                raise
+        return conn
+
+
+def _disconnect(conn):
+    """
+    Disconnect the given connection, ignoring errors since it is being thrown away.
+
+    :param conn: A :class:`~adbpy.connection.sync.Connection` instance
+    :return: `None`
+    """
+    if not conn.is_connected:
+        return
+    try:
+        conn.disconnect()
+    except connection.ConnectionError as e:
+        LOGGER.debug('Error disconnecting pooled connection %s: %s', conn, e)
@@ -17,8 +17,8 @@ class Connection(connection.Connection):
     """
 
     @classmethod
-    @exception.rethrow_timeout(transport.TransportConnectTimeout, connection.ConnectionTimeoutError)
     @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportConnectTimeout, connection.ConnectionTimeoutError)
     def connect(cls, transport, *args, **kwargs):
         """
         Create a new connection based on the given transport.
@@ -32,8 +32,8 @@ class Connection(connection.Connection):
         return cls(transport, context)
 
     @connection.requires_active_connection
-    @exception.rethrow_timeout(transport.TransportDisconnectTimeout, connection.ConnectionTimeoutError)
     @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportDisconnectTimeout, connection.ConnectionTimeoutError)
     def disconnect(self, *args, **kwargs):
         """
         Disconnect the connection.
@@ -47,8 +47,8 @@ class Connection(connection.Connection):
         self._context = None
 
     @connection.requires_active_connection
-    @exception.rethrow_timeout(transport.TransportSendTimeout, connection.ConnectionTimeoutError)
     @exception.rethrow(transport.TransportError, connection.ConnectionError)
+    @exception.rethrow_timeout(transport.TransportSendTimeout, connection.ConnectionTimeoutError)
     def send(self, data, *args, **kwargs):
         """
         Send the given data buffer over the connection.
@@ -60,28 +60,62 @@ class Connection(connection.Connection):
         """
         return self._transport.send(self._context, data, **kwargs)
 
+    def recv(self, num_bytes, *args, **kwargs):
+        """
+        Read exactly the given number of bytes from the connection.
+
+        :param num_bytes: Number of bytes to read
+        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :return: A :class:`~bytearray` of exactly `num_bytes` length
+        """
+        return self.recv_exactly(num_bytes, *args, **kwargs)
+
     @connection.requires_active_connection
-    @exception.rethrow_timeout(transport.TransportReceiveTimeout, connection.ConnectionTimeoutError)
     @exception.rethrow(transport.TransportError, connection.ConnectionError)
-    def recv(self, num_bytes, *args, **kwargs):
+    @exception.rethrow_timeout(transport.TransportReceiveTimeout, connection.ConnectionTimeoutError)
+    def recv_into(self, buffer, *args, **kwargs):
+        """
+        Read bytes from the connection until the given buffer is full.
+
+        :param buffer: Writable buffer, e.g. :class:`~bytearray` or :class:`~memoryview`, to read into
+        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :return: Number of bytes read, which is always `len(buffer)`
+        """
+        view = memoryview(buffer).cast('B')
+        num_received = self._fill(view, **kwargs)
+        if num_received != len(view):
+            raise connection.ConnectionEndOfStreamError('Expected {} bytes; received {}'.format(len(view),
+                                                                                                num_received))
+        return num_received
+
+    def recv_exactly(self, num_bytes, *args, **kwargs):
         """
-        Read bytes from the connection.
+        Read exactly the given number of bytes from the connection.
 
         :param num_bytes: Number of bytes to read
-        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.recv` method
-        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.recv` method
-        :return: Bytes read
+        :param args: Optional positional args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :return: A :class:`~bytearray` of exactly `num_bytes` length
         """
-        if not num_bytes:
-            return None
-
-        buf = b''
-        remaining = num_bytes
-        while remaining > 0:
-            data = self._transport.recv(self._context, remaining, **kwargs)
-            if not data:
+        buf = bytearray(num_bytes)
+        self.recv_into(buf, *args, **kwargs)
+        return buf
+
+    def _fill(self, view, **kwargs):
+        """
+        Read from the transport into the given view until it is full or the remote end closes the connection.
+
+        :param view: A :class:`~memoryview` to fill
+        :param kwargs: Optional keyword args to pass to the :meth:`~adbpy.transport.Transport.recv_into` method
+        :return: Number of bytes read into the view
+        """
+        num_received, num_bytes = 0, len(view)
+        while num_received < num_bytes:
+            received = self._transport.recv_into(self._context, view[num_received:], **kwargs)
+            if not received:
                 break
-            buf += data
-            remaining -= len(data)
+            num_received += received
 
-        return buf
+        return num_received
@@ -3,10 +3,18 @@
     ~~~~~~~~~~~~
 
     Contains functionality for dealing with RSA keys required for auth between host and device.
+
+    AUTH tokens are signed by a :class:`~adbpy.crypto.Signer` backend. The pure-Python `rsa` backend is always
+    available; the `cryptography` backend is used by default when that package is installed since it signs several
+    orders of magnitude faster.
 """
 
+import abc
+import collections
 import io
 import os
+import threading
+
 import rsa
 
 from pyasn1.type.univ import ObjectIdentifier
@@ -14,8 +22,17 @@ from pyasn1.codec.der import decoder
 
 from rsa import pem
 
+try:
+    from cryptography.exceptions import UnsupportedAlgorithm
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa as crypto_rsa, utils
+except ImportError:
+    crypto_rsa = None
 
-__all__ = ['sign', 'public_key_bytes_from_private_key_path', 'KeyLoadError', 'KeySignError']
+
+__all__ = ['sign', 'public_key_bytes_from_private_key_path', 'KeyStore', 'key_store', 'Signer', 'RSASigner',
+           'CryptographySigner', 'SIGNERS', 'DEFAULT_SIGNER', 'get_signer', 'KeyLoadError', 'KeySignError']
 
 
 #: Key marker used to identify "header" and "footer" of PKCS #8 key.
@@ -32,6 +49,10 @@ RSA_OID = ObjectIdentifier('1.2.840.113549.1.1.1')
 PATCHED_HASH_KEY = 'ADB'
 
 
+#: Default maximum number of entries cached by a :class:`~adbpy.crypto.KeyStore`.
+DEFAULT_KEY_CACHE_SIZE = 64
+
+
 class KeyLoadError(Exception):
     """
     Exception raised when loading of the private key fails.
@@ -44,6 +65,228 @@ class KeySignError(Exception):
     """
 
 
+class Signer(metaclass=abc.ABCMeta):
+    """
+    Abstract class that defines the interface a signing backend must implement.
+
+    A signer loads PKCS #8 RSA private keys into its own key type and signs AUTH tokens sent by `adbd`. The token is
+    already a SHA-1 digest, so it must be signed with PKCS #1 v1.5 padding *without* being hashed again.
+    """
+
+    #: Name of the backend.
+    name = None
+
+    def __repr__(self):
+        return '<{}(name={})>'.format(self.__class__.__name__, self.name)
+
+    @abc.abstractmethod
+    def load_private_key(self, path):
+        """
+        Load the PKCS #8 RSA private key from the given path.
+
+        :param path: Path to PKCS #8 RSA key to load
+        :return: Private key object specific to this backend
+        """
+
+    @abc.abstractmethod
+    def sign(self, private_key, data):
+        """
+        Sign the given pre-hashed bytes with the given private key.
+
+        :param private_key: Private key object returned by :meth:`load_private_key`
+        :param data: Bytes of SHA-1 digest to sign
+        :return: Signed bytes
+        """
+
+
+class RSASigner(Signer):
+    """
+    Signer backed by the pure-Python :mod:`rsa` package along with the patched :class:`~adbpy.crypto.ADBHash`.
+    """
+
+    name = 'rsa'
+
+    def load_private_key(self, path):
+        return _private_key_from_path(path)
+
+    def sign(self, private_key, data):
+        try:
+            return rsa.sign(data, private_key, PATCHED_HASH_KEY)
+        except Exception as e:
+            raise KeySignError('Unable to sign data: {}'.format(e))
+
+
+class CryptographySigner(Signer):
+    """
+    Signer backed by the optional :mod:`cryptography` package, which signs the token as a pre-hashed SHA-1 digest.
+    """
+
+    name = 'cryptography'
+
+    def load_private_key(self, path):
+        try:
+            private_key = serialization.load_pem_private_key(_read_bytes(path), password=None,
+                                                             backend=default_backend())
+        except (ValueError, TypeError, UnsupportedAlgorithm):
+            raise KeyLoadError('Unable to load/decode PKCS #8 RSA key')
+
+        if not isinstance(private_key, crypto_rsa.RSAPrivateKey):
+            raise KeyLoadError('Got key type {}, expected RSA'.format(type(private_key).__name__))
+        return private_key
+
+    def sign(self, private_key, data):
+        try:
+            return private_key.sign(bytes(data), padding.PKCS1v15(), utils.Prehashed(hashes.SHA1()))
+        except Exception as e:
+            raise KeySignError('Unable to sign data: {}'.format(e))
+
+
+#: Available signing backends by name.
+SIGNERS = collections.OrderedDict([
+    ('rsa', RSASigner())
+])
+
+if crypto_rsa is not None:
+    SIGNERS['cryptography'] = CryptographySigner()
+
+#: Name of the backend used when none is specified; the fastest one available.
+DEFAULT_SIGNER = 'cryptography' if 'cryptography' in SIGNERS else 'rsa'
+
+
+def get_signer(name=None):
+    """
+    Get the signer for the backend of the given name.
+
+    :param name: Optional name of the backend; default: :data:`~adbpy.crypto.DEFAULT_SIGNER`
+    :return: A :class:`~adbpy.crypto.Signer` instance
+    """
+    name = name or DEFAULT_SIGNER
+    try:
+        return SIGNERS[name]
+    except KeyError:
+        raise ValueError('Unknown signer backend {}; expected one of {}'.format(name, ', '.join(SIGNERS)))
+
+
+class KeyStore:
+    """
+    Least recently used cache of loaded private keys and public key bytes.
+
+    Private keys are loaded by, and cached in the form needed by, the store's :class:`~adbpy.crypto.Signer`.
+
+    Entries are keyed by path and modification time, so a key file that changes on disk is loaded again on next use.
+    Use :meth:`invalidate` to drop entries explicitly, e.g. after replacing keys within the resolution of the file
+    system timestamps.
+    """
+
+    def __init__(self, maxsize=DEFAULT_KEY_CACHE_SIZE, signer=None):
+        self.maxsize = maxsize
+        self.signer = signer or get_signer()
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{}(maxsize={}, signer={}, size={})>'.format(self.__class__.__name__, self.maxsize, self.signer.name,
+                                                             len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def private_key(self, path):
+        """
+        Get the PKCS #8 RSA private key at the given path.
+
+        :param path: Path to PKCS #8 RSA key to load
+        :return: Private key object specific to the store signer
+        """
+        _validate_private_key_path(path)
+        return self._get(self.signer.name, path, self.signer.load_private_key)
+
+    def sign(self, path, data):
+        """
+        Sign the given bytes using the private key at the specified path.
+
+        :param path: Path to private key to sign bytes with
+        :param data: Bytes of data to sign
+        :return: Signed bytes
+        """
+        return self.signer.sign(self.private_key(path), data)
+
+    def public_key_bytes(self, path):
+        """
+        Get the bytes of the public key for the corresponding private key file path.
+
+        :param path: Path to private key
+        :return: Bytes of public key
+        """
+        _validate_private_key_path(path)
+
+        public_key_path = '{}.pub'.format(path)
+        if not os.path.exists(public_key_path):
+            raise ValueError('Public key path {} does not exist'.format(path))
+
+        return self._get('public', public_key_path, _read_bytes)
+
+    def invalidate(self, path=None):
+        """
+        Drop the cached entries for the given private key path or all entries.
+
+        :param path: Optional path to private key; default: `None` (all keys)
+        :return: `None`
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            paths = (os.path.abspath(path), os.path.abspath('{}.pub'.format(path)))
+            for key in [key for key in self._entries if key[1] in paths]:
+                del self._entries[key]
+
+    def _get(self, kind, path, loader):
+        """
+        Get the cached value for the given file or load and cache it.
+
+        :param kind: Kind of value cached for the file
+        :param path: Path to the file
+        :param loader: Function that loads the value from the path
+        :return: Cached or newly loaded value
+        """
+        path = os.path.abspath(path)
+        key = (kind, path, os.stat(path).st_mtime_ns)
+
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            except KeyError:
+                pass
+
+        value = loader(path)
+
+        with self._lock:
+            # Drop entries for older versions of the same file before adding the new one.
+            for stale in [k for k in self._entries if k[:2] == key[:2]]:
+                del self._entries[stale]
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return value
+
+
+#: Process-wide key store, See: :func:`~adbpy.crypto.key_store`.
+_key_store = KeyStore()
+
+
+def key_store():
+    """
+    Get the process-wide :class:`~adbpy.crypto.KeyStore` used by :func:`~adbpy.crypto.sign` and
+    :func:`~adbpy.crypto.public_key_bytes_from_private_key_path`.
+
+    :return: A :class:`~adbpy.crypto.KeyStore` instance
+    """
+    return _key_store
+
+
 def sign(path, data):
     """
     Sign the given bytes using the private key at the specified path.
@@ -52,8 +295,7 @@ def sign(path, data):
     :param data: Bytes of data to sign
     :return: Signed bytes
     """
-    private_key = _private_key_from_path(path)
-    return rsa.sign(data, private_key, PATCHED_HASH_KEY)
+    return _key_store.sign(path, data)
 
 
 def public_key_bytes_from_private_key_path(path):
@@ -65,19 +307,32 @@ def public_key_bytes_from_private_key_path(path):
     :param path: Path to private key
     :return: Bytes of public key
     """
+    return _key_store.public_key_bytes(path)
+
+
+def _validate_private_key_path(path):
+    """
+    Validate that the given private key path exists.
+
+    :param path: Path to private key
+    :return: `None`
+    """
     if not path:
         raise ValueError('Path required')
 
     if not os.path.exists(path):
         raise ValueError('Private key path {} does not exist'.format(path))
 
-    public_key_path = '{}.pub'.format(path)
 
-    if not os.path.exists(public_key_path):
-        raise ValueError('Public key path {} does not exist'.format(path))
+def _read_bytes(path):
+    """
+    Read the contents of the file at the given path.
 
-    with io.open(public_key_path, 'rb') as public_key:
-        return public_key.read()
+    :param path: Path to file
+    :return: Bytes of the file
+    """
+    with io.open(path, 'rb') as f:
+        return f.read()
 
 
 def _private_key_from_path(path):
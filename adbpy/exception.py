@@ -5,44 +5,64 @@
     Contains functionality for dealing with exceptions.
 """
 
+import asyncio
 import functools
 
 
-def rethrow(catch_exc, raise_exc, raise_exc_fmt='{catch_exc.message}'):
+def rethrow(catch_exc, raise_exc, raise_exc_fmt='{catch_exc}'):
     """
     Decorator to catch a specific exception type and rethrow it as another.
 
+    Supports both regular functions and coroutines.
+
     :param catch_exc: Type of exception to catch
     :param raise_exc: Type of exception to throw
     :param raise_exc_fmt: Format string to generate message of new exception
     """
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except catch_exc as e:
-                raise raise_exc(raise_exc_fmt.format(catch_exc=catch_exc)) from e
-        return wrapper
-    return decorator
+    def new_exc(func, args, kwargs, e):
+        return raise_exc(raise_exc_fmt.format(catch_exc=e))
+    return _rethrow_decorator(catch_exc, new_exc)
 
 
 def rethrow_timeout(catch_exc, raise_exc):
     """
     Decorator to catch specific timeout exception types and rethrow it as another.
 
+    Supports both regular functions and coroutines.
+
     :param catch_exc: Type of timeout exception to catch
     :param raise_exc: Type of timeout exception to throw
     """
+    def new_exc(func, args, kwargs, e):
+        timeout = kwargs.get('timeout')
+        timeout_msg = '' if not timeout else ' of {} ms'.format(timeout)
+        return raise_exc('{} exceeded timeout{}'.format(func.__name__, timeout_msg))
+    return _rethrow_decorator(catch_exc, new_exc)
+
+
+def _rethrow_decorator(catch_exc, new_exc):
+    """
+    Build a decorator that catches a specific exception type and rethrows the exception created by `new_exc`.
+
+    :param catch_exc: Type of exception to catch
+    :param new_exc: Function that takes the decorated function, its args, kwargs and caught exception and
+    returns the exception to throw
+    """
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except catch_exc as e:
-                timeout = kwargs.get('timeout')
-                timeout_msg = '' if not timeout else ' of {} ms'.format(timeout)
-                exc_msg = '{} exceeded timeout{}'.format(func.__name__, timeout_msg)
-                raise raise_exc(exc_msg) from e
+        if asyncio.iscoroutinefunction(func):
+            @asyncio.coroutine
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    return (yield from func(*args, **kwargs))
+                except catch_exc as e:
+                    raise new_exc(func, args, kwargs, e) from e
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    return func(*args, **kwargs)
+                except catch_exc as e:
+                    raise new_exc(func, args, kwargs, e) from e
         return wrapper
     return decorator
@@ -0,0 +1,486 @@
+"""
+    adbpy.instrumentation
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for collecting metrics about ADB connections and their streams.
+
+    A :class:`~adbpy.instrumentation.ConnectionMetrics` instance attached to a wire protocol counts the messages and
+    bytes sent and received per command, checksum failures and timeouts, and records latency histograms of stream
+    opens (round trips) and write acknowledgements. Metrics are aggregated in memory and optionally forwarded to a
+    :class:`~adbpy.instrumentation.Sink` that exports them, e.g. to StatsD or Prometheus.
+
+    Instrumentation is disabled unless a wire protocol is given metrics; the cost of the disabled path is a single
+    `None` check per message.
+
+    >>> metrics = ConnectionMetrics(sink=StatsdSink(), tags={'serial': serial})
+    >>> wire = WireProtocol(conn, metrics=metrics)
+"""
+
+import abc
+import bisect
+import collections
+import socket
+import threading
+import time
+
+from adbpy.message import adb
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+__all__ = ['ConnectionMetrics', 'Histogram', 'AckTimer', 'Sink', 'StatsdSink', 'PrometheusSink',
+           'DEFAULT_BUCKETS', 'command_name']
+
+
+#: Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: Maximum size in bytes of a single StatsD datagram, small enough to never be fragmented.
+STATSD_MAX_DATAGRAM = 1432
+
+#: Default maximum number of seconds a metric is buffered by a :class:`~adbpy.instrumentation.StatsdSink` once
+#: another metric is written.
+STATSD_FLUSH_INTERVAL = 1.0
+
+#: Name of each command by its value.
+COMMAND_NAMES = {command.value: command.name.upper() for command in adb.Command}
+
+
+def command_name(command):
+    """
+    Get the name of the given message command, e.g. "WRTE".
+
+    :param command: Message command value
+    :return: Name of the command or its hex value if it is unknown
+    """
+    return COMMAND_NAMES.get(command) or hex(command)
+
+
+def _service(destination):
+    """
+    Get the service of the given stream destination, e.g. "shell" for "shell:ls".
+
+    :param destination: Stream destination
+    :return: Service name
+    """
+    return destination.split(':', 1)[0]
+
+
+class Histogram:
+    """
+    Histogram of values, e.g. latencies in seconds, counted in fixed buckets.
+
+    :param buckets: Sorted upper bounds of the buckets; values above the last one are counted in an overflow bucket
+    """
+
+    __slots__ = ['buckets', 'counts', 'count', 'sum', 'max']
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def __repr__(self):
+        return '<{}(count={}, mean={}, max={})>'.format(self.__class__.__name__, self.count, self.mean, self.max)
+
+    @property
+    def mean(self):
+        """
+        Return the mean of all observed values or `0.0` if there are none.
+        """
+        return self.sum / self.count if self.count else 0.0
+
+    def observe(self, value):
+        """
+        Count the given value.
+
+        :param value: Value to count
+        :return: `None`
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """
+        Estimate the given percentile as the upper bound of the bucket it falls in.
+
+        :param percent: Percentile between 0 and 100
+        :return: Upper bound of the bucket, the maximum value for the overflow bucket or `0.0` if there are no values
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, self.count * percent / 100.0)
+        total = 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        """
+        Return the state of the histogram as a :class:`dict`.
+        """
+        return {'count': self.count, 'sum': self.sum, 'max': self.max,
+                'buckets': collections.OrderedDict(zip(self.buckets + (float('inf'),), self.counts))}
+
+
+class Sink(metaclass=abc.ABCMeta):
+    """
+    Abstract class that defines the interface a metrics exporter must implement.
+
+    Sinks are called synchronously on every recorded event, from the threads or event loops of the connections, so
+    they must be thread-safe and must not block.
+    """
+
+    @abc.abstractmethod
+    def increment(self, name, value, tags):
+        """
+        Increment the counter of the given name.
+
+        :param name: Metric name, e.g. "adb.messages.sent"
+        :param value: Amount to increment by
+        :param tags: A :class:`dict` of tag name to value
+        :return: `None`
+        """
+
+    @abc.abstractmethod
+    def observe(self, name, value, tags):
+        """
+        Record the given value in the histogram of the given name.
+
+        :param name: Metric name, e.g. "adb.ack.seconds"
+        :param value: Observed value in seconds
+        :param tags: A :class:`dict` of tag name to value
+        :return: `None`
+        """
+
+    def flush(self):
+        """
+        Export anything buffered by the sink.
+
+        :return: `None`
+        """
+
+
+class StatsdSink(Sink):
+    """
+    Sink that sends metrics to a StatsD server over UDP, buffering them into datagrams of up to
+    :data:`STATSD_MAX_DATAGRAM` bytes.
+
+    A datagram is sent once it is full or, when a metric is written, once its oldest metric was buffered for
+    `flush_interval` seconds. Metrics written right before a connection goes quiet stay buffered until the next
+    write, so call :meth:`flush` on a timer to export them promptly.
+
+    :param host: StatsD server host
+    :param port: StatsD server port
+    :param prefix: Optional prefix prepended to every metric name
+    :param dogstatsd: Append tags using the DogStatsD extension; default: `True`, otherwise tags are dropped
+    :param flush_interval: Maximum number of seconds to buffer metrics; default: :data:`STATSD_FLUSH_INTERVAL`
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='', dogstatsd=True, flush_interval=STATSD_FLUSH_INTERVAL):
+        self.address = (host, port)
+        self.prefix = prefix + '.' if prefix else ''
+        self.dogstatsd = dogstatsd
+        self.flush_interval = flush_interval
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._buffer = []
+        self._size = 0
+        self._buffered_at = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{}(address={}, prefix={})>'.format(self.__class__.__name__, self.address, self.prefix)
+
+    def increment(self, name, value, tags):
+        self._write('{}{}:{}|c{}'.format(self.prefix, name, value, self._tags(tags)))
+
+    def observe(self, name, value, tags):
+        self._write('{}{}:{:.3f}|ms{}'.format(self.prefix, name, value * 1000, self._tags(tags)))
+
+    def flush(self):
+        with self._lock:
+            self._send()
+
+    def close(self):
+        """
+        Flush buffered metrics and close the socket.
+
+        :return: `None`
+        """
+        self.flush()
+        self._socket.close()
+
+    def _tags(self, tags):
+        if not tags or not self.dogstatsd:
+            return ''
+        return '|#' + ','.join('{}:{}'.format(key, value) for key, value in sorted(tags.items()))
+
+    def _write(self, line):
+        now = time.monotonic()
+        with self._lock:
+            if self._size + len(line) + 1 > STATSD_MAX_DATAGRAM:
+                self._send()
+            if not self._buffer:
+                self._buffered_at = now
+            self._buffer.append(line)
+            self._size += len(line) + 1
+            if now - self._buffered_at >= self.flush_interval:
+                self._send()
+
+    def _send(self):
+        if not self._buffer:
+            return
+        try:
+            self._socket.sendto('\n'.join(self._buffer).encode(), self.address)
+        except OSError:
+            # Metrics are best effort; a missing server must not break connections.
+            pass
+        del self._buffer[:]
+        self._size = 0
+
+
+class PrometheusSink(Sink):
+    """
+    Sink that records metrics in `prometheus_client` counters and histograms, created on first use with the tag
+    names as labels. Requires the optional `prometheus_client` package.
+
+    :param registry: Optional `prometheus_client` registry; default: the global registry
+    :param namespace: Optional namespace prepended to every metric name
+    :param buckets: Upper bounds in seconds of the histogram buckets
+    """
+
+    def __init__(self, registry=None, namespace='', buckets=DEFAULT_BUCKETS):
+        if prometheus_client is None:
+            raise RuntimeError('PrometheusSink requires the prometheus_client package')
+        self.registry = registry or prometheus_client.REGISTRY
+        self.namespace = namespace
+        self.buckets = buckets
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value, tags):
+        self._metric(prometheus_client.Counter, name, tags, {}).labels(**tags).inc(value)
+
+    def observe(self, name, value, tags):
+        self._metric(prometheus_client.Histogram, name, tags, {'buckets': self.buckets}).labels(**tags).observe(value)
+
+    def _metric(self, metric_class, name, tags, kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = metric_class(name.replace('.', '_'), name, sorted(tags),
+                                                                namespace=self.namespace, registry=self.registry,
+                                                                **kwargs)
+        return metric
+
+
+class ConnectionMetrics:
+    """
+    Metrics of a single ADB connection, aggregated in memory and forwarded to an optional sink.
+
+    Message and byte counters are keyed by command value, use :func:`command_name` to name them. Latency
+    histograms are keyed by stream service, e.g. "shell" or "sync", so slow services stand out.
+
+    :param sink: Optional :class:`~adbpy.instrumentation.Sink` to forward every event to
+    :param tags: Optional :class:`dict` of tags identifying the connection, e.g. the device serial, added to every
+        event forwarded to the sink
+    :param buckets: Upper bounds in seconds of the latency histogram buckets
+    """
+
+    def __init__(self, sink=None, tags=None, buckets=DEFAULT_BUCKETS):
+        self.sink = sink
+        self.tags = dict(tags or {})
+        self.buckets = buckets
+        self.messages_sent = collections.Counter()
+        self.bytes_sent = collections.Counter()
+        self.messages_received = collections.Counter()
+        self.bytes_received = collections.Counter()
+        self.checksum_failures = 0
+        self.timeouts = collections.Counter()
+        self.round_trips = collections.defaultdict(self._histogram)
+        self.acks = collections.defaultdict(self._histogram)
+
+    def __repr__(self):
+        return '<{}(tags={}, sent={}, received={})>'.format(self.__class__.__name__, self.tags,
+                                                            sum(self.messages_sent.values()),
+                                                            sum(self.messages_received.values()))
+
+    def sent(self, messages):
+        """
+        Count the given messages written to the connection.
+
+        :param messages: Iterable of :class:`~adbpy.message.adb.Message` instances
+        :return: `None`
+        """
+        for msg in messages:
+            self._count(self.messages_sent, self.bytes_sent, 'sent', msg)
+
+    def received(self, msg):
+        """
+        Count the given message read from the connection.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance
+        :return: `None`
+        """
+        self._count(self.messages_received, self.bytes_received, 'received', msg)
+
+    def checksum_failure(self):
+        """
+        Count a message received with an invalid data payload checksum.
+
+        :return: `None`
+        """
+        self.checksum_failures += 1
+        if self.sink is not None:
+            self.sink.increment('adb.checksum_failures', 1, self.tags)
+
+    def timeout(self, operation):
+        """
+        Count an operation that exceeded its timeout.
+
+        :param operation: Name of the operation, e.g. "recv" or "stream.read"
+        :return: `None`
+        """
+        self.timeouts[operation] += 1
+        if self.sink is not None:
+            self.sink.increment('adb.timeouts', 1, self._tagged('operation', operation))
+
+    def round_trip(self, service, seconds):
+        """
+        Record the time the remote system took to accept a stream.
+
+        :param service: Service of the stream, e.g. "shell"
+        :param seconds: Time from sending OPEN to receiving OKAY
+        :return: `None`
+        """
+        self.round_trips[service].observe(seconds)
+        if self.sink is not None:
+            self.sink.observe('adb.round_trip.seconds', seconds, self._tagged('service', service))
+
+    def ack(self, service, seconds):
+        """
+        Record the time the remote system took to acknowledge a write.
+
+        :param service: Service of the stream, e.g. "sync"
+        :param seconds: Time from sending WRTE to receiving the OKAY covering it
+        :return: `None`
+        """
+        self.acks[service].observe(seconds)
+        if self.sink is not None:
+            self.sink.observe('adb.ack.seconds', seconds, self._tagged('service', service))
+
+    def stream_timer(self, destination):
+        """
+        Create an :class:`~adbpy.instrumentation.AckTimer` for a stream being opened to the given destination.
+
+        :param destination: Stream destination
+        :return: An :class:`~adbpy.instrumentation.AckTimer` instance
+        """
+        return AckTimer(self, _service(destination))
+
+    def snapshot(self):
+        """
+        Return all metrics as a :class:`dict` with commands named, e.g. for logging or serializing to JSON.
+        """
+        def named(counter):
+            return {command_name(command): value for command, value in counter.items()}
+
+        def histograms(by_service):
+            return {service: histogram.snapshot() for service, histogram in by_service.items()}
+
+        return {
+            'tags': dict(self.tags),
+            'messages_sent': named(self.messages_sent),
+            'bytes_sent': named(self.bytes_sent),
+            'messages_received': named(self.messages_received),
+            'bytes_received': named(self.bytes_received),
+            'checksum_failures': self.checksum_failures,
+            'timeouts': dict(self.timeouts),
+            'round_trips': histograms(self.round_trips),
+            'acks': histograms(self.acks)
+        }
+
+    def _histogram(self):
+        return Histogram(self.buckets)
+
+    def _count(self, messages, num_bytes, direction, msg):
+        size = adb.MESSAGE_SIZE + msg.data_length
+        messages[msg.command] += 1
+        num_bytes[msg.command] += size
+        if self.sink is not None:
+            tags = self._tagged('command', command_name(msg.command))
+            self.sink.increment('adb.messages.' + direction, 1, tags)
+            self.sink.increment('adb.bytes.' + direction, size, tags)
+
+    def _tagged(self, name, value):
+        tags = dict(self.tags)
+        tags[name] = value
+        return tags
+
+
+class AckTimer:
+    """
+    Times how long the remote system takes to accept a stream and to acknowledge each of its writes.
+
+    Writes are acknowledged in order, so each OKAY acknowledges the oldest outstanding writes its acked bytes cover,
+    or every outstanding write without delayed acknowledgements.
+
+    :param metrics: A :class:`~adbpy.instrumentation.ConnectionMetrics` instance to record into
+    :param service: Service of the stream, e.g. "shell"
+    """
+
+    __slots__ = ['metrics', 'service', 'opened_at', 'written', 'acked', 'pending']
+
+    #: Clock used for timing.
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, metrics, service):
+        self.metrics = metrics
+        self.service = service
+        self.opened_at = self.clock()
+        self.written = 0
+        self.acked = 0
+        self.pending = collections.deque()
+
+    def opened(self):
+        """
+        Record the stream was accepted by the remote system.
+
+        :return: `None`
+        """
+        self.metrics.round_trip(self.service, self.clock() - self.opened_at)
+
+    def sent(self, num_bytes):
+        """
+        Record a write of the given number of bytes was sent.
+
+        :param num_bytes: Number of bytes written
+        :return: `None`
+        """
+        self.written += num_bytes
+        self.pending.append((self.clock(), self.written))
+
+    def on_ack(self, acked_bytes):
+        """
+        Record an acknowledgement from the remote system.
+
+        :param acked_bytes: Number of bytes acknowledged or `None` if it acknowledges every outstanding write
+        :return: `None`
+        """
+        self.acked = self.written if acked_bytes is None else self.acked + acked_bytes
+        now = self.clock()
+        while self.pending and self.pending[0][1] <= self.acked:
+            sent_at, _ = self.pending.popleft()
+            self.metrics.ack(self.service, now - sent_at)
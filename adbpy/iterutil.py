@@ -7,7 +7,7 @@
 import collections
 
 
-__all__ = ['IterableEmpty', 'iterable', 'first']
+__all__ = ['IterableEmpty', 'iterable', 'first', 'chunks']
 
 
 DEFAULT_SENTINEL = object()
@@ -44,3 +44,21 @@ def first(func, *args, **kwargs):
         raise IterableEmpty('Iterable did not yield any items')
 
     return item
+
+
+def chunks(data, size):
+    """
+    Return a generator that yields consecutive slices of the given bytes-like object that are at most `size` bytes.
+
+    Slices are :class:`~memoryview` instances so no data is copied.
+
+    :param data: Bytes-like object to slice
+    :param size: Maximum number of bytes in each slice
+    :return: Generator that yields :class:`~memoryview` slices of the data
+    """
+    if size < 1:
+        raise ValueError('size must be >= 1')
+
+    view = memoryview(data).cast('B')
+    for offset in range(0, len(view), size):
+        yield view[offset:offset + size]
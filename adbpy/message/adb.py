@@ -9,21 +9,32 @@ import enum
 import struct
 
 from adbpy import message
+from adbpy.message import checksum
 
 
-__all__ = ['Message', 'Command', 'AuthType', 'to_bytes', 'from_bytes',
+__all__ = ['Message', 'Command', 'AuthType', 'Feature', 'FrameDecoder', 'to_bytes', 'to_bytes_many', 'pack_into',
+           'from_bytes', 'set_checksum_backend', 'version_skips_checksum', 'acked_bytes', 'parse_system_identity',
            'connect', 'auth', 'open', 'ready', 'write', 'close']
 
 
 #: Protocol version.
 VERSION = 0x01000000
 
+#: Protocol version from which data payload checksums are no longer computed or validated.
+VERSION_SKIP_CHECKSUM = 0x01000001
+
 #: Maximum message body size.
 MAXDATA = 256 * 1024
 
 #: Older ADB version max data size limit; required max for CONNECT and AUTH messages.
 CONNECT_AUTH_MAXDATA = 4096
 
+#: Size of the receive window advertised when opening a stream with delayed acknowledgements.
+DELAYED_ACK_WINDOW = 32 * 1024 * 1024
+
+#: Struct of the acknowledged byte count carried by an OKAY message when using delayed acknowledgements.
+ACKED_BYTES_STRUCT = struct.Struct('<I')
+
 #: Size of a serialized ADB message in bytes.
 MESSAGE_SIZE = 24
 
@@ -33,6 +44,12 @@ COMMAND_MASK = 0xffffffff
 #: Struct pack/unpack string for handling six unsigned integers.
 MESSAGE_FORMAT = '<6I'
 
+#: Precompiled struct used to pack/unpack message headers.
+MESSAGE_STRUCT = struct.Struct(MESSAGE_FORMAT)
+
+#: Function used to compute data payload checksums, See: :func:`~adbpy.message.adb.set_checksum_backend`.
+_checksum_backend = checksum.get_backend()
+
 
 class Command(enum.IntEnum):
     """
@@ -77,6 +94,18 @@ class SystemType(enum.Enum):
     host = 'host'
 
 
+class Feature(enum.Enum):
+    """
+    Enumeration for common features advertised in the "banner" of the "system-identity-string".
+    """
+
+    shell_v2 = 'shell_v2'
+    cmd = 'cmd'
+    stat_v2 = 'stat_v2'
+    ls_v2 = 'ls_v2'
+    delayed_ack = 'delayed_ack'
+
+
 class StreamIdentifierFormat(enum.Enum):
     """
     Enumeration for common stream "destination" strings.
@@ -87,8 +116,12 @@ class StreamIdentifierFormat(enum.Enum):
     local_dgram = 'local-dgram:{identifier}'
     local_stream = 'local-stream:{identifier}'
     shell = 'shell'
+    shell_command = 'shell:{command}'
+    shell_v2_command = 'shell,v2,raw:{command}'
+    exec_command = 'exec:{command}'
     upload = 'upload'
     fs_bridge = 'fs-bridge'
+    sync = 'sync:'
 
 
 class Message:
@@ -192,12 +225,67 @@ def to_bytes(msg):
     :return: Byte representation of :class:`~adbpy.message.adb.Message` instance
     """
     try:
-        return struct.pack(MESSAGE_FORMAT, msg.command, msg.arg0, msg.arg1,
-                           msg.data_length, msg.data_checksum, msg.magic)
+        return MESSAGE_STRUCT.pack(msg.command, msg.arg0, msg.arg1, msg.data_length, msg.data_checksum, msg.magic)
     except struct.error:
         raise message.MessagePackError('Unable to pack message into byte buffer')
 
 
+def to_bytes_many(messages):
+    """
+    Pack the headers and data payloads of the given :class:`~adbpy.message.adb.Message` instances into a single,
+    preallocated buffer that can be written to a transport in one call.
+
+    >>> buffer = message.to_bytes_many([message.write(1, 2, b'foo'), message.write(1, 2, b'bar')])
+    >>> len(buffer)
+    54
+
+    :param messages: Iterable of :class:`~adbpy.message.adb.Message` instances to convert to bytes
+    :return: A :class:`~bytearray` containing the header and data payload of every message in order
+    """
+    messages = list(messages)
+    buffer = bytearray(sum(packed_size(msg) for msg in messages))
+
+    offset = 0
+    for msg in messages:
+        offset = pack_into(buffer, offset, msg)
+
+    return buffer
+
+
+def pack_into(buffer, offset, msg):
+    """
+    Pack the header and data payload of the given :class:`~adbpy.message.adb.Message` instance into a writable buffer
+    starting at the given offset.
+
+    :param buffer: Writable bytes-like object, e.g. :class:`~bytearray` or :class:`~memoryview`
+    :param offset: Position in the buffer to start writing the message
+    :param msg: :class:`~adbpy.message.adb.Message` instance to pack
+    :return: Position in the buffer immediately after the packed message
+    """
+    end = offset + packed_size(msg)
+    if end > len(buffer):
+        raise message.MessagePackError('Buffer too small to pack message; need {} bytes'.format(end))
+
+    try:
+        MESSAGE_STRUCT.pack_into(buffer, offset, msg.command, msg.arg0, msg.arg1,
+                                 msg.data_length, msg.data_checksum, msg.magic)
+    except struct.error:
+        raise message.MessagePackError('Unable to pack message into byte buffer')
+
+    buffer[offset + MESSAGE_SIZE:end] = msg.data
+    return end
+
+
+def packed_size(msg):
+    """
+    Compute the number of bytes required to pack the header and data payload of the given message.
+
+    :param msg: :class:`~adbpy.message.adb.Message` instance to measure
+    :return: A :class:`~int` number of bytes
+    """
+    return MESSAGE_SIZE + len(msg.data)
+
+
 def from_bytes(msg_bytes):
     """
     Unpack the given bytes into a :class:`~adbpy.message.adb.Message` instance.
@@ -212,40 +300,171 @@ def from_bytes(msg_bytes):
     :return: A :class:`~adbpy.message.adb.Message` created from the given bytes
     """
     try:
-        command, arg0, arg1, data_length, data_checksum, magic = struct.unpack(MESSAGE_FORMAT, msg_bytes)
+        command, arg0, arg1, data_length, data_checksum, magic = MESSAGE_STRUCT.unpack(msg_bytes)
     except struct.error:
         raise message.MessageUnpackError('Unable to unpack message from byte buffer')
-    else:
+
+    try:
         return _response(command, arg0, arg1, data_length, data_checksum, magic)
+    except ValueError:
+        raise message.MessageUnpackError('Unknown message command {}'.format(hex(command)))
 
 
-def attach_data(msg, data):
+def attach_data(msg, data, skip_checksum=False):
     """
     Mutate the given message by attaching a data payload.
 
     :param msg: :class:`~adbpy.message.adb.Message` instance receiving a data payload
     :param data: Data payload to attach to the message instance
+    :param skip_checksum: Don't validate the payload checksum; default: `False`
     :return: `None`
     """
     # Validate the data payload checksum matches the checksum received in the message header.
-    checksum = _checksum(data)
-    if msg.data_checksum != checksum:
-        raise message.MessageChecksumError('Checksum {} != {}'.format(msg.data_checksum, checksum))
+    if not skip_checksum:
+        data_checksum = _checksum(data)
+        if msg.data_checksum != data_checksum:
+            raise message.MessageChecksumError('Checksum {} != {}'.format(msg.data_checksum, data_checksum))
 
     msg.data = data
 
 
-def connect(serial, banner, system_type=SystemType.host.value):
+class FrameDecoder:
+    """
+    Incremental decoder that consumes arbitrary chunks of bytes read from a transport and yields back complete
+    :class:`~adbpy.message.adb.Message` instances.
+
+    Received bytes are copied once into a single, reusable :class:`~bytearray` and the data payload of each decoded
+    message is a :class:`~memoryview` slice of that buffer. A payload is only valid until the decoder is advanced
+    again; callers that need to hold onto it must copy it, e.g. `bytes(msg.data)`.
+
+    >>> decoder = FrameDecoder()
+    >>> for msg in decoder.feed(transport.recv(context, 4096)):
+    ...     handle(msg)
+    """
+
+    __slots__ = ['_buffer', '_view', '_start', '_end', '_max_data', '_skip_checksum']
+
+    def __init__(self, max_data=MAXDATA, skip_checksum=False):
+        self._buffer = bytearray(MESSAGE_SIZE + max_data)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._max_data = max_data
+        self._skip_checksum = skip_checksum
+
+    def __repr__(self):
+        return '<{}(max_data={}, pending={})>'.format(self.__class__.__name__, self._max_data, self.pending)
+
+    @property
+    def pending(self):
+        """
+        Return the number of buffered bytes that do not yet make up a complete message.
+        """
+        return self._end - self._start
+
+    def feed(self, data):
+        """
+        Generator function that buffers the given chunk of bytes and yields back every message that can be completed.
+
+        Bytes of a partial message remain buffered until a future call provides the remainder.
+
+        :param data: Bytes-like object read from a transport
+        :return: Generator that yields back :class:`~adbpy.message.adb.Message` instances
+        """
+        data = memoryview(data).cast('B')
+        offset, length = 0, len(data)
+
+        while True:
+            msg = self._next_message()
+            if msg is not None:
+                yield msg
+                continue
+
+            if offset >= length:
+                return
+
+            if self._start == self._end:
+                self.reset()
+            elif self._end == len(self._buffer):
+                self._compact()
+
+            num_bytes = min(length - offset, len(self._buffer) - self._end)
+            self._view[self._end:self._end + num_bytes] = data[offset:offset + num_bytes]
+            self._end += num_bytes
+            offset += num_bytes
+
+    def reset(self):
+        """
+        Discard all buffered bytes.
+
+        :return: `None`
+        """
+        self._start = self._end = 0
+
+    def _next_message(self):
+        """
+        Decode the next complete message from the buffer.
+
+        :return: A :class:`~adbpy.message.adb.Message` instance or `None` if the buffer holds a partial message
+        """
+        start, end = self._start, self._end
+        if end - start < MESSAGE_SIZE:
+            return None
+
+        command, arg0, arg1, data_length, data_checksum, magic = MESSAGE_STRUCT.unpack_from(self._buffer, start)
+        if magic != _magic(command):
+            raise message.MessageUnpackError('Message magic {} does not match command {}'.format(magic, command))
+        if data_length > self._max_data:
+            raise message.MessageUnpackError('Message data length {} exceeds {}'.format(data_length, self._max_data))
+
+        data_start = start + MESSAGE_SIZE
+        data_end = data_start + data_length
+        if end < data_end:
+            return None
+
+        try:
+            msg = _response(command, arg0, arg1, data_length, data_checksum, magic)
+        except ValueError:
+            raise message.MessageUnpackError('Unknown message command {}'.format(hex(command)))
+
+        if data_length:
+            attach_data(msg, self._view[data_start:data_end], self._skip_checksum)
+
+        self._start = data_end
+        return msg
+
+    def _compact(self):
+        """
+        Move the partial message at the end of the buffer to the front to make room for more bytes.
+
+        :return: `None`
+        """
+        num_bytes = self._end - self._start
+        self._view[:num_bytes] = self._view[self._start:self._end]
+        self._start, self._end = 0, num_bytes
+
+
+def connect(serial, banner, system_type=SystemType.host.value, version=VERSION, max_data=MAXDATA, features=()):
     """
     Create a :class:`~adbpy.message.adb.Message` instance that represents a connect message.
 
+    The remote system replies with its own connect message and both ends then use the lower of the two
+    versions and maximum data payload sizes.
+
     :param serial: Unique identifier
     :param banner: Human readable version/identifier string
     :param system_type: System type creating the message; default: "host"
+    :param version: Protocol version to advertise; default: :data:`~adbpy.message.adb.VERSION`
+    :param max_data: Maximum data payload size to advertise; default: :data:`~adbpy.message.adb.MAXDATA`
+    :param features: Optional iterable of feature names to advertise, See: :class:`~adbpy.message.adb.Feature`
     :return: A :class:`~adbpy.adb.message.adb.Message` instance for connecting to a remote system
     """
+    features = ','.join(getattr(feature, 'value', feature) for feature in features)
+    if features:
+        banner = ';'.join(item for item in (banner, 'features={}'.format(features)) if item)
+
     system_identity_string = _null_terminated(':'.join((system_type, serial, banner)))
-    return _request(Command.cnxn, VERSION, CONNECT_AUTH_MAXDATA, system_identity_string)
+    return _request(Command.cnxn, version, max_data, system_identity_string)
 
 
 def auth(auth_type, data):
@@ -281,43 +500,50 @@ def auth_rsa_public_key(public_key):
     return auth(AuthType.rsa_public_key, _null_terminated(public_key))
 
 
-def open(local_id, destination):
+def open(local_id, destination, window=0):
     """
     Create a :class:`~adbpy.message.adb.Message` instance that represents a open message to connect
     to a stream of a specific id.
 
     :param local_id: Stream id on remote system to connect with
     :param destination: Stream destination, See: `~adbpy.message.adb.StreamIdentifierFormat`
+    :param window: Optional number of bytes the remote system may write before waiting for acknowledgements when
+        using delayed acknowledgements; default: `0` (disabled)
     :return: A :class:`~adbpy.adb.message.Message` instance to open a stream by id on a remote system
     """
-    return _request(Command.open, local_id, 0, _null_terminated(destination))
+    return _request(Command.open, local_id, window, _null_terminated(destination))
 
 
-def ready(local_id, remote_id):
+def ready(local_id, remote_id, acked_bytes=None):
     """
     Create a :class:`~adbpy.message.adb.Message` instance that represents a ready message indicating that the stream
     is ready for write messages.
 
     :param local_id: Identifier for the stream on the local end
     :param remote_id: Identifier for the stream on the remote system
+    :param acked_bytes: Optional number of bytes consumed since the last ready message when using delayed
+        acknowledgements; default: `None` (disabled)
     :return: A :class:`~adbpy.message.adb.Message` instance to inform the remote system it's ready for write messages
     """
-    return _request(Command.okay, local_id, remote_id)
+    data = b'' if acked_bytes is None else ACKED_BYTES_STRUCT.pack(acked_bytes)
+    return _request(Command.okay, local_id, remote_id, data)
 
 
-def okay(local_id, remote_id):
+def okay(local_id, remote_id, acked_bytes=None):
     """
     Create a :class:`~adbpy.message.adb.Message` instance that represents a ready message indicating that the stream
     is ready for write messages.
 
     :param local_id: Identifier for the stream on the local end
     :param remote_id: Identifier for the stream on the remote system
+    :param acked_bytes: Optional number of bytes consumed since the last ready message when using delayed
+        acknowledgements; default: `None` (disabled)
     :return: A :class:`~adbpy.message.adb.Message` instance to inform the remote system it's ready for write messages
     """
-    return ready(local_id, remote_id)
+    return ready(local_id, remote_id, acked_bytes)
 
 
-def write(local_id, remote_id, data):
+def write(local_id, remote_id, data, skip_checksum=False):
     """
     Create a :class:`~adbpy.message.adb.Message` instance that represents a write message sending a data payload
     to a specific stream id.
@@ -325,14 +551,15 @@ def write(local_id, remote_id, data):
     :param local_id: Identifier for the stream on the local end
     :param remote_id: Identifier for the stream on the remote system
     :param data: Data payload sent to the stream
+    :param skip_checksum: Don't compute the payload checksum, See: :func:`~adbpy.message.adb.version_skips_checksum`
     :return: A :class:`~adbpy.message.adb.Message` instance with a data payload for a specific remote stream
     """
     if not data:
         raise ValueError('data must not be empty')
-    if data > MAXDATA:
+    if len(data) > MAXDATA:
         raise ValueError('data must be <= {}'.format(MAXDATA))
 
-    return _request(Command.wrte, local_id, remote_id, data)
+    return _request(Command.wrte, local_id, remote_id, data, skip_checksum)
 
 
 def close(local_id, remote_id):
@@ -347,7 +574,65 @@ def close(local_id, remote_id):
     return _request(Command.clse, local_id, remote_id)
 
 
-def _request(command, arg0=None, arg1=None, data=b''):
+def acked_bytes(msg):
+    """
+    Get the number of bytes acknowledged by the given ready message.
+
+    :param msg: :class:`~adbpy.message.adb.Message` instance of a ready message
+    :return: A :class:`int` number of bytes or `None` if the message does not use delayed acknowledgements
+    """
+    if len(msg.data) != ACKED_BYTES_STRUCT.size:
+        return None
+    return ACKED_BYTES_STRUCT.unpack(msg.data)[0]
+
+
+def parse_system_identity(data):
+    """
+    Parse the "system-identity-string" data payload of a connect message.
+
+    The banner of a remote system is a `;` separated list of `key=value` properties, e.g.
+    "device::ro.product.name=foo;ro.product.model=bar;features=shell_v2,cmd".
+
+    :param data: Data payload of a connect message
+    :return: A :class:`tuple` of system type, serial and a :class:`dict` of banner properties
+    """
+    identity = bytes(data).rstrip(b'\0').decode('utf-8', 'replace')
+    system_type, _, remainder = identity.partition(':')
+    serial, _, banner = remainder.partition(':')
+
+    properties = {}
+    for item in banner.split(';'):
+        key, sep, value = item.partition('=')
+        if sep:
+            properties[key] = value
+
+    return system_type, serial, properties
+
+
+def version_skips_checksum(version):
+    """
+    Check to see if data payload checksums are skipped for the given protocol version.
+
+    The version should be the lower of the versions advertised by both ends of a connection.
+
+    :param version: Protocol version
+    :return: A :class:`bool` indicating if checksums are neither computed nor validated
+    """
+    return version >= VERSION_SKIP_CHECKSUM
+
+
+def set_checksum_backend(name):
+    """
+    Set the backend used to compute data payload checksums, See: :data:`~adbpy.message.checksum.BACKENDS`.
+
+    :param name: Name of the checksum backend
+    :return: `None`
+    """
+    global _checksum_backend
+    _checksum_backend = checksum.get_backend(name)
+
+
+def _request(command, arg0=None, arg1=None, data=b'', skip_checksum=False):
     """
     Create a :class:`~adbpy.message.adb.Message` instance with the given header information and optional data payload
     that represents a new request being sent to a remote system.
@@ -356,10 +641,12 @@ def _request(command, arg0=None, arg1=None, data=b''):
     :param arg0: Optional message header arg0 value
     :param arg1: Optional message header arg1 value
     :param data: Optional data payload
+    :param skip_checksum: Optional flag to use a checksum of zero instead of computing it
     :return: A :class:`~adbpy.message.adb.Message` instance with the given header data and optional data payload
     """
     data = _data_to_bytes(data)
-    return Message(int(command), arg0, arg1, len(data), _checksum(data), _magic(command), data)
+    data_checksum = 0 if skip_checksum else _checksum(data)
+    return Message(int(command), arg0, arg1, len(data), data_checksum, _magic(command), data)
 
 
 def _response(command, arg0, arg1, data_length, data_checksum, magic):
@@ -382,19 +669,19 @@ def _data_to_bytes(data, encoding='utf-8', errors='strict'):
     """
     Convert the message data payload to bytes.
 
-    If `data` is already a :class:`~bytes` instance, it is returned unmodified.
+    If `data` is already a bytes-like instance, it is returned unmodified.
 
-    :param data: bytes/str instance to convert to bytes
+    :param data: bytes/bytearray/memoryview/str instance to convert to bytes
     :param encoding:
     :param errors:
-    :return: data as :class:`~bytes` instance
+    :return: data as a bytes-like instance
     """
-    if isinstance(data, bytes):
+    if isinstance(data, (bytes, bytearray, memoryview)):
         return data
     if isinstance(data, str):
         return data.encode(encoding, errors)
 
-    raise message.MessageError('Expected bytes/str; got {}'.format(type(data)))
+    raise message.MessageError('Expected bytes-like/str; got {}'.format(type(data)))
 
 
 def _null_terminated(data):
@@ -420,9 +707,9 @@ def _magic(command):
 
 def _checksum(data):
     """
-    Compute the checksum of the given data payload.
+    Compute the checksum of the given data payload using the active checksum backend.
 
     :param data: Data payload to consume the checksum
     :return: A :class:`int` representing the computed checksum of the data payload
     """
-    return sum(data) & COMMAND_MASK
+    return _checksum_backend(data)
@@ -0,0 +1,102 @@
+"""
+    adbpy.message.checksum
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for computing data payload checksums of ADB protocol messages.
+
+    The checksum of a payload is the sum of all of its bytes. Several interchangeable backends are available that
+    compute the same value at different speeds.
+"""
+
+import collections
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ['BACKENDS', 'DEFAULT_BACKEND', 'get_backend', 'python_checksum', 'zlib_checksum', 'numpy_checksum']
+
+
+#: Bitmask applied to computed checksum values.
+CHECKSUM_MASK = 0xffffffff
+
+#: Largest chunk size whose byte sum (255 * 256) cannot exceed the adler-32 modulus (65521).
+ADLER32_CHUNK_SIZE = 256
+
+
+def python_checksum(data):
+    """
+    Compute the checksum of the given data payload by summing it byte by byte.
+
+    :param data: Bytes-like data payload
+    :return: A :class:`int` representing the computed checksum of the data payload
+    """
+    if not isinstance(data, (bytes, bytearray)):
+        view = memoryview(data)
+        if view.format != 'B' or view.ndim != 1:
+            data = view.cast('B')
+    return sum(data) & CHECKSUM_MASK
+
+
+def zlib_checksum(data, _adler32=zlib.adler32):
+    """
+    Compute the checksum of the given data payload using :func:`~zlib.adler32`.
+
+    The low 16-bits of an adler-32 value is one plus the byte sum of the input, modulo 65521. By feeding chunks small
+    enough that their sum never reaches the modulus, the exact byte sum is recovered while the summing itself
+    happens in C.
+
+    :param data: Bytes-like data payload
+    :return: A :class:`int` representing the computed checksum of the data payload
+    """
+    view = memoryview(data).cast('B')
+    if len(view) <= ADLER32_CHUNK_SIZE:
+        return python_checksum(view)
+
+    total = 0
+    for i in range(0, len(view), ADLER32_CHUNK_SIZE):
+        total += _adler32(view[i:i + ADLER32_CHUNK_SIZE]) & 0xffff
+
+    # Remove the implicit "+ 1" from each chunk.
+    num_chunks = (len(view) + ADLER32_CHUNK_SIZE - 1) // ADLER32_CHUNK_SIZE
+    return (total - num_chunks) & CHECKSUM_MASK
+
+
+def numpy_checksum(data):
+    """
+    Compute the checksum of the given data payload using :mod:`numpy`.
+
+    :param data: Bytes-like data payload
+    :return: A :class:`int` representing the computed checksum of the data payload
+    """
+    return int(numpy.frombuffer(data, dtype=numpy.uint8).sum(dtype=numpy.uint64)) & CHECKSUM_MASK
+
+
+#: Available checksum backends by name.
+BACKENDS = collections.OrderedDict([
+    ('zlib', zlib_checksum),
+    ('python', python_checksum)
+])
+
+if numpy is not None:
+    BACKENDS['numpy'] = numpy_checksum
+
+#: Name of the backend used when none is specified.
+DEFAULT_BACKEND = 'zlib'
+
+
+def get_backend(name=None):
+    """
+    Get the checksum function for the backend of the given name.
+
+    :param name: Optional name of the backend; default: :data:`~adbpy.message.checksum.DEFAULT_BACKEND`
+    :return: Function that takes a bytes-like data payload and returns its checksum
+    """
+    name = name or DEFAULT_BACKEND
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown checksum backend {}; expected one of {}'.format(name, ', '.join(BACKENDS)))
@@ -23,6 +23,12 @@ class ProtocolConnectionError(ProtocolError):
     """
 
 
+class ProtocolTimeoutError(ProtocolConnectionError):
+    """
+    Exception raised when the underlying connection exceeds its timeout.
+    """
+
+
 class ProtocolNoResponseError(ProtocolError):
     """
     Exception raised when a protocol request expects a response but does not receive one.
@@ -35,6 +41,12 @@ class ProtocolInvalidResponseError(ProtocolError):
     """
 
 
+class ProtocolAuthError(ProtocolError):
+    """
+    Exception raised when the remote system does not accept any of the keys used to authenticate.
+    """
+
+
 class WireProtocol(metaclass=abc.ABCMeta):
     """
     Abstract class that defines the interface a wire protocol must implement.
@@ -52,6 +64,13 @@ class WireProtocol(metaclass=abc.ABCMeta):
     def __repr__(self):
         return '<{}(connection={})>'.format(self.__class__.__name__, self._connection)
 
+    @property
+    def connection(self):
+        """
+        Return the connection the wire protocol reads from and writes to.
+        """
+        return self._connection
+
     @abc.abstractmethod
     def send(self, *args, **kwargs):
         pass
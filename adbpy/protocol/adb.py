@@ -0,0 +1,406 @@
+"""
+    adbpy.protocol.adb
+    ~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for the ADB wire protocol.
+"""
+
+import asyncio
+import threading
+
+from adbpy import connection, crypto, exception, message, protocol
+from adbpy.message import adb
+
+
+__all__ = ['WireProtocol', 'AsyncWireProtocol', 'Session', 'FEATURES']
+
+
+#: Features advertised by default during the connection handshake.
+FEATURES = (adb.Feature.shell_v2.value, adb.Feature.delayed_ack.value)
+
+
+class Session:
+    """
+    Represents the parameters of a connection negotiated by the connection handshake.
+    """
+
+    __slots__ = ['version', 'max_data', 'system_type', 'serial', 'properties', 'features']
+
+    def __init__(self, version, max_data, system_type, serial, properties, features):
+        self.version = version
+        self.max_data = max_data
+        self.system_type = system_type
+        self.serial = serial
+        self.properties = properties
+        self.features = features
+
+    def __repr__(self):
+        return '<{}(version={}, max_data={}, system_type={}, serial={}, features={})>'.format(
+            self.__class__.__name__, hex(self.version), self.max_data, self.system_type, self.serial,
+            ','.join(sorted(self.features)))
+
+    @property
+    def skip_checksum(self):
+        """
+        Return `True` if data payload checksums are skipped for the negotiated version, `False` otherwise.
+        """
+        return adb.version_skips_checksum(self.version)
+
+    def supports(self, feature):
+        """
+        Check to see if the given feature was advertised by both ends of the connection.
+
+        :param feature: Feature name or :class:`~adbpy.message.adb.Feature` value
+        :return: A :class:`bool` indicating if the feature is supported
+        """
+        return getattr(feature, 'value', feature) in self.features
+
+
+class WireProtocol(protocol.WireProtocol):
+    """
+    ADB wire protocol over a synchronous (blocking) :class:`~adbpy.connection.sync.Connection`.
+
+    Outgoing messages can be queued and flushed together in a single write to the connection. Incoming messages are
+    read header first, followed by their data payload which is validated against the header checksum. Each payload
+    is received directly into its own buffer, so unlike those decoded by :class:`~adbpy.message.adb.FrameDecoder`
+    it stays valid after the next read without being copied.
+
+    Sending is thread-safe, so one thread may read messages while several others send them.
+
+    Given :class:`~adbpy.instrumentation.ConnectionMetrics`, every message sent and received, checksum failure and
+    timeout is counted.
+    """
+
+    def __init__(self, connection, max_data=adb.MAXDATA, skip_checksum=False, metrics=None):
+        super().__init__(connection)
+        self.max_data = max_data
+        self.skip_checksum = skip_checksum
+        self.metrics = metrics
+        self.session = None
+        _apply_session(self, getattr(connection, 'session', None))
+        self._header = bytearray(adb.MESSAGE_SIZE)
+        self._queue = []
+        self._lock = threading.Lock()
+
+    def handshake(self, serial='', banner='', key_paths=(), version=adb.VERSION_SKIP_CHECKSUM,
+                  max_data=adb.MAXDATA, features=FEATURES, **kwargs):
+        """
+        Connect to the remote system, authenticating if it asks to, and apply the negotiated version and maximum
+        data payload size to this wire protocol.
+
+        :param serial: Optional unique identifier of the local system
+        :param banner: Optional banner of the local system
+        :param key_paths: Optional iterable of paths to private keys to authenticate with
+        :param version: Protocol version to advertise; default: :data:`~adbpy.message.adb.VERSION_SKIP_CHECKSUM`
+        :param max_data: Maximum data payload size to advertise; default: :data:`~adbpy.message.adb.MAXDATA`
+        :param features: Iterable of feature names to advertise; default: :data:`~adbpy.protocol.adb.FEATURES`
+        :param kwargs: Optional keyword args to pass to the connection `send` and `recv` methods
+        :return: A :class:`~adbpy.protocol.adb.Session` instance
+        """
+        flow = _handshake(self, serial, banner, key_paths, version, max_data, features)
+        msg = next(flow)
+        while True:
+            self.send(msg, **kwargs)
+            try:
+                msg = flow.send(self.recv(**kwargs))
+            except StopIteration as e:
+                return e.value
+
+    def queue(self, msg):
+        """
+        Queue the given message to be sent on the next :meth:`~adbpy.protocol.adb.WireProtocol.flush`.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance to send
+        :return: `None`
+        """
+        with self._lock:
+            self._queue.append(msg)
+
+    @exception.rethrow(connection.ConnectionError, protocol.ProtocolConnectionError)
+    @exception.rethrow(connection.ConnectionTimeoutError, protocol.ProtocolTimeoutError)
+    def flush(self, **kwargs):
+        """
+        Send all queued messages in a single write to the connection.
+
+        :param kwargs: Optional keyword args to pass to the connection `send` method
+        :return: `None`
+        """
+        with self._lock:
+            if not self._queue:
+                return
+            data = adb.to_bytes_many(self._queue)
+            if self.metrics is not None:
+                self.metrics.sent(self._queue)
+            del self._queue[:]
+            try:
+                self._connection.send(data, **kwargs)
+            except connection.ConnectionTimeoutError:
+                _timed_out(self, 'send')
+                raise
+
+    def send(self, msg, **kwargs):
+        """
+        Send the given message, along with any previously queued messages, in a single write to the connection.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance to send
+        :param kwargs: Optional keyword args to pass to the connection `send` method
+        :return: `None`
+        """
+        self.queue(msg)
+        self.flush(**kwargs)
+
+    @exception.rethrow(connection.ConnectionError, protocol.ProtocolConnectionError)
+    @exception.rethrow(connection.ConnectionTimeoutError, protocol.ProtocolTimeoutError)
+    def recv(self, **kwargs):
+        """
+        Read the next message, including its data payload, from the connection.
+
+        :param kwargs: Optional keyword args to pass to the connection `recv_into` method
+        :return: A :class:`~adbpy.message.adb.Message` instance
+        """
+        try:
+            self._connection.recv_into(self._header, **kwargs)
+            msg = _unpack_header(self._header, self.max_data)
+
+            if msg.data_length:
+                data = self._connection.recv_exactly(msg.data_length, **kwargs)
+                adb.attach_data(msg, data, self.skip_checksum)
+        except (connection.ConnectionTimeoutError, message.MessageChecksumError) as e:
+            _recv_failed(self, e)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.received(msg)
+        return msg
+
+
+class AsyncWireProtocol(protocol.WireProtocol):
+    """
+    ADB wire protocol over an asynchronous (non-blocking) :class:`~adbpy.connection.async.Connection`.
+
+    Behaves like :class:`~adbpy.protocol.adb.WireProtocol` except :meth:`flush`, :meth:`send` and :meth:`recv`
+    are coroutines.
+    """
+
+    def __init__(self, connection, max_data=adb.MAXDATA, skip_checksum=False, metrics=None):
+        super().__init__(connection)
+        self.max_data = max_data
+        self.skip_checksum = skip_checksum
+        self.metrics = metrics
+        self.session = None
+        _apply_session(self, getattr(connection, 'session', None))
+        self._queue = []
+
+    @asyncio.coroutine
+    def handshake(self, serial='', banner='', key_paths=(), version=adb.VERSION_SKIP_CHECKSUM,
+                  max_data=adb.MAXDATA, features=FEATURES, **kwargs):
+        """
+        Connect to the remote system, authenticating if it asks to, and apply the negotiated version and maximum
+        data payload size to this wire protocol.
+
+        :param serial: Optional unique identifier of the local system
+        :param banner: Optional banner of the local system
+        :param key_paths: Optional iterable of paths to private keys to authenticate with
+        :param version: Protocol version to advertise; default: :data:`~adbpy.message.adb.VERSION_SKIP_CHECKSUM`
+        :param max_data: Maximum data payload size to advertise; default: :data:`~adbpy.message.adb.MAXDATA`
+        :param features: Iterable of feature names to advertise; default: :data:`~adbpy.protocol.adb.FEATURES`
+        :param kwargs: Optional keyword args to pass to the connection `send` and `recv` methods
+        :return: A :class:`~adbpy.protocol.adb.Session` instance
+        """
+        flow = _handshake(self, serial, banner, key_paths, version, max_data, features)
+        msg = next(flow)
+        while True:
+            yield from self.send(msg, **kwargs)
+            reply = yield from self.recv(**kwargs)
+            try:
+                msg = flow.send(reply)
+            except StopIteration as e:
+                return e.value
+
+    def queue(self, msg):
+        """
+        Queue the given message to be sent on the next :meth:`~adbpy.protocol.adb.AsyncWireProtocol.flush`.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance to send
+        :return: `None`
+        """
+        self._queue.append(msg)
+
+    @exception.rethrow(connection.ConnectionError, protocol.ProtocolConnectionError)
+    @exception.rethrow(connection.ConnectionTimeoutError, protocol.ProtocolTimeoutError)
+    @asyncio.coroutine
+    def flush(self, **kwargs):
+        """
+        Send all queued messages in a single write to the connection.
+
+        :param kwargs: Optional keyword args to pass to the connection `send` method
+        :return: `None`
+        """
+        if not self._queue:
+            return
+        data = adb.to_bytes_many(self._queue)
+        if self.metrics is not None:
+            self.metrics.sent(self._queue)
+        del self._queue[:]
+        try:
+            yield from self._connection.send(data, **kwargs)
+        except connection.ConnectionTimeoutError:
+            _timed_out(self, 'send')
+            raise
+
+    @asyncio.coroutine
+    def send(self, msg, **kwargs):
+        """
+        Send the given message, along with any previously queued messages, in a single write to the connection.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance to send
+        :param kwargs: Optional keyword args to pass to the connection `send` method
+        :return: `None`
+        """
+        self.queue(msg)
+        yield from self.flush(**kwargs)
+
+    @exception.rethrow(connection.ConnectionError, protocol.ProtocolConnectionError)
+    @exception.rethrow(connection.ConnectionTimeoutError, protocol.ProtocolTimeoutError)
+    @asyncio.coroutine
+    def recv(self, **kwargs):
+        """
+        Read the next message, including its data payload, from the connection.
+
+        :param kwargs: Optional keyword args to pass to the connection `recv` method
+        :return: A :class:`~adbpy.message.adb.Message` instance
+        """
+        try:
+            header = yield from self._connection.recv(adb.MESSAGE_SIZE, **kwargs)
+            msg = _unpack_header(header, self.max_data)
+
+            if msg.data_length:
+                data = yield from self._connection.recv(msg.data_length, **kwargs)
+                adb.attach_data(msg, data, self.skip_checksum)
+        except (connection.ConnectionTimeoutError, message.MessageChecksumError) as e:
+            _recv_failed(self, e)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.received(msg)
+        return msg
+
+
+def _handshake(wire_protocol, serial, banner, key_paths, version, max_data, features):
+    """
+    Generator that implements the connection handshake independent of how messages are sent and received.
+
+    It yields messages to send and expects to be sent the reply to each one. Once connected, it applies the
+    :class:`~adbpy.protocol.adb.Session` to the given wire protocol and returns it.
+
+    :param wire_protocol: Wire protocol performing the handshake
+    :param serial: Unique identifier of the local system
+    :param banner: Banner of the local system
+    :param key_paths: Iterable of paths to private keys to authenticate with
+    :param version: Protocol version to advertise
+    :param max_data: Maximum data payload size to advertise
+    :param features: Iterable of feature names to advertise
+    :return: A :class:`~adbpy.protocol.adb.Session` instance
+    """
+    features = [getattr(feature, 'value', feature) for feature in features]
+    key_paths = list(key_paths)
+
+    # Remote systems reply with the version we advertise, so replies may already skip checksums.
+    wire_protocol.max_data = max(max_data, adb.CONNECT_AUTH_MAXDATA)
+    wire_protocol.skip_checksum = adb.version_skips_checksum(version)
+
+    reply = yield adb.connect(serial, banner, version=version, max_data=max_data, features=features)
+
+    # Sign the token with each key until one is accepted, then fall back to offering the first public key,
+    # which the user must accept on the remote system.
+    for path in key_paths:
+        if not _is_auth_token(reply):
+            break
+        reply = yield adb.auth_signature(crypto.sign(path, bytes(reply.data)))
+    if _is_auth_token(reply) and key_paths:
+        reply = yield adb.auth_rsa_public_key(crypto.public_key_bytes_from_private_key_path(key_paths[0]))
+
+    if reply.is_auth:
+        raise protocol.ProtocolAuthError('Remote system requires authentication; {} keys tried'.format(len(key_paths)))
+    if not reply.is_connect:
+        raise protocol.ProtocolInvalidResponseError('Expected connect message; got {}'.format(reply))
+
+    system_type, serial, properties = adb.parse_system_identity(reply.data)
+    remote_features = properties.get('features', '').split(',')
+    session = Session(min(version, reply.arg0), min(max_data, reply.arg1), system_type, serial, properties,
+                      frozenset(feature for feature in remote_features if feature in features))
+
+    wire_protocol.connection.session = session
+    _apply_session(wire_protocol, session)
+    return session
+
+
+def _apply_session(wire_protocol, session):
+    """
+    Apply the negotiated maximum data payload size and checksum mode of the given session to a wire protocol.
+
+    :param wire_protocol: Wire protocol to update
+    :param session: A :class:`~adbpy.protocol.adb.Session` instance or `None` to leave it unchanged
+    :return: `None`
+    """
+    if session is None:
+        return
+    wire_protocol.session = session
+    wire_protocol.max_data = session.max_data
+    wire_protocol.skip_checksum = session.skip_checksum
+
+
+def _timed_out(wire_protocol, operation):
+    """
+    Count a connection operation of the given wire protocol that exceeded its timeout.
+
+    :param wire_protocol: Wire protocol whose operation timed out
+    :param operation: Name of the operation, e.g. "send"
+    :return: `None`
+    """
+    if wire_protocol.metrics is not None:
+        wire_protocol.metrics.timeout(operation)
+
+
+def _recv_failed(wire_protocol, error):
+    """
+    Count a failure to receive a message by the given wire protocol.
+
+    :param wire_protocol: Wire protocol that failed to receive a message
+    :param error: Timeout or checksum exception raised
+    :return: `None`
+    """
+    if wire_protocol.metrics is None:
+        return
+    if isinstance(error, message.MessageChecksumError):
+        wire_protocol.metrics.checksum_failure()
+    else:
+        wire_protocol.metrics.timeout('recv')
+
+
+def _is_auth_token(msg):
+    """
+    Check to see if the given message is an authentication token to sign.
+
+    :param msg: A :class:`~adbpy.message.adb.Message` instance
+    :return: A :class:`bool` indicating if the message is a token
+    """
+    return msg.is_auth and msg.arg0 == adb.AuthType.token
+
+
+def _unpack_header(header, max_data):
+    """
+    Unpack and validate a message header read from the connection.
+
+    :param header: Bytes of the message header
+    :param max_data: Maximum data payload length allowed
+    :return: A :class:`~adbpy.message.adb.Message` instance without its data payload
+    """
+    msg = adb.from_bytes(header)
+    if msg.magic != msg.command ^ adb.COMMAND_MASK:
+        raise protocol.ProtocolInvalidResponseError('Message magic {} does not match command {}'.format(
+            msg.magic, hex(msg.command)))
+    if msg.data_length > max_data:
+        raise protocol.ProtocolInvalidResponseError('Message data length {} exceeds {}'.format(
+            msg.data_length, max_data))
+    return msg
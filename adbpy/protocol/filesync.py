@@ -0,0 +1,905 @@
+"""
+    adbpy.protocol.filesync
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for the SYNC sub-protocol used to transfer files to and from a remote system.
+
+    The SYNC protocol runs over a stream opened to the `sync:` service. Every request and response starts with an
+    8-byte header of a four character id followed by a 32-bit little-endian length or value. File contents are sent
+    as DATA packets of at most :data:`SYNC_DATA_MAX` bytes, each packed together with its header into a single stream
+    write, so files of any size are transferred without being loaded into memory.
+
+    Directories are synced incrementally: remote directories are listed and only files that differ in size or
+    modification time are pushed, with requests pipelined over a single stream.
+"""
+
+import asyncio
+import collections
+import enum
+import io
+import os
+import posixpath
+import stat
+import struct
+import time
+
+from adbpy import protocol
+from adbpy.message import adb
+from adbpy.protocol import stream
+
+
+__all__ = ['FileSync', 'AsyncFileSync', 'SyncId', 'StatResult', 'DirectoryEntry', 'DirectorySyncResult',
+           'FileSyncError']
+
+
+#: Destination of the stream that speaks the SYNC protocol.
+SYNC_DESTINATION = adb.StreamIdentifierFormat.sync.value
+
+#: Struct of the header of every SYNC request and response: id and length (or value).
+SYNC_HEADER = struct.Struct('<4sI')
+
+#: Struct of the body of a STAT response following its id: mode, size and mtime.
+STAT_STRUCT = struct.Struct('<3I')
+
+#: Struct of the body of a DENT response following its id: mode, size, mtime and name length.
+DENT_STRUCT = struct.Struct('<4I')
+
+#: Maximum number of file bytes carried by a single DATA packet.
+SYNC_DATA_MAX = 64 * 1024
+
+#: Maximum length of a remote path in bytes.
+SYNC_PATH_MAX = 1024
+
+#: Mode used for pushed files when none is given: a regular file with permissions 0644.
+DEFAULT_PUSH_MODE = stat.S_IFREG | 0o644
+
+#: Default maximum number of requests sent before their responses are read when syncing a directory.
+DEFAULT_PIPELINE_DEPTH = 32
+
+
+class FileSyncError(protocol.ProtocolError):
+    """
+    Exception raised when the remote system fails a SYNC request.
+    """
+
+
+class SyncId(enum.Enum):
+    """
+    Enumeration for the ids of SYNC requests and responses.
+    """
+
+    stat = b'STAT'
+    list = b'LIST'
+    send = b'SEND'
+    recv = b'RECV'
+    dent = b'DENT'
+    data = b'DATA'
+    done = b'DONE'
+    okay = b'OKAY'
+    fail = b'FAIL'
+    quit = b'QUIT'
+
+
+class StatResult(collections.namedtuple('StatResult', 'mode size mtime')):
+    """
+    Result of a STAT request. All fields are zero if the remote path does not exist.
+    """
+
+    __slots__ = ()
+
+    @property
+    def exists(self):
+        return self.mode != 0
+
+
+#: Entry of a LIST response.
+DirectoryEntry = collections.namedtuple('DirectoryEntry', 'name mode size mtime')
+
+#: Result of syncing a directory: relative paths of the files pushed and of those left unchanged.
+DirectorySyncResult = collections.namedtuple('DirectorySyncResult', 'pushed unchanged')
+
+#: Local file to push when syncing a directory.
+_LocalFile = collections.namedtuple('_LocalFile', 'relpath path remote_path mode st')
+
+
+class _Buffer:
+    """
+    Reassembles SYNC packets from stream payloads, which do not line up with packet boundaries.
+    """
+
+    __slots__ = ['pending']
+
+    def __init__(self):
+        self.pending = memoryview(b'')
+
+    def take(self, view):
+        """
+        Copy as many pending bytes as fit into the given view.
+
+        :param view: A writable :class:`~memoryview` to copy into
+        :return: Number of bytes copied
+        """
+        num_bytes = min(len(view), len(self.pending))
+        view[:num_bytes] = self.pending[:num_bytes]
+        self.pending = self.pending[num_bytes:]
+        return num_bytes
+
+
+class _MemorySource:
+    """
+    File-like wrapper over a bytes-like object, e.g. a :class:`~mmap.mmap`, that supports `readinto` without copying
+    the object.
+    """
+
+    __slots__ = ['view', 'offset']
+
+    def __init__(self, data):
+        self.view = memoryview(data).cast('B')
+        self.offset = 0
+
+    def readinto(self, buffer):
+        chunk = self.view[self.offset:self.offset + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self.offset += len(chunk)
+        return len(chunk)
+
+
+class _BaseFileSync:
+    """
+    State and packing shared by synchronous and asynchronous SYNC protocol clients.
+    """
+
+    def __init__(self, stream, timeout=None):
+        self.stream = stream
+        self.timeout = timeout
+        self.failed = False
+        self._buffer = _Buffer()
+
+    def __repr__(self):
+        return '<{}(stream={})>'.format(self.__class__.__name__, self.stream)
+
+    @property
+    def chunk_size(self):
+        """
+        Return the number of file bytes sent per DATA packet so each packet fits in a single stream write.
+        """
+        return max(1, min(SYNC_DATA_MAX, self.stream.max_data - SYNC_HEADER.size))
+
+    def _fail(self, reason):
+        """
+        Create the error raised for a FAIL response. The remote system ends the SYNC session after sending one, so the
+        session is marked as failed and no more requests are written.
+
+        :param reason: Bytes of the failure reason
+        :return: A :class:`~adbpy.protocol.filesync.FileSyncError` instance
+        """
+        self.failed = True
+        return FileSyncError(reason.decode('utf-8', 'replace'))
+
+    def _check_usable(self):
+        """
+        Raise if the remote system ended the SYNC session after a failed request.
+
+        :return: `None`
+        """
+        if self.failed:
+            raise FileSyncError('{} ended after a failed request'.format(self))
+
+    def _fill_data_packet(self, source, view):
+        """
+        Read the next chunk of the source into a DATA packet.
+
+        :param source: Object with a `readinto` method
+        :param view: A :class:`~memoryview` of a packet buffer of `SYNC_HEADER.size + chunk_size` bytes
+        :return: A :class:`~memoryview` of the packet or `None` once the source is exhausted
+        """
+        num_bytes = source.readinto(view[SYNC_HEADER.size:])
+        if not num_bytes:
+            return None
+        SYNC_HEADER.pack_into(view, 0, SyncId.data.value, num_bytes)
+        return view[:SYNC_HEADER.size + num_bytes]
+
+
+def _request(sync_id, path=b''):
+    """
+    Pack a SYNC request with the given id and path.
+
+    :param sync_id: A :class:`~adbpy.protocol.filesync.SyncId` value
+    :param path: Remote path as :class:`str` or bytes
+    :return: Bytes of the request
+    """
+    if isinstance(path, str):
+        path = path.encode('utf-8')
+    if len(path) > SYNC_PATH_MAX:
+        raise ValueError('Path must be <= {} bytes'.format(SYNC_PATH_MAX))
+    return SYNC_HEADER.pack(sync_id.value, len(path)) + path
+
+
+def _send_request(remote_path, mode):
+    """
+    Pack a SEND request for the given remote path and mode.
+
+    :param remote_path: Remote path as :class:`str`
+    :param mode: File mode of the remote file
+    :return: Bytes of the request
+    """
+    return _request(SyncId.send, '{},{}'.format(remote_path, mode))
+
+
+def _sync_id(value):
+    """
+    Convert the id of a SYNC response header.
+
+    :param value: Four bytes id of the response
+    :return: A :class:`~adbpy.protocol.filesync.SyncId` value
+    """
+    try:
+        return SyncId(value)
+    except ValueError:
+        raise protocol.ProtocolInvalidResponseError('Unknown SYNC response id {!r}'.format(value))
+
+
+def _unexpected(sync_id, request):
+    """
+    Create the exception raised when a response of the wrong type is received.
+
+    :param sync_id: A :class:`~adbpy.protocol.filesync.SyncId` value received
+    :param request: A :class:`~adbpy.protocol.filesync.SyncId` value of the request
+    :return: A :class:`~adbpy.protocol.ProtocolInvalidResponseError` instance
+    """
+    return protocol.ProtocolInvalidResponseError('Unexpected {} response to {} request'.format(
+        sync_id.value.decode(), request.value.decode()))
+
+
+def _mtime(mtime):
+    """
+    Get the SYNC representation of the given modification time.
+
+    :param mtime: Modification time in seconds or `None` for now
+    :return: A :class:`int` modification time
+    """
+    return int(time.time() if mtime is None else mtime)
+
+
+def _walk_local(local_dir, remote_dir):
+    """
+    Collect the regular files under the given local directory grouped by the remote directory they belong in.
+
+    :param local_dir: Local directory path
+    :param remote_dir: Remote directory path the local directory maps to
+    :return: A :class:`~collections.OrderedDict` of remote directory path to a list of
+        :class:`~adbpy.protocol.filesync._LocalFile` instances
+    """
+    if not os.path.isdir(local_dir):
+        raise ValueError('Local path {} is not a directory'.format(local_dir))
+
+    tree = collections.OrderedDict()
+    for dirpath, dirnames, filenames in os.walk(local_dir):
+        dirnames.sort()
+        reldir = os.path.relpath(dirpath, local_dir)
+        reldir = '' if reldir == os.curdir else reldir.replace(os.sep, '/')
+        files = []
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            st = os.stat(path)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            relpath = posixpath.join(reldir, name)
+            files.append(_LocalFile(relpath, path, posixpath.join(remote_dir, relpath),
+                                    stat.S_IFREG | stat.S_IMODE(st.st_mode), st))
+        if files:
+            tree[posixpath.join(remote_dir, reldir).rstrip('/') or '/'] = files
+    return tree
+
+
+def _diff(tree, listings):
+    """
+    Split local files into those that differ in size or modification time from the remote system and the rest.
+
+    :param tree: Local files by remote directory, See: :func:`~adbpy.protocol.filesync._walk_local`
+    :param listings: A :class:`list` of LIST responses for each remote directory of the tree, in order
+    :return: Tuple of the list of :class:`~adbpy.protocol.filesync._LocalFile` instances to push and the list of
+        unchanged relative paths
+    """
+    changed, unchanged = [], []
+    for files, entries in zip(tree.values(), listings):
+        remote = {entry.name: entry for entry in entries}
+        for local in files:
+            entry = remote.get(posixpath.basename(local.relpath))
+            if (entry is not None and stat.S_ISREG(entry.mode) and entry.size == local.st.st_size and
+                    entry.mtime == int(local.st.st_mtime)):
+                unchanged.append(local.relpath)
+            else:
+                changed.append(local)
+    return changed, unchanged
+
+
+def _batches(items, size):
+    """
+    Split the given list into consecutive batches of at most the given size.
+
+    :param items: A :class:`list` to split
+    :param size: Maximum size of a batch
+    :return: Generator of lists
+    """
+    size = max(1, size)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class FileSync(_BaseFileSync):
+    """
+    Synchronous (blocking) SYNC protocol client over a :class:`~adbpy.protocol.stream.Stream`.
+
+    Requests are issued one at a time; each method reads its complete response before returning. The remote system
+    ends the session after a failed push or pull, so every request made after one raises a
+    :class:`~adbpy.protocol.filesync.FileSyncError`.
+    """
+
+    @classmethod
+    def open(cls, manager, timeout=None):
+        """
+        Open a SYNC stream through the given stream manager.
+
+        :param manager: A started :class:`~adbpy.protocol.stream.StreamManager` instance
+        :param timeout: Optional timeout in seconds for stream operations
+        :return: A :class:`~adbpy.protocol.filesync.FileSync` instance
+        """
+        return cls(manager.open(SYNC_DESTINATION, timeout), timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stat(self, remote_path):
+        """
+        Get the mode, size and modification time of the given remote path.
+
+        :param remote_path: Remote path
+        :return: A :class:`~adbpy.protocol.filesync.StatResult` instance
+        """
+        self._write(_request(SyncId.stat, remote_path))
+        return self._read_stat()
+
+    def listdir(self, remote_path):
+        """
+        List the entries of the given remote directory.
+
+        :param remote_path: Remote directory path
+        :return: A :class:`list` of :class:`~adbpy.protocol.filesync.DirectoryEntry` instances
+        """
+        self._write(_request(SyncId.list, remote_path))
+        return self._read_listing()
+
+    def push(self, source, remote_path, mode=DEFAULT_PUSH_MODE, mtime=None):
+        """
+        Push the contents of the given source to the remote path.
+
+        :param source: Local file path, file object opened in binary mode or bytes-like object, e.g.
+            a :class:`~mmap.mmap`
+        :param remote_path: Remote file path
+        :param mode: File mode of the remote file; default: :data:`DEFAULT_PUSH_MODE`
+        :param mtime: Optional modification time of the remote file; default: that of the local file path or now
+        :return: Number of bytes pushed
+        """
+        num_bytes = self._send_file(source, remote_path, mode, mtime)
+        self._read_status(SyncId.send)
+        return num_bytes
+
+    def pull(self, remote_path, dest):
+        """
+        Pull the contents of the given remote path, writing them to the destination as they arrive.
+
+        :param remote_path: Remote file path
+        :param dest: Local file path or file object opened in binary mode
+        :return: Number of bytes pulled
+        """
+        if isinstance(dest, str):
+            with io.open(dest, 'wb') as f:
+                return self.pull(remote_path, f)
+
+        self._write(_request(SyncId.recv, remote_path))
+
+        view = memoryview(bytearray(SYNC_DATA_MAX))
+        num_bytes = 0
+        while True:
+            sync_id, length = self._read_header()
+            if sync_id is SyncId.done:
+                return num_bytes
+            if sync_id is SyncId.fail:
+                raise self._fail(self._read_exactly(length))
+            if sync_id is not SyncId.data:
+                raise _unexpected(sync_id, SyncId.recv)
+            if length > SYNC_DATA_MAX:
+                raise protocol.ProtocolInvalidResponseError('DATA packet of {} bytes exceeds {}'.format(
+                    length, SYNC_DATA_MAX))
+            self._readinto(view[:length])
+            dest.write(view[:length])
+            num_bytes += length
+
+    def sync_directory(self, local_dir, remote_dir, dry_run=False, pipeline_depth=DEFAULT_PIPELINE_DEPTH):
+        """
+        Push the files under the local directory that are missing on the remote system or differ from it in size or
+        modification time, like `adb sync`.
+
+        Every remote directory is listed with pipelined LIST requests and the changed files are pushed with pipelined
+        SEND requests, all over this one stream.
+
+        :param local_dir: Local directory path
+        :param remote_dir: Remote directory path
+        :param dry_run: Only compare the directories without pushing; default: `False`
+        :param pipeline_depth: Maximum number of requests sent before reading their responses
+        :return: A :class:`~adbpy.protocol.filesync.DirectorySyncResult` instance
+        """
+        tree = _walk_local(local_dir, remote_dir)
+
+        listings = []
+        for batch in _batches(list(tree), pipeline_depth):
+            for remote_path in batch:
+                self._write(_request(SyncId.list, remote_path))
+            for _ in batch:
+                listings.append(self._read_listing())
+
+        changed, unchanged = _diff(tree, listings)
+        if not dry_run:
+            self._push_many(changed, pipeline_depth)
+        return DirectorySyncResult([local.relpath for local in changed], unchanged)
+
+    def close(self):
+        """
+        End the SYNC session, once the remote system received the request, and close the stream.
+
+        :return: `None`
+        """
+        if self.stream.is_open and not self.failed:
+            self._write(_request(SyncId.quit))
+            try:
+                self.stream.drain(self.timeout)
+            except stream.StreamClosedError:
+                pass
+        self.stream.close()
+
+    def _send_file(self, source, remote_path, mode, mtime):
+        """
+        Write the SEND request, DATA packets and DONE request for a file without waiting for the response.
+
+        :param source: Local file path, file object opened in binary mode or bytes-like object
+        :param remote_path: Remote file path
+        :param mode: File mode of the remote file
+        :param mtime: Optional modification time of the remote file
+        :return: Number of bytes sent
+        """
+        if isinstance(source, str):
+            with io.open(source, 'rb') as f:
+                if mtime is None:
+                    mtime = os.fstat(f.fileno()).st_mtime
+                return self._send_file(f, remote_path, mode, mtime)
+        if not hasattr(source, 'readinto'):
+            source = _MemorySource(source)
+
+        self._write(_send_request(remote_path, mode))
+
+        view = memoryview(bytearray(SYNC_HEADER.size + self.chunk_size))
+        num_bytes = 0
+        while True:
+            packet = self._fill_data_packet(source, view)
+            if packet is None:
+                break
+            self._write(packet)
+            num_bytes += len(packet) - SYNC_HEADER.size
+
+        self._write(SYNC_HEADER.pack(SyncId.done.value, _mtime(mtime)))
+        return num_bytes
+
+    def _push_many(self, files, pipeline_depth):
+        """
+        Push the given files with pipelined SEND requests.
+
+        The remote system ends the session after the first failed push and does not answer the requests pipelined
+        behind it, so that failure is raised and the session is left unusable.
+
+        :param files: A :class:`list` of :class:`~adbpy.protocol.filesync._LocalFile` instances
+        :param pipeline_depth: Maximum number of SEND requests sent before reading their responses
+        :return: `None`
+        """
+        for batch in _batches(files, pipeline_depth):
+            for local in batch:
+                try:
+                    self._send_file(local.path, local.remote_path, local.mode, local.st.st_mtime)
+                except stream.StreamClosedError:
+                    # Closed after failing an earlier push of the batch; its FAIL response is read below.
+                    break
+            for local in batch:
+                try:
+                    self._read_status(SyncId.send)
+                except FileSyncError as e:
+                    raise FileSyncError('{}: {}'.format(local.remote_path, e)) from e
+
+    def _read_status(self, request):
+        """
+        Read the OKAY or FAIL response to a request.
+
+        :param request: A :class:`~adbpy.protocol.filesync.SyncId` value of the request
+        :return: `None`
+        """
+        sync_id, length = self._read_header()
+        if sync_id is SyncId.fail:
+            raise self._fail(self._read_exactly(length))
+        if sync_id is not SyncId.okay:
+            raise _unexpected(sync_id, request)
+
+    def _read_stat(self):
+        """
+        Read the response to a STAT request.
+
+        :return: A :class:`~adbpy.protocol.filesync.StatResult` instance
+        """
+        data = self._read_exactly(4 + STAT_STRUCT.size)
+        sync_id = _sync_id(bytes(data[:4]))
+        if sync_id is not SyncId.stat:
+            raise _unexpected(sync_id, SyncId.stat)
+        return StatResult(*STAT_STRUCT.unpack_from(data, 4))
+
+    def _read_listing(self):
+        """
+        Read the complete response to a LIST request.
+
+        :return: A :class:`list` of :class:`~adbpy.protocol.filesync.DirectoryEntry` instances
+        """
+        entries = []
+        while True:
+            entry = self._read_dent()
+            if entry is None:
+                return entries
+            entries.append(entry)
+
+    def _read_dent(self):
+        """
+        Read the next entry of the response to a LIST request.
+
+        :return: A :class:`~adbpy.protocol.filesync.DirectoryEntry` instance or `None` once the listing is done
+        """
+        data = self._read_exactly(4 + DENT_STRUCT.size)
+        sync_id = _sync_id(bytes(data[:4]))
+        if sync_id is SyncId.done:
+            return None
+        if sync_id is not SyncId.dent:
+            raise _unexpected(sync_id, SyncId.list)
+        mode, size, mtime, name_length = DENT_STRUCT.unpack_from(data, 4)
+        name = self._read_exactly(name_length).decode('utf-8', 'surrogateescape')
+        return DirectoryEntry(name, mode, size, mtime)
+
+    def _read_header(self):
+        """
+        Read the header of the next response.
+
+        :return: Tuple of a :class:`~adbpy.protocol.filesync.SyncId` value and the length/value of the header
+        """
+        sync_id, length = SYNC_HEADER.unpack(self._read_exactly(SYNC_HEADER.size))
+        return _sync_id(sync_id), length
+
+    def _read_exactly(self, num_bytes):
+        """
+        Read exactly the given number of bytes of the response.
+
+        :param num_bytes: Number of bytes to read
+        :return: A :class:`~bytearray` of exactly `num_bytes` length
+        """
+        buf = bytearray(num_bytes)
+        self._readinto(memoryview(buf))
+        return buf
+
+    def _readinto(self, view):
+        """
+        Read response bytes from the stream until the given view is full.
+
+        :param view: A writable :class:`~memoryview` to fill
+        :return: `None`
+        """
+        num_received = self._buffer.take(view)
+        while num_received < len(view):
+            data = self.stream.read(self.timeout)
+            if not data:
+                raise protocol.ProtocolNoResponseError('{} closed during SYNC response'.format(self.stream))
+            self._buffer.pending = memoryview(data)
+            num_received += self._buffer.take(view[num_received:])
+
+    def _write(self, data):
+        self._check_usable()
+        self.stream.write(data, self.timeout)
+
+
+class AsyncFileSync(_BaseFileSync):
+    """
+    Asynchronous (non-blocking) SYNC protocol client over a :class:`~adbpy.protocol.stream.AsyncStream`.
+
+    Behaves like :class:`~adbpy.protocol.filesync.FileSync` except every public method is a coroutine.
+    """
+
+    @classmethod
+    @asyncio.coroutine
+    def open(cls, manager, timeout=None):
+        """
+        Open a SYNC stream through the given stream manager.
+
+        :param manager: A started :class:`~adbpy.protocol.stream.AsyncStreamManager` instance
+        :param timeout: Optional timeout in seconds for stream operations
+        :return: A :class:`~adbpy.protocol.filesync.AsyncFileSync` instance
+        """
+        stream = yield from manager.open(SYNC_DESTINATION, timeout)
+        return cls(stream, timeout)
+
+    @asyncio.coroutine
+    def stat(self, remote_path):
+        """
+        Get the mode, size and modification time of the given remote path.
+
+        :param remote_path: Remote path
+        :return: A :class:`~adbpy.protocol.filesync.StatResult` instance
+        """
+        yield from self._write(_request(SyncId.stat, remote_path))
+        return (yield from self._read_stat())
+
+    @asyncio.coroutine
+    def listdir(self, remote_path):
+        """
+        List the entries of the given remote directory.
+
+        :param remote_path: Remote directory path
+        :return: A :class:`list` of :class:`~adbpy.protocol.filesync.DirectoryEntry` instances
+        """
+        yield from self._write(_request(SyncId.list, remote_path))
+        return (yield from self._read_listing())
+
+    @asyncio.coroutine
+    def push(self, source, remote_path, mode=DEFAULT_PUSH_MODE, mtime=None):
+        """
+        Push the contents of the given source to the remote path.
+
+        :param source: Local file path, file object opened in binary mode or bytes-like object, e.g.
+            a :class:`~mmap.mmap`
+        :param remote_path: Remote file path
+        :param mode: File mode of the remote file; default: :data:`DEFAULT_PUSH_MODE`
+        :param mtime: Optional modification time of the remote file; default: that of the local file path or now
+        :return: Number of bytes pushed
+        """
+        num_bytes = yield from self._send_file(source, remote_path, mode, mtime)
+        yield from self._read_status(SyncId.send)
+        return num_bytes
+
+    @asyncio.coroutine
+    def pull(self, remote_path, dest):
+        """
+        Pull the contents of the given remote path, writing them to the destination as they arrive.
+
+        :param remote_path: Remote file path
+        :param dest: Local file path or file object opened in binary mode
+        :return: Number of bytes pulled
+        """
+        if isinstance(dest, str):
+            with io.open(dest, 'wb') as f:
+                return (yield from self.pull(remote_path, f))
+
+        yield from self._write(_request(SyncId.recv, remote_path))
+
+        view = memoryview(bytearray(SYNC_DATA_MAX))
+        num_bytes = 0
+        while True:
+            sync_id, length = yield from self._read_header()
+            if sync_id is SyncId.done:
+                return num_bytes
+            if sync_id is SyncId.fail:
+                data = yield from self._read_exactly(length)
+                raise self._fail(data)
+            if sync_id is not SyncId.data:
+                raise _unexpected(sync_id, SyncId.recv)
+            if length > SYNC_DATA_MAX:
+                raise protocol.ProtocolInvalidResponseError('DATA packet of {} bytes exceeds {}'.format(
+                    length, SYNC_DATA_MAX))
+            yield from self._readinto(view[:length])
+            dest.write(view[:length])
+            num_bytes += length
+
+    @asyncio.coroutine
+    def sync_directory(self, local_dir, remote_dir, dry_run=False, pipeline_depth=DEFAULT_PIPELINE_DEPTH):
+        """
+        Push the files under the local directory that are missing on the remote system or differ from it in size or
+        modification time, like `adb sync`.
+
+        Every remote directory is listed with pipelined LIST requests and the changed files are pushed with pipelined
+        SEND requests, all over this one stream.
+
+        :param local_dir: Local directory path
+        :param remote_dir: Remote directory path
+        :param dry_run: Only compare the directories without pushing; default: `False`
+        :param pipeline_depth: Maximum number of requests sent before reading their responses
+        :return: A :class:`~adbpy.protocol.filesync.DirectorySyncResult` instance
+        """
+        tree = _walk_local(local_dir, remote_dir)
+
+        listings = []
+        for batch in _batches(list(tree), pipeline_depth):
+            for remote_path in batch:
+                yield from self._write(_request(SyncId.list, remote_path))
+            for _ in batch:
+                listings.append((yield from self._read_listing()))
+
+        changed, unchanged = _diff(tree, listings)
+        if not dry_run:
+            yield from self._push_many(changed, pipeline_depth)
+        return DirectorySyncResult([local.relpath for local in changed], unchanged)
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        End the SYNC session, once the remote system received the request, and close the stream.
+
+        :return: `None`
+        """
+        if self.stream.is_open and not self.failed:
+            yield from self._write(_request(SyncId.quit))
+            try:
+                yield from self.stream.drain(self.timeout)
+            except stream.StreamClosedError:
+                pass
+        yield from self.stream.close()
+
+    @asyncio.coroutine
+    def _send_file(self, source, remote_path, mode, mtime):
+        """
+        Write the SEND request, DATA packets and DONE request for a file without waiting for the response.
+
+        :param source: Local file path, file object opened in binary mode or bytes-like object
+        :param remote_path: Remote file path
+        :param mode: File mode of the remote file
+        :param mtime: Optional modification time of the remote file
+        :return: Number of bytes sent
+        """
+        if isinstance(source, str):
+            with io.open(source, 'rb') as f:
+                if mtime is None:
+                    mtime = os.fstat(f.fileno()).st_mtime
+                return (yield from self._send_file(f, remote_path, mode, mtime))
+        if not hasattr(source, 'readinto'):
+            source = _MemorySource(source)
+
+        yield from self._write(_send_request(remote_path, mode))
+
+        view = memoryview(bytearray(SYNC_HEADER.size + self.chunk_size))
+        num_bytes = 0
+        while True:
+            packet = self._fill_data_packet(source, view)
+            if packet is None:
+                break
+            yield from self._write(packet)
+            num_bytes += len(packet) - SYNC_HEADER.size
+
+        yield from self._write(SYNC_HEADER.pack(SyncId.done.value, _mtime(mtime)))
+        return num_bytes
+
+    @asyncio.coroutine
+    def _push_many(self, files, pipeline_depth):
+        """
+        Push the given files with pipelined SEND requests, See: :meth:`~adbpy.protocol.filesync.FileSync._push_many`.
+
+        :param files: A :class:`list` of :class:`~adbpy.protocol.filesync._LocalFile` instances
+        :param pipeline_depth: Maximum number of SEND requests sent before reading their responses
+        :return: `None`
+        """
+        for batch in _batches(files, pipeline_depth):
+            for local in batch:
+                try:
+                    yield from self._send_file(local.path, local.remote_path, local.mode, local.st.st_mtime)
+                except stream.StreamClosedError:
+                    # Closed after failing an earlier push of the batch; its FAIL response is read below.
+                    break
+            for local in batch:
+                try:
+                    yield from self._read_status(SyncId.send)
+                except FileSyncError as e:
+                    raise FileSyncError('{}: {}'.format(local.remote_path, e)) from e
+
+    @asyncio.coroutine
+    def _read_status(self, request):
+        """
+        Read the OKAY or FAIL response to a request.
+
+        :param request: A :class:`~adbpy.protocol.filesync.SyncId` value of the request
+        :return: `None`
+        """
+        sync_id, length = yield from self._read_header()
+        if sync_id is SyncId.fail:
+            data = yield from self._read_exactly(length)
+            raise self._fail(data)
+        if sync_id is not SyncId.okay:
+            raise _unexpected(sync_id, request)
+
+    @asyncio.coroutine
+    def _read_stat(self):
+        """
+        Read the response to a STAT request.
+
+        :return: A :class:`~adbpy.protocol.filesync.StatResult` instance
+        """
+        data = yield from self._read_exactly(4 + STAT_STRUCT.size)
+        sync_id = _sync_id(bytes(data[:4]))
+        if sync_id is not SyncId.stat:
+            raise _unexpected(sync_id, SyncId.stat)
+        return StatResult(*STAT_STRUCT.unpack_from(data, 4))
+
+    @asyncio.coroutine
+    def _read_listing(self):
+        """
+        Read the complete response to a LIST request.
+
+        :return: A :class:`list` of :class:`~adbpy.protocol.filesync.DirectoryEntry` instances
+        """
+        entries = []
+        while True:
+            entry = yield from self._read_dent()
+            if entry is None:
+                return entries
+            entries.append(entry)
+
+    @asyncio.coroutine
+    def _read_dent(self):
+        """
+        Read the next entry of the response to a LIST request.
+
+        :return: A :class:`~adbpy.protocol.filesync.DirectoryEntry` instance or `None` once the listing is done
+        """
+        data = yield from self._read_exactly(4 + DENT_STRUCT.size)
+        sync_id = _sync_id(bytes(data[:4]))
+        if sync_id is SyncId.done:
+            return None
+        if sync_id is not SyncId.dent:
+            raise _unexpected(sync_id, SyncId.list)
+        mode, size, mtime, name_length = DENT_STRUCT.unpack_from(data, 4)
+        name = yield from self._read_exactly(name_length)
+        return DirectoryEntry(name.decode('utf-8', 'surrogateescape'), mode, size, mtime)
+
+    @asyncio.coroutine
+    def _read_header(self):
+        """
+        Read the header of the next response.
+
+        :return: Tuple of a :class:`~adbpy.protocol.filesync.SyncId` value and the length/value of the header
+        """
+        data = yield from self._read_exactly(SYNC_HEADER.size)
+        sync_id, length = SYNC_HEADER.unpack(data)
+        return _sync_id(sync_id), length
+
+    @asyncio.coroutine
+    def _read_exactly(self, num_bytes):
+        """
+        Read exactly the given number of bytes of the response.
+
+        :param num_bytes: Number of bytes to read
+        :return: A :class:`~bytearray` of exactly `num_bytes` length
+        """
+        buf = bytearray(num_bytes)
+        yield from self._readinto(memoryview(buf))
+        return buf
+
+    @asyncio.coroutine
+    def _readinto(self, view):
+        """
+        Read response bytes from the stream until the given view is full.
+
+        :param view: A writable :class:`~memoryview` to fill
+        :return: `None`
+        """
+        num_received = self._buffer.take(view)
+        while num_received < len(view):
+            data = yield from self.stream.read(self.timeout)
+            if not data:
+                raise protocol.ProtocolNoResponseError('{} closed during SYNC response'.format(self.stream))
+            self._buffer.pending = memoryview(data)
+            num_received += self._buffer.take(view[num_received:])
+
+    @asyncio.coroutine
+    def _write(self, data):
+        self._check_usable()
+        yield from self.stream.write(data, self.timeout)
@@ -0,0 +1,200 @@
+"""
+    adbpy.protocol.forward
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for forwarding local TCP connections to a remote system over a single ADB connection.
+
+    Every accepted client gets its own :class:`~adbpy.protocol.stream.AsyncStream` multiplexed by an
+    :class:`~adbpy.protocol.stream.AsyncStreamManager`, so any number of forwarded sockets share one connection and one
+    event loop. Both directions are bounded: data from the client is read no faster than the stream write window
+    allows and data from the remote system is acknowledged only after the client socket has drained it below the
+    buffer size.
+"""
+
+import asyncio
+import logging
+
+from adbpy.message import adb
+
+
+__all__ = ['PortForwarder', 'forward']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: Default number of bytes buffered in each direction of a forwarded connection.
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+
+class PortForwarder:
+    """
+    Asynchronous TCP server that forwards every accepted client to a stream destination on a remote system, e.g.
+
+    >>> forwarder = yield from forward(manager, 8080)
+    >>> forwarder.address
+    ('127.0.0.1', 50123)
+    """
+
+    def __init__(self, manager, destination, host='localhost', port=0, buffer_size=DEFAULT_BUFFER_SIZE,
+                 timeout=None, loop=None):
+        self.manager = manager
+        self.destination = destination
+        self.host = host
+        self.port = port
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self.loop = loop or manager.loop
+        self.server = None
+        self._tasks = set()
+
+    def __repr__(self):
+        return '<{}(destination={}, address={}, connections={})>'.format(self.__class__.__name__, self.destination,
+                                                                         self.address, self.connections)
+
+    @property
+    def address(self):
+        """
+        Return the local address the server is listening on or `None` if it is not started.
+        """
+        if self.server is None or not self.server.sockets:
+            return None
+        return self.server.sockets[0].getsockname()[:2]
+
+    @property
+    def connections(self):
+        """
+        Return the number of clients currently being forwarded.
+        """
+        return len(self._tasks)
+
+    @asyncio.coroutine
+    def start(self):
+        """
+        Start accepting local clients.
+
+        :return: `None`
+        """
+        self.server = yield from asyncio.start_server(self._accept, self.host, self.port, loop=self.loop,
+                                                      limit=self.buffer_size)
+        LOGGER.debug('Forwarding %s to %s', self.address, self.destination)
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Stop accepting clients and close every forwarded connection.
+
+        :return: `None`
+        """
+        if self.server is not None:
+            self.server.close()
+            yield from self.server.wait_closed()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            yield from asyncio.wait(list(self._tasks), loop=self.loop)
+
+    def _accept(self, reader, writer):
+        """
+        Start forwarding a newly accepted client.
+
+        :param reader: :class:`~asyncio.StreamReader` of the client
+        :param writer: :class:`~asyncio.StreamWriter` of the client
+        :return: `None`
+        """
+        task = self.loop.create_task(self._forward(reader, writer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @asyncio.coroutine
+    def _forward(self, reader, writer):
+        """
+        Open a stream for the given client and pump data in both directions until either side closes.
+
+        ADB streams cannot be half-closed, so the end of either direction ends the whole connection.
+
+        :param reader: :class:`~asyncio.StreamReader` of the client
+        :param writer: :class:`~asyncio.StreamWriter` of the client
+        :return: `None`
+        """
+        stream = None
+        try:
+            stream = yield from self.manager.open(self.destination, self.timeout)
+            writer.transport.set_write_buffer_limits(high=self.buffer_size)
+            pumps = [self.loop.create_task(_to_stream(reader, stream, self.timeout)),
+                     self.loop.create_task(_to_client(stream, writer))]
+            try:
+                done, _ = yield from asyncio.wait(pumps, loop=self.loop, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for pump in pumps:
+                    pump.cancel()
+                yield from asyncio.wait(pumps, loop=self.loop)
+            for pump in done:
+                pump.result()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOGGER.debug('Forwarding to %s stopped: %s', self.destination, e)
+        finally:
+            writer.close()
+            if stream is not None:
+                yield from stream.close()
+
+
+@asyncio.coroutine
+def _to_stream(reader, stream, timeout=None):
+    """
+    Copy data read from a client to a stream.
+
+    Reads are capped at the maximum stream payload so each one is written as a single message without being sliced.
+
+    :param reader: :class:`~asyncio.StreamReader` of the client
+    :param stream: :class:`~adbpy.protocol.stream.AsyncStream` to write to
+    :param timeout: Optional timeout in seconds to wait for the stream write window
+    :return: `None`
+    """
+    while True:
+        data = yield from reader.read(stream.max_data)
+        if not data:
+            return
+        yield from stream.write(data, timeout)
+
+
+@asyncio.coroutine
+def _to_client(stream, writer):
+    """
+    Copy data read from a stream to a client.
+
+    The next payload is not read, and therefore not acknowledged, until the client has drained the previous one.
+
+    :param stream: :class:`~adbpy.protocol.stream.AsyncStream` to read from
+    :param writer: :class:`~asyncio.StreamWriter` of the client
+    :return: `None`
+    """
+    while True:
+        data = yield from stream.read()
+        if not data:
+            return
+        writer.write(data)
+        yield from writer.drain()
+
+
+@asyncio.coroutine
+def forward(manager, remote_port, local_port=0, remote_host='localhost', local_host='localhost',
+            buffer_size=DEFAULT_BUFFER_SIZE, timeout=None):
+    """
+    Forward a local TCP port to a TCP port on the remote system.
+
+    :param manager: A started :class:`~adbpy.protocol.stream.AsyncStreamManager` instance
+    :param remote_port: Port to connect to on the remote system
+    :param local_port: Port to listen on; default: any free port
+    :param remote_host: Host to connect to from the remote system; default: localhost
+    :param local_host: Host to listen on; default: localhost
+    :param buffer_size: Number of bytes buffered in each direction of a forwarded connection
+    :param timeout: Optional timeout in seconds for opening streams and waiting on their write windows
+    :return: A started :class:`~adbpy.protocol.forward.PortForwarder` instance
+    """
+    destination = adb.StreamIdentifierFormat.tcp.value.format(host=remote_host, port=remote_port)
+    forwarder = PortForwarder(manager, destination, local_host, local_port, buffer_size, timeout, manager.loop)
+    yield from forwarder.start()
+    return forwarder
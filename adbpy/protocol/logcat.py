@@ -0,0 +1,521 @@
+"""
+    adbpy.protocol.logcat
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for streaming log records from a remote system in the binary `logger_entry` format.
+
+    Records are read by `logcat -B` over an `exec:` stream, which unlike `shell:` never alters the binary data, and
+    parsed directly from the stream payloads. A reader puts them into a bounded queue that applies an
+    :class:`~adbpy.protocol.logcat.OverflowPolicy` once consumers fall behind. The `block` policy stops reading,
+    which holds back only the logcat stream since the remote system waits for each read to be acknowledged; the other
+    policies keep reading and discard records instead.
+"""
+
+import asyncio
+import collections
+import enum
+import logging
+import struct
+import threading
+
+import adbpy
+from adbpy.message import adb
+
+
+__all__ = ['LogcatReader', 'AsyncLogcatReader', 'LogRecord', 'LogPriority', 'LogEntryDecoder', 'OverflowPolicy',
+           'RecordQueue', 'AsyncRecordQueue']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: Struct of the fields leading every `logger_entry`: payload length and header size (zero for version 1).
+ENTRY_PREFIX = struct.Struct('<HH')
+
+#: Struct of the fields of every `logger_entry` version following the prefix: pid, tid, sec and nsec.
+ENTRY_FIELDS = struct.Struct('<iIII')
+
+#: Struct of each optional trailing header field: log id (version 3+) and uid (version 4). A 24 byte header is read
+#: as version 3 since version 2, whose extra field is the euid instead, is only written by pre-logd kernel loggers.
+ENTRY_EXTRA_FIELD = struct.Struct('<I')
+
+#: Size of a version 1 `logger_entry` header, which does not carry its header size.
+ENTRY_V1_HEADER_SIZE = 20
+
+#: Default maximum number of records buffered for consumers.
+DEFAULT_MAX_RECORDS = 10000
+
+#: Default rate at which records are kept by the `sample` policy while the queue is full.
+DEFAULT_SAMPLE_EVERY = 10
+
+
+class LogPriority(enum.IntEnum):
+    """
+    Enumeration for the priorities of log records.
+    """
+
+    unknown = 0
+    default = 1
+    verbose = 2
+    debug = 3
+    info = 4
+    warn = 5
+    error = 6
+    fatal = 7
+    silent = 8
+
+
+class OverflowPolicy(enum.Enum):
+    """
+    Enumeration for what a full record queue does with new records.
+    """
+
+    #: Wait for consumers to make room, which stops reading from the logcat stream.
+    block = 'block'
+
+    #: Discard the oldest buffered record to make room.
+    drop_oldest = 'drop_oldest'
+
+    #: Keep one in every `sample_every` new records, discarding the oldest buffered record to make room for it.
+    sample = 'sample'
+
+
+class LogRecord(collections.namedtuple('LogRecord', 'pid tid sec nsec lid uid priority tag message')):
+    """
+    Log record parsed from a binary `logger_entry`. `lid` and `uid` are `None` when the entry version lacks them.
+    `priority` is a :class:`~adbpy.protocol.logcat.LogPriority` unless the entry carries an unknown value.
+    """
+
+    __slots__ = ()
+
+    @property
+    def time(self):
+        """
+        Return the time the record was logged, in seconds since the epoch.
+        """
+        return self.sec + self.nsec / 1e9
+
+
+class LogEntryDecoder:
+    """
+    Parses binary `logger_entry` structures, of any version, from stream payloads that do not line up with entry
+    boundaries.
+    """
+
+    __slots__ = ['buffer']
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Append the given payload and return the records it completed.
+
+        :param data: Bytes-like stream payload
+        :return: A :class:`list` of :class:`~adbpy.protocol.logcat.LogRecord` instances
+        """
+        self.buffer += data
+        records, start = [], 0
+        with memoryview(self.buffer) as view:
+            while len(view) - start >= ENTRY_PREFIX.size:
+                length, header_size = ENTRY_PREFIX.unpack_from(view, start)
+                header_size = header_size or ENTRY_V1_HEADER_SIZE
+                end = start + header_size + length
+                if end > len(view):
+                    break
+                records.append(_parse_entry(view, start, header_size, end))
+                start = end
+        del self.buffer[:start]
+        return records
+
+
+def _parse_entry(view, start, header_size, end):
+    """
+    Parse a single `logger_entry` structure.
+
+    :param view: A :class:`~memoryview` of the buffer holding the entry
+    :param start: Offset of the entry
+    :param header_size: Size of the entry header
+    :param end: Offset following the entry payload
+    :return: A :class:`~adbpy.protocol.logcat.LogRecord` instance
+    """
+    pid, tid, sec, nsec = ENTRY_FIELDS.unpack_from(view, start + ENTRY_PREFIX.size)
+    extra = [ENTRY_EXTRA_FIELD.unpack_from(view, offset)[0]
+             for offset in range(start + ENTRY_V1_HEADER_SIZE, start + min(header_size, 28), ENTRY_EXTRA_FIELD.size)]
+    lid, uid = (extra + [None, None])[:2]
+
+    payload = bytes(view[start + header_size:end])
+    try:
+        priority = LogPriority(payload[0]) if payload else LogPriority.unknown
+    except ValueError:
+        priority = payload[0]
+    tag, sep, message = payload[1:].partition(b'\0')
+    if not sep:
+        tag, message = b'', tag
+    message = message.rstrip(b'\0').rstrip(b'\n')
+
+    return LogRecord(pid, tid, sec, nsec, lid, uid, priority, tag.decode('utf-8', 'replace'),
+                     message.decode('utf-8', 'replace'))
+
+
+class _BaseRecordQueue:
+    """
+    Bounded buffer of records and the overflow policy bookkeeping shared by synchronous and asynchronous queues.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAX_RECORDS, policy=OverflowPolicy.drop_oldest,
+                 sample_every=DEFAULT_SAMPLE_EVERY):
+        if maxsize < 1:
+            raise ValueError('maxsize must be >= 1')
+        self.maxsize = maxsize
+        self.policy = OverflowPolicy(policy)
+        self.sample_every = max(1, sample_every)
+        self.dropped = 0
+        self.is_closed = False
+        self._records = collections.deque()
+        self._overflowed = 0
+
+    def __repr__(self):
+        return '<{}(maxsize={}, policy={}, size={}, dropped={})>'.format(self.__class__.__name__, self.maxsize,
+                                                                         self.policy.value, len(self._records),
+                                                                         self.dropped)
+
+    def __len__(self):
+        return len(self._records)
+
+    def _admit(self, record):
+        """
+        Add the record to a full queue according to a dropping policy.
+
+        :param record: Record to add
+        :return: `None`
+        """
+        self._overflowed += 1
+        if self.policy is OverflowPolicy.sample and self._overflowed % self.sample_every:
+            self.dropped += 1
+            return
+        self._records.popleft()
+        self._records.append(record)
+        self.dropped += 1
+
+    def _append(self, record):
+        """
+        Add the record to a queue that has room.
+
+        :param record: Record to add
+        :return: `None`
+        """
+        self._overflowed = 0
+        self._records.append(record)
+
+
+class RecordQueue(_BaseRecordQueue):
+    """
+    Thread-safe bounded queue of records with an :class:`~adbpy.protocol.logcat.OverflowPolicy`.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAX_RECORDS, policy=OverflowPolicy.drop_oldest,
+                 sample_every=DEFAULT_SAMPLE_EVERY):
+        super().__init__(maxsize, policy, sample_every)
+        self._condition = threading.Condition()
+
+    def put(self, record):
+        """
+        Add the given record, applying the overflow policy when the queue is full.
+
+        :param record: Record to add
+        :return: `None`
+        """
+        with self._condition:
+            if len(self._records) >= self.maxsize:
+                if self.policy is OverflowPolicy.block:
+                    self._condition.wait_for(lambda: len(self._records) < self.maxsize or self.is_closed)
+                    if self.is_closed:
+                        return
+                else:
+                    self._admit(record)
+                    return
+            self._append(record)
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest record.
+
+        :param timeout: Optional timeout in seconds to wait for a record
+        :return: A record or `None` once the queue is closed and empty
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._records or self.is_closed, timeout):
+                raise TimeoutError('No record within {} seconds'.format(timeout))
+            if not self._records:
+                return None
+            record = self._records.popleft()
+            self._condition.notify_all()
+            return record
+
+    def close(self):
+        """
+        Close the queue; consumers receive the remaining records followed by `None`.
+
+        :return: `None`
+        """
+        with self._condition:
+            self.is_closed = True
+            self._condition.notify_all()
+
+
+class AsyncRecordQueue(_BaseRecordQueue):
+    """
+    Bounded queue of records with an :class:`~adbpy.protocol.logcat.OverflowPolicy` for use on a single event loop.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAX_RECORDS, policy=OverflowPolicy.drop_oldest,
+                 sample_every=DEFAULT_SAMPLE_EVERY, loop=None):
+        super().__init__(maxsize, policy, sample_every)
+        self._condition = asyncio.Condition(loop=loop)
+
+    @asyncio.coroutine
+    def put(self, record):
+        """
+        Add the given record, applying the overflow policy when the queue is full.
+
+        :param record: Record to add
+        :return: `None`
+        """
+        with (yield from self._condition):
+            if len(self._records) >= self.maxsize:
+                if self.policy is OverflowPolicy.block:
+                    yield from self._condition.wait_for(lambda: len(self._records) < self.maxsize or self.is_closed)
+                    if self.is_closed:
+                        return
+                else:
+                    self._admit(record)
+                    return
+            self._append(record)
+            self._condition.notify_all()
+
+    @asyncio.coroutine
+    def get(self):
+        """
+        Remove and return the oldest record.
+
+        :return: A record or `None` once the queue is closed and empty
+        """
+        with (yield from self._condition):
+            yield from self._condition.wait_for(lambda: self._records or self.is_closed)
+            if not self._records:
+                return None
+            record = self._records.popleft()
+            self._condition.notify_all()
+            return record
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close the queue; consumers receive the remaining records followed by `None`.
+
+        :return: `None`
+        """
+        with (yield from self._condition):
+            self.is_closed = True
+            self._condition.notify_all()
+
+
+def _destination(args):
+    """
+    Get the stream destination that runs `logcat -B` with the given arguments.
+
+    :param args: Additional logcat arguments, e.g. "-b main,system"
+    :return: Stream destination string
+    """
+    command = 'logcat -B {}'.format(args).rstrip()
+    return adb.StreamIdentifierFormat.exec_command.value.format(command=command)
+
+
+class LogcatReader:
+    """
+    Streams log records from a remote system into a :class:`~adbpy.protocol.logcat.RecordQueue` on a background
+    thread. Iterating the reader yields records until the stream is closed, e.g.
+
+    >>> with LogcatReader.open(manager, policy=OverflowPolicy.drop_oldest) as logcat:
+    ...     for record in logcat:
+    ...         print(record.tag, record.message)
+    """
+
+    def __init__(self, stream, queue):
+        self.stream = stream
+        self.queue = queue
+        self._decoder = LogEntryDecoder()
+        self._thread = threading.Thread(target=self._read_loop, name=repr(self), daemon=True)
+
+    def __repr__(self):
+        return '<{}(stream={})>'.format(self.__class__.__name__, self.stream)
+
+    @classmethod
+    def open(cls, manager, args='', maxsize=DEFAULT_MAX_RECORDS, policy=OverflowPolicy.drop_oldest,
+             sample_every=DEFAULT_SAMPLE_EVERY, timeout=None):
+        """
+        Start streaming log records through the given stream manager.
+
+        :param manager: A started :class:`~adbpy.protocol.stream.StreamManager` instance
+        :param args: Optional additional logcat arguments, e.g. "-b main,system"
+        :param maxsize: Maximum number of records buffered for consumers
+        :param policy: An :class:`~adbpy.protocol.logcat.OverflowPolicy` applied once the buffer is full
+        :param sample_every: Rate at which new records are kept by the `sample` policy
+        :param timeout: Optional timeout in seconds to wait for the stream to open
+        :return: A started :class:`~adbpy.protocol.logcat.LogcatReader` instance
+        """
+        reader = cls(manager.open(_destination(args), timeout), RecordQueue(maxsize, policy, sample_every))
+        reader._thread.start()
+        return reader
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.get, None)
+
+    @property
+    def dropped(self):
+        """
+        Return the number of records discarded by the overflow policy.
+        """
+        return self.queue.dropped
+
+    def get(self, timeout=None):
+        """
+        Get the next log record.
+
+        :param timeout: Optional timeout in seconds to wait for a record
+        :return: A :class:`~adbpy.protocol.logcat.LogRecord` instance or `None` once the stream is closed
+        """
+        return self.queue.get(timeout)
+
+    def close(self):
+        """
+        Stop streaming log records.
+
+        :return: `None`
+        """
+        self.stream.close()
+        self.queue.close()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _read_loop(self):
+        """
+        Read payloads from the stream and queue their records until the stream is closed.
+
+        :return: `None`
+        """
+        try:
+            for data in self.stream:
+                for record in self._decoder.feed(data):
+                    self.queue.put(record)
+                if self.queue.is_closed:
+                    break
+        except Exception as e:
+            LOGGER.debug('Logcat reader stopped: %s', e)
+        finally:
+            self.queue.close()
+
+
+class AsyncLogcatReader:
+    """
+    Streams log records from a remote system into an :class:`~adbpy.protocol.logcat.AsyncRecordQueue` from a
+    background task.
+
+    Behaves like :class:`~adbpy.protocol.logcat.LogcatReader` except it is an asynchronous iterator and its methods
+    are coroutines.
+    """
+
+    def __init__(self, stream, queue, loop=None):
+        self.stream = stream
+        self.queue = queue
+        self.loop = loop or adbpy.get_event_loop()
+        self._decoder = LogEntryDecoder()
+        self._task = None
+
+    def __repr__(self):
+        return '<{}(stream={})>'.format(self.__class__.__name__, self.stream)
+
+    @classmethod
+    @asyncio.coroutine
+    def open(cls, manager, args='', maxsize=DEFAULT_MAX_RECORDS, policy=OverflowPolicy.drop_oldest,
+             sample_every=DEFAULT_SAMPLE_EVERY, timeout=None):
+        """
+        Start streaming log records through the given stream manager.
+
+        :param manager: A started :class:`~adbpy.protocol.stream.AsyncStreamManager` instance
+        :param args: Optional additional logcat arguments, e.g. "-b main,system"
+        :param maxsize: Maximum number of records buffered for consumers
+        :param policy: An :class:`~adbpy.protocol.logcat.OverflowPolicy` applied once the buffer is full
+        :param sample_every: Rate at which new records are kept by the `sample` policy
+        :param timeout: Optional timeout in seconds to wait for the stream to open
+        :return: A started :class:`~adbpy.protocol.logcat.AsyncLogcatReader` instance
+        """
+        stream = yield from manager.open(_destination(args), timeout)
+        reader = cls(stream, AsyncRecordQueue(maxsize, policy, sample_every, loop=manager.loop), manager.loop)
+        reader._task = reader.loop.create_task(reader._read_loop())
+        return reader
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        record = yield from self.get()
+        if record is None:
+            raise StopAsyncIteration
+        return record
+
+    @property
+    def dropped(self):
+        """
+        Return the number of records discarded by the overflow policy.
+        """
+        return self.queue.dropped
+
+    @asyncio.coroutine
+    def get(self):
+        """
+        Get the next log record.
+
+        :return: A :class:`~adbpy.protocol.logcat.LogRecord` instance or `None` once the stream is closed
+        """
+        return (yield from self.queue.get())
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Stop streaming log records.
+
+        :return: `None`
+        """
+        yield from self.stream.close()
+        yield from self.queue.close()
+        if self._task is not None:
+            yield from self._task
+
+    @asyncio.coroutine
+    def _read_loop(self):
+        """
+        Read payloads from the stream and queue their records until the stream is closed.
+
+        :return: `None`
+        """
+        try:
+            while not self.queue.is_closed:
+                data = yield from self.stream.read()
+                if not data:
+                    break
+                for record in self._decoder.feed(data):
+                    yield from self.queue.put(record)
+        except Exception as e:
+            LOGGER.debug('Logcat reader stopped: %s', e)
+        finally:
+            yield from self.queue.close()
@@ -0,0 +1,473 @@
+"""
+    adbpy.protocol.shell
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for running shell commands on a remote system and consuming their output as it arrives.
+
+    When both ends support the `shell_v2` feature, commands run with the shell v2 protocol, which frames stdin, stdout
+    and stderr in separate packets and reports the exit code of the command. Otherwise the output of the command is
+    the raw stream data and no exit code is available.
+"""
+
+import asyncio
+import collections
+import enum
+import struct
+
+from adbpy import protocol
+from adbpy.message import adb
+from adbpy.protocol import stream
+
+
+__all__ = ['Shell', 'AsyncShell', 'ShellOutput', 'ShellPacketId', 'LineBuffer', 'shell']
+
+
+#: Struct of the header of a shell v2 packet: id and data length.
+SHELL_V2_HEADER = struct.Struct('<BI')
+
+
+class ShellPacketId(enum.IntEnum):
+    """
+    Enumeration for the ids of shell v2 packets.
+    """
+
+    stdin = 0
+    stdout = 1
+    stderr = 2
+    exit = 3
+    close_stdin = 4
+    window_size_change = 5
+
+
+class ShellOutput(collections.namedtuple('ShellOutput', 'fd data')):
+    """
+    Chunk or line of output of a shell command along with the file descriptor, stdout or stderr, it was written to.
+    """
+
+    __slots__ = ()
+
+    @property
+    def is_stderr(self):
+        return self.fd == ShellPacketId.stderr
+
+
+class LineBuffer:
+    """
+    Splits a sequence of data chunks into lines.
+
+    Chunks are appended to a single :class:`~bytearray` and complete lines are copied out of it once; consumed bytes
+    are dropped from the front of the buffer once per chunk rather than once per line.
+    """
+
+    __slots__ = ['buffer', 'keepends', '_scanned']
+
+    def __init__(self, keepends=False):
+        self.buffer = bytearray()
+        self.keepends = keepends
+        self._scanned = 0
+
+    def feed(self, data):
+        """
+        Append the given chunk and return the lines it completed.
+
+        :param data: Bytes-like chunk of data
+        :return: A :class:`list` of lines as bytes
+        """
+        self.buffer += data
+        lines, start = [], 0
+        with memoryview(self.buffer) as view:
+            while True:
+                end = self.buffer.find(b'\n', self._scanned)
+                if end < 0:
+                    break
+                lines.append(self._line(view[start:end + 1]))
+                start = self._scanned = end + 1
+        del self.buffer[:start]
+        self._scanned = len(self.buffer)
+        return lines
+
+    def flush(self):
+        """
+        Return the trailing data not terminated by a newline, if any, and empty the buffer.
+
+        :return: A :class:`list` holding zero or one line
+        """
+        lines = [self._line(self.buffer)] if self.buffer else []
+        del self.buffer[:]
+        self._scanned = 0
+        return lines
+
+    def _line(self, data):
+        if not self.keepends:
+            if data[-2:] == b'\r\n':
+                data = data[:-2]
+            elif data[-1:] == b'\n':
+                data = data[:-1]
+        return bytes(data)
+
+
+class _PacketDecoder:
+    """
+    Reassembles shell v2 packets from stream payloads, which do not line up with packet boundaries.
+    """
+
+    __slots__ = ['buffer']
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Append the given payload and return the packets it completed.
+
+        :param data: Bytes-like stream payload
+        :return: A :class:`list` of tuples of packet id and data bytes
+        """
+        self.buffer += data
+        packets, start = [], 0
+        with memoryview(self.buffer) as view:
+            while len(view) - start >= SHELL_V2_HEADER.size:
+                packet_id, length = SHELL_V2_HEADER.unpack_from(view, start)
+                end = start + SHELL_V2_HEADER.size + length
+                if end > len(view):
+                    break
+                packets.append((packet_id, bytes(view[start + SHELL_V2_HEADER.size:end])))
+                start = end
+        del self.buffer[:start]
+        return packets
+
+
+class _BaseShell:
+    """
+    State and framing shared by synchronous and asynchronous shell commands.
+    """
+
+    def __init__(self, stream, v2, timeout=None):
+        self.stream = stream
+        self.v2 = v2
+        self.timeout = timeout
+        self.exit_code = None
+        self._decoder = _PacketDecoder() if v2 else None
+
+    def __repr__(self):
+        return '<{}(stream={}, v2={})>'.format(self.__class__.__name__, self.stream, self.v2)
+
+    def _decode(self, data):
+        """
+        Convert a stream payload into output chunks, recording the exit code when it arrives.
+
+        :param data: Bytes of the stream payload
+        :return: A :class:`list` of :class:`~adbpy.protocol.shell.ShellOutput` instances
+        """
+        if not self.v2:
+            return [ShellOutput(ShellPacketId.stdout, data)]
+
+        outputs = []
+        for packet_id, payload in self._decoder.feed(data):
+            if packet_id == ShellPacketId.exit:
+                self.exit_code = payload[0] if payload else 0
+            elif packet_id in (ShellPacketId.stdout, ShellPacketId.stderr):
+                outputs.append(ShellOutput(ShellPacketId(packet_id), payload))
+        return outputs
+
+    def _stdin(self, data):
+        """
+        Frame the given data written to stdin of the command.
+
+        :param data: Bytes-like data
+        :return: Bytes-like data to write to the stream
+        """
+        if not self.v2:
+            return data
+        return SHELL_V2_HEADER.pack(ShellPacketId.stdin, len(data)) + bytes(data)
+
+    def _close_stdin(self):
+        """
+        Create the packet that closes stdin of the command.
+
+        :return: Bytes to write to the stream
+        """
+        if not self.v2:
+            raise protocol.ProtocolError('Closing stdin requires the shell v2 protocol')
+        return SHELL_V2_HEADER.pack(ShellPacketId.close_stdin, 0)
+
+
+def _destination(command, v2):
+    """
+    Get the stream destination that runs the given command.
+
+    :param command: Shell command
+    :param v2: Use the shell v2 protocol
+    :return: Stream destination string
+    """
+    destination = adb.StreamIdentifierFormat.shell_v2_command if v2 else adb.StreamIdentifierFormat.shell_command
+    return destination.value.format(command=command)
+
+
+def _split_lines(outputs, buffers):
+    """
+    Split output chunks into lines using a line buffer per file descriptor.
+
+    :param outputs: Iterable of :class:`~adbpy.protocol.shell.ShellOutput` chunks
+    :param buffers: A :class:`dict` of file descriptor to :class:`~adbpy.protocol.shell.LineBuffer`
+    :return: A :class:`list` of :class:`~adbpy.protocol.shell.ShellOutput` lines
+    """
+    return [ShellOutput(output.fd, line) for output in outputs for line in buffers[output.fd].feed(output.data)]
+
+
+def _flush_lines(buffers):
+    """
+    Flush the trailing, unterminated line of every line buffer.
+
+    :param buffers: A :class:`dict` of file descriptor to :class:`~adbpy.protocol.shell.LineBuffer`
+    :return: A :class:`list` of :class:`~adbpy.protocol.shell.ShellOutput` lines
+    """
+    return [ShellOutput(fd, line) for fd, buffer in buffers.items() for line in buffer.flush()]
+
+
+def _line_buffers(keepends):
+    return collections.OrderedDict((fd, LineBuffer(keepends)) for fd in (ShellPacketId.stdout, ShellPacketId.stderr))
+
+
+class Shell(_BaseShell):
+    """
+    Synchronous (blocking) shell command running over a :class:`~adbpy.protocol.stream.Stream`.
+
+    Iterating the shell yields :class:`~adbpy.protocol.shell.ShellOutput` chunks as stream payloads arrive, e.g.
+
+    >>> with Shell.open(manager, 'logcat -d') as sh:
+    ...     for output in sh.lines():
+    ...         print(output.data)
+    """
+
+    @classmethod
+    def open(cls, manager, command, v2=None, timeout=None):
+        """
+        Run the given command through the given stream manager.
+
+        :param manager: A started :class:`~adbpy.protocol.stream.StreamManager` instance
+        :param command: Shell command
+        :param v2: Use the shell v2 protocol; default: if the `shell_v2` feature was negotiated
+        :param timeout: Optional timeout in seconds for stream operations
+        :return: A :class:`~adbpy.protocol.shell.Shell` instance
+        """
+        if v2 is None:
+            v2 = manager.supports(adb.Feature.shell_v2)
+        return cls(manager.open(_destination(command, v2), timeout), v2, timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            data = self.stream.read(self.timeout)
+            if not data:
+                return
+            yield from self._decode(data)
+
+    def lines(self, keepends=False):
+        """
+        Iterate the output of the command split into lines.
+
+        :param keepends: Keep line endings; default: `False`
+        :return: Generator of :class:`~adbpy.protocol.shell.ShellOutput` lines
+        """
+        buffers = _line_buffers(keepends)
+        for output in self:
+            yield from _split_lines((output,), buffers)
+        yield from _flush_lines(buffers)
+
+    def write(self, data):
+        """
+        Write the given data to stdin of the command.
+
+        :param data: Bytes-like data
+        :return: `None`
+        """
+        self.stream.write(self._stdin(data), self.timeout)
+
+    def close_stdin(self):
+        """
+        Close stdin of the command. Requires the shell v2 protocol.
+
+        :return: `None`
+        """
+        self.stream.write(self._close_stdin(), self.timeout)
+
+    def wait(self):
+        """
+        Discard the remaining output and wait for the command to complete.
+
+        :return: Exit code of the command or `None` without the shell v2 protocol
+        """
+        for _ in self:
+            pass
+        return self.exit_code
+
+    def close(self):
+        """
+        Close the stream, terminating the command if it is still running.
+
+        :return: `None`
+        """
+        self.stream.close()
+
+
+class AsyncShell(_BaseShell):
+    """
+    Asynchronous (non-blocking) shell command running over a :class:`~adbpy.protocol.stream.AsyncStream`.
+
+    Behaves like :class:`~adbpy.protocol.shell.Shell` except it is an asynchronous iterator and its methods are
+    coroutines. :meth:`read` returns the next chunk for callers that cannot use `async for`.
+    """
+
+    def __init__(self, stream, v2, timeout=None):
+        super().__init__(stream, v2, timeout)
+        self._pending = collections.deque()
+
+    @classmethod
+    @asyncio.coroutine
+    def open(cls, manager, command, v2=None, timeout=None):
+        """
+        Run the given command through the given stream manager.
+
+        :param manager: A started :class:`~adbpy.protocol.stream.AsyncStreamManager` instance
+        :param command: Shell command
+        :param v2: Use the shell v2 protocol; default: if the `shell_v2` feature was negotiated
+        :param timeout: Optional timeout in seconds for stream operations
+        :return: A :class:`~adbpy.protocol.shell.AsyncShell` instance
+        """
+        if v2 is None:
+            v2 = manager.supports(adb.Feature.shell_v2)
+        s = yield from manager.open(_destination(command, v2), timeout)
+        return cls(s, v2, timeout)
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        output = yield from self.read()
+        if output is None:
+            raise StopAsyncIteration
+        return output
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Read the next chunk of output of the command.
+
+        :return: A :class:`~adbpy.protocol.shell.ShellOutput` instance or `None` once the command completed
+        """
+        while not self._pending:
+            data = yield from self.stream.read(self.timeout)
+            if not data:
+                return None
+            self._pending.extend(self._decode(data))
+        return self._pending.popleft()
+
+    def lines(self, keepends=False):
+        """
+        Iterate the output of the command split into lines.
+
+        :param keepends: Keep line endings; default: `False`
+        :return: An asynchronous iterator of :class:`~adbpy.protocol.shell.ShellOutput` lines
+        """
+        return _AsyncLines(self, keepends)
+
+    @asyncio.coroutine
+    def write(self, data):
+        """
+        Write the given data to stdin of the command.
+
+        :param data: Bytes-like data
+        :return: `None`
+        """
+        yield from self.stream.write(self._stdin(data), self.timeout)
+
+    @asyncio.coroutine
+    def close_stdin(self):
+        """
+        Close stdin of the command. Requires the shell v2 protocol.
+
+        :return: `None`
+        """
+        yield from self.stream.write(self._close_stdin(), self.timeout)
+
+    @asyncio.coroutine
+    def wait(self):
+        """
+        Discard the remaining output and wait for the command to complete.
+
+        :return: Exit code of the command or `None` without the shell v2 protocol
+        """
+        while (yield from self.read()) is not None:
+            pass
+        return self.exit_code
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close the stream, terminating the command if it is still running.
+
+        :return: `None`
+        """
+        yield from self.stream.close()
+
+
+class _AsyncLines:
+    """
+    Asynchronous iterator over the output lines of an :class:`~adbpy.protocol.shell.AsyncShell`.
+    """
+
+    def __init__(self, shell, keepends):
+        self._shell = shell
+        self._buffers = _line_buffers(keepends)
+        self._pending = collections.deque()
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        line = yield from self.read()
+        if line is None:
+            raise StopAsyncIteration
+        return line
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Read the next line of output of the command.
+
+        :return: A :class:`~adbpy.protocol.shell.ShellOutput` instance or `None` once the command completed
+        """
+        while not self._pending and not self._done:
+            output = yield from self._shell.read()
+            if output is None:
+                self._pending.extend(_flush_lines(self._buffers))
+                self._done = True
+            else:
+                self._pending.extend(_split_lines((output,), self._buffers))
+        return self._pending.popleft() if self._pending else None
+
+
+def shell(manager, command, v2=None, timeout=None):
+    """
+    Run the given command through the given stream manager.
+
+    :param manager: A started :class:`~adbpy.protocol.stream.StreamManager` or
+        :class:`~adbpy.protocol.stream.AsyncStreamManager` instance
+    :param command: Shell command
+    :param v2: Use the shell v2 protocol; default: if the `shell_v2` feature was negotiated
+    :param timeout: Optional timeout in seconds for stream operations
+    :return: A :class:`~adbpy.protocol.shell.Shell` instance or, for an asynchronous manager, a coroutine that
+        returns a :class:`~adbpy.protocol.shell.AsyncShell` instance
+    """
+    if isinstance(manager, stream.AsyncStreamManager):
+        return AsyncShell.open(manager, command, v2, timeout)
+    return Shell.open(manager, command, v2, timeout)
@@ -0,0 +1,781 @@
+"""
+    adbpy.protocol.stream
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for multiplexing many ADB streams over a single connection.
+"""
+
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+
+import adbpy
+from adbpy import iterutil, protocol
+from adbpy.message import adb
+
+
+__all__ = ['Stream', 'StreamManager', 'AsyncStream', 'AsyncStreamManager', 'WriteWindow',
+           'StreamError', 'StreamOpenError', 'StreamClosedError', 'StreamTimeoutError']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StreamError(protocol.ProtocolError):
+    """
+    Base exception for all stream related errors.
+    """
+
+
+class StreamOpenError(StreamError):
+    """
+    Exception raised when the remote system refuses to open a stream.
+    """
+
+
+class StreamClosedError(StreamError):
+    """
+    Exception raised when writing to a stream that has been closed.
+    """
+
+
+class StreamTimeoutError(StreamError):
+    """
+    Exception raised when a stream operation exceeds its timeout.
+    """
+
+
+class WriteWindow:
+    """
+    Tracks the bytes written to a stream that the remote system has not acknowledged yet.
+
+    Without delayed acknowledgements, the remote system answers every write with an empty OKAY and only a single
+    write may be outstanding (stop-and-wait). With delayed acknowledgements, the remote system advertises a window of
+    bytes it will buffer and every OKAY carries the number of bytes it has consumed, so writes keep flowing while the
+    window is open.
+    """
+
+    __slots__ = ['size', 'unacked']
+
+    def __init__(self, size=None):
+        self.size = size
+        self.unacked = 0
+
+    def __repr__(self):
+        return '<{}(size={}, unacked={})>'.format(self.__class__.__name__, self.size, self.unacked)
+
+    @property
+    def is_open(self):
+        """
+        Return `True` if another write may be sent, `False` otherwise.
+        """
+        if self.size is None:
+            return self.unacked == 0
+        return self.unacked < self.size
+
+    @property
+    def is_drained(self):
+        """
+        Return `True` if the remote system has acknowledged every write, `False` otherwise.
+        """
+        return self.unacked <= 0
+
+    def consume(self, num_bytes):
+        """
+        Record a write of the given number of bytes sent to the remote system.
+
+        :param num_bytes: Length of the written data payload
+        :return: `None`
+        """
+        self.unacked += num_bytes
+
+    def release(self, acked_bytes=None):
+        """
+        Record an acknowledgement received from the remote system.
+
+        :param acked_bytes: Number of bytes acknowledged or `None` if the acknowledgement covers the outstanding write
+        :return: `None`
+        """
+        if acked_bytes is None or self.size is None:
+            self.unacked = 0
+        else:
+            self.unacked -= acked_bytes
+
+
+class _BaseStream:
+    """
+    State shared by synchronous and asynchronous streams.
+
+    A stream is identified by a `local_id` allocated by its manager and a `remote_id` assigned by the remote system
+    when it accepts the stream.
+    """
+
+    def __init__(self, manager, local_id, destination):
+        self.local_id = local_id
+        self.remote_id = None
+        self.destination = destination
+        self.is_closed = False
+        self.window = None
+        self._manager = manager
+        metrics = manager.metrics
+        self._timer = metrics.stream_timer(destination) if metrics is not None else None
+
+    def __repr__(self):
+        return '<{}(local_id={}, remote_id={}, destination={})>'.format(self.__class__.__name__, self.local_id,
+                                                                        self.remote_id, self.destination)
+
+    @property
+    def is_open(self):
+        """
+        Return `True` if the remote system accepted the stream and it has not been closed, `False` otherwise.
+        """
+        return self.remote_id is not None and not self.is_closed
+
+    @property
+    def max_data(self):
+        """
+        Return the maximum data payload size of a single write message of the stream.
+        """
+        return self._manager.max_data
+
+    def _on_message(self, msg):
+        """
+        Handle a message routed to this stream by its manager.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` addressed to this stream
+        :return: `None`
+        """
+        if msg.is_ready:
+            if self.remote_id is None:
+                self.remote_id = msg.arg0
+                self.window = WriteWindow(adb.acked_bytes(msg) if self._manager.delayed_ack else None)
+                if self._timer is not None:
+                    self._timer.opened()
+                self._on_open()
+            else:
+                self._on_ack(adb.acked_bytes(msg))
+        elif msg.is_write:
+            self._on_data(msg.data)
+        elif msg.is_close:
+            self.is_closed = True
+            self._on_close()
+
+    def _on_open(self):
+        raise NotImplementedError
+
+    def _on_ack(self, acked_bytes):
+        raise NotImplementedError
+
+    def _on_data(self, data):
+        raise NotImplementedError
+
+    def _on_close(self):
+        raise NotImplementedError
+
+    def _write_message(self, data):
+        """
+        Create a write message for the given data payload.
+
+        :param data: Data payload to write
+        :return: A :class:`~adbpy.message.adb.Message` instance
+        """
+        if not self.is_open:
+            raise StreamClosedError('{} is not open'.format(self))
+        return adb.write(self.local_id, self.remote_id, data, self._manager.skip_checksum)
+
+    def _release(self, acked_bytes):
+        """
+        Account for an acknowledgement of the given number of bytes received from the remote system.
+
+        :param acked_bytes: Number of bytes acknowledged or `None` for stop-and-wait acknowledgements
+        :return: `None`
+        """
+        self.window.release(acked_bytes)
+        if self._timer is not None:
+            self._timer.on_ack(acked_bytes)
+
+    def _consume(self, num_bytes):
+        """
+        Account for a write of the given number of bytes about to be sent.
+
+        :param num_bytes: Number of bytes written
+        :return: `None`
+        """
+        self.window.consume(num_bytes)
+        if self._timer is not None:
+            self._timer.sent(num_bytes)
+
+    def _timeout_error(self, operation, timeout):
+        """
+        Create the error raised when the given operation on the stream exceeds its timeout.
+
+        :param operation: Name of the operation, e.g. "read"
+        :param timeout: Timeout in seconds that was exceeded
+        :return: A :class:`~adbpy.protocol.stream.StreamTimeoutError` instance
+        """
+        if self._manager.metrics is not None:
+            self._manager.metrics.timeout('stream.' + operation)
+        return StreamTimeoutError('{} {} exceeded timeout of {} seconds'.format(self, operation, timeout))
+
+    def _ack_message(self, data):
+        """
+        Create a ready message acknowledging the given data payload was consumed.
+
+        :param data: Data payload read from the stream
+        :return: A :class:`~adbpy.message.adb.Message` instance
+        """
+        acked_bytes = len(data) if self._manager.delayed_ack else None
+        return adb.okay(self.local_id, self.remote_id, acked_bytes)
+
+    def _can_write(self):
+        return self.is_closed or self.window.is_open
+
+    def _is_drained(self):
+        return self.is_closed or self.window.is_drained
+
+
+class Stream(_BaseStream):
+    """
+    Synchronous (blocking) ADB stream created by :meth:`~adbpy.protocol.stream.StreamManager.open`.
+
+    Every data payload read from the stream is acknowledged to the remote system, which won't send more until it is.
+    This keeps a slow consumer from stalling other streams sharing the connection.
+
+    Writes are sent as soon as the :class:`~adbpy.protocol.stream.WriteWindow` of the stream allows and do not wait
+    for their own acknowledgement; use :meth:`drain` to wait for the remote system to consume everything written.
+    """
+
+    def __init__(self, manager, local_id, destination):
+        super().__init__(manager, local_id, destination)
+        self._opened = threading.Event()
+        self._acked = threading.Condition()
+        self._inbox = queue.Queue()
+
+    def __iter__(self):
+        return iter(self.read, b'')
+
+    def read(self, timeout=None):
+        """
+        Read the next data payload written by the remote system.
+
+        :param timeout: Optional timeout in seconds to wait for data
+        :return: Bytes of the next payload or `b''` once the stream is closed
+        """
+        try:
+            data = self._inbox.get(timeout=timeout)
+        except queue.Empty:
+            raise self._timeout_error('read', timeout)
+
+        if data is None:
+            self._inbox.put(None)
+            return b''
+
+        if not self.is_closed:
+            self._manager.send(self._ack_message(data))
+        return data
+
+    def write(self, data, timeout=None):
+        """
+        Write data to the stream, split into payloads of the negotiated maximum size, as its write window allows.
+
+        :param data: Bytes-like data to write
+        :param timeout: Optional timeout in seconds to wait for the write window to open for each payload
+        :return: `None`
+        """
+        for chunk in iterutil.chunks(data, self._manager.max_data):
+            with self._acked:
+                if not self._acked.wait_for(self._can_write, timeout):
+                    raise self._timeout_error('write', timeout)
+                msg = self._write_message(chunk)
+                self._consume(len(chunk))
+            self._manager.send(msg)
+
+    def drain(self, timeout=None):
+        """
+        Wait for the remote system to acknowledge every write.
+
+        :param timeout: Optional timeout in seconds to wait for the acknowledgements
+        :return: `None`
+        """
+        with self._acked:
+            if not self._acked.wait_for(self._is_drained, timeout):
+                raise self._timeout_error('drain', timeout)
+        if not self.window.is_drained:
+            raise StreamClosedError('{} closed before writes were acknowledged'.format(self))
+
+    def close(self):
+        """
+        Close the stream.
+
+        :return: `None`
+        """
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self._manager.close_stream(self)
+        self._on_close()
+
+    def _on_open(self):
+        self._opened.set()
+
+    def _on_ack(self, acked_bytes):
+        # Writers consume the window under the same lock, so neither side loses updates to it or the timer.
+        with self._acked:
+            self._release(acked_bytes)
+            self._acked.notify_all()
+
+    def _on_data(self, data):
+        self._inbox.put(data)
+
+    def _on_close(self):
+        self._opened.set()
+        with self._acked:
+            self._acked.notify_all()
+        self._inbox.put(None)
+
+
+class AsyncStream(_BaseStream):
+    """
+    Asynchronous (non-blocking) ADB stream created by :meth:`~adbpy.protocol.stream.AsyncStreamManager.open`.
+
+    Behaves like :class:`~adbpy.protocol.stream.Stream` except :meth:`read`, :meth:`write` and :meth:`close`
+    are coroutines.
+    """
+
+    def __init__(self, manager, local_id, destination):
+        super().__init__(manager, local_id, destination)
+        self._loop = manager.loop
+        self._opened = asyncio.Event(loop=self._loop)
+        self._acked = asyncio.Event(loop=self._loop)
+        self._inbox = asyncio.Queue(loop=self._loop)
+
+    @asyncio.coroutine
+    def read(self, timeout=None):
+        """
+        Read the next data payload written by the remote system.
+
+        :param timeout: Optional timeout in seconds to wait for data
+        :return: Bytes of the next payload or `b''` once the stream is closed
+        """
+        try:
+            data = yield from asyncio.wait_for(self._inbox.get(), timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            raise self._timeout_error('read', timeout)
+
+        if data is None:
+            self._inbox.put_nowait(None)
+            return b''
+
+        if not self.is_closed:
+            yield from self._manager.send(self._ack_message(data))
+        return data
+
+    @asyncio.coroutine
+    def write(self, data, timeout=None):
+        """
+        Write data to the stream, split into payloads of the negotiated maximum size, as its write window allows.
+
+        :param data: Bytes-like data to write
+        :param timeout: Optional timeout in seconds to wait for the write window to open for each payload
+        :return: `None`
+        """
+        for chunk in iterutil.chunks(data, self._manager.max_data):
+            yield from self._wait_for(self._can_write, 'write', timeout)
+            msg = self._write_message(chunk)
+            self._consume(len(chunk))
+            yield from self._manager.send(msg)
+
+    @asyncio.coroutine
+    def drain(self, timeout=None):
+        """
+        Wait for the remote system to acknowledge every write.
+
+        :param timeout: Optional timeout in seconds to wait for the acknowledgements
+        :return: `None`
+        """
+        yield from self._wait_for(self._is_drained, 'drain', timeout)
+        if not self.window.is_drained:
+            raise StreamClosedError('{} closed before writes were acknowledged'.format(self))
+
+    @asyncio.coroutine
+    def _wait_for(self, predicate, operation, timeout):
+        """
+        Wait for the given predicate to become true as acknowledgements arrive.
+
+        :param predicate: Function that returns `True` once waiting is done
+        :param operation: Name of the operation waiting, used in the timeout error
+        :param timeout: Optional timeout in seconds to wait
+        :return: `None`
+        """
+        try:
+            yield from asyncio.wait_for(self._wait_for_ack(predicate), timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            raise self._timeout_error(operation, timeout)
+
+    @asyncio.coroutine
+    def _wait_for_ack(self, predicate):
+        while not predicate():
+            self._acked.clear()
+            yield from self._acked.wait()
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close the stream.
+
+        :return: `None`
+        """
+        if self.is_closed:
+            return
+        self.is_closed = True
+        yield from self._manager.close_stream(self)
+        self._on_close()
+
+    def _on_open(self):
+        self._opened.set()
+
+    def _on_ack(self, acked_bytes):
+        self._release(acked_bytes)
+        self._acked.set()
+
+    def _on_data(self, data):
+        self._inbox.put_nowait(data)
+
+    def _on_close(self):
+        self._opened.set()
+        self._acked.set()
+        self._inbox.put_nowait(None)
+
+
+class _BaseStreamManager(protocol.FlowProtocol):
+    """
+    Stream bookkeeping shared by synchronous and asynchronous stream managers.
+
+    Streams are indexed by their `local_id`; the remote system addresses every OKAY, WRTE and CLSE message to
+    a stream by putting its `local_id` in `arg1`.
+
+    When `delayed_ack` is enabled, which both ends of the connection must support, streams are opened with a receive
+    window of `window` bytes and acknowledgements carry the number of bytes consumed. By default it is enabled if
+    the feature was negotiated by the handshake of the wire protocol.
+    """
+
+    #: Type of stream created by :meth:`open`.
+    stream_class = None
+
+    def __init__(self, wire_protocol, delayed_ack=None, window=adb.DELAYED_ACK_WINDOW):
+        super().__init__(wire_protocol)
+        if delayed_ack is None:
+            delayed_ack = self.supports(adb.Feature.delayed_ack)
+        self.delayed_ack = delayed_ack
+        self.window = window
+        self.error = None
+        self._streams = {}
+        self._local_ids = itertools.count(1)
+
+    @property
+    def skip_checksum(self):
+        """
+        Return `True` if data payload checksums are skipped by the wire protocol, `False` otherwise.
+        """
+        return self._wire_protocol.skip_checksum
+
+    @property
+    def max_data(self):
+        """
+        Return the maximum data payload size negotiated by the wire protocol.
+        """
+        return self._wire_protocol.max_data
+
+    @property
+    def metrics(self):
+        """
+        Return the :class:`~adbpy.instrumentation.ConnectionMetrics` of the wire protocol or `None` if it has none.
+        """
+        return getattr(self._wire_protocol, 'metrics', None)
+
+    @property
+    def streams(self):
+        """
+        Return a list of all streams that have not been closed.
+        """
+        return list(self._streams.values())
+
+    def supports(self, feature):
+        """
+        Check to see if the given feature was negotiated by the handshake of the wire protocol.
+
+        :param feature: Feature name or :class:`~adbpy.message.adb.Feature` value
+        :return: A :class:`bool` indicating if the feature is supported
+        """
+        session = self._wire_protocol.session
+        return session is not None and session.supports(feature)
+
+    def _register(self, destination):
+        """
+        Create a stream with a new local id and index it.
+
+        :param destination: Stream destination, See: `~adbpy.message.adb.StreamIdentifierFormat`
+        :return: A new stream instance
+        """
+        if self.error is not None:
+            raise StreamError('Stream manager stopped: {}'.format(self.error))
+
+        local_id = next(self._local_ids)
+        while local_id in self._streams:
+            local_id = next(self._local_ids)
+
+        stream = self._streams[local_id] = self.stream_class(self, local_id, destination)
+        return stream
+
+    def _open_message(self, stream):
+        """
+        Create the open message for the given stream.
+
+        :param stream: Stream to open
+        :return: A :class:`~adbpy.message.adb.Message` instance
+        """
+        window = self.window if self.delayed_ack else 0
+        return adb.open(stream.local_id, stream.destination, window)
+
+    def _open_timeout_error(self, destination, timeout):
+        """
+        Create the error raised when opening a stream to the given destination exceeds its timeout.
+
+        :param destination: Stream destination
+        :param timeout: Timeout in seconds that was exceeded
+        :return: A :class:`~adbpy.protocol.stream.StreamTimeoutError` instance
+        """
+        if self.metrics is not None:
+            self.metrics.timeout('stream.open')
+        return StreamTimeoutError('Open of {} exceeded timeout of {} seconds'.format(destination, timeout))
+
+    def _unregister(self, stream):
+        """
+        Remove the given stream from the index.
+
+        :param stream: Stream to remove
+        :return: `None`
+        """
+        self._streams.pop(stream.local_id, None)
+
+    def _dispatch(self, msg):
+        """
+        Route a message read from the wire protocol to the stream it is addressed to.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance
+        :return: `None`
+        """
+        stream = self._streams.get(msg.arg1)
+        if stream is None:
+            LOGGER.debug('Dropping message for unknown stream %s', msg)
+            return
+
+        stream._on_message(msg)
+        if stream.is_closed:
+            self._unregister(stream)
+
+    def _close_all(self, error):
+        """
+        Close every stream after the wire protocol failed.
+
+        :param error: Exception raised by the wire protocol
+        :return: `None`
+        """
+        self.error = error
+        for stream in self.streams:
+            stream.is_closed = True
+            stream._on_close()
+            self._unregister(stream)
+
+
+class StreamManager(_BaseStreamManager):
+    """
+    Multiplexes synchronous (blocking) streams over a single :class:`~adbpy.protocol.adb.WireProtocol`.
+
+    A background reader thread reads every incoming message and routes it to the stream it is addressed to. The
+    reader stops, closing every stream, once the wire protocol fails, e.g. when its connection is disconnected.
+    """
+
+    stream_class = Stream
+
+    def __init__(self, wire_protocol, delayed_ack=None, window=adb.DELAYED_ACK_WINDOW):
+        super().__init__(wire_protocol, delayed_ack, window)
+        self._lock = threading.Lock()
+        self._reader = None
+
+    def start(self):
+        """
+        Start the reader thread.
+
+        :return: `None`
+        """
+        self._reader = threading.Thread(target=self._read_loop, name=repr(self), daemon=True)
+        self._reader.start()
+
+    def open(self, destination, timeout=None):
+        """
+        Open a new stream to the given destination.
+
+        :param destination: Stream destination, See: `~adbpy.message.adb.StreamIdentifierFormat`
+        :param timeout: Optional timeout in seconds to wait for the remote system to accept the stream
+        :return: A :class:`~adbpy.protocol.stream.Stream` instance
+        """
+        with self._lock:
+            stream = self._register(destination)
+
+        self.send(self._open_message(stream))
+
+        if not stream._opened.wait(timeout):
+            self._discard(stream)
+            raise self._open_timeout_error(destination, timeout)
+        # A stream accepted and closed right away, e.g. a command that exits immediately, still has output to read.
+        if stream.remote_id is None:
+            self._discard(stream)
+            raise StreamOpenError('Remote system refused to open {}'.format(destination))
+
+        return stream
+
+    def close_stream(self, stream):
+        """
+        Inform the remote system that the given stream is closed and stop routing messages to it.
+
+        :param stream: Stream to close
+        :return: `None`
+        """
+        self._discard(stream)
+        if stream.remote_id is not None and self.error is None:
+            self.send(adb.close(stream.local_id, stream.remote_id))
+
+    def send(self, msg):
+        """
+        Send a message through the wire protocol.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance to send
+        :return: `None`
+        """
+        self._wire_protocol.send(msg)
+
+    def _discard(self, stream):
+        with self._lock:
+            self._unregister(stream)
+
+    def _read_loop(self):
+        """
+        Read messages from the wire protocol and route them to streams until it fails.
+
+        :return: `None`
+        """
+        try:
+            while True:
+                msg = self._wire_protocol.recv()
+                with self._lock:
+                    self._dispatch(msg)
+        except Exception as e:
+            LOGGER.debug('Stream manager reader stopped: %s', e)
+            with self._lock:
+                self._close_all(e)
+
+
+class AsyncStreamManager(_BaseStreamManager):
+    """
+    Multiplexes asynchronous (non-blocking) streams over a single :class:`~adbpy.protocol.adb.AsyncWireProtocol`.
+
+    A background reader task reads every incoming message and routes it to the stream it is addressed to.
+    """
+
+    stream_class = AsyncStream
+
+    def __init__(self, wire_protocol, delayed_ack=None, window=adb.DELAYED_ACK_WINDOW, loop=None):
+        super().__init__(wire_protocol, delayed_ack, window)
+        self.loop = loop or adbpy.get_event_loop()
+        self._reader = None
+        self._send_lock = asyncio.Lock(loop=self.loop)
+
+    def start(self):
+        """
+        Start the reader task.
+
+        :return: `None`
+        """
+        self._reader = self.loop.create_task(self._read_loop())
+
+    @asyncio.coroutine
+    def stop(self):
+        """
+        Cancel the reader task and close every stream.
+
+        :return: `None`
+        """
+        if self._reader is not None:
+            self._reader.cancel()
+            yield from asyncio.wait([self._reader], loop=self.loop)
+            self._reader = None
+
+    @asyncio.coroutine
+    def open(self, destination, timeout=None):
+        """
+        Open a new stream to the given destination.
+
+        :param destination: Stream destination, See: `~adbpy.message.adb.StreamIdentifierFormat`
+        :param timeout: Optional timeout in seconds to wait for the remote system to accept the stream
+        :return: A :class:`~adbpy.protocol.stream.AsyncStream` instance
+        """
+        stream = self._register(destination)
+        yield from self.send(self._open_message(stream))
+
+        try:
+            yield from asyncio.wait_for(stream._opened.wait(), timeout, loop=self.loop)
+        except asyncio.TimeoutError:
+            self._unregister(stream)
+            raise self._open_timeout_error(destination, timeout)
+        if stream.remote_id is None:
+            self._unregister(stream)
+            raise StreamOpenError('Remote system refused to open {}'.format(destination))
+
+        return stream
+
+    @asyncio.coroutine
+    def close_stream(self, stream):
+        """
+        Inform the remote system that the given stream is closed and stop routing messages to it.
+
+        :param stream: Stream to close
+        :return: `None`
+        """
+        self._unregister(stream)
+        if stream.remote_id is not None and self.error is None:
+            yield from self.send(adb.close(stream.local_id, stream.remote_id))
+
+    @asyncio.coroutine
+    def send(self, msg):
+        """
+        Send a message through the wire protocol.
+
+        Streams send concurrently, so writes to the connection are serialized; messages queued while another write
+        is in progress go out together in the next one.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance to send
+        :return: `None`
+        """
+        self._wire_protocol.queue(msg)
+        with (yield from self._send_lock):
+            yield from self._wire_protocol.flush()
+
+    @asyncio.coroutine
+    def _read_loop(self):
+        """
+        Read messages from the wire protocol and route them to streams until it fails or is cancelled.
+
+        :return: `None`
+        """
+        try:
+            while True:
+                msg = yield from self._wire_protocol.recv()
+                self._dispatch(msg)
+        except asyncio.CancelledError:
+            self._close_all(StreamError('Stream manager stopped'))
+        except Exception as e:
+            LOGGER.debug('Stream manager reader stopped: %s', e)
+            self._close_all(e)
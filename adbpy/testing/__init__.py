@@ -0,0 +1,6 @@
+"""
+    adbpy.testing
+    ~~~~~~~~~~~~~
+
+    Contains functionality for exercising the library without a real device, e.g. in tests, benchmarks and load tests.
+"""
@@ -0,0 +1,608 @@
+"""
+    adbpy.testing.adbd
+    ~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for a fake `adbd` that speaks the device side of the ADB protocol using `asyncio`.
+
+    The fake performs the connection handshake, optionally asking the host to authenticate, and serves every stream
+    the host opens with a service chosen by the prefix of its destination, See: :mod:`~adbpy.testing.services`.
+    Services are coroutine functions, so thousands of streams are served on a single event loop.
+
+    The link to the host can be shaped with a :class:`~adbpy.testing.adbd.LinkProfile` that delays, throttles and
+    segments everything the fake writes, to reproduce slow or lossy connections deterministically.
+
+    >>> with adbd.background() as device:
+    ...     wire = WireProtocol(Connection.connect(tcp.Transport(*device.address)))
+    ...     wire.handshake()
+"""
+
+import asyncio
+import collections
+import contextlib
+import enum
+import itertools
+import logging
+import os
+import socket
+import threading
+
+from adbpy import iterutil
+from adbpy.message import adb
+from adbpy.testing import services
+
+
+__all__ = ['FakeAdbd', 'AuthMode', 'LinkProfile', 'DeviceStream', 'DEFAULT_SERVICES', 'background']
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: Features advertised by default.
+DEFAULT_FEATURES = (adb.Feature.shell_v2.value, adb.Feature.delayed_ack.value)
+
+#: Services by destination prefix served by default; the longest matching prefix wins.
+DEFAULT_SERVICES = collections.OrderedDict([
+    ('shell,v2,raw:', services.shell_v2),
+    ('shell:', services.shell),
+    ('exec:', services.shell),
+    ('sync:', services.sync),
+    ('tcp:', services.echo),
+    ('echo:', services.echo),
+    ('sink:', services.sink),
+    ('source:', services.source)
+])
+
+#: Number of bytes read from the host connection at a time.
+READ_SIZE = 64 * 1024
+
+#: Number of written bytes buffered by a link before writers wait for it to drain.
+LINK_HIGH_WATER = 4 * 1024 * 1024
+
+#: Number of bytes a service writes ahead of the acknowledgements of the host, like the socket buffer between adbd
+#: and the process serving a stream.
+SOCKET_BUFFER_SIZE = 256 * 1024
+
+
+class AuthMode(enum.Enum):
+    """
+    Enumeration for how the fake authenticates the host.
+    """
+
+    #: Accept the connection without authentication.
+    none = 'none'
+
+    #: Accept the first signature, as if it was made by a known key.
+    signature = 'signature'
+
+    #: Reject every signature and accept a public key, as if the user allowed it on the device.
+    public_key = 'public_key'
+
+    #: Reject every signature and public key.
+    reject = 'reject'
+
+
+class LinkProfile(collections.namedtuple('LinkProfile', 'latency bandwidth segment_size')):
+    """
+    Shape of the link from the fake to the host: a `latency` in seconds added to every write, a `bandwidth` in bytes
+    per second and a `segment_size` in bytes each write is split into. `None` disables a constraint.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, latency=None, bandwidth=None, segment_size=None):
+        return super().__new__(cls, latency, bandwidth, segment_size)
+
+
+class _Link:
+    """
+    Writes bytes to the host in order through a background task that applies a :class:`LinkProfile`.
+    """
+
+    def __init__(self, writer, profile, loop):
+        self.writer = writer
+        self.profile = profile
+        self.loop = loop
+        self.pending = 0
+        self._queue = collections.deque()
+        self._ready = asyncio.Event(loop=loop)
+        self._drained = asyncio.Event(loop=loop)
+        self._drained.set()
+        self._next_send = 0.0
+        self._task = loop.create_task(self._pump())
+
+    @asyncio.coroutine
+    def send(self, data):
+        """
+        Queue the given bytes to be written, waiting if too many bytes are already queued.
+
+        :param data: Bytes to write
+        :return: `None`
+        """
+        self._queue.append((self.loop.time() + (self.profile.latency or 0), data))
+        self.pending += len(data)
+        self._ready.set()
+        if self.pending > LINK_HIGH_WATER:
+            self._drained.clear()
+            yield from self._drained.wait()
+
+    def close(self):
+        """
+        Stop writing and close the connection to the host.
+
+        :return: `None`
+        """
+        self._task.cancel()
+        self.writer.close()
+
+    @asyncio.coroutine
+    def _pump(self):
+        with contextlib.suppress(ConnectionError):
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    yield from self._ready.wait()
+                due, data = self._queue.popleft()
+                delay = due - self.loop.time()
+                if delay > 0:
+                    yield from asyncio.sleep(delay, loop=self.loop)
+                for segment in iterutil.chunks(data, self.profile.segment_size or len(data)):
+                    yield from self._write(segment)
+                self.pending -= len(data)
+                if self.pending <= LINK_HIGH_WATER:
+                    self._drained.set()
+
+    @asyncio.coroutine
+    def _write(self, segment):
+        if self.profile.bandwidth:
+            delay = self._next_send - self.loop.time()
+            if delay > 0:
+                yield from asyncio.sleep(delay, loop=self.loop)
+            self._next_send = max(self._next_send, self.loop.time()) + len(segment) / self.profile.bandwidth
+        self.writer.write(segment)
+        yield from self.writer.drain()
+        if self.profile.segment_size:
+            # Give the host a chance to read each segment on its own.
+            yield from asyncio.sleep(0, loop=self.loop)
+
+
+class DeviceStream:
+    """
+    Device end of a stream opened by the host, handed to the service that serves it.
+
+    Data written by the host is acknowledged when the service reads it. Data written by the service is buffered up
+    to :data:`SOCKET_BUFFER_SIZE` bytes and sent as the acknowledgements of the host allow, with or without delayed
+    acknowledgements, just like a real device.
+    """
+
+    def __init__(self, session, local_id, remote_id, destination, window):
+        self.session = session
+        self.local_id = local_id
+        self.remote_id = remote_id
+        self.destination = destination
+        self.is_closed = False
+        self._window = window
+        self._unacked = 0
+        self._inbox = asyncio.Queue(loop=session.loop)
+        self._acked = asyncio.Event(loop=session.loop)
+        self._outbox = collections.deque()
+        self._buffered = 0
+        self._sent = asyncio.Event(loop=session.loop)
+        self._sender = None
+
+    def __repr__(self):
+        return '<{}(local_id={}, remote_id={}, destination={})>'.format(self.__class__.__name__, self.local_id,
+                                                                        self.remote_id, self.destination)
+
+    @property
+    def adbd(self):
+        """
+        Return the :class:`~adbpy.testing.adbd.FakeAdbd` serving the stream.
+        """
+        return self.session.adbd
+
+    @property
+    def max_data(self):
+        """
+        Return the maximum data payload size of a single write message.
+        """
+        return self.session.max_data
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Read the next data payload written by the host.
+
+        :return: Bytes of the next payload or `b''` once the stream is closed
+        """
+        data = yield from self._inbox.get()
+        if data is None:
+            self._inbox.put_nowait(None)
+            return b''
+        if not self.is_closed:
+            acked_bytes = len(data) if self._window is not None else None
+            yield from self.session.send(adb.okay(self.local_id, self.remote_id, acked_bytes))
+        return data
+
+    @asyncio.coroutine
+    def write(self, data):
+        """
+        Write data to the host, split into payloads of the negotiated maximum size, waiting while the buffer is full.
+
+        :param data: Bytes-like data to write
+        :return: `True` if everything was buffered, `False` if the host closed the stream
+        """
+        for chunk in iterutil.chunks(data, self.max_data):
+            while not self.is_closed and self._buffered >= SOCKET_BUFFER_SIZE:
+                self._sent.clear()
+                yield from self._sent.wait()
+            if self.is_closed:
+                return False
+            self._outbox.append(bytes(chunk))
+            self._buffered += len(chunk)
+            if self._sender is None:
+                self._sender = self.session.loop.create_task(self._send())
+        return True
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close the stream once everything buffered was sent.
+
+        :return: `None`
+        """
+        if self._sender is not None:
+            yield from self._sender
+        if self.is_closed:
+            return
+        self._on_close()
+        yield from self.session.send(adb.close(self.local_id, self.remote_id))
+
+    @asyncio.coroutine
+    def _send(self):
+        """
+        Send the buffered payloads to the host as its acknowledgements allow.
+        """
+        try:
+            while self._outbox:
+                while not self.is_closed and not self._can_write():
+                    self._acked.clear()
+                    yield from self._acked.wait()
+                if self.is_closed:
+                    return
+                chunk = self._outbox.popleft()
+                self._buffered -= len(chunk)
+                self._unacked += len(chunk)
+                self._sent.set()
+                yield from self.session.send(adb.write(self.local_id, self.remote_id, chunk,
+                                                       self.session.skip_checksum))
+        finally:
+            self._sender = None
+
+    def _can_write(self):
+        if self._window is None:
+            return self._unacked == 0
+        return self._unacked < self._window
+
+    def _on_ack(self, acked_bytes):
+        self._unacked = 0 if acked_bytes is None or self._window is None else self._unacked - acked_bytes
+        self._acked.set()
+
+    def _on_data(self, data):
+        self._inbox.put_nowait(data)
+
+    def _on_close(self):
+        self.is_closed = True
+        self.session.streams.pop(self.local_id, None)
+        self._inbox.put_nowait(None)
+        self._acked.set()
+        self._sent.set()
+
+
+class _Session:
+    """
+    Device end of a single host connection.
+    """
+
+    def __init__(self, adbd, reader, writer):
+        self.adbd = adbd
+        self.loop = adbd.loop
+        self.reader = reader
+        self.link = _Link(writer, adbd.link, adbd.loop)
+        self.streams = {}
+        self.version = adbd.version
+        self.max_data = adb.CONNECT_AUTH_MAXDATA
+        self.skip_checksum = False
+        self.features = frozenset()
+        self.is_connected = False
+        self._ids = itertools.count(1)
+        self._tasks = set()
+        self.ended = asyncio.Event(loop=adbd.loop)
+
+    @asyncio.coroutine
+    def run(self):
+        """
+        Serve the host until it disconnects.
+
+        :return: `None`
+        """
+        decoder = adb.FrameDecoder(skip_checksum=True)
+        try:
+            while True:
+                data = yield from self.reader.read(READ_SIZE)
+                if not data:
+                    break
+                for msg in decoder.feed(data):
+                    yield from self._handle(msg)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            for stream in list(self.streams.values()):
+                stream._on_close()
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                yield from asyncio.wait(tasks, loop=self.loop)
+            self.link.close()
+            self.ended.set()
+
+    @asyncio.coroutine
+    def send(self, msg):
+        """
+        Send a message to the host.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance
+        :return: `None`
+        """
+        yield from self.link.send(adb.to_bytes_many((msg,)))
+
+    @asyncio.coroutine
+    def _handle(self, msg):
+        """
+        Handle a message from the host. Data payloads are only valid until the next message is decoded.
+
+        :param msg: A :class:`~adbpy.message.adb.Message` instance
+        :return: `None`
+        """
+        if msg.is_connect:
+            yield from self._on_connect(msg)
+        elif msg.is_auth:
+            yield from self._on_auth(msg)
+        elif not self.is_connected:
+            LOGGER.debug('Dropping %s before connection handshake', msg)
+        elif msg.is_open:
+            yield from self._on_open(msg)
+        else:
+            stream = self.streams.get(msg.arg1)
+            if stream is None or stream.remote_id != msg.arg0:
+                return
+            if msg.is_ready:
+                stream._on_ack(adb.acked_bytes(msg))
+            elif msg.is_write:
+                stream._on_data(bytes(msg.data))
+            elif msg.is_close:
+                stream._on_close()
+
+    @asyncio.coroutine
+    def _on_connect(self, msg):
+        self.version = min(self.adbd.version, msg.arg0)
+        self.max_data = min(self.adbd.max_data, msg.arg1)
+        self.skip_checksum = adb.version_skips_checksum(self.version)
+        _, _, properties = adb.parse_system_identity(msg.data)
+        self.features = frozenset(properties.get('features', '').split(',')) & frozenset(self.adbd.features)
+        if self.adbd.auth is AuthMode.none:
+            yield from self._accept()
+        else:
+            yield from self._send_token()
+
+    @asyncio.coroutine
+    def _on_auth(self, msg):
+        mode = self.adbd.auth
+        if msg.arg0 == adb.AuthType.signature and mode is AuthMode.signature:
+            yield from self._accept()
+        elif msg.arg0 == adb.AuthType.rsa_public_key and mode in (AuthMode.signature, AuthMode.public_key):
+            self.adbd.public_keys.append(bytes(msg.data).rstrip(b'\0'))
+            yield from self._accept()
+        else:
+            yield from self._send_token()
+
+    @asyncio.coroutine
+    def _send_token(self):
+        yield from self.send(adb.auth(adb.AuthType.token, os.urandom(20)))
+
+    @asyncio.coroutine
+    def _accept(self):
+        self.is_connected = True
+        yield from self.send(adb.connect(self.adbd.serial, self.adbd.banner, adb.SystemType.device.value,
+                                         self.version, self.adbd.max_data, self.adbd.features))
+
+    @asyncio.coroutine
+    def _on_open(self, msg):
+        destination = bytes(msg.data).rstrip(b'\0').decode('utf-8', 'replace')
+        self.adbd.destinations.append(destination)
+        service, argument = self.adbd.service_for(destination)
+        if service is None:
+            yield from self.send(adb.close(0, msg.arg0))
+            return
+
+        delayed_ack = adb.Feature.delayed_ack.value in self.features and msg.arg1
+        stream = DeviceStream(self, next(self._ids), msg.arg0, destination, msg.arg1 if delayed_ack else None)
+        self.streams[stream.local_id] = stream
+        acked_bytes = self.adbd.window if delayed_ack else None
+        yield from self.send(adb.ready(stream.local_id, stream.remote_id, acked_bytes))
+
+        task = self.loop.create_task(self._serve(service, stream, argument))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @asyncio.coroutine
+    def _serve(self, service, stream, argument):
+        try:
+            yield from service(stream, argument)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            LOGGER.exception('Service for %s failed', stream.destination)
+        finally:
+            if not stream.is_closed:
+                yield from stream.close()
+
+
+class FakeAdbd:
+    """
+    Fake `adbd` that serves any number of host connections over TCP or socket pairs on an `asyncio` event loop.
+
+    :param services: Optional :class:`dict` of destination prefix to service, merged over :data:`DEFAULT_SERVICES`;
+        streams to a prefix whose service is `None` are refused
+    :param serial: Serial number reported to the host
+    :param features: Iterable of features advertised to the host
+    :param auth: An :class:`~adbpy.testing.adbd.AuthMode` for authenticating the host
+    :param link: A :class:`~adbpy.testing.adbd.LinkProfile` applied to everything written to the host
+    :param files: Optional :class:`dict` of remote path to bytes served by the SYNC service
+    :param keep_pushed: Store pushed files in `files`; default: `True`, otherwise they are discarded
+    :param version: Protocol version advertised to the host
+    :param max_data: Maximum data payload size advertised to the host
+    :param window: Receive window advertised for streams with delayed acknowledgements
+    :param loop: Optional event loop to serve on
+    """
+
+    def __init__(self, services=None, serial='fake', features=DEFAULT_FEATURES, auth=AuthMode.none,
+                 link=LinkProfile(), files=None, keep_pushed=True, version=adb.VERSION_SKIP_CHECKSUM,
+                 max_data=adb.MAXDATA, window=adb.DELAYED_ACK_WINDOW, loop=None):
+        self.services = collections.OrderedDict(DEFAULT_SERVICES)
+        self.services.update(services or {})
+        self.serial = serial
+        self.banner = 'ro.product.name=fake;ro.product.model=fake;ro.product.device=fake'
+        self.features = tuple(getattr(feature, 'value', feature) for feature in features)
+        self.auth = AuthMode(auth)
+        self.link = link
+        self.files = {} if files is None else files
+        self.keep_pushed = keep_pushed
+        self.version = version
+        self.max_data = max_data
+        self.window = window
+        self.loop = loop or asyncio.get_event_loop()
+        self.server = None
+        self.destinations = []
+        self.public_keys = []
+        self._sessions = set()
+
+    def __repr__(self):
+        return '<{}(serial={}, address={}, sessions={})>'.format(self.__class__.__name__, self.serial, self.address,
+                                                                 len(self._sessions))
+
+    @property
+    def address(self):
+        """
+        Return the (host, port) the fake listens on or `None` if it is not listening.
+        """
+        if self.server is None or not self.server.sockets:
+            return None
+        return self.server.sockets[0].getsockname()[:2]
+
+    @property
+    def sessions(self):
+        """
+        Return the number of host connections being served.
+        """
+        return len(self._sessions)
+
+    def service_for(self, destination):
+        """
+        Find the service for the given stream destination.
+
+        :param destination: Stream destination
+        :return: A :class:`tuple` of the service, or `None` if there is none, and the destination without its prefix
+        """
+        prefixes = [prefix for prefix in self.services if destination.startswith(prefix)]
+        if not prefixes:
+            return None, destination
+        prefix = max(prefixes, key=len)
+        return self.services[prefix], destination[len(prefix):]
+
+    @asyncio.coroutine
+    def listen(self, host='127.0.0.1', port=0):
+        """
+        Start accepting host connections over TCP.
+
+        :param host: Host to listen on
+        :param port: Port to listen on; default: any free port
+        :return: `None`
+        """
+        self.server = yield from asyncio.start_server(self.serve, host, port, loop=self.loop, limit=READ_SIZE)
+
+    @asyncio.coroutine
+    def serve(self, reader, writer):
+        """
+        Serve a single host connection until it disconnects.
+
+        :param reader: :class:`~asyncio.StreamReader` of the connection
+        :param writer: :class:`~asyncio.StreamWriter` of the connection
+        :return: `None`
+        """
+        with contextlib.suppress(OSError):
+            writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = _Session(self, reader, writer)
+        self._sessions.add(session)
+        try:
+            yield from session.run()
+        finally:
+            self._sessions.discard(session)
+
+    def socketpair(self):
+        """
+        Create a connected socket pair and serve one end of it. Safe to call from any thread.
+
+        :return: The host end of the pair as a :class:`~socket.socket`
+        """
+        local, remote = socket.socketpair()
+
+        @asyncio.coroutine
+        def serve():
+            reader, writer = yield from asyncio.open_connection(sock=remote, loop=self.loop, limit=READ_SIZE)
+            yield from self.serve(reader, writer)
+
+        self.loop.call_soon_threadsafe(self.loop.create_task, serve())
+        return local
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Stop listening, disconnect every host connection and wait for their services to stop.
+
+        :return: `None`
+        """
+        if self.server is not None:
+            self.server.close()
+            yield from self.server.wait_closed()
+            self.server = None
+        sessions = list(self._sessions)
+        for session in sessions:
+            session.link.close()
+        if sessions:
+            yield from asyncio.wait([session.ended.wait() for session in sessions], loop=self.loop)
+
+
+@contextlib.contextmanager
+def background(host='127.0.0.1', port=0, **kwargs):
+    """
+    Context manager that runs a listening :class:`~adbpy.testing.adbd.FakeAdbd` on its own event loop in a
+    background thread, for use by synchronous clients.
+
+    :param host: Host to listen on
+    :param port: Port to listen on; default: any free port
+    :param kwargs: Keyword args to pass to :class:`~adbpy.testing.adbd.FakeAdbd`
+    :return: The running :class:`~adbpy.testing.adbd.FakeAdbd` instance
+    """
+    loop = asyncio.new_event_loop()
+    adbd = FakeAdbd(loop=loop, **kwargs)
+    loop.run_until_complete(adbd.listen(host, port))
+    thread = threading.Thread(target=loop.run_forever, name=repr(adbd), daemon=True)
+    thread.start()
+    try:
+        yield adbd
+    finally:
+        asyncio.run_coroutine_threadsafe(adbd.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
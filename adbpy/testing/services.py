@@ -0,0 +1,354 @@
+"""
+    adbpy.testing.services
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for the services a :class:`~adbpy.testing.adbd.FakeAdbd` serves streams with.
+
+    A service is a coroutine function called with the :class:`~adbpy.testing.adbd.DeviceStream` to serve and the
+    destination of the stream without the prefix the service is registered for, e.g. "ls -l" for "shell:ls -l". The
+    stream is closed once the service returns.
+"""
+
+import asyncio
+import collections
+import stat
+
+from adbpy.protocol import filesync
+from adbpy.protocol.shell import SHELL_V2_HEADER, ShellPacketId
+
+
+__all__ = ['File', 'echo', 'sink', 'source', 'shell', 'shell_v2', 'sync']
+
+
+#: Mode of files served by the SYNC service when none was pushed.
+DEFAULT_FILE_MODE = stat.S_IFREG | 0o644
+
+#: Exit code of shell commands that are not supported.
+COMMAND_NOT_FOUND = 127
+
+
+class File(collections.namedtuple('File', 'mode data mtime')):
+    """
+    File served by the SYNC service. Plain bytes in :attr:`~adbpy.testing.adbd.FakeAdbd.files` are served as regular
+    files with mode 0644 and mtime 0.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, value):
+        """
+        Return the given value as a :class:`~adbpy.testing.services.File` instance.
+
+        :param value: A :class:`~adbpy.testing.services.File` instance or bytes-like file contents
+        :return: A :class:`~adbpy.testing.services.File` instance
+        """
+        return value if isinstance(value, cls) else cls(DEFAULT_FILE_MODE, value, 0)
+
+
+class _Reader:
+    """
+    Reads exact numbers of bytes from the payloads of a stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
+
+    @asyncio.coroutine
+    def read_exactly(self, num_bytes):
+        """
+        Read exactly the given number of bytes.
+
+        :param num_bytes: Number of bytes to read
+        :return: Bytes read or `None` if the stream closed first
+        """
+        while len(self.buffer) < num_bytes:
+            data = yield from self.stream.read()
+            if not data:
+                return None
+            self.buffer += data
+        data = bytes(self.buffer[:num_bytes])
+        del self.buffer[:num_bytes]
+        return data
+
+
+@asyncio.coroutine
+def echo(stream, argument):
+    """
+    Write every payload back to the host.
+    """
+    while True:
+        data = yield from stream.read()
+        if not data or not (yield from stream.write(data)):
+            return
+
+
+@asyncio.coroutine
+def sink(stream, argument):
+    """
+    Discard every payload until the host closes the stream.
+    """
+    while (yield from stream.read()):
+        pass
+
+
+@asyncio.coroutine
+def source(stream, argument):
+    """
+    Write the number of bytes given as the argument to the host and close the stream.
+    """
+    yield from _source(stream.write, int(argument or 0), stream.max_data)
+
+
+@asyncio.coroutine
+def _source(write, num_bytes, chunk_size):
+    data = bytes(min(num_bytes, chunk_size))
+    while num_bytes > 0:
+        chunk = data[:num_bytes] if num_bytes < len(data) else data
+        if not (yield from write(chunk)):
+            return
+        num_bytes -= len(chunk)
+
+
+class _RawShell:
+    """
+    Shell command I/O over a raw stream: stdin and stdout are the stream data and stderr is merged into stdout.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    @asyncio.coroutine
+    def read(self):
+        return (yield from self.stream.read())
+
+    @asyncio.coroutine
+    def write(self, data, fd=ShellPacketId.stdout):
+        return (yield from self.stream.write(data))
+
+    @asyncio.coroutine
+    def exit(self, code):
+        pass
+
+
+class _V2Shell(_RawShell):
+    """
+    Shell command I/O over a stream framed with the shell v2 protocol.
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.reader = _Reader(stream)
+
+    @asyncio.coroutine
+    def read(self):
+        while True:
+            header = yield from self.reader.read_exactly(SHELL_V2_HEADER.size)
+            if header is None:
+                return b''
+            packet_id, length = SHELL_V2_HEADER.unpack(header)
+            data = yield from self.reader.read_exactly(length)
+            if packet_id == ShellPacketId.close_stdin or data is None:
+                return b''
+            if packet_id == ShellPacketId.stdin and data:
+                return data
+
+    @asyncio.coroutine
+    def write(self, data, fd=ShellPacketId.stdout):
+        return (yield from self.stream.write(SHELL_V2_HEADER.pack(fd, len(data)) + bytes(data)))
+
+    @asyncio.coroutine
+    def exit(self, code):
+        yield from self.stream.write(SHELL_V2_HEADER.pack(ShellPacketId.exit, 1) + bytes([code & 0xff]))
+
+
+@asyncio.coroutine
+def _run(io, command):
+    """
+    Run a shell command.
+
+    Supported commands are `echo <text>`, `cat` (stdin to stdout), `source <num_bytes>`, `sink` (discard stdin),
+    `sleep <seconds>` and `exit <code>`; anything else writes an error to stderr and exits with
+    :data:`COMMAND_NOT_FOUND`.
+
+    :param io: Shell command I/O of the stream
+    :param command: Command line
+    :return: Exit code of the command
+    """
+    name, _, args = command.strip().partition(' ')
+    if name == 'echo':
+        yield from io.write(args.encode() + b'\n')
+    elif name == 'cat':
+        while True:
+            data = yield from io.read()
+            if not data or not (yield from io.write(data)):
+                break
+    elif name == 'source':
+        chunk_size = io.stream.max_data - SHELL_V2_HEADER.size
+        yield from _source(io.write, int(args or 0), chunk_size)
+    elif name == 'sink':
+        while (yield from io.read()):
+            pass
+    elif name == 'sleep':
+        yield from asyncio.sleep(float(args or 0), loop=io.stream.session.loop)
+    elif name == 'exit':
+        return int(args or 0)
+    else:
+        yield from io.write('sh: {}: not found\n'.format(name).encode(), ShellPacketId.stderr)
+        return COMMAND_NOT_FOUND
+    return 0
+
+
+@asyncio.coroutine
+def shell(stream, command):
+    """
+    Run a shell command without the shell v2 protocol, See: :func:`_run`.
+    """
+    yield from _run(_RawShell(stream), command)
+
+
+@asyncio.coroutine
+def shell_v2(stream, command):
+    """
+    Run a shell command with the shell v2 protocol, reporting its exit code, See: :func:`_run`.
+    """
+    io = _V2Shell(stream)
+    code = yield from _run(io, command)
+    yield from io.exit(code)
+
+
+def _sync_response(sync_id, value, body=b''):
+    """
+    Create a SYNC response of the given id, header value and body.
+    """
+    return filesync.SYNC_HEADER.pack(sync_id.value, value) + body
+
+
+def _sync_fail(reason):
+    reason = reason.encode()
+    return _sync_response(filesync.SyncId.fail, len(reason), reason)
+
+
+def _lookup(files, path):
+    """
+    Get the mode, size and mtime of the given path, inferring directories from the paths of files.
+
+    :param files: A :class:`dict` of path to file
+    :param path: Remote path
+    :return: A :class:`tuple` of mode, size and mtime which are all zero if the path does not exist
+    """
+    if path in files:
+        f = File.of(files[path])
+        return f.mode, len(f.data), f.mtime
+    prefix = path.rstrip('/') + '/'
+    if any(name.startswith(prefix) for name in files):
+        return stat.S_IFDIR | 0o755, 0, 0
+    return 0, 0, 0
+
+
+def _listing(files, path):
+    """
+    Create the DENT responses listing the given directory, followed by DONE.
+
+    :param files: A :class:`dict` of path to file
+    :param path: Remote directory path
+    :return: Bytes of the responses
+    """
+    prefix = path.rstrip('/') + '/'
+    names = sorted({name[len(prefix):].split('/', 1)[0] for name in files if name.startswith(prefix)})
+    response = bytearray()
+    for name in names:
+        mode, size, mtime = _lookup(files, prefix + name)
+        encoded = name.encode()
+        response += filesync.SyncId.dent.value + filesync.DENT_STRUCT.pack(mode, size, mtime, len(encoded)) + encoded
+    response += filesync.SyncId.done.value + bytes(filesync.DENT_STRUCT.size)
+    return bytes(response)
+
+
+@asyncio.coroutine
+def sync(stream, argument):
+    """
+    Serve the SYNC protocol from the in-memory :attr:`~adbpy.testing.adbd.FakeAdbd.files` of the fake.
+
+    Pushed files are stored unless :attr:`~adbpy.testing.adbd.FakeAdbd.keep_pushed` is disabled, which turns the
+    service into a sink. Pushes to paths under "/readonly/" fail. Like adbd, the session ends after any FAIL response.
+    """
+    adbd, reader = stream.adbd, _Reader(stream)
+    while True:
+        header = yield from reader.read_exactly(filesync.SYNC_HEADER.size)
+        if header is None:
+            return
+        sync_id, length = filesync.SYNC_HEADER.unpack(header)
+        if sync_id == filesync.SyncId.quit.value:
+            return
+        path = yield from reader.read_exactly(length)
+        if path is None:
+            return
+        path = path.decode('utf-8', 'replace')
+
+        if sync_id == filesync.SyncId.stat.value:
+            response = filesync.SyncId.stat.value + filesync.STAT_STRUCT.pack(*_lookup(adbd.files, path))
+        elif sync_id == filesync.SyncId.list.value:
+            response = _listing(adbd.files, path)
+        elif sync_id == filesync.SyncId.send.value:
+            response = yield from _receive_file(reader, adbd, path)
+            if response is None:
+                return
+        elif sync_id == filesync.SyncId.recv.value:
+            response = _send_file(adbd.files, path)
+        else:
+            response = _sync_fail('Unknown request {}'.format(sync_id))
+        if not (yield from stream.write(response)) or response.startswith(filesync.SyncId.fail.value):
+            return
+
+
+@asyncio.coroutine
+def _receive_file(reader, adbd, request):
+    """
+    Read the DATA packets of a pushed file up to its DONE and store the file.
+
+    :param reader: A :class:`~adbpy.testing.services._Reader` of the stream
+    :param adbd: The :class:`~adbpy.testing.adbd.FakeAdbd` storing the file
+    :param request: Body of the SEND request: path and mode separated by a comma
+    :return: Bytes of the response or `None` if the stream closed
+    """
+    path, _, mode = request.rpartition(',')
+    data = bytearray() if adbd.keep_pushed else None
+    while True:
+        header = yield from reader.read_exactly(filesync.SYNC_HEADER.size)
+        if header is None:
+            return None
+        sync_id, length = filesync.SYNC_HEADER.unpack(header)
+        if sync_id == filesync.SyncId.done.value:
+            break
+        chunk = yield from reader.read_exactly(length)
+        if chunk is None:
+            return None
+        if data is not None:
+            data += chunk
+
+    if path.startswith('/readonly/'):
+        return _sync_fail('Read-only file system')
+    if data is not None:
+        adbd.files[path] = File(int(mode or DEFAULT_FILE_MODE), bytes(data), length)
+    return _sync_response(filesync.SyncId.okay, 0)
+
+
+def _send_file(files, path):
+    """
+    Create the DATA packets of a pulled file followed by DONE.
+
+    :param files: A :class:`dict` of path to file
+    :param path: Remote file path
+    :return: Bytes of the responses
+    """
+    if path not in files:
+        return _sync_fail('No such file or directory')
+    data = File.of(files[path]).data
+    response = bytearray()
+    for offset in range(0, len(data), filesync.SYNC_DATA_MAX):
+        chunk = data[offset:offset + filesync.SYNC_DATA_MAX]
+        response += _sync_response(filesync.SyncId.data, len(chunk), chunk)
+    response += _sync_response(filesync.SyncId.done, 0)
+    return bytes(response)
@@ -8,6 +8,8 @@
 import abc
 import functools
 
+from adbpy import exception
+
 
 __all__ = ['Transport', 'requires_context', 'rethrow_timeout_exception']
 
@@ -61,6 +63,12 @@ class TransportReceiveTimeout(TransportTimeoutError):
     """
 
 
+class TransportEndOfStreamError(TransportError):
+    """
+    Exception raised when the remote end closes the transport before an exact-length recv completes.
+    """
+
+
 class TransportContextRequiredError(TransportError):
     """
     Exception raised when a function decorated with :func:`~adbpy.transport.requires_context` does not receive
@@ -89,21 +97,12 @@ def rethrow_timeout_exception(catch_exc, raise_exc):
     """
     Decorator that catches low level transport timeout related exception and raises an `adbpy` specific one.
 
+    Supports both regular functions and coroutines.
+
     :param catch_exc: Underlying transport timeout exception to catch
     :param raise_exc: General transport timeout exception to raise
     """
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except catch_exc as e:
-                timeout = kwargs.get('timeout')
-                timeout_msg = '' if not timeout else ' of {} ms'.format(timeout)
-                exc_msg = '{} exceeded timeout{}'.format(func.__name__, timeout_msg)
-                raise raise_exc(exc_msg) from e
-        return wrapper
-    return decorator
+    return exception.rethrow_timeout(catch_exc, raise_exc)
 
 
 class Transport(metaclass=abc.ABCMeta):
@@ -126,3 +125,18 @@ class Transport(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def recv(self, context, num_bytes, **kwargs):
         pass
+
+    @abc.abstractmethod
+    def recv_into(self, context, buffer, **kwargs):
+        pass
+
+    def probe(self, context):
+        """
+        Cheaply check to see if the transport managed by the given context is still usable without blocking.
+
+        Transports that cannot check cheaply assume they are.
+
+        :param context: Transport context object to check
+        :return: A :class:`bool` indicating if the transport is usable
+        """
+        return True
@@ -8,16 +8,16 @@
 import asyncio
 import collections
 import logging
-import socket
 
 from adbpy import transport
+from adbpy.transport import trace
 
 
 __all__ = ['Context', 'Transport']
 
 
 LOGGER = logging.getLogger(__name__)
-WIRE_LOGGER = LOGGER.getChild('wire')
+TRACER = trace.Tracer(LOGGER)
 
 
 #: Transport context object returned by :meth:`~adbpy.transport.async.tcp.Transport.connect`.
@@ -36,7 +36,8 @@ class Transport(transport.Transport):
     def __repr__(self):
         return '<{}(host={}, port={})>'.format(self.__class__.__name__, self._host, self._port)
 
-    @transport.rethrow_timeout_exception(socket.timeout, transport.TransportConnectTimeout)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportConnectTimeout)
+    @asyncio.coroutine
     def connect(self, reader=None, writer=None, loop=None, timeout=transport.DEFAULT_CONNECT_TIMEOUT_MS):
         """
         Connect to an asynchronous (non-blocking) TCP socket at the defined host/port.
@@ -47,11 +48,12 @@ class Transport(transport.Transport):
         :param timeout: Optional timeout in seconds to use when connecting to the socket
         :return: A :class:`~adbpy.transport.async.tcp.Context` instance used to communicate with the socket
         """
-        reader, writer = self._open_socket(self._host, self._port, reader, writer, loop)
+        reader, writer = yield from self._open_socket(self._host, self._port, reader, writer, timeout, loop)
         return Context(reader, writer, loop)
 
     @transport.requires_context(Context)
-    @transport.rethrow_timeout_exception(socket.timeout, transport.TransportDisconnectTimeout)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportDisconnectTimeout)
+    @asyncio.coroutine
     def disconnect(self, context, timeout=transport.DEFAULT_DISCONNECT_TIMEOUT_MS):
         """
         Disconnect from the asynchronous (non-blocking) TCP socket managed by the given context object.
@@ -63,7 +65,8 @@ class Transport(transport.Transport):
         self._close_socket(context.reader, context.writer, context.loop)
 
     @transport.requires_context(Context)
-    @transport.rethrow_timeout_exception(socket.timeout, transport.TransportSendTimeout)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportSendTimeout)
+    @asyncio.coroutine
     def send(self, context, data, timeout=transport.DEFAULT_SEND_TIMEOUT_MS):
         """
         Send data to the asynchronous (non-blocking) TCP socket managed by the given context object.
@@ -73,10 +76,11 @@ class Transport(transport.Transport):
         :param timeout: Optional timeout in seconds to use when sending to the socket
         :return: `None`
         """
-        return self._write_bytes_to_socket(context.writer, data, timeout, context.loop)
+        return (yield from self._write_bytes_to_socket(context.writer, data, timeout, context.loop))
 
     @transport.requires_context(Context)
-    @transport.rethrow_timeout_exception(socket.timeout, transport.TransportReceiveTimeout)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportReceiveTimeout)
+    @asyncio.coroutine
     def recv(self, context, num_bytes, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
         """
         Receive data from the asynchronous (non-blocking) TCP socket managed by the given context object.
@@ -86,8 +90,42 @@ class Transport(transport.Transport):
         :param timeout: Optional timeout in seconds to use when receiving from the socket
         :return: A :class:`bytes` buffer containing data read from the socket
         """
-        return self._read_bytes_from_socket(context.reader, num_bytes, timeout, context.loop)
+        return (yield from self._read_bytes_from_socket(context.reader, num_bytes, timeout, context.loop))
 
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportReceiveTimeout)
+    @asyncio.coroutine
+    def recv_into(self, context, buffer, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive data from the asynchronous (non-blocking) TCP socket managed by the given context object into
+        the given buffer.
+
+        :param context: A :class:`~adbpy.transport.async.tcp.Context` object whose socket want to receive data from
+        :param buffer: Writable buffer, e.g. :class:`~bytearray` or :class:`~memoryview`, to read into
+        :param timeout: Optional timeout in seconds to use when receiving from the socket
+        :return: A :class:`~int` number of bytes read into the buffer
+        """
+        data = yield from self._read_bytes_from_socket(context.reader, len(buffer), timeout, context.loop)
+        num_bytes = len(data)
+        buffer[:num_bytes] = data
+        return num_bytes
+
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportReceiveTimeout)
+    @asyncio.coroutine
+    def recv_exactly(self, context, num_bytes, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive exactly the given number of bytes from the asynchronous (non-blocking) TCP socket managed by the
+        given context object.
+
+        :param context: A :class:`~adbpy.transport.async.tcp.Context` object whose socket want to receive data from
+        :param num_bytes: Number of bytes to read from the socket
+        :param timeout: Optional timeout in seconds to use when receiving from the socket
+        :return: A :class:`bytes` buffer of exactly `num_bytes` length containing data read from the socket
+        """
+        return (yield from self._read_exactly_from_socket(context.reader, num_bytes, timeout, context.loop))
+
+    @asyncio.coroutine
     def _write_bytes_to_socket(self, writer, data, timeout, loop=None):
         """
         Write a buffer of bytes to the given writer.
@@ -98,16 +136,16 @@ class Transport(transport.Transport):
         :param loop: Optional event loop instance to use
         :return: `None`
         """
-        LOGGER.debug('Writing data to {}:{}, timeout={}, length={}'.format(self._host, self._port,
-                                                                           timeout, len(data)))
-
-        if WIRE_LOGGER.isEnabledFor(logging.DEBUG):
-            WIRE_LOGGER.debug('>>> {}'.format(data))
+        if TRACER.debug:
+            LOGGER.debug('Writing data to %s:%s, timeout=%s, length=%s', self._host, self._port, timeout, len(data))
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.sent, _channel(writer), data)
 
         writer.write(data)
         result = yield from asyncio.wait_for(writer.drain(), timeout=timeout, loop=loop)
         return result
 
+    @asyncio.coroutine
     def _read_bytes_from_socket(self, reader, num_bytes, timeout, loop=None):
         """
         Read a buffer of bytes from the given reader.
@@ -118,17 +156,44 @@ class Transport(transport.Transport):
         :param loop: Optional event loop instance to use
         :return: A :class:`~bytes` buffer read from the socket
         """
-        LOGGER.debug('Reading data from {}:{}, timeout={}, length={}'.format(self._host, self._port,
-                                                                             timeout, num_bytes))
+        if TRACER.debug:
+            LOGGER.debug('Reading data from %s:%s, timeout=%s, length=%s', self._host, self._port, timeout, num_bytes)
 
         data = yield from asyncio.wait_for(reader.read(num_bytes), timeout=timeout, loop=loop)
 
-        if WIRE_LOGGER.isEnabledFor(logging.DEBUG):
-            WIRE_LOGGER.debug('<<< {}'.format(data))
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.received, _channel(reader), data)
+
+        return data
+
+    @asyncio.coroutine
+    def _read_exactly_from_socket(self, reader, num_bytes, timeout, loop=None):
+        """
+        Read a buffer of exactly the given number of bytes from the given reader.
+
+        :param reader: A :class:`~asyncio.streams.StreamReader` instance to read bytes from
+        :param num_bytes: Number of bytes to read
+        :param timeout: Timeout in seconds for the read to complete
+        :param loop: Optional event loop instance to use
+        :return: A :class:`~bytes` buffer read from the socket
+        """
+        if TRACER.debug:
+            LOGGER.debug('Reading exactly from %s:%s, timeout=%s, length=%s', self._host, self._port, timeout,
+                         num_bytes)
+
+        try:
+            data = yield from asyncio.wait_for(reader.readexactly(num_bytes), timeout=timeout, loop=loop)
+        except asyncio.IncompleteReadError as e:
+            raise transport.TransportEndOfStreamError('Expected {} bytes; received {}'.format(
+                num_bytes, len(e.partial))) from e
+
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.received, _channel(reader), data)
 
         return data
 
-    def _open_socket(self, host, port, reader=None, writer=None, loop=None):
+    @asyncio.coroutine
+    def _open_socket(self, host, port, reader=None, writer=None, timeout=None, loop=None):
         """
         Create a socket connection to the given host/port and return back reader/writers for it.
 
@@ -136,6 +201,7 @@ class Transport(transport.Transport):
         :param port: Remote port to connect
         :param reader: Optional :class:`~asyncio.streams.StreamReader` instance to re-use
         :param writer: Optional :class:`~asyncio.streams.StreamWriter` instance to re-use
+        :param timeout: Optional timeout in seconds for the connection to open
         :param loop: Optional event loop instance to use
         :return: A tuple of :class:`~asyncio.streams.StreamReader` and :class:`~asyncio.streams.StreamWriter` instances
         """
@@ -143,9 +209,10 @@ class Transport(transport.Transport):
             LOGGER.debug('Reusing existing reader/writer')
             return reader, writer
 
-        LOGGER.debug('Opening socket to {}:{}'.format(host, port))
+        LOGGER.debug('Opening socket to %s:%s', host, port)
 
-        reader, writer = yield from asyncio.open_connection(host, port, loop=loop)
+        reader, writer = yield from asyncio.wait_for(asyncio.open_connection(host, port, loop=loop),
+                                                     timeout=timeout, loop=loop)
         return reader, writer
 
     def _close_socket(self, reader, writer, loop=None):
@@ -159,3 +226,16 @@ class Transport(transport.Transport):
         """
         LOGGER.debug('Closing socket')
         writer.close()
+
+
+def _channel(stream):
+    """
+    Get the channel identifying the connection of the given stream in wire captures: its socket file descriptor.
+
+    :param stream: A :class:`~asyncio.streams.StreamReader` or :class:`~asyncio.streams.StreamWriter` instance
+    :return: A :class:`~int` channel
+    """
+    # Readers only expose their transport privately.
+    stream_transport = getattr(stream, 'transport', None) or getattr(stream, '_transport', None)
+    sock = stream_transport.get_extra_info('socket') if stream_transport is not None else None
+    return sock.fileno() if sock is not None else id(stream)
@@ -0,0 +1,448 @@
+"""
+    adbpy.transport.async.usb
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for an asynchronous (non-blocking) USB transport powered by the asynchronous
+    transfer API of `libusb` and `asyncio`.
+"""
+
+import asyncio
+import collections
+import functools
+import logging
+import threading
+
+import usb1
+
+import adbpy
+from adbpy import transport
+from adbpy.transport import trace
+from adbpy.transport.sync import usb as sync_usb
+
+
+__all__ = ['Context', 'Transport', 'BulkReader']
+
+
+LOGGER = logging.getLogger(__name__)
+TRACER = trace.Tracer(LOGGER)
+
+
+#: Default number of bulk-IN transfers kept submitted at once.
+DEFAULT_NUM_TRANSFERS = 4
+
+#: Default size in bytes of the buffer of each bulk-IN transfer; large enough for the maximum ADB data payload.
+DEFAULT_TRANSFER_SIZE = 256 * 1024
+
+#: Default number of bytes buffered for the reader of a transport; reading pauses above twice this and resumes once
+#: the reader has drained the buffer back down to it.
+DEFAULT_BUFFER_LIMIT = 4 * DEFAULT_TRANSFER_SIZE
+
+#: Transport context object returned by :meth:`~adbpy.transport.async.usb.Transport.connect`.
+Context = collections.namedtuple('Context', 'usb reader bulk_reader events loop')
+
+
+class BulkReader:
+    """
+    Keeps several bulk-IN transfers submitted on an endpoint so the device always has a buffer to complete into.
+
+    Each transfer is resubmitted with the same buffer as soon as its data has been handed off, so no buffers are
+    allocated while reading. `libusb` completes transfers on an endpoint in the order they were submitted, which
+    keeps the data in order. While paused, completed transfers are held back and resubmitted once reading resumes,
+    so a :class:`~asyncio.StreamReader` can use the reader as its transport for flow control.
+
+    Callbacks are invoked from the thread handling `libusb` events. `on_data` receives a :class:`~bytes` copy of each
+    completed transfer and `on_error` receives an exception once reading stops because of an error.
+    """
+
+    def __init__(self, handle, endpoint_address, on_data, on_error, num_transfers=DEFAULT_NUM_TRANSFERS,
+                 transfer_size=DEFAULT_TRANSFER_SIZE):
+        self._handle = handle
+        self._endpoint_address = endpoint_address
+        self._on_data = on_data
+        self._on_error = on_error
+        self._num_transfers = num_transfers
+        self._transfer_size = transfer_size
+        self._transfers = []
+        self._held = []
+        self._is_paused = False
+        self._running = False
+        self._lock = threading.RLock()
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def __repr__(self):
+        return '<{}(endpoint_address={}, num_transfers={}, transfer_size={})>'.format(
+            self.__class__.__name__, self._endpoint_address, self._num_transfers, self._transfer_size)
+
+    @property
+    def pending(self):
+        """
+        Return the number of transfers currently submitted.
+        """
+        return sum(1 for t in self._transfers if t.isSubmitted())
+
+    @sync_usb.libusb_exception_handler
+    def start(self):
+        """
+        Allocate and submit all transfers.
+
+        :return: `None`
+        """
+        with self._lock:
+            self._running = True
+            self._idle.clear()
+            for _ in range(self._num_transfers):
+                t = self._handle.getTransfer()
+                t.setBulk(self._endpoint_address, self._transfer_size, callback=self._on_transfer)
+                self._transfers.append(t)
+                t.submit()
+
+    def stop(self, timeout=None):
+        """
+        Cancel all submitted transfers and wait for their cancellation to complete.
+
+        Events must still be handled for cancellations to complete, i.e. stop the reader before the event thread.
+
+        :param timeout: Optional timeout in seconds to wait for cancellation
+        :return: A :class:`bool` indicating if all transfers stopped before the timeout
+        """
+        with self._lock:
+            self._running = False
+            for t in self._transfers:
+                try:
+                    t.cancel()
+                except usb1.USBError:
+                    pass
+            self._check_idle()
+        return self._idle.wait(timeout)
+
+    def pause_reading(self):
+        """
+        Stop resubmitting transfers as they complete. Transfers already submitted may still complete.
+
+        :return: `None`
+        """
+        with self._lock:
+            self._is_paused = True
+
+    def resume_reading(self):
+        """
+        Resubmit the transfers held back while paused and keep resubmitting transfers as they complete.
+
+        :return: `None`
+        """
+        with self._lock:
+            self._is_paused = False
+            held, self._held = self._held, []
+            for t in held:
+                if not self._running:
+                    break
+                self._resubmit(t)
+            self._check_idle()
+
+    def close(self):
+        """
+        Free all transfers; they must not be submitted.
+
+        :return: `None`
+        """
+        with self._lock:
+            for t in self._transfers:
+                t.close()
+            del self._transfers[:]
+            del self._held[:]
+
+    def _on_transfer(self, t):
+        """
+        Callback invoked by `libusb` when a transfer completes, fails or is cancelled.
+
+        :param t: A :class:`~usb1.USBTransfer` instance
+        :return: `None`
+        """
+        status = t.getStatus()
+
+        if status == usb1.TRANSFER_COMPLETED:
+            num_bytes = t.getActualLength()
+            if num_bytes:
+                data = bytes(memoryview(t.getBuffer())[:num_bytes])
+                if trace.CAPTURE is not None:
+                    trace.capture(trace.Direction.received, id(self._handle), data)
+                self._on_data(data)
+        elif status not in (usb1.TRANSFER_TIMED_OUT, usb1.TRANSFER_CANCELLED):
+            with self._lock:
+                was_running, self._running = self._running, False
+            if was_running:
+                self._on_error(_transfer_error(status))
+
+        with self._lock:
+            if self._running:
+                if self._is_paused:
+                    self._held.append(t)
+                else:
+                    self._resubmit(t)
+            self._check_idle()
+
+    def _resubmit(self, t):
+        try:
+            t.submit()
+        except usb1.USBError as e:
+            self._running = False
+            self._on_error(sync_usb.USBError('Unable to resubmit transfer: {}'.format(e)))
+
+    def _check_idle(self):
+        if not self._running and not any(t.isSubmitted() for t in self._transfers):
+            self._idle.set()
+
+
+class Transport(transport.Transport):
+    """
+    Class for interacting with a USB device asynchronously.
+
+    Device discovery and setup are shared with :class:`~adbpy.transport.sync.usb.Transport`. Reads are served by a
+    :class:`~adbpy.transport.async.usb.BulkReader` feeding a :class:`~asyncio.StreamReader`, so there is always a
+    transfer waiting when the device has data. The device may send far ahead of the reader, e.g. a whole window per
+    stream with delayed acknowledgements, so the bulk reader is paused while more than twice `buffer_limit` bytes
+    are buffered and resumed once reads drain it back down to `buffer_limit`.
+    """
+
+    def __init__(self, serial=None, vid=None, pid=None, usb_class=None, usb_subclass=None, usb_protocol=None,
+                 num_transfers=DEFAULT_NUM_TRANSFERS, transfer_size=DEFAULT_TRANSFER_SIZE,
+                 buffer_limit=DEFAULT_BUFFER_LIMIT):
+        self._transport = sync_usb.Transport(serial, vid, pid, usb_class, usb_subclass, usb_protocol)
+        self._num_transfers = num_transfers
+        self._transfer_size = transfer_size
+        self._buffer_limit = buffer_limit
+
+    def __repr__(self):
+        return '<{}(transport={}, num_transfers={}, transfer_size={})>'.format(
+            self.__class__.__name__, self._transport, self._num_transfers, self._transfer_size)
+
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportConnectTimeout)
+    @asyncio.coroutine
+    def connect(self, libusb_ctx=None, loop=None, timeout=transport.DEFAULT_CONNECT_TIMEOUT_MS, registry=None,
+                pool=None):
+        """
+        Connect to a USB device at the defined serial/vid/pid and start reading from it.
+
+        :param libusb_ctx: Optional :class:`~usb1.USBContext` object to re-use
+        :param loop: Optional :class:`~asyncio.events.AbstractEventLoop` instance to use
+        :param timeout: Optional timeout in seconds to use when connecting to the device
+        :param registry: Optional :class:`~adbpy.transport.sync.usb.DeviceRegistry` to find the device in
+        :param pool: Optional :class:`~adbpy.transport.sync.usb.HandlePool` to take a claimed device handle from
+        :return: A :class:`~adbpy.transport.async.usb.Context` instance used to communicate with a USB device
+        """
+        loop = loop or adbpy.get_event_loop()
+        connect = functools.partial(self._transport.connect, libusb_ctx, registry=registry, pool=pool)
+        usb = yield from asyncio.wait_for(loop.run_in_executor(None, connect), timeout=timeout, loop=loop)
+
+        reader = asyncio.StreamReader(limit=self._buffer_limit, loop=loop)
+        bulk_reader = BulkReader(usb.handle, usb.read_endpoint_address,
+                                 on_data=functools.partial(loop.call_soon_threadsafe, reader.feed_data),
+                                 on_error=functools.partial(loop.call_soon_threadsafe, reader.set_exception),
+                                 num_transfers=self._num_transfers, transfer_size=self._transfer_size)
+        reader.set_transport(bulk_reader)
+
+        events = sync_usb.EventThread(usb.ctx)
+        events.start()
+        context = Context(usb, reader, bulk_reader, events, loop)
+        try:
+            bulk_reader.start()
+        except BaseException:
+            yield from loop.run_in_executor(None, self._close, context)
+            raise
+
+        return context
+
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportDisconnectTimeout)
+    @asyncio.coroutine
+    def disconnect(self, context, timeout=transport.DEFAULT_DISCONNECT_TIMEOUT_MS):
+        """
+        Stop reading from and disconnect from the USB device managed by the given context object.
+
+        :param context: A :class:`~adbpy.transport.async.usb.Context` object whose device we want to disconnect
+        :param timeout: Optional timeout in seconds to use when disconnecting from the device
+        :return: `None`
+        """
+        yield from asyncio.wait_for(context.loop.run_in_executor(None, self._close, context),
+                                    timeout=timeout, loop=context.loop)
+        context.reader.feed_eof()
+
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportSendTimeout)
+    @asyncio.coroutine
+    def send(self, context, data, timeout=transport.DEFAULT_SEND_TIMEOUT_MS):
+        """
+        Send data to the USB device managed by the given context object with a bulk-OUT transfer.
+
+        :param context: A :class:`~adbpy.transport.async.usb.Context` object whose device we want to send data to
+        :param data: Byte buffer payload to write to the USB device
+        :param timeout: Optional timeout in seconds to use when sending to the device
+        :return: `None`
+        """
+        if TRACER.debug:
+            LOGGER.debug('Writing data to endpoint_address=%s, timeout=%s, length=%s',
+                         context.usb.write_endpoint_address, timeout, len(data))
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.sent, id(context.usb.handle), data)
+
+        future, lock = asyncio.Future(loop=context.loop), threading.RLock()
+        t = _submit_bulk_write(context.usb.handle, context.usb.write_endpoint_address, data,
+                               functools.partial(_complete_future, context.loop, future, lock))
+        try:
+            num_bytes = yield from asyncio.wait_for(future, timeout=timeout, loop=context.loop)
+        except BaseException:
+            # Timed out or cancelled; the transfer is closed by its callback once the cancellation completes.
+            _cancel_bulk_write(t, lock)
+            raise
+
+        if num_bytes != len(data):
+            raise sync_usb.USBIncompleteSendError('Expected {}; sent {}'.format(len(data), num_bytes))
+
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportReceiveTimeout)
+    @asyncio.coroutine
+    def recv(self, context, num_bytes, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive up to the given number of bytes already read from the USB device managed by the given context object.
+
+        :param context: A :class:`~adbpy.transport.async.usb.Context` object whose device we want to receive data from
+        :param num_bytes: Maximum number of bytes to receive
+        :param timeout: Optional timeout in seconds to use when receiving from the device
+        :return: A :class:`~bytes` buffer containing data read from the device
+        """
+        return (yield from asyncio.wait_for(context.reader.read(num_bytes), timeout=timeout, loop=context.loop))
+
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportReceiveTimeout)
+    @asyncio.coroutine
+    def recv_into(self, context, buffer, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive data from the USB device managed by the given context object into the given buffer.
+
+        :param context: A :class:`~adbpy.transport.async.usb.Context` object whose device we want to receive data from
+        :param buffer: Writable buffer, e.g. :class:`~bytearray` or :class:`~memoryview`, to read into
+        :param timeout: Optional timeout in seconds to use when receiving from the device
+        :return: A :class:`~int` number of bytes read into the buffer
+        """
+        data = yield from asyncio.wait_for(context.reader.read(len(buffer)), timeout=timeout, loop=context.loop)
+        num_bytes = len(data)
+        buffer[:num_bytes] = data
+        return num_bytes
+
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(asyncio.TimeoutError, transport.TransportReceiveTimeout)
+    @asyncio.coroutine
+    def recv_exactly(self, context, num_bytes, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive exactly the given number of bytes from the USB device managed by the given context object.
+
+        :param context: A :class:`~adbpy.transport.async.usb.Context` object whose device we want to receive data from
+        :param num_bytes: Number of bytes to receive
+        :param timeout: Optional timeout in seconds to use when receiving from the device
+        :return: A :class:`bytes` buffer of exactly `num_bytes` length containing data read from the device
+        """
+        try:
+            return (yield from asyncio.wait_for(context.reader.readexactly(num_bytes), timeout=timeout,
+                                                loop=context.loop))
+        except asyncio.IncompleteReadError as e:
+            raise transport.TransportEndOfStreamError('Expected {} bytes; received {}'.format(
+                num_bytes, len(e.partial))) from e
+
+    def _close(self, context):
+        """
+        Stop the bulk reader and event thread, then release the device. Blocks, so it runs in an executor.
+
+        :param context: A :class:`~adbpy.transport.async.usb.Context` object to close
+        :return: `None`
+        """
+        stopped = context.bulk_reader.stop(timeout=1)
+        if not stopped:
+            LOGGER.warning('Timed out cancelling transfers of %s; leaking them', context.bulk_reader)
+        context.events.stop()
+        # Transfers still submitted are owned by libusb and must not be freed.
+        if stopped:
+            context.bulk_reader.close()
+        self._transport.disconnect(context.usb)
+
+
+@sync_usb.libusb_exception_handler
+def _submit_bulk_write(handle, endpoint_address, data, callback):
+    """
+    Submit a bulk-OUT transfer of the given data.
+
+    :param handle: A :class:`~usb1.USBDeviceHandle` that manages the endpoint
+    :param endpoint_address: Address of the USB endpoint to write to
+    :param data: Buffer to write
+    :param callback: Function invoked with the transfer once it completes
+    :return: The submitted :class:`~usb1.USBTransfer` instance
+    """
+    t = handle.getTransfer()
+    t.setBulk(endpoint_address, data, callback=callback)
+    t.submit()
+    return t
+
+
+def _complete_future(loop, future, lock, t):
+    """
+    Callback invoked by `libusb` when a bulk-OUT transfer completes which resolves the given future on its loop.
+
+    The transfer is doomed so :mod:`usb1` closes it as soon as this callback returns.
+
+    :param loop: Event loop that owns the future
+    :param future: A :class:`~asyncio.Future` to resolve with the number of bytes written
+    :param lock: A :class:`~threading.RLock` shared with :func:`_cancel_bulk_write`
+    :param t: A :class:`~usb1.USBTransfer` instance
+    :return: `None`
+    """
+    with lock:
+        t.doom()
+        status = t.getStatus()
+        if status == usb1.TRANSFER_COMPLETED:
+            result, error = t.getActualLength(), None
+        else:
+            result, error = None, _transfer_error(status)
+    loop.call_soon_threadsafe(_resolve_future, future, result, error)
+
+
+def _cancel_bulk_write(t, lock):
+    """
+    Cancel a bulk-OUT transfer unless its callback already ran.
+
+    The lock keeps the callback, and the close that follows it, from running while the transfer is cancelled.
+
+    :param t: A :class:`~usb1.USBTransfer` instance submitted by :func:`_submit_bulk_write`
+    :param lock: A :class:`~threading.RLock` shared with :func:`_complete_future`
+    :return: `None`
+    """
+    with lock:
+        if t.isSubmitted():
+            try:
+                t.cancel()
+            except usb1.USBError:
+                pass
+
+
+def _resolve_future(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _transfer_error(status):
+    """
+    Create the `adbpy` exception for the given failed transfer status.
+
+    :param status: Status of a `libusb` transfer
+    :return: A :class:`~adbpy.transport.sync.usb.USBError` instance
+    """
+    if status == usb1.TRANSFER_NO_DEVICE:
+        return sync_usb.USBDeviceNotFound('Device has been disconnected')
+    if status == usb1.TRANSFER_TIMED_OUT:
+        return transport.TransportTimeoutError('Exceeded timeout')
+    if status == usb1.TRANSFER_CANCELLED:
+        return sync_usb.USBError('Transfer cancelled')
+    return sync_usb.USBError('Transfer failed with status {}'.format(status))
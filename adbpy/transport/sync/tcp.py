@@ -8,16 +8,18 @@
 import collections
 import contextlib
 import logging
+import select
 import socket
 
 from adbpy import transport
+from adbpy.transport import trace
 
 
 __all__ = ['Context', 'Transport']
 
 
 LOGGER = logging.getLogger(__name__)
-WIRE_LOGGER = LOGGER.getChild('wire')
+TRACER = trace.Tracer(LOGGER)
 
 
 #: Transport context object returned by :meth:`~adbpy.transport.sync.tcp.Transport.connect`.
@@ -102,6 +104,37 @@ class Transport(transport.Transport):
         """
         return self._read_bytes_from_socket(context.sock, num_bytes, timeout)
 
+    @transport.requires_context(Context)
+    @transport.rethrow_timeout_exception(socket.timeout, transport.TransportReceiveTimeout)
+    def recv_into(self, context, buffer, timeout=transport.DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive data from the synchronous (blocking) TCP socket managed by the given context object into
+        the given buffer.
+
+        :param context: A :class:`~adbpy.transport.sync.tcp.Context` object whose socket we want to receive data from
+        :param buffer: Writable buffer, e.g. :class:`~bytearray` or :class:`~memoryview`, to read into
+        :param timeout: Optional timeout in seconds to use when receiving from the socket
+        :return: A :class:`~int` number of bytes read into the buffer
+        """
+        return self._read_bytes_into_buffer_from_socket(context.sock, buffer, timeout)
+
+    @transport.requires_context(Context)
+    def probe(self, context):
+        """
+        Check to see if the TCP socket managed by the given context object is still open and idle without blocking.
+
+        A socket is not usable if the remote end closed it or if it has unread data, since an idle connection is
+        not expected to receive anything.
+
+        :param context: A :class:`~adbpy.transport.sync.tcp.Context` object whose socket we want to check
+        :return: A :class:`bool` indicating if the socket is usable
+        """
+        try:
+            readable, _, _ = select.select([context.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
     def _write_bytes_to_socket(self, sock, data, timeout):
         """
         Write a buffer of bytes to the given socket.
@@ -111,11 +144,10 @@ class Transport(transport.Transport):
         :param timeout: Timeout in seconds to set on the socket before writing
         :return: `None`
         """
-        LOGGER.debug('Writing data to {}:{}, timeout={}, length={}'.format(self._host, self._port,
-                                                                           timeout, len(data)))
-
-        if WIRE_LOGGER.isEnabledFor(logging.DEBUG):
-            WIRE_LOGGER.debug('>>> {}'.format(data))
+        if TRACER.debug:
+            LOGGER.debug('Writing data to %s:%s, timeout=%s, length=%s', self._host, self._port, timeout, len(data))
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.sent, sock.fileno(), data)
 
         with socket_timeout_scope(sock, timeout):
             return sock.sendall(data)
@@ -129,17 +161,38 @@ class Transport(transport.Transport):
         :param timeout: Timeout in seconds to set on the socket before reading
         :return: A :class:`~bytes` buffer read from the socket
         """
-        LOGGER.debug('Reading data from {}:{}, timeout={}, length={}'.format(self._host, self._port,
-                                                                             timeout, num_bytes))
+        if TRACER.debug:
+            LOGGER.debug('Reading data from %s:%s, timeout=%s, length=%s', self._host, self._port, timeout, num_bytes)
 
         with socket_timeout_scope(sock, timeout):
             data = sock.recv(num_bytes)
 
-        if WIRE_LOGGER.isEnabledFor(logging.DEBUG):
-            WIRE_LOGGER.debug('<<< {}'.format(data))
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.received, sock.fileno(), data)
 
         return data
 
+    def _read_bytes_into_buffer_from_socket(self, sock, buffer, timeout):
+        """
+        Read bytes from the given socket directly into a buffer.
+
+        :param sock: A :class:`~socket.socket` instance to read bytes from
+        :param buffer: Writable buffer to read into; at most `len(buffer)` bytes are read
+        :param timeout: Timeout in seconds to set on the socket before reading
+        :return: A :class:`~int` number of bytes read into the buffer
+        """
+        if TRACER.debug:
+            LOGGER.debug('Reading data from %s:%s, timeout=%s, length=%s', self._host, self._port, timeout,
+                         len(buffer))
+
+        with socket_timeout_scope(sock, timeout):
+            num_bytes = sock.recv_into(buffer)
+
+        if trace.CAPTURE is not None:
+            trace.capture(trace.Direction.received, sock.fileno(), memoryview(buffer)[:num_bytes])
+
+        return num_bytes
+
     def _open_socket(self, host, port, sock=None, timeout=None):
         """
         Create a socket connection to the given host/port.
@@ -154,7 +207,7 @@ class Transport(transport.Transport):
             LOGGER.debug('Reusing existing socket')
             return sock
 
-        LOGGER.debug('Opening socket to {}:{}'.format(host, port))
+        LOGGER.debug('Opening socket to %s:%s', host, port)
         return socket.create_connection((host, port), timeout)
 
     def _close_socket(self, sock):
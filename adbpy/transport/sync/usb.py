@@ -5,18 +5,22 @@
     Contains functionality for a synchronous (blocking) USB transport powered by `libusb`.
 """
 
+import collections
 import functools
 import logging
+import threading
 import usb1
 
 from adbpy import iterutil, transport
+from adbpy.transport import trace
 
 
-__all__ = ['Context', 'Transport']
+__all__ = ['Context', 'Transport', 'DeviceRegistry', 'RegisteredDevice', 'EventThread', 'SharedContext',
+           'HandlePool', 'shared_context']
 
 
 LOGGER = logging.getLogger(__name__)
-WIRE_LOGGER = LOGGER.getChild('wire')
+TRACER = trace.Tracer(LOGGER)
 
 
 #: Default timeout in milliseconds for a USB transport connect attempt.
@@ -34,6 +38,14 @@ DEFAULT_RECV_TIMEOUT_MS = 0
 #: USB interface endpoint address flag value indicating it is used for reading.
 ENDPOINT_DIRECTION_IN = 0x80
 
+#: USB interface class, subclass and protocol of ADB interfaces.
+ADB_CLASS = 0xff
+ADB_SUBCLASS = 0x42
+ADB_PROTOCOL = 0x01
+
+#: Timeout in seconds the event thread waits for `libusb` events before checking if it should stop.
+EVENT_TIMEOUT = 0.1
+
 
 class USBError(transport.TransportError):
     """
@@ -72,10 +84,13 @@ class Context:
     """
 
     __slots__ = ['ctx', 'device', 'settings', 'read_endpoint', 'read_endpoint_address', 'write_endpoint',
-                 'write_endpoint_address', 'handle', 'interface']
+                 'write_endpoint_address', 'handle', 'interface', 'owns_ctx', 'serial', 'pool']
 
-    def __init__(self, ctx, device, settings, read_endpoint, write_endpoint, handle, interface):
+    def __init__(self, ctx, device, settings, read_endpoint, write_endpoint, handle, interface, owns_ctx=True):
         self.ctx = ctx
+        self.owns_ctx = owns_ctx
+        self.serial = None
+        self.pool = None
         self.device = device
         self.settings = settings
         self.read_endpoint = read_endpoint
@@ -120,6 +135,467 @@ def libusb_exception_handler(func):
     return decorator
 
 
+#: Device interface indexed by a :class:`~adbpy.transport.sync.usb.DeviceRegistry`.
+RegisteredDevice = collections.namedtuple('RegisteredDevice', 'serial vid pid usb_class usb_subclass usb_protocol '
+                                                              'device settings')
+
+
+class EventThread(threading.Thread):
+    """
+    Thread that handles `libusb` events, which invokes transfer and hotplug callbacks, until stopped.
+    """
+
+    def __init__(self, ctx):
+        super().__init__(name='{}({})'.format(self.__class__.__name__, id(ctx)), daemon=True)
+        self._ctx = ctx
+        self._running = True
+
+    def run(self):
+        while self._running:
+            try:
+                self._ctx.handleEventsTimeout(EVENT_TIMEOUT)
+            except usb1.USBError as e:
+                if e.value != usb1.ERROR_INTERRUPTED:
+                    LOGGER.exception('Error handling USB events')
+
+    def stop(self):
+        """
+        Stop handling events and wait for the thread to exit.
+
+        :return: `None`
+        """
+        self._running = False
+        self.join()
+
+
+class DeviceRegistry:
+    """
+    Index of the attached USB interfaces matching a class/subclass/protocol, ADB by default, that is kept current by
+    `libusb` hotplug callbacks so finding a device does not enumerate the bus.
+
+    Hotplug callbacks cannot perform synchronous I/O, so reading the serial number of an arriving device, which is a
+    control transfer, is deferred until the next lookup and then done once per device. That transfer is completed by
+    the thread handling events, which also runs the hotplug callbacks, so it is never done while holding the registry
+    lock.
+
+    When the platform does not support hotplug, the bus is enumerated once on start and again with :meth:`refresh`.
+    """
+
+    def __init__(self, ctx, usb_class=ADB_CLASS, usb_subclass=ADB_SUBCLASS, usb_protocol=ADB_PROTOCOL):
+        self.ctx = ctx
+        self._usb_class = usb_class
+        self._usb_subclass = usb_subclass
+        self._usb_protocol = usb_protocol
+        self._lock = threading.Lock()
+        self._arrived = collections.OrderedDict()
+        self._reading = set()
+        self._devices = collections.OrderedDict()
+        self._by_serial = {}
+        self._hotplug_handle = None
+        self._events = None
+
+    def __repr__(self):
+        return '<{}(devices={})>'.format(self.__class__.__name__, len(self._devices))
+
+    def __len__(self):
+        return len(self.devices)
+
+    @property
+    def devices(self):
+        """
+        Return a list of all :class:`~adbpy.transport.sync.usb.RegisteredDevice` instances.
+        """
+        self._register_arrived()
+        with self._lock:
+            return list(self._devices.values())
+
+    @libusb_exception_handler
+    def start(self, handle_events=True):
+        """
+        Index the attached devices and register for hotplug events when supported.
+
+        Hotplug callbacks are invoked while `libusb` events are handled. Unless `handle_events` is `False`, a
+        :class:`~adbpy.transport.sync.usb.EventThread` is started to do so.
+
+        :param handle_events: Start a thread to handle `libusb` events; default: `True`
+        :return: `None`
+        """
+        if not usb1.hasCapability(usb1.CAP_HAS_HOTPLUG):
+            LOGGER.debug('USB hotplug not supported; enumerating devices once')
+            self.refresh()
+            return
+
+        self._hotplug_handle = self.ctx.hotplugRegisterCallback(self._on_hotplug, flags=usb1.HOTPLUG_ENUMERATE)
+        if handle_events:
+            self._events = EventThread(self.ctx)
+            self._events.start()
+
+    @libusb_exception_handler
+    def stop(self):
+        """
+        Unregister hotplug callbacks and stop handling events.
+
+        :return: `None`
+        """
+        if self._hotplug_handle is not None:
+            self.ctx.hotplugDeregisterCallback(self._hotplug_handle)
+            self._hotplug_handle = None
+        if self._events is not None:
+            self._events.stop()
+            self._events = None
+
+    @libusb_exception_handler
+    def refresh(self):
+        """
+        Rebuild the index by enumerating all attached devices.
+
+        :return: `None`
+        """
+        with self._lock:
+            self._arrived.clear()
+            self._reading.clear()
+            self._devices.clear()
+            self._by_serial.clear()
+            for device in self.ctx.getDeviceList(skip_on_error=True):
+                self._arrived[_device_key(device)] = device
+
+    def find(self, serial=None, vid=None, pid=None, usb_class=None, usb_subclass=None, usb_protocol=None):
+        """
+        Find the first indexed device that matches the given filters.
+
+        A lookup by serial is a single dictionary lookup.
+
+        :param serial: Serial number of local USB device we want
+        :param vid: Vendor ID of USB device we want
+        :param pid: Product ID of USB device we want
+        :param usb_class: Specific class of local USB device we want
+        :param usb_subclass: Specific subclass of USB device we want
+        :param usb_protocol: Specific protocol of USB device we want
+        :return: A :class:`~adbpy.transport.sync.usb.RegisteredDevice` instance
+        """
+        def _is_match(entry):
+            return all((not vid or entry.vid == vid,
+                        not pid or entry.pid == pid,
+                        not usb_class or entry.usb_class == usb_class,
+                        not usb_subclass or entry.usb_subclass == usb_subclass,
+                        not usb_protocol or entry.usb_protocol == usb_protocol))
+
+        self._register_arrived()
+        with self._lock:
+            if serial:
+                candidates = self._by_serial.get(serial, ())
+            else:
+                candidates = self._devices.values()
+            entry = next((entry for entry in candidates if _is_match(entry)), None)
+
+        if entry is None:
+            filter_str = _usb_filter_str(serial, vid, pid, usb_class, usb_subclass, usb_protocol)
+            raise USBDeviceNotFound('No matching device for filter {}'.format(filter_str))
+        return entry
+
+    def _on_hotplug(self, ctx, device, event):
+        """
+        Callback invoked by `libusb` when a device arrives or leaves.
+
+        :param ctx: A :class:`~usb1.USBContext` instance
+        :param device: A :class:`~usb1.USBDevice` instance
+        :param event: Hotplug event type
+        :return: `False` to stay registered
+        """
+        key = _device_key(device)
+        with self._lock:
+            if event == usb1.HOTPLUG_EVENT_DEVICE_ARRIVED:
+                self._arrived[key] = device
+            else:
+                self._arrived.pop(key, None)
+                self._reading.discard(key)
+                self._unregister(key)
+        return False
+
+    def _register_arrived(self):
+        """
+        Index the interfaces of all devices that arrived since the last lookup. The registry lock must not be held.
+
+        Descriptors are read without the lock; devices that leave in the meantime are not indexed.
+
+        :return: `None`
+        """
+        while True:
+            with self._lock:
+                if not self._arrived:
+                    return
+                arrived = list(self._arrived.items())
+                self._arrived.clear()
+                self._reading.update(key for key, _ in arrived)
+
+            read = []
+            for key, device in arrived:
+                try:
+                    read.append((key, self._entries(device)))
+                except usb1.USBError as e:
+                    LOGGER.debug('Skipping USB device %s: %s', key, e)
+                    read.append((key, []))
+
+            with self._lock:
+                for key, entries in read:
+                    if key not in self._reading:
+                        continue
+                    self._reading.discard(key)
+                    self._unregister(key)
+                    if entries:
+                        self._devices[key] = entries[0]
+                        for entry in entries:
+                            self._by_serial.setdefault(entry.serial, []).append(entry)
+
+    def _unregister(self, key):
+        """
+        Remove the device with the given key from the index. The registry lock must be held.
+
+        :param key: Key of the device, See: :func:`~adbpy.transport.sync.usb._device_key`
+        :return: `None`
+        """
+        removed = self._devices.pop(key, None)
+        if removed is None:
+            return
+        entries = [entry for entry in self._by_serial.get(removed.serial, ()) if _device_key(entry.device) != key]
+        if entries:
+            self._by_serial[removed.serial] = entries
+        else:
+            self._by_serial.pop(removed.serial, None)
+
+    def _entries(self, device):
+        """
+        Create index entries for every matching interface setting of the given device.
+
+        :param device: A :class:`~usb1.USBDevice` instance
+        :return: A :class:`list` of :class:`~adbpy.transport.sync.usb.RegisteredDevice` instances
+        """
+        settings = [setting for setting in device.iterSettings()
+                    if (not self._usb_class or setting.getClass() == self._usb_class) and
+                    (not self._usb_subclass or setting.getSubClass() == self._usb_subclass) and
+                    (not self._usb_protocol or setting.getProtocol() == self._usb_protocol)]
+        if not settings:
+            return []
+
+        serial = device.getSerialNumber()
+        return [RegisteredDevice(serial, device.getVendorID(), device.getProductID(), setting.getClass(),
+                                 setting.getSubClass(), setting.getProtocol(), device, setting)
+                for setting in settings]
+
+
+class SharedContext:
+    """
+    Reference counted :class:`~usb1.USBContext` that is opened on first use and exited once the last user
+    releases it.
+
+    Use :func:`~adbpy.transport.sync.usb.shared_context` to get the process-wide instance.
+
+    >>> with shared_context() as ctx:
+    ...     registry = DeviceRegistry(ctx)
+    """
+
+    def __init__(self):
+        self._ctx = None
+        self._refs = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{}(refs={})>'.format(self.__class__.__name__, self._refs)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @libusb_exception_handler
+    def acquire(self):
+        """
+        Open the context if needed and add a reference to it.
+
+        :return: A :class:`~usb1.USBContext` instance
+        """
+        with self._lock:
+            if self._ctx is None:
+                self._ctx = _open_context()
+            self._refs += 1
+            return self._ctx
+
+    @libusb_exception_handler
+    def release(self):
+        """
+        Remove a reference to the context, exiting it when none remain.
+
+        :return: `None`
+        """
+        with self._lock:
+            if self._refs == 0:
+                return
+            self._refs -= 1
+            if self._refs == 0:
+                ctx, self._ctx = self._ctx, None
+                _close_context(ctx)
+
+
+#: Process-wide shared context, See: :func:`~adbpy.transport.sync.usb.shared_context`.
+_shared_context = SharedContext()
+
+
+def shared_context():
+    """
+    Get the process-wide :class:`~adbpy.transport.sync.usb.SharedContext`.
+
+    :return: A :class:`~adbpy.transport.sync.usb.SharedContext` instance
+    """
+    return _shared_context
+
+
+class HandlePool:
+    """
+    Pool of opened device handles with their interface claimed, keyed by device serial number.
+
+    Disconnecting a transport connected through the pool returns the handle to the pool with its interface still
+    claimed, so reconnecting to the same device skips opening it, detaching kernel drivers and claiming the
+    interface. Handles stay claimed until :meth:`close` or :meth:`discard`.
+
+    Devices are found through the given :class:`~adbpy.transport.sync.usb.DeviceRegistry`, or by enumerating the
+    bus of the given context otherwise. Without either, the process-wide shared context is used.
+    """
+
+    def __init__(self, ctx=None, registry=None):
+        self._registry = registry
+        self._shared = ctx is None and registry is None
+        self.ctx = registry.ctx if registry is not None else ctx or shared_context().acquire()
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._in_use = {}
+
+    def __repr__(self):
+        return '<{}(idle={}, in_use={})>'.format(self.__class__.__name__, len(self._idle), len(self._in_use))
+
+    def acquire(self, serial=None, vid=None, pid=None, usb_class=None, usb_subclass=None, usb_protocol=None):
+        """
+        Take the claimed handle of the first device matching the given filters, opening and claiming it if the pool
+        does not have one yet.
+
+        :param serial: Serial number of local USB device we want
+        :param vid: Vendor ID of USB device we want
+        :param pid: Product ID of USB device we want
+        :param usb_class: Specific class of local USB device we want
+        :param usb_subclass: Specific subclass of USB device we want
+        :param usb_protocol: Specific protocol of USB device we want
+        :return: A :class:`~adbpy.transport.sync.usb.Context` instance
+        """
+        if serial:
+            with self._lock:
+                context = self._idle.pop(serial, None)
+                if context is not None:
+                    self._in_use[serial] = context
+            if context is not None:
+                if self._is_attached(serial):
+                    return context
+                self._discard_quietly(context)
+
+        if self._registry is not None:
+            entry = self._registry.find(serial, vid, pid, usb_class, usb_subclass, usb_protocol)
+            device, settings, serial = entry.device, entry.settings, entry.serial
+        else:
+            device, settings = _find_device_by_serial_vid_pid(self.ctx, serial, vid, pid,
+                                                              usb_class, usb_subclass, usb_protocol)
+            serial = device.getSerialNumber()
+
+        # Reserve the serial so the device is opened and claimed without holding the lock.
+        with self._lock:
+            if serial in self._in_use:
+                raise USBDeviceAccessDenied('Device {} is already in use'.format(serial))
+            context = self._idle.pop(serial, None)
+            self._in_use[serial] = context
+        if context is not None:
+            return context
+
+        try:
+            context = _claim_device(self.ctx, device, settings, owns_ctx=False)
+        except BaseException:
+            with self._lock:
+                self._in_use.pop(serial, None)
+            raise
+        context.serial = serial
+        context.pool = self
+        with self._lock:
+            self._in_use[serial] = context
+        return context
+
+    def release(self, context):
+        """
+        Return the given context to the pool, keeping its interface claimed.
+
+        :param context: A :class:`~adbpy.transport.sync.usb.Context` acquired from this pool
+        :return: `None`
+        """
+        with self._lock:
+            if self._in_use.pop(context.serial, None) is context:
+                self._idle[context.serial] = context
+
+    @libusb_exception_handler
+    def discard(self, context):
+        """
+        Release the interface and close the handle of the given context instead of returning it to the pool, e.g.
+        after its device has been disconnected.
+
+        :param context: A :class:`~adbpy.transport.sync.usb.Context` acquired from this pool
+        :return: `None`
+        """
+        with self._lock:
+            self._in_use.pop(context.serial, None)
+            self._idle.pop(context.serial, None)
+        _unclaim_device(context)
+
+    @libusb_exception_handler
+    def close(self):
+        """
+        Release and close every idle handle in the pool, then release the shared context if the pool used it.
+
+        :return: `None`
+        """
+        with self._lock:
+            contexts = list(self._idle.values())
+            self._idle.clear()
+        for context in contexts:
+            _unclaim_device(context)
+        if self._shared:
+            self._shared = False
+            shared_context().release()
+
+    def _discard_quietly(self, context):
+        """
+        Release the interface and close the handle of a context taken from the pool whose device is gone.
+
+        :param context: A :class:`~adbpy.transport.sync.usb.Context` reserved by this pool
+        :return: `None`
+        """
+        with self._lock:
+            self._in_use.pop(context.serial, None)
+        try:
+            _unclaim_device(context)
+        except usb1.USBError:
+            pass
+
+    def _is_attached(self, serial):
+        """
+        Check to see if the device with the given serial is still attached, as far as the registry knows.
+
+        :param serial: Device serial number
+        :return: A :class:`bool`; always `True` without a registry
+        """
+        if self._registry is None:
+            return True
+        try:
+            self._registry.find(serial)
+        except USBDeviceNotFound:
+            return False
+        return True
+
+
 class Transport(transport.Transport):
     """
     Class for interacting with a synchronous (blocking) USB device.
@@ -139,40 +615,41 @@ class Transport(transport.Transport):
 
     @transport.rethrow_timeout_exception(transport.TransportTimeoutError, transport.TransportConnectTimeout)
     @libusb_exception_handler
-    def connect(self, libusb_ctx=None, timeout=DEFAULT_CONNECT_TIMEOUT_MS):
+    def connect(self, libusb_ctx=None, timeout=DEFAULT_CONNECT_TIMEOUT_MS, registry=None, pool=None):
         """
         Connect to a USB device at the defined serial/vid/pid.
 
         :param libusb_ctx: Optional :class:`~usb1.USBContext` object to re-use
         :param timeout: Optional timeout in milliseconds to use when connecting to the device
+        :param registry: Optional :class:`~adbpy.transport.sync.usb.DeviceRegistry` to find the device in instead of
+            enumerating all devices; its context is used
+        :param pool: Optional :class:`~adbpy.transport.sync.usb.HandlePool` to take an already claimed device handle
+            from; the device is returned to it on disconnect
         :return: A :class:`~adbpy.transport.sync.usb.Context` instance used to communicate with a USB device
         """
-        # Create or re-use a libusb USBContext for every separate connection. This should
-        # work just fine and allow us to configure them independently.
-        ctx = _open_context(libusb_ctx)
-
-        # Grab the first device based on the optional serial/vid/pid criteria. If no filters are given, this will
-        # yield back the first USB device of the supported class/subclass/protocol. If none are found, an exception is
-        # thrown.
-        device, settings = _find_device_by_serial_vid_pid(ctx, self._serial, self._vid, self._pid,
-                                                          self._usb_class, self._usb_subclass, self._usb_protocol)
-
-        # Grab the first read/write endpoints for the device we're using. These are used for future read/write calls.
-        read_endpoint = _find_device_read_endpoint(settings)
-        write_endpoint = _find_device_write_endpoint(settings)
-
-        # Open a new handle and connect/claim our target interface. This will hold it for libusb so it won't
-        # be accessible to other consumers until we release it.
-        handle, interface = _open_device_handle(device, settings)
-
-        # Detach existing kernel driver if it happens to be there.
-        _detach_kernel_interface(handle, interface)
-
-        # Claim the device interface. Doing so means this device will not be usable from other USB clients,
-        # such as other command-line tools.
-        _claim_interface(handle, interface)
-
-        return Context(ctx, device, settings, read_endpoint, write_endpoint, handle, interface)
+        if pool is not None:
+            return pool.acquire(self._serial, self._vid, self._pid,
+                                self._usb_class, self._usb_subclass, self._usb_protocol)
+
+        if registry is not None:
+            # Indexed devices belong to the context of the registry, so it must be used.
+            ctx = registry.ctx
+            entry = registry.find(self._serial, self._vid, self._pid,
+                                  self._usb_class, self._usb_subclass, self._usb_protocol)
+            device, settings = entry.device, entry.settings
+        else:
+            # Create or re-use a libusb USBContext for every separate connection. This should
+            # work just fine and allow us to configure them independently.
+            ctx = _open_context(libusb_ctx)
+
+            # Grab the first device based on the optional serial/vid/pid criteria. If no filters are given, this will
+            # yield back the first USB device of the supported class/subclass/protocol. If none are found, an
+            # exception is thrown.
+            device, settings = _find_device_by_serial_vid_pid(ctx, self._serial, self._vid, self._pid,
+                                                              self._usb_class, self._usb_subclass,
+                                                              self._usb_protocol)
+
+        return _claim_device(ctx, device, settings, owns_ctx=registry is None and libusb_ctx is None)
 
     @transport.requires_context(Context)
     @requires_handle
@@ -186,9 +663,14 @@ class Transport(transport.Transport):
         :param timeout: Optional timeout in milliseconds to use when disconnecting from the device
         :return: `None`
         """
+        if context.pool is not None:
+            context.pool.release(context)
+            return
+
         _release_interface(context.handle, context.interface)
         _close_handle(context.handle)
-        _close_context(context.ctx)
+        if context.owns_ctx:
+            _close_context(context.ctx)
 
     @transport.requires_context(Context)
     @requires_handle
@@ -222,6 +704,23 @@ class Transport(transport.Transport):
         endpoint_address = context.read_endpoint_address
         return _read_bytes_from_endpoint_address(context.handle, endpoint_address, num_bytes, timeout)
 
+    @transport.requires_context(Context)
+    @requires_handle
+    @transport.rethrow_timeout_exception(transport.TransportTimeoutError, transport.TransportReceiveTimeout)
+    @libusb_exception_handler
+    def recv_into(self, context, buffer, timeout=DEFAULT_RECV_TIMEOUT_MS):
+        """
+        Receive data from the USB device managed by the given context object into the given buffer in a
+        synchronous (blocking) call.
+
+        :param context: A :class:`~adbpy.transport.sync.usb.Context` object whose device we want to receive data from
+        :param buffer: Writable buffer, e.g. :class:`~bytearray` or :class:`~memoryview`, to read into
+        :param timeout: Optional timeout in milliseconds to use when receiving from the socket
+        :return: A :class:`~int` number of bytes read into the buffer
+        """
+        endpoint_address = context.read_endpoint_address
+        return _read_bytes_into_buffer_from_endpoint_address(context.handle, endpoint_address, buffer, timeout)
+
 
 def _usb_filter_str(serial, vid, pid, usb_class, usb_subclass, usb_protocol):
     """
@@ -248,7 +747,7 @@ def _open_context(libusb_ctx=None):
     :return: A :class:`~usb1.USBContext` instance
     """
     ctx = libusb_ctx or usb1.USBContext().open()
-    LOGGER.debug('Using USB context {}'.format(id(ctx)))
+    LOGGER.debug('Using USB context %s', id(ctx))
     return ctx
 
 
@@ -271,18 +770,68 @@ def _find_device_by_serial_vid_pid(ctx, serial, vid, pid, usb_class, usb_subclas
     """
     filter_str = _usb_filter_str(serial, vid, pid, usb_class, usb_subclass, usb_protocol)
     try:
-        LOGGER.debug('Looking for USB device with filter {}').format(filter_str)
+        LOGGER.debug('Looking for USB device with filter %s', filter_str)
         device, settings = iterutil.first(_yield_matching_devices, ctx, serial, vid, pid,
                                           usb_class, usb_subclass, usb_protocol)
     except iterutil.IterableEmpty:
         raise USBDeviceNotFound('No matching device for filter {}'.format(filter_str))
     else:
-        LOGGER.debug('Found USB device with serial={}, vid={}, pid={}'.format(device.getSerialNumber(),
-                                                                              device.getVendorID(),
-                                                                              device.getProductID()))
+        LOGGER.debug('Found USB device with serial=%s, vid=%s, pid=%s', device.getSerialNumber(),
+                     device.getVendorID(), device.getProductID())
         return device, settings
 
 
+def _device_key(device):
+    """
+    Get the key identifying the given device while it is attached, which remains available after it leaves.
+
+    :param device: A :class:`~usb1.USBDevice` instance
+    :return: A :class:`tuple` of bus number and device address
+    """
+    return device.getBusNumber(), device.getDeviceAddress()
+
+
+def _claim_device(ctx, device, settings, owns_ctx=True):
+    """
+    Open the given device, claim its interface and create the transport context used to communicate with it.
+
+    :param ctx: A :class:`~usb1.USBContext` the device belongs to
+    :param device: A :class:`~usb1.USBDevice` to open
+    :param settings: A :class:`~usb1.USBSetting` for the given device
+    :param owns_ctx: Exit the context when the transport disconnects
+    :return: A :class:`~adbpy.transport.sync.usb.Context` instance
+    """
+    # Grab the first read/write endpoints for the device we're using. These are used for future read/write calls.
+    read_endpoint = _find_device_read_endpoint(settings)
+    write_endpoint = _find_device_write_endpoint(settings)
+
+    # Open a new handle and connect/claim our target interface. This will hold it for libusb so it won't
+    # be accessible to other consumers until we release it.
+    handle, interface = _open_device_handle(device, settings)
+
+    # Detach existing kernel driver if it happens to be there.
+    _detach_kernel_interface(handle, interface)
+
+    # Claim the device interface. Doing so means this device will not be usable from other USB clients,
+    # such as other command-line tools.
+    _claim_interface(handle, interface)
+
+    return Context(ctx, device, settings, read_endpoint, write_endpoint, handle, interface, owns_ctx)
+
+
+def _unclaim_device(context):
+    """
+    Release the interface and close the handle of the given transport context.
+
+    :param context: A :class:`~adbpy.transport.sync.usb.Context` instance
+    :return: `None`
+    """
+    try:
+        _release_interface(context.handle, context.interface)
+    finally:
+        _close_handle(context.handle)
+
+
 def _find_device_read_endpoint(settings):
     """
     Find the correct USB endpoint for reading from the device.
@@ -291,7 +840,7 @@ def _find_device_read_endpoint(settings):
     :return: A :class:`~usb1.USBEndpoint` instance that we can read from
     """
     read_endpoint = iterutil.first(_yield_read_endpoints, settings)
-    LOGGER.debug('Found read endpoint at address {}'.format(read_endpoint.getAddress()))
+    LOGGER.debug('Found read endpoint at address %s', read_endpoint.getAddress())
     return read_endpoint
 
 
@@ -303,7 +852,7 @@ def _find_device_write_endpoint(settings):
     :return: A :class:`~usb1.USBEndpoint` instance that we can write to
     """
     write_endpoint = iterutil.first(_yield_write_endpoints, settings)
-    LOGGER.debug('Found write endpoint at address {}'.format(write_endpoint.getAddress()))
+    LOGGER.debug('Found write endpoint at address %s', write_endpoint.getAddress())
     return write_endpoint
 
 
@@ -316,7 +865,7 @@ def _open_device_handle(device, settings):
     :return: A tuple of :class:`usb1.USBDeviceHandle` and :class:`int` representing the interface number
     """
     handle, interface = device.open(), settings.getNumber()
-    LOGGER.debug('Opened USB device handle {} with interface {}'.format(id(handle), interface))
+    LOGGER.debug('Opened USB device handle %s with interface %s', id(handle), interface)
     return handle, interface
 
 
@@ -329,7 +878,7 @@ def _detach_kernel_interface(handle, interface):
     :return: `None`
     """
     if handle.kernelDriverActive(interface):
-        LOGGER.debug('Detaching existing kernel driver for interface {}'.format(interface))
+        LOGGER.debug('Detaching existing kernel driver for interface %s', interface)
         handle.detachKernelDriver(interface)
 
 
@@ -343,7 +892,7 @@ def _claim_interface(handle, interface):
     :param interface: A :class:`int` that represents the interface to claim
     :return: `None`
     """
-    LOGGER.debug('Claiming interface {}'.format(interface))
+    LOGGER.debug('Claiming interface %s', interface)
     handle.claimInterface(interface)
 
 
@@ -357,7 +906,7 @@ def _release_interface(handle, interface):
     :param interface: A :class:`int` that represents the interface to release
     :return: `None`
     """
-    LOGGER.debug('Releasing interface {}'.format(interface))
+    LOGGER.debug('Releasing interface %s', interface)
     handle.releaseInterface(interface)
 
 
@@ -368,7 +917,7 @@ def _close_handle(handle):
     :param handle: A :class:`~usb1.USBDeviceHandle` to close
     :return: `None`
     """
-    LOGGER.debug('Closing USB device handle {}'.format(id(handle)))
+    LOGGER.debug('Closing USB device handle %s', id(handle))
     handle.close()
 
 
@@ -379,7 +928,7 @@ def _close_context(ctx):
     :param ctx: A :class:`~usb1.USBContext` to close
     :return: `None`
     """
-    LOGGER.debug('Exiting USB context {}'.format(id(ctx)))
+    LOGGER.debug('Exiting USB context %s', id(ctx))
     ctx.exit()
 
 
@@ -393,11 +942,11 @@ def _write_bytes_to_endpoint_address(handle, endpoint_address, data, timeout):
     :param timeout: Timeout in milliseconds for the write to complete
     :return: A :class:`~int` that represents the number of bytes actually written to the endpoint
     """
-    LOGGER.debug('Writing data to endpoint_address={}, timeout={}, length={}'.format(endpoint_address,
-                                                                                     timeout, len(data)))
-
-    if WIRE_LOGGER.isEnabledFor(logging.DEBUG):
-        WIRE_LOGGER.debug('>>> {}'.format(data))
+    if TRACER.debug:
+        LOGGER.debug('Writing data to endpoint_address=%s, timeout=%s, length=%s', endpoint_address, timeout,
+                     len(data))
+    if trace.CAPTURE is not None:
+        trace.capture(trace.Direction.sent, id(handle), data)
 
     num_bytes = handle.bulkWrite(endpoint_address, data, timeout)
 
@@ -417,17 +966,37 @@ def _read_bytes_from_endpoint_address(handle, endpoint_address, num_bytes, timeo
     :param timeout: Timeout in milliseconds for the read to complete
     :return: A :class:`~bytes` buffer of data read from the endpoint
     """
-    LOGGER.debug('Reading data from endpoint_address={}, timeout={}, length={}'.format(endpoint_address,
-                                                                                       timeout, num_bytes))
+    if TRACER.debug:
+        LOGGER.debug('Reading data from endpoint_address=%s, timeout=%s, length=%s', endpoint_address, timeout,
+                     num_bytes)
 
     data = handle.bulkRead(endpoint_address, num_bytes, timeout)
 
-    if WIRE_LOGGER.isEnabledFor(logging.DEBUG):
-        WIRE_LOGGER.debug('<<< {}'.format(data))
+    if trace.CAPTURE is not None:
+        trace.capture(trace.Direction.received, id(handle), data)
 
     return data
 
 
+def _read_bytes_into_buffer_from_endpoint_address(handle, endpoint_address, buffer, timeout):
+    """
+    Read bytes from the given USB device endpoint into a buffer.
+
+    `libusb1` only exposes bulk reads that return a new buffer, so the data is copied into the given
+    buffer once.
+
+    :param handle: A :class:`~usb1.USBDeviceHandle` that manages the endpoint
+    :param endpoint_address: Address of the USB endpoint to read from
+    :param buffer: Writable buffer to read into; at most `len(buffer)` bytes are read
+    :param timeout: Timeout in milliseconds for the read to complete
+    :return: A :class:`~int` number of bytes read into the buffer
+    """
+    data = _read_bytes_from_endpoint_address(handle, endpoint_address, len(buffer), timeout)
+    num_bytes = len(data)
+    buffer[:num_bytes] = data
+    return num_bytes
+
+
 def _is_read_endpoint(address):
     """
     Check to see if the given address is a read endpoint.
@@ -496,8 +1065,8 @@ def _yield_matching_devices(ctx, serial, vid, pid, usb_class, usb_subclass, usb_
         Predicate function that returns `True` when a USB device matches all requirements and `False` otherwise.
         """
         serial_match = not serial or device.getSerialNumber() == serial
-        vid_match = not vid or device.getVendorId() == vid
-        pid_match = not pid or device.getProductId() == pid
+        vid_match = not vid or device.getVendorID() == vid
+        pid_match = not pid or device.getProductID() == pid
         usb_class_match = not usb_class or setting.getClass() == usb_class
         usb_subclass_match = not usb_subclass or setting.getSubClass() == usb_subclass
         usb_protocol_match = not usb_protocol or setting.getProtocol() == usb_protocol
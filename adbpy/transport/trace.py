@@ -0,0 +1,258 @@
+"""
+    adbpy.transport.trace
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Contains functionality for tracing the data transports send and receive without slowing down their hot paths.
+
+    Transports log through a :class:`~adbpy.transport.trace.Tracer`, which caches whether debug logging is enabled so
+    the disabled path is a single attribute check, and log messages are formatted lazily by :mod:`logging`. Call
+    :func:`refresh` after changing log levels for transports to pick up the change.
+
+    Payloads are not logged. Instead, every buffer sent or received can be written to a binary capture file in the
+    `pcap` format, with a :class:`~adbpy.transport.trace.WireCapture` started by :func:`start_capture`.
+
+    >>> trace.start_capture('adb.pcap')
+    >>> ...
+    >>> trace.stop_capture()
+"""
+
+import collections
+import enum
+import io
+import logging
+import struct
+import threading
+import time
+
+
+__all__ = ['Tracer', 'WireCapture', 'CaptureRecord', 'Direction', 'start_capture', 'stop_capture', 'capture',
+           'read_capture', 'refresh']
+
+
+#: Magic number of `pcap` files with microsecond timestamps.
+PCAP_MAGIC = 0xa1b2c3d4
+
+#: Link type of captured records: `LINKTYPE_USER0`, reserved for private use.
+PCAP_LINKTYPE = 147
+
+#: Default maximum number of bytes of each buffer stored; enough for a maximum size message and its header.
+DEFAULT_SNAPLEN = 256 * 1024 + 64
+
+#: Header of a `pcap` file: magic, version major/minor, timezone offset, timestamp accuracy, snaplen and link type.
+PCAP_FILE_HEADER = struct.Struct('<IHHiIII')
+
+#: Header of a `pcap` record: timestamp seconds/microseconds, stored length and original length.
+PCAP_RECORD_HEADER = struct.Struct('<IIII')
+
+#: Pseudo-header prepended to each captured buffer: direction and channel, e.g. the socket file descriptor.
+CAPTURE_HEADER = struct.Struct('<B3xQ')
+
+#: Mask applied to channel identifiers to fit the capture header.
+CHANNEL_MASK = 0xffffffffffffffff
+
+#: Capture every transport writes to, See: :func:`~adbpy.transport.trace.start_capture`.
+CAPTURE = None
+
+#: Tracers created by :class:`~adbpy.transport.trace.Tracer`, refreshed together by :func:`refresh`.
+_tracers = []
+
+
+class Direction(enum.IntEnum):
+    """
+    Enumeration for the direction of captured data.
+    """
+
+    sent = 0
+    received = 1
+
+
+#: Record read back from a capture file by :func:`~adbpy.transport.trace.read_capture`.
+CaptureRecord = collections.namedtuple('CaptureRecord', 'timestamp direction channel data original_length')
+
+
+class Tracer:
+    """
+    Caches whether a logger is enabled for debug messages in its `debug` attribute, which is only checked again by
+    :meth:`refresh` or :func:`~adbpy.transport.trace.refresh`.
+
+    >>> if TRACER.debug:
+    ...     LOGGER.debug('Writing data to %s, length=%s', address, len(data))
+
+    :param logger: A :class:`~logging.Logger` instance
+    """
+
+    __slots__ = ['logger', 'debug']
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.refresh()
+        _tracers.append(self)
+
+    def __repr__(self):
+        return '<{}(logger={}, debug={})>'.format(self.__class__.__name__, self.logger.name, self.debug)
+
+    def refresh(self):
+        """
+        Check again if the logger is enabled for debug messages.
+
+        :return: `None`
+        """
+        self.debug = self.logger.isEnabledFor(logging.DEBUG)
+
+
+def refresh():
+    """
+    Check again if the loggers of every tracer are enabled, e.g. right after changing log levels.
+
+    :return: `None`
+    """
+    for tracer in _tracers:
+        tracer.refresh()
+
+
+class WireCapture:
+    """
+    Writes buffers sent and received by transports to a binary `pcap` file.
+
+    Each record holds a :data:`CAPTURE_HEADER` with the direction and channel of the buffer followed by the buffer,
+    truncated to `snaplen` bytes. Records from different threads are written whole, in the order they are captured.
+
+    :param path_or_file: Path of the file to create or a file object opened in binary mode
+    :param snaplen: Maximum number of bytes of each buffer to store
+    """
+
+    def __init__(self, path_or_file, snaplen=DEFAULT_SNAPLEN):
+        if isinstance(path_or_file, str):
+            self._file, self._owns_file = io.open(path_or_file, 'wb'), True
+        else:
+            self._file, self._owns_file = path_or_file, False
+        self.snaplen = snaplen
+        self.records = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        self._file.write(PCAP_FILE_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, snaplen + CAPTURE_HEADER.size, PCAP_LINKTYPE))
+
+    def __repr__(self):
+        return '<{}(file={}, records={})>'.format(self.__class__.__name__, getattr(self._file, 'name', self._file),
+                                                  self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, direction, channel, data):
+        """
+        Write a record of the given buffer.
+
+        :param direction: A :class:`~adbpy.transport.trace.Direction` value
+        :param channel: Integer identifying the connection, e.g. the socket file descriptor
+        :param data: Bytes-like buffer sent or received
+        :return: `None`
+        """
+        timestamp = time.time()
+        stored = memoryview(data)[:self.snaplen]
+        header = CAPTURE_HEADER.pack(direction, channel & CHANNEL_MASK)
+        record = PCAP_RECORD_HEADER.pack(int(timestamp), int(timestamp % 1 * 1000000), len(header) + len(stored),
+                                         len(header) + len(data))
+        with self._lock:
+            if self.closed:
+                return
+            self._file.write(record + header)
+            self._file.write(stored)
+            self.records += 1
+
+    def flush(self):
+        """
+        Flush written records to the file.
+
+        :return: `None`
+        """
+        with self._lock:
+            if not self.closed:
+                self._file.flush()
+
+    def close(self):
+        """
+        Flush written records and close the file if it was opened by the capture.
+
+        :return: `None`
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._owns_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+
+def start_capture(path_or_file, snaplen=DEFAULT_SNAPLEN):
+    """
+    Start capturing every buffer sent and received by every transport, replacing any capture in progress.
+
+    :param path_or_file: Path of the file to create or a file object opened in binary mode
+    :param snaplen: Maximum number of bytes of each buffer to store
+    :return: The started :class:`~adbpy.transport.trace.WireCapture` instance
+    """
+    global CAPTURE
+    stop_capture()
+    CAPTURE = WireCapture(path_or_file, snaplen)
+    return CAPTURE
+
+
+def stop_capture():
+    """
+    Stop the capture in progress, if any, and close it.
+
+    :return: `None`
+    """
+    global CAPTURE
+    wire_capture, CAPTURE = CAPTURE, None
+    if wire_capture is not None:
+        wire_capture.close()
+
+
+def capture(direction, channel, data):
+    """
+    Write the given buffer to the capture in progress, if any.
+
+    Transports check :data:`CAPTURE` before calling this so nothing is called when not capturing.
+
+    :param direction: A :class:`~adbpy.transport.trace.Direction` value
+    :param channel: Integer identifying the connection, e.g. the socket file descriptor
+    :param data: Bytes-like buffer sent or received
+    :return: `None`
+    """
+    wire_capture = CAPTURE
+    if wire_capture is not None:
+        wire_capture.write(direction, channel, data)
+
+
+def read_capture(path_or_file):
+    """
+    Read back the records of a capture file written by :class:`~adbpy.transport.trace.WireCapture`.
+
+    :param path_or_file: Path of the capture file or a file object opened in binary mode
+    :return: Generator of :class:`~adbpy.transport.trace.CaptureRecord` instances
+    """
+    if isinstance(path_or_file, str):
+        with io.open(path_or_file, 'rb') as f:
+            yield from read_capture(f)
+        return
+
+    magic, _, _, _, _, _, linktype = PCAP_FILE_HEADER.unpack(path_or_file.read(PCAP_FILE_HEADER.size))
+    if magic != PCAP_MAGIC or linktype != PCAP_LINKTYPE:
+        raise ValueError('Not a wire capture file: magic={}, linktype={}'.format(hex(magic), linktype))
+
+    while True:
+        header = path_or_file.read(PCAP_RECORD_HEADER.size)
+        if len(header) < PCAP_RECORD_HEADER.size:
+            return
+        seconds, microseconds, stored_length, original_length = PCAP_RECORD_HEADER.unpack(header)
+        record = path_or_file.read(stored_length)
+        direction, channel = CAPTURE_HEADER.unpack_from(record)
+        yield CaptureRecord(seconds + microseconds / 1000000, Direction(direction), channel,
+                            record[CAPTURE_HEADER.size:], original_length - CAPTURE_HEADER.size)
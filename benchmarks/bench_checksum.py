@@ -0,0 +1,37 @@
+"""
+    benchmarks/bench_checksum
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the throughput of each :mod:`~adbpy.message.checksum` backend.
+
+    Usage: PYTHONPATH=. python benchmarks/bench_checksum.py [--json PATH] [--compare PATH]
+"""
+
+import os
+import sys
+
+import harness
+
+from adbpy.message import adb, checksum
+
+
+#: Payload sizes in bytes to measure.
+PAYLOAD_SIZES = (64, 4096, 64 * 1024, adb.MAXDATA)
+
+
+def benchmarks(min_duration=harness.MIN_DURATION):
+    """
+    Measure the throughput of every checksum backend for each payload size.
+
+    :param min_duration: Minimum number of seconds to spend measuring each backend/size pair
+    :return: Generator of :class:`~benchmarks.harness.Result` instances
+    """
+    for size in PAYLOAD_SIZES:
+        data = os.urandom(size)
+        for name, func in checksum.BACKENDS.items():
+            assert func(data) == sum(data) & checksum.CHECKSUM_MASK
+            yield harness.bytes_per_second('checksum', lambda: func(data), size, min_duration, backend=name, size=size)
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(benchmarks))
@@ -0,0 +1,162 @@
+"""
+    benchmarks/bench_connection
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the throughput of synchronous and asynchronous connections over loopback TCP sockets.
+
+    Usage: PYTHONPATH=. python benchmarks/bench_connection.py [--json PATH] [--compare PATH]
+"""
+
+import asyncio
+import contextlib
+import socket
+import sys
+import threading
+
+import harness
+
+from adbpy.connection import async as async_connection
+from adbpy.connection import sync as sync_connection
+from adbpy.message import adb
+from adbpy.transport.async import tcp as async_tcp
+from adbpy.transport.sync import tcp as sync_tcp
+
+
+#: Sizes in bytes of each read or write call to measure.
+CHUNK_SIZES = (adb.MESSAGE_SIZE, 4096, 64 * 1024, adb.MAXDATA)
+
+#: Number of bytes transferred by each measured call.
+TRANSFER_SIZE = 16 * 1024 * 1024
+
+
+def _source(sock):
+    """
+    Write to the given socket until the other end closes it.
+    """
+    data = bytes(adb.MAXDATA)
+    with contextlib.suppress(OSError):
+        while True:
+            sock.sendall(data)
+
+
+def _sink(sock):
+    """
+    Read from the given socket until the other end closes it.
+    """
+    buffer = bytearray(adb.MAXDATA)
+    with contextlib.suppress(OSError):
+        while sock.recv_into(buffer):
+            pass
+
+
+@contextlib.contextmanager
+def peer(target):
+    """
+    Context manager that listens on a loopback port and serves the first client with the given function on a
+    background thread.
+
+    :param target: Function that is called with the accepted socket
+    :return: Port the peer listens on
+    """
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def serve():
+        sock, _ = listener.accept()
+        with sock:
+            target(sock)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    try:
+        yield listener.getsockname()[1]
+    finally:
+        listener.close()
+        thread.join(1)
+
+
+def _read(conn, chunk_size, num_bytes):
+    for _ in range(num_bytes // chunk_size):
+        conn.recv(chunk_size)
+
+
+def _read_into(conn, chunk_size, num_bytes):
+    buffer = bytearray(chunk_size)
+    for _ in range(num_bytes // chunk_size):
+        conn.recv_into(buffer)
+
+
+def _write(conn, chunk_size, num_bytes):
+    data = bytes(chunk_size)
+    for _ in range(num_bytes // chunk_size):
+        conn.send(data)
+
+
+def sync_benchmarks(min_duration):
+    """
+    Measure :class:`~adbpy.connection.sync.Connection` reads and writes for each chunk size.
+    """
+    for name, func, target in (('sync.Connection.recv', _read, _source),
+                               ('sync.Connection.recv_into', _read_into, _source),
+                               ('sync.Connection.send', _write, _sink)):
+        with peer(target) as port:
+            conn = sync_connection.Connection.connect(sync_tcp.Transport('127.0.0.1', port))
+            try:
+                for chunk_size in CHUNK_SIZES:
+                    num_bytes = min(TRANSFER_SIZE, chunk_size * 4096)
+                    yield harness.throughput(name, lambda: func(conn, chunk_size, num_bytes), num_bytes,
+                                             min_duration, chunk_size=chunk_size)
+            finally:
+                conn.disconnect()
+
+
+@asyncio.coroutine
+def _async_read(conn, chunk_size, num_bytes):
+    for _ in range(num_bytes // chunk_size):
+        yield from conn.recv(chunk_size)
+
+
+@asyncio.coroutine
+def _async_write(conn, chunk_size, num_bytes):
+    data = bytes(chunk_size)
+    for _ in range(num_bytes // chunk_size):
+        yield from conn.send(data)
+
+
+def async_benchmarks(min_duration):
+    """
+    Measure :class:`~adbpy.connection.async.Connection` reads and writes for each chunk size.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        for name, func, target in (('async.Connection.recv', _async_read, _source),
+                                   ('async.Connection.send', _async_write, _sink)):
+            with peer(target) as port:
+                conn = loop.run_until_complete(async_connection.Connection.connect(
+                    async_tcp.Transport('127.0.0.1', port), loop=loop))
+                try:
+                    for chunk_size in CHUNK_SIZES:
+                        num_bytes = min(TRANSFER_SIZE, chunk_size * 4096)
+                        yield harness.throughput(
+                            name, lambda: loop.run_until_complete(func(conn, chunk_size, num_bytes)), num_bytes,
+                            min_duration, chunk_size=chunk_size)
+                finally:
+                    loop.run_until_complete(conn.disconnect())
+    finally:
+        loop.close()
+
+
+def benchmarks(min_duration=harness.MIN_DURATION):
+    """
+    Measure synchronous and asynchronous connection throughput.
+
+    :param min_duration: Minimum number of seconds to spend measuring each benchmark
+    :return: Generator of :class:`~benchmarks.harness.Result` instances
+    """
+    yield from sync_benchmarks(min_duration)
+    yield from async_benchmarks(min_duration)
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(benchmarks))
@@ -0,0 +1,134 @@
+"""
+    benchmarks/bench_end_to_end
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures push and shell throughput through the full stack, from the stream manager down to the socket, against a
+    :class:`~adbpy.testing.adbd.FakeAdbd` that discards pushed files and produces shell output as fast as it can.
+
+    Usage: PYTHONPATH=. python benchmarks/bench_end_to_end.py [--json PATH] [--compare PATH]
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+
+import harness
+
+from adbpy.connection import async as async_connection
+from adbpy.connection import sync as sync_connection
+from adbpy.protocol import adb as adb_protocol
+from adbpy.protocol import filesync, shell, stream
+from adbpy.testing import adbd
+from adbpy.transport.async import tcp as async_tcp
+from adbpy.transport.sync import tcp as sync_tcp
+
+
+#: Number of bytes pushed or read from a shell command by each measured call.
+TRANSFER_SIZE = 8 * 1024 * 1024
+
+
+def _wire(sock):
+    """
+    Create a synchronous wire protocol over the given socket and perform the connection handshake.
+    """
+    wire = adb_protocol.WireProtocol(sync_connection.Connection.connect(sync_tcp.Transport('localhost', 0), sock=sock))
+    wire.handshake()
+    return wire
+
+
+@contextlib.contextmanager
+def fake_device():
+    """
+    Context manager that serves a :class:`~adbpy.testing.adbd.FakeAdbd`, which discards pushed files, on a background
+    thread and yields the host end of a socket pair connected to it.
+    """
+    with adbd.background(keep_pushed=False) as device:
+        sock = device.socketpair()
+        try:
+            yield sock
+        finally:
+            sock.close()
+
+
+def _shell_command(num_bytes):
+    return 'source {}'.format(num_bytes)
+
+
+def sync_benchmarks(min_duration):
+    """
+    Measure push and shell throughput through a :class:`~adbpy.protocol.stream.StreamManager`.
+    """
+    data = os.urandom(TRANSFER_SIZE)
+    with fake_device() as sock:
+        manager = stream.StreamManager(_wire(sock))
+        manager.start()
+        with filesync.FileSync.open(manager, timeout=5) as sync:
+            yield harness.throughput('end_to_end.sync.push', lambda: sync.push(data, '/sdcard/bench'), len(data),
+                                     min_duration)
+
+        def run_shell():
+            with shell.Shell.open(manager, _shell_command(TRANSFER_SIZE), v2=False, timeout=5) as sh:
+                assert sum(len(output.data) for output in sh) == TRANSFER_SIZE
+
+        yield harness.throughput('end_to_end.sync.shell', run_shell, TRANSFER_SIZE, min_duration)
+
+
+def async_benchmarks(min_duration):
+    """
+    Measure push and shell throughput through an :class:`~adbpy.protocol.stream.AsyncStreamManager`.
+    """
+    data = os.urandom(TRANSFER_SIZE)
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def start(sock):
+        reader, writer = yield from asyncio.open_connection(sock=sock, loop=loop)
+        conn = yield from async_connection.Connection.connect(async_tcp.Transport('localhost', 0),
+                                                              reader=reader, writer=writer, loop=loop)
+        wire = adb_protocol.AsyncWireProtocol(conn)
+        yield from wire.handshake()
+        manager = stream.AsyncStreamManager(wire, loop=loop)
+        manager.start()
+        return manager
+
+    @asyncio.coroutine
+    def run_shell(manager):
+        sh = yield from shell.AsyncShell.open(manager, _shell_command(TRANSFER_SIZE), v2=False, timeout=5)
+        num_bytes = 0
+        while True:
+            output = yield from sh.read()
+            if output is None:
+                break
+            num_bytes += len(output.data)
+        yield from sh.close()
+        assert num_bytes == TRANSFER_SIZE
+
+    try:
+        with fake_device() as sock:
+            manager = loop.run_until_complete(start(sock))
+            sync = loop.run_until_complete(filesync.AsyncFileSync.open(manager, timeout=5))
+            yield harness.throughput('end_to_end.async.push',
+                                     lambda: loop.run_until_complete(sync.push(data, '/sdcard/bench')), len(data),
+                                     min_duration)
+            loop.run_until_complete(sync.close())
+            yield harness.throughput('end_to_end.async.shell', lambda: loop.run_until_complete(run_shell(manager)),
+                                     TRANSFER_SIZE, min_duration)
+            loop.run_until_complete(manager.stop())
+    finally:
+        loop.close()
+
+
+def benchmarks(min_duration=harness.MIN_DURATION):
+    """
+    Measure synchronous and asynchronous end-to-end throughput.
+
+    :param min_duration: Minimum number of seconds to spend measuring each benchmark
+    :return: Generator of :class:`~benchmarks.harness.Result` instances
+    """
+    yield from sync_benchmarks(min_duration)
+    yield from async_benchmarks(min_duration)
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(benchmarks))
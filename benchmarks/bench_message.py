@@ -0,0 +1,61 @@
+"""
+    benchmarks/bench_message
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the per-message cost of the :mod:`~adbpy.message.adb` codec.
+
+    Usage: PYTHONPATH=. python benchmarks/bench_message.py [--json PATH] [--compare PATH]
+"""
+
+import os
+import sys
+
+import harness
+
+from adbpy.message import adb
+
+
+#: Payload sizes in bytes to measure.
+PAYLOAD_SIZES = (64, 4096, adb.MAXDATA)
+
+#: Number of messages packed or decoded together by the batch benchmarks.
+BATCH_SIZE = 64
+
+
+def benchmarks(min_duration=harness.MIN_DURATION):
+    """
+    Measure packing, unpacking, checksumming and incremental decoding of messages for each payload size.
+
+    :func:`~adbpy.message.adb.to_bytes` only packs the header, so it is measured once rather than per payload size.
+
+    :param min_duration: Minimum number of seconds to spend measuring each benchmark
+    :return: Generator of :class:`~benchmarks.harness.Result` instances
+    """
+    okay = adb.okay(1, 2)
+    header = adb.to_bytes(okay)
+    yield harness.ops_per_second('message.to_bytes', lambda: adb.to_bytes(okay), min_duration)
+    yield harness.ops_per_second('message.from_bytes', lambda: adb.from_bytes(header), min_duration)
+
+    for size in PAYLOAD_SIZES:
+        data = os.urandom(size)
+        msg = adb.write(1, 2, data)
+        yield harness.ops_per_second('message.write', lambda: adb.write(1, 2, data), min_duration, size=size)
+        buffer = bytearray(adb.packed_size(msg))
+        yield harness.ops_per_second('message.pack_into', lambda: adb.pack_into(buffer, 0, msg), min_duration,
+                                     size=size)
+
+        batch = [msg] * BATCH_SIZE
+        yield harness.ops_per_second('message.to_bytes_many', lambda: adb.to_bytes_many(batch), min_duration,
+                                     size=size, batch=BATCH_SIZE)
+        yield harness.bytes_per_second('message._checksum', lambda: adb._checksum(data), size, min_duration,
+                                       size=size)
+
+        for skip_checksum in (False, True):
+            packed = bytes(adb.to_bytes_many(batch))
+            decoder = adb.FrameDecoder(skip_checksum=skip_checksum)
+            yield harness.bytes_per_second('message.FrameDecoder.feed', lambda: list(decoder.feed(packed)),
+                                           len(packed), min_duration, size=size, skip_checksum=skip_checksum)
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(benchmarks))
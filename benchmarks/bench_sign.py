@@ -0,0 +1,74 @@
+"""
+    benchmarks/bench_sign
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the AUTH token signing rate of each :mod:`~adbpy.crypto` signer backend.
+
+    Usage: PYTHONPATH=. python benchmarks/bench_sign.py [--json PATH] [--compare PATH]
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+
+import harness
+import rsa
+
+from pyasn1.codec.der import encoder
+from pyasn1.type import univ
+from rsa import pem
+
+from adbpy import crypto
+
+
+#: Key sizes in bits to measure; `adb` generates 2048-bit keys.
+KEY_SIZES = (1024, 2048)
+
+#: Minimum number of seconds to spend measuring each backend/size pair.
+MIN_DURATION = 0.5
+
+
+def write_pkcs8_key(path, bits):
+    """
+    Generate a new RSA private key and write it to the given path as a PKCS #8 PEM file.
+
+    :param path: Path to write the private key to
+    :param bits: Size of the key in bits
+    :return: `None`
+    """
+    _, private_key = rsa.newkeys(bits)
+
+    algorithm = univ.Sequence()
+    algorithm.setComponentByPosition(0, crypto.RSA_OID)
+    algorithm.setComponentByPosition(1, univ.Null(''))
+
+    private_key_info = univ.Sequence()
+    private_key_info.setComponentByPosition(0, univ.Integer(0))
+    private_key_info.setComponentByPosition(1, algorithm)
+    private_key_info.setComponentByPosition(2, univ.OctetString(private_key.save_pkcs1(format='DER')))
+
+    with open(path, 'wb') as f:
+        f.write(pem.save_pem(encoder.encode(private_key_info), crypto.PKCS8_PRIVATE_KEY_MARKER))
+
+
+def benchmarks(min_duration=MIN_DURATION):
+    """
+    Measure the signing rate of every signer backend for each key size.
+
+    :param min_duration: Minimum number of seconds to spend measuring each backend/size pair
+    :return: Generator of :class:`~benchmarks.harness.Result` instances
+    """
+    token = hashlib.sha1(os.urandom(20)).digest()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for bits in KEY_SIZES:
+            path = os.path.join(tmpdir, 'adbkey{}'.format(bits))
+            write_pkcs8_key(path, bits)
+            for name, signer in crypto.SIGNERS.items():
+                private_key = signer.load_private_key(path)
+                yield harness.ops_per_second('sign', lambda: signer.sign(private_key, token),
+                                             max(min_duration, MIN_DURATION), backend=name, bits=bits)
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(benchmarks))
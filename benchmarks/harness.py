@@ -0,0 +1,222 @@
+"""
+    benchmarks/harness
+    ~~~~~~~~~~~~~~~~~~
+
+    Contains functionality shared by the benchmark scripts: timing, reporting and comparing results against a
+    baseline so regressions are caught.
+
+    Every benchmark script exposes a `benchmarks(min_duration)` generator that yields
+    :class:`~benchmarks.harness.Result` instances and calls :func:`main` when run directly. Results are written as
+    JSON with `--json` and compared against a previous JSON file with `--compare`.
+"""
+
+import argparse
+import collections
+import json
+import platform
+import sys
+import time
+import timeit
+
+import adbpy
+
+
+#: Default minimum number of seconds to spend measuring each benchmark.
+MIN_DURATION = 0.2
+
+#: Default relative slowdown, compared to a baseline, reported as a regression. Every result is a rate, so lower
+#: values are slower.
+REGRESSION_THRESHOLD = 0.1
+
+
+class Result(collections.namedtuple('Result', 'name params unit value')):
+    """
+    Measurement of a single benchmark. `params` is a :class:`dict` of the parameters measured, e.g. the payload size.
+    """
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """
+        Return the string that identifies the benchmark and its parameters across runs.
+        """
+        params = ','.join('{}={}'.format(k, v) for k, v in sorted(self.params.items()))
+        return '{}[{}]'.format(self.name, params) if params else self.name
+
+
+def measure(func, min_duration=MIN_DURATION):
+    """
+    Measure how long the given function takes, calling it as many times as needed to run for at least
+    `min_duration` seconds and keeping the best of three repeats.
+
+    :param func: Function to measure
+    :param min_duration: Minimum number of seconds to spend measuring
+    :return: A :class:`tuple` of the number of calls and the elapsed seconds
+    """
+    timer = timeit.Timer(func)
+    number, elapsed = 1, 0.0
+    while elapsed < min_duration:
+        number *= 2
+        elapsed = min(timer.repeat(repeat=3, number=number))
+    return number, elapsed
+
+
+def ops_per_second(name, func, min_duration=MIN_DURATION, **params):
+    """
+    Measure the rate at which the given function can be called.
+
+    :param name: Name of the benchmark
+    :param func: Function to measure
+    :param min_duration: Minimum number of seconds to spend measuring
+    :param params: Parameters of the benchmark
+    :return: A :class:`~benchmarks.harness.Result` instance
+    """
+    number, elapsed = measure(func, min_duration)
+    return Result(name, params, 'ops/s', number / elapsed)
+
+
+def bytes_per_second(name, func, num_bytes, min_duration=MIN_DURATION, **params):
+    """
+    Measure the rate at which the given function, which processes the given number of bytes each call, can be called.
+
+    :param name: Name of the benchmark
+    :param func: Function to measure
+    :param num_bytes: Number of bytes each call processes
+    :param min_duration: Minimum number of seconds to spend measuring
+    :param params: Parameters of the benchmark
+    :return: A :class:`~benchmarks.harness.Result` instance
+    """
+    number, elapsed = measure(func, min_duration)
+    return Result(name, params, 'MB/s', num_bytes * number / elapsed / (1024 * 1024))
+
+
+def throughput(name, func, num_bytes, min_duration=MIN_DURATION, **params):
+    """
+    Measure the throughput of a function that transfers the given number of bytes each call.
+
+    Unlike :func:`bytes_per_second`, the function is called once per repeat until the minimum duration is reached,
+    so it may be expensive and stateful, e.g. a transfer over a socket.
+
+    :param name: Name of the benchmark
+    :param func: Function to measure
+    :param num_bytes: Number of bytes each call transfers
+    :param min_duration: Minimum number of seconds to spend measuring
+    :param params: Parameters of the benchmark
+    :return: A :class:`~benchmarks.harness.Result` instance
+    """
+    rates, started = [], time.perf_counter()
+    while len(rates) < 3 or time.perf_counter() - started < min_duration:
+        start = time.perf_counter()
+        func()
+        rates.append(num_bytes / (time.perf_counter() - start) / (1024 * 1024))
+    return Result(name, params, 'MB/s', max(rates))
+
+
+def environment():
+    """
+    Return a :class:`dict` describing where the benchmarks ran.
+    """
+    return {
+        'adbpy': adbpy.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+
+def to_json(results):
+    """
+    Convert the given results into a JSON serializable :class:`dict`.
+
+    :param results: Iterable of :class:`~benchmarks.harness.Result` instances
+    :return: A :class:`dict` with the environment and results
+    """
+    return {
+        'environment': environment(),
+        'results': [dict(result._asdict(), key=result.key) for result in results]
+    }
+
+
+def load(path):
+    """
+    Load results written by :func:`to_json` from the given path.
+
+    :param path: Path of a JSON results file
+    :return: A :class:`dict` of result key to :class:`~benchmarks.harness.Result`
+    """
+    with open(path) as f:
+        data = json.load(f)
+    return {r['key']: Result(r['name'], r['params'], r['unit'], r['value']) for r in data['results']}
+
+
+def regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Find the results that are slower than their baseline by more than the given threshold.
+
+    :param results: Iterable of :class:`~benchmarks.harness.Result` instances
+    :param baseline: A :class:`dict` of result key to baseline :class:`~benchmarks.harness.Result`
+    :param threshold: Relative slowdown, e.g. 0.1 for 10%, tolerated before reporting a regression
+    :return: A :class:`list` of tuples of result, baseline result and relative change
+    """
+    found = []
+    for result in results:
+        base = baseline.get(result.key)
+        if base is None or base.unit != result.unit or not base.value:
+            continue
+        change = (result.value - base.value) / base.value
+        if change < -threshold:
+            found.append((result, base, change))
+    return found
+
+
+def report(results, out=sys.stdout):
+    """
+    Print the given results as a table.
+
+    :param results: Iterable of :class:`~benchmarks.harness.Result` instances
+    :param out: File to print to
+    :return: `None`
+    """
+    for result in results:
+        print('{:<60}{:>16.1f} {}'.format(result.key, result.value, result.unit), file=out, flush=True)
+
+
+def main(*suites, argv=None):
+    """
+    Run the given benchmark suites from the command line.
+
+    :param suites: Functions that take a minimum duration and yield :class:`~benchmarks.harness.Result` instances
+    :param argv: Optional command line arguments; default: :data:`sys.argv`
+    :return: Exit status, non-zero if any regression was found
+    """
+    parser = argparse.ArgumentParser(description='Run adbpy benchmarks.')
+    parser.add_argument('--json', metavar='PATH', help='write results to PATH as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare results against a JSON file from --json')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='relative slowdown reported as a regression (default: %(default)s)')
+    parser.add_argument('--min-duration', type=float, default=MIN_DURATION,
+                        help='minimum seconds to measure each benchmark (default: %(default)s)')
+    parser.add_argument('--filter', metavar='SUBSTRING', default='', help='only report results whose key matches')
+    args = parser.parse_args(argv)
+
+    results = []
+    for suite in suites:
+        for result in suite(args.min_duration):
+            if args.filter in result.key:
+                report([result])
+                results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(to_json(results), f, indent=2, sort_keys=True)
+
+    if not args.compare:
+        return 0
+
+    found = regressions(results, load(args.compare), args.threshold)
+    for result, base, change in found:
+        print('REGRESSION {}: {:.1f} -> {:.1f} {} ({:+.1%})'.format(result.key, base.value, result.value,
+                                                                    result.unit, change))
+    return 1 if found else 0
@@ -0,0 +1,26 @@
+"""
+    benchmarks/run
+    ~~~~~~~~~~~~~~
+
+    Runs every benchmark script and reports their combined results.
+
+    Usage: PYTHONPATH=. python benchmarks/run.py [--json PATH] [--compare PATH] [--threshold FRACTION]
+        [--filter SUBSTRING]
+"""
+
+import sys
+
+import bench_checksum
+import bench_connection
+import bench_end_to_end
+import bench_message
+import bench_sign
+import harness
+
+
+#: Benchmark scripts in the order they are run.
+SCRIPTS = (bench_message, bench_checksum, bench_connection, bench_end_to_end, bench_sign)
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(*(script.benchmarks for script in SCRIPTS)))
@@ -0,0 +1,93 @@
+"""
+    tests/conftest
+    ~~~~~~~~~~~~~~
+
+    Contains fixtures shared by the tests of protocols served by the fake `adbd`, See: :mod:`~adbpy.testing.adbd`.
+"""
+
+import asyncio
+
+import pytest
+
+from adbpy.connection import async as async_connection
+from adbpy.connection import sync as sync_connection
+from adbpy.protocol import adb as adb_protocol
+from adbpy.protocol import stream
+from adbpy.testing import adbd
+from adbpy.transport.async import tcp as async_tcp
+from adbpy.transport.sync import tcp as sync_tcp
+
+
+def _connect(sock, metrics=None):
+    """
+    Create a synchronous wire protocol over the given socket.
+    """
+    conn = sync_connection.Connection.connect(sync_tcp.Transport('localhost', 0), sock=sock)
+    return adb_protocol.WireProtocol(conn, metrics=metrics)
+
+
+@pytest.fixture(scope='session')
+def connect():
+    """
+    Fixture that returns a function creating a synchronous wire protocol over a socket, with optional metrics.
+    """
+    return _connect
+
+
+@pytest.fixture(scope='function')
+def device_kwargs():
+    """
+    Fixture that returns the keyword args of the fake device; override it to add services or change its settings.
+    """
+    return {}
+
+
+@pytest.fixture(scope='function')
+def device(device_kwargs):
+    """
+    Fixture that yields a listening :class:`~adbpy.testing.adbd.FakeAdbd` running on a background thread.
+    """
+    with adbd.background(**device_kwargs) as device:
+        yield device
+
+
+@pytest.fixture(scope='function')
+def device_socket(device):
+    """
+    Fixture that yields the host end of a socket pair whose other end is served by the fake device.
+    """
+    sock = device.socketpair()
+    yield sock
+    sock.close()
+
+
+@pytest.fixture(scope='function')
+def manager(connect, device_socket):
+    """
+    Fixture that returns a started :class:`~adbpy.protocol.stream.StreamManager` connected to the fake device.
+    """
+    wire = connect(device_socket)
+    wire.handshake()
+    manager = stream.StreamManager(wire)
+    manager.start()
+    return manager
+
+
+@pytest.fixture(scope='function')
+def start_async_manager(device_socket):
+    """
+    Fixture that returns a coroutine function which connects to the fake device on the given event loop, performs
+    the connection handshake and returns a started :class:`~adbpy.protocol.stream.AsyncStreamManager`.
+    """
+    @asyncio.coroutine
+    def start(loop):
+        reader, writer = yield from asyncio.open_connection(sock=device_socket, loop=loop)
+        conn = yield from async_connection.Connection.connect(async_tcp.Transport('localhost', 0),
+                                                              reader=reader, writer=writer, loop=loop)
+        wire = adb_protocol.AsyncWireProtocol(conn)
+        yield from wire.handshake()
+        manager = stream.AsyncStreamManager(wire, loop=loop)
+        manager.start()
+        return manager
+
+    return start
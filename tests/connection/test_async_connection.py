@@ -0,0 +1,109 @@
+"""
+    tests/connection/test_async_connection
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.connection.async` module.
+"""
+
+import asyncio
+
+import pytest
+
+from adbpy import connection
+from adbpy.connection.async import Connection
+from adbpy.transport.async import tcp
+
+
+@pytest.fixture(scope='function')
+def loop():
+    """
+    Fixture that yields a new event loop.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='function')
+def echo_server(loop):
+    """
+    Fixture that yields the port of a local TCP server that echoes back the first `n` bytes it receives
+    and then closes the connection.
+    """
+    @asyncio.coroutine
+    def handle(reader, writer):
+        data = yield from reader.read(1024)
+        writer.write(data)
+        yield from writer.drain()
+        writer.close()
+
+    server = loop.run_until_complete(asyncio.start_server(handle, '127.0.0.1', 0, loop=loop))
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+    loop.run_until_complete(server.wait_closed())
+
+
+def test_connection_recv_returns_exact_number_of_bytes(loop, echo_server):
+    """
+    Assert that :meth:`~adbpy.connection.async.Connection.recv` returns exactly the number of bytes requested.
+    """
+    @asyncio.coroutine
+    def run():
+        conn = yield from Connection.connect(tcp.Transport('127.0.0.1', echo_server), loop=loop)
+        yield from conn.send(b'foobarbaz')
+        first = yield from conn.recv(3)
+        rest = yield from conn.recv(6)
+        yield from conn.disconnect()
+        return first, rest
+
+    first, rest = loop.run_until_complete(run())
+    assert (first, rest) == (b'foo', b'barbaz')
+    assert isinstance(first, bytearray)
+
+
+def test_connection_recv_raises_on_end_of_stream(loop, echo_server):
+    """
+    Assert that :meth:`~adbpy.connection.async.Connection.recv` raises a
+    :class:`~adbpy.connection.ConnectionEndOfStreamError` when the remote end closes before all bytes arrive.
+    """
+    @asyncio.coroutine
+    def run():
+        conn = yield from Connection.connect(tcp.Transport('127.0.0.1', echo_server), loop=loop)
+        yield from conn.send(b'foo')
+        yield from conn.recv(4)
+
+    with pytest.raises(connection.ConnectionEndOfStreamError):
+        loop.run_until_complete(run())
+
+
+def test_connection_recv_raises_on_timeout(loop, echo_server):
+    """
+    Assert that :meth:`~adbpy.connection.async.Connection.recv` raises a
+    :class:`~adbpy.connection.ConnectionTimeoutError` when the transport times out.
+    """
+    @asyncio.coroutine
+    def run():
+        conn = yield from Connection.connect(tcp.Transport('127.0.0.1', echo_server), loop=loop)
+        try:
+            yield from conn.recv(4, timeout=0.01)
+        finally:
+            yield from conn.send(b'foo')
+            yield from conn.disconnect()
+
+    with pytest.raises(connection.ConnectionTimeoutError):
+        loop.run_until_complete(run())
+
+
+def test_connection_requires_active_connection(loop, echo_server):
+    """
+    Assert that :class:`~adbpy.connection.async.Connection` methods raise a
+    :class:`~adbpy.connection.ConnectionRequiredError` once disconnected.
+    """
+    @asyncio.coroutine
+    def run():
+        conn = yield from Connection.connect(tcp.Transport('127.0.0.1', echo_server), loop=loop)
+        yield from conn.disconnect()
+        yield from conn.send(b'foo')
+
+    with pytest.raises(connection.ConnectionRequiredError):
+        loop.run_until_complete(run())
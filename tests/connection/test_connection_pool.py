@@ -0,0 +1,156 @@
+"""
+    tests/connection/test_connection_pool
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.connection.pool` module.
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from adbpy.connection import pool as connection_pool
+
+
+@pytest.fixture(scope='function')
+def server():
+    """
+    Fixture that yields a listening TCP socket whose connections are accepted by the test when needed.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture(scope='function')
+def pool(mocker):
+    """
+    Fixture that yields a :class:`~adbpy.connection.pool.ConnectionPool` with a recording setup function.
+    """
+    pool = connection_pool.ConnectionPool(setup=mocker.Mock(), max_per_host=2, idle_timeout=60)
+    yield pool
+    pool.close()
+
+
+def test_released_connection_is_reused(pool, server):
+    """
+    Assert that a released connection is handed out again without being set up again.
+    """
+    host, port = server.getsockname()
+    with pool.connection(host, port) as first:
+        pass
+    with pool.connection(host, port) as second:
+        pass
+
+    assert second is first
+    assert pool._setup.call_count == 1
+
+
+def test_dead_connection_is_not_reused(pool, server):
+    """
+    Assert that an idle connection closed by the remote end fails the liveness probe and is replaced.
+    """
+    host, port = server.getsockname()
+    first = pool.acquire(host, port)
+    pool.release(first)
+    server.accept()[0].close()
+
+    second = pool.acquire(host, port)
+    assert second is not first
+    assert not first.is_connected
+
+
+def test_connection_with_connect_timeout_is_reused(server, mocker):
+    """
+    Assert that an idle connection opened with a `connect_timeout` passes the liveness probe without waiting for
+    the socket timeout.
+    """
+    pool = connection_pool.ConnectionPool(setup=mocker.Mock(), connect_timeout=5)
+    host, port = server.getsockname()
+    try:
+        first = pool.acquire(host, port)
+        pool.release(first)
+
+        start = time.monotonic()
+        second = pool.acquire(host, port)
+        assert time.monotonic() - start < 1
+        assert second is first
+    finally:
+        pool.close()
+
+
+def test_idle_connections_are_evicted(pool, server):
+    """
+    Assert that :meth:`~adbpy.connection.pool.ConnectionPool.evict_idle` closes connections idle for too long.
+    """
+    host, port = server.getsockname()
+    conn = pool.acquire(host, port)
+    pool.release(conn)
+
+    assert pool.evict_idle() == 0
+    pool.idle_timeout = 0
+    assert pool.evict_idle() == 1
+    assert not conn.is_connected
+
+
+def test_stale_connections_closed_without_lock(pool, server, mocker):
+    """
+    Assert that :meth:`~adbpy.connection.pool.ConnectionPool.acquire` closes stale idle connections after releasing
+    the pool lock.
+    """
+    host, port = server.getsockname()
+    first = pool.acquire(host, port)
+    pool.release(first)
+    pool.idle_timeout = 0
+    unlocked = []
+
+    def try_lock():
+        acquired = pool._condition.acquire(timeout=1)
+        if acquired:
+            pool._condition.release()
+        unlocked.append(acquired)
+
+    def disconnect(conn):
+        other = threading.Thread(target=try_lock)
+        other.start()
+        other.join()
+        conn.disconnect()
+
+    mocker.patch.object(connection_pool, '_disconnect', side_effect=disconnect)
+    second = pool.acquire(host, port)
+
+    assert second is not first
+    assert unlocked == [True]
+    assert not first.is_connected
+
+
+def test_acquire_waits_for_max_per_host(pool, server):
+    """
+    Assert that :meth:`~adbpy.connection.pool.ConnectionPool.acquire` raises a
+    :class:`~adbpy.connection.pool.ConnectionPoolTimeoutError` once `max_per_host` connections are in use.
+    """
+    host, port = server.getsockname()
+    conns = [pool.acquire(host, port) for _ in range(2)]
+
+    with pytest.raises(connection_pool.ConnectionPoolTimeoutError):
+        pool.acquire(host, port, timeout=0.05)
+
+    pool.release(conns[0])
+    assert pool.acquire(host, port, timeout=0.05) is conns[0]
+
+
+def test_connection_discarded_on_error(pool, server):
+    """
+    Assert that a connection is closed instead of pooled when the block using it raises.
+    """
+    host, port = server.getsockname()
+    with pytest.raises(RuntimeError):
+        with pool.connection(host, port) as conn:
+            raise RuntimeError()
+
+    assert not conn.is_connected
+    assert pool.acquire(host, port) is not conn
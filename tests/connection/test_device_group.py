@@ -0,0 +1,216 @@
+"""
+    tests/connection/test_device_group
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.connection.group` module.
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from adbpy.connection import group
+from adbpy.transport.sync import tcp, usb
+
+
+@pytest.fixture(scope='function')
+def server():
+    """
+    Fixture that yields the "host:port" target of a listening TCP socket.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(64)
+    yield '{}:{}'.format(*sock.getsockname())
+    sock.close()
+
+
+@pytest.fixture(scope='function')
+def refused():
+    """
+    Fixture that returns the "host:port" target of a TCP port nothing is listening on.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    target = '{}:{}'.format(*sock.getsockname())
+    sock.close()
+    return target
+
+
+@pytest.fixture(scope='function')
+def loop():
+    """
+    Fixture that yields a new event loop.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+class ConcurrencyTracker:
+    """
+    Operation that sleeps while recording the highest number of concurrent calls.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = 0
+        self.highest = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.highest = max(self.highest, self.active)
+
+    def exit(self):
+        with self.lock:
+            self.active -= 1
+
+    def __call__(self, conn, value):
+        self.enter()
+        try:
+            time.sleep(self.delay)
+            return value
+        finally:
+            self.exit()
+
+    @asyncio.coroutine
+    def coroutine(self, conn, value):
+        self.enter()
+        try:
+            yield from asyncio.sleep(self.delay)
+            return value
+        finally:
+            self.exit()
+
+
+def test_transport_parses_host_port_and_serial_targets():
+    """
+    Assert that "host:port" targets get a TCP transport and anything else a USB transport for that serial.
+    """
+    assert isinstance(group._transport('10.0.0.2:5555', tcp, usb), tcp.Transport)
+    assert isinstance(group._transport('emulator-5554', tcp, usb), usb.Transport)
+    assert isinstance(group._transport('0123456789ABCDEF', tcp, usb), usb.Transport)
+
+
+@pytest.mark.parametrize('target, transport_class, expected', [
+    ('10.0.0.2:5555', tcp.Transport, 2.5),
+    ('0123456789ABCDEF', usb.Transport, 2500)
+], ids=['tcp', 'usb'])
+def test_run_connects_with_timeout_in_transport_units(mocker, target, transport_class, expected):
+    """
+    Assert that the connect timeout, given in seconds, is passed to each transport in the unit it takes.
+    """
+    connect = mocker.patch.object(transport_class, 'connect')
+    mocker.patch.object(transport_class, 'disconnect')
+    devices = group.DeviceGroup([target], connect_timeout=2.5)
+
+    assert devices.map(lambda conn: None)[0].ok
+    connect.assert_called_once_with(timeout=expected)
+
+
+def test_run_returns_results_for_every_target(server, mocker):
+    """
+    Assert that :meth:`~adbpy.connection.group.DeviceGroup.run` runs the setup and operation once per device.
+    """
+    setup = mocker.Mock()
+    devices = group.DeviceGroup([server] * 4, setup=setup)
+
+    outcomes = list(devices.run(lambda conn, value: value * 2, 21))
+
+    assert [outcome.result for outcome in outcomes] == [42] * 4
+    assert all(outcome.ok for outcome in outcomes)
+    assert setup.call_count == 4
+
+
+def test_run_reports_errors_per_target(server, refused):
+    """
+    Assert that connection and operation errors are returned for the affected devices without stopping the rest.
+    """
+    def operation(conn):
+        raise RuntimeError('boom')
+
+    devices = group.DeviceGroup([server, refused])
+    outcomes = {outcome.target: outcome for outcome in devices.run(operation)}
+
+    assert isinstance(outcomes[server].error, RuntimeError)
+    assert isinstance(outcomes[refused].error, OSError)
+
+
+def test_run_bounds_concurrency(server):
+    """
+    Assert that no more than `max_concurrency` devices are operated on at the same time.
+    """
+    tracker = ConcurrencyTracker(0.02)
+    devices = group.DeviceGroup([server] * 8, max_concurrency=3)
+
+    list(devices.run(tracker, None))
+
+    assert tracker.highest == 3
+
+
+def test_run_takes_as_long_as_slowest_device(server):
+    """
+    Assert that devices are operated on in parallel rather than one after the other.
+    """
+    tracker = ConcurrencyTracker(0.2)
+    devices = group.DeviceGroup([server] * 8)
+
+    start = time.monotonic()
+    list(devices.run(tracker, None))
+
+    assert time.monotonic() - start < 0.2 * 4
+
+
+def test_map_returns_results_in_target_order(server, refused):
+    """
+    Assert that :meth:`~adbpy.connection.group.DeviceGroup.map` returns one outcome per target in target order.
+    """
+    devices = group.DeviceGroup([refused, server])
+
+    outcomes = devices.map(lambda conn: 'ok')
+
+    assert [outcome.target for outcome in outcomes] == [refused, server]
+    assert not outcomes[0].ok
+    assert outcomes[1].result == 'ok'
+
+
+def test_async_run_returns_results_for_every_target(loop, server, refused):
+    """
+    Assert that :meth:`~adbpy.connection.group.AsyncDeviceGroup.run` yields an outcome for every device.
+    """
+    tracker = ConcurrencyTracker(0.02)
+    devices = group.AsyncDeviceGroup([server] * 6 + [refused], max_concurrency=2, loop=loop)
+
+    @asyncio.coroutine
+    def run():
+        outcomes = []
+        for future in devices.run(tracker.coroutine, 'ok'):
+            outcome = yield from future
+            outcomes.append(outcome)
+        return outcomes
+
+    outcomes = loop.run_until_complete(run())
+
+    assert sorted(outcome.result for outcome in outcomes if outcome.ok) == ['ok'] * 6
+    assert [outcome.target for outcome in outcomes if not outcome.ok] == [refused]
+    assert tracker.highest == 2
+
+
+def test_async_map_runs_plain_setup_and_coroutine_operation(loop, server, mocker):
+    """
+    Assert that :meth:`~adbpy.connection.group.AsyncDeviceGroup.map` accepts a plain setup function along with a
+    coroutine function operation.
+    """
+    setup = mocker.Mock(return_value=None)
+    tracker = ConcurrencyTracker(0)
+    devices = group.AsyncDeviceGroup([server, server], setup=setup, loop=loop)
+
+    outcomes = loop.run_until_complete(devices.map(tracker.coroutine, 1))
+
+    assert [outcome.result for outcome in outcomes] == [1, 1]
+    assert setup.call_count == 2
@@ -0,0 +1,95 @@
+"""
+    tests/connection/test_sync_connection
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.connection.sync` module.
+"""
+
+import socket
+
+import pytest
+
+from adbpy import connection
+from adbpy.connection.sync import Connection
+from adbpy.transport.sync import tcp
+
+
+@pytest.fixture(scope='function')
+def socket_pair():
+    """
+    Fixture that yields a connected pair of sockets.
+    """
+    local, remote = socket.socketpair()
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+@pytest.fixture(scope='function')
+def conn(socket_pair):
+    """
+    Fixture that yields a :class:`~adbpy.connection.sync.Connection` wrapping the local end of a socket pair.
+    """
+    local, _ = socket_pair
+    return Connection.connect(tcp.Transport('localhost', 0), sock=local)
+
+
+def test_recv_exactly_returns_exact_number_of_bytes(conn, socket_pair):
+    """
+    Assert that :meth:`~adbpy.connection.sync.Connection.recv_exactly` returns exactly the number of bytes requested
+    when the data arrives in several segments.
+    """
+    _, remote = socket_pair
+    remote.sendall(b'foo')
+    remote.sendall(b'barbaz')
+    data = conn.recv_exactly(9)
+
+    assert data == b'foobarbaz'
+    assert isinstance(data, bytearray)
+
+
+def test_recv_into_fills_memoryview(conn, socket_pair):
+    """
+    Assert that :meth:`~adbpy.connection.sync.Connection.recv_into` fills the given :class:`~memoryview`.
+    """
+    _, remote = socket_pair
+    buf = bytearray(b'..........')
+    remote.sendall(b'foobar')
+
+    assert conn.recv_into(memoryview(buf)[2:8]) == 6
+    assert buf == b'..foobar..'
+
+
+def test_recv_into_raises_on_end_of_stream(conn, socket_pair):
+    """
+    Assert that :meth:`~adbpy.connection.sync.Connection.recv_into` raises a
+    :class:`~adbpy.connection.ConnectionEndOfStreamError` when the remote end closes before the buffer is full.
+    """
+    _, remote = socket_pair
+    remote.sendall(b'foo')
+    remote.close()
+
+    with pytest.raises(connection.ConnectionEndOfStreamError):
+        conn.recv_into(bytearray(4))
+
+
+def test_recv_raises_on_end_of_stream(conn, socket_pair):
+    """
+    Assert that :meth:`~adbpy.connection.sync.Connection.recv` raises a
+    :class:`~adbpy.connection.ConnectionEndOfStreamError` when the remote end closes before all bytes arrive.
+    """
+    _, remote = socket_pair
+    remote.sendall(b'foo')
+    remote.close()
+
+    with pytest.raises(connection.ConnectionEndOfStreamError):
+        conn.recv(4)
+
+
+def test_recv_raises_on_timeout(conn):
+    """
+    Assert that :meth:`~adbpy.connection.sync.Connection.recv` raises a
+    :class:`~adbpy.connection.ConnectionTimeoutError` when the transport times out.
+    """
+    with pytest.raises(connection.ConnectionTimeoutError):
+        conn.recv(4, timeout=0.01)
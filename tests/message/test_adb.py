@@ -7,6 +7,7 @@
 
 import pytest
 
+from adbpy import message
 from adbpy.message import adb
 
 
@@ -55,3 +56,200 @@ def test_checksum_generates_expected_crc32_value(data):
     Assert that :func:`~adbpy.message.adb._checksum` generates the expected checksum value.
     """
     assert adb._checksum(data) == sum(data) & adb.COMMAND_MASK
+
+
+def _frame(msg):
+    """
+    Serialize the given message header and data payload as it would appear on the wire.
+    """
+    return adb.to_bytes(msg) + msg.data
+
+
+@pytest.fixture(scope='function')
+def frames():
+    """
+    Fixture that returns serialized messages and the messages they were created from.
+    """
+    msgs = [adb.connect('0123456789ABCDEF', 'foobarbaz'), adb.ready(1, 2),
+            adb.open(1, 'shell:ls'), adb.close(1, 2)]
+    return b''.join(_frame(msg) for msg in msgs), msgs
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 24, 25, 1024])
+def test_frame_decoder_yields_messages_from_arbitrary_chunks(frames, chunk_size):
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` yields back every message regardless of how the
+    serialized bytes are split into chunks.
+    """
+    data, msgs = frames
+    decoder = adb.FrameDecoder()
+
+    decoded = []
+    for i in range(0, len(data), chunk_size):
+        decoded.extend((msg.command, msg.arg0, msg.arg1, bytes(msg.data))
+                       for msg in decoder.feed(data[i:i + chunk_size]))
+
+    assert decoded == [(msg.command, msg.arg0, msg.arg1, msg.data) for msg in msgs]
+    assert decoder.pending == 0
+
+
+def test_frame_decoder_payload_is_memoryview_of_buffer(frames):
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` yields message payloads as :class:`~memoryview` instances.
+    """
+    data, _ = frames
+    msg = next(adb.FrameDecoder().feed(data))
+    assert isinstance(msg.data, memoryview)
+
+
+def test_frame_decoder_buffers_partial_message(frames):
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` holds onto bytes that do not make up a complete message.
+    """
+    data, _ = frames
+    decoder = adb.FrameDecoder()
+    assert not list(decoder.feed(data[:adb.MESSAGE_SIZE + 1]))
+    assert decoder.pending == adb.MESSAGE_SIZE + 1
+
+
+def test_frame_decoder_compacts_buffer_across_many_messages():
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` reuses its buffer when fed more bytes than it can hold.
+    """
+    msg = adb.open(1, 'x' * 100)
+    data = _frame(msg) * 10
+    decoder = adb.FrameDecoder(max_data=len(msg.data))
+
+    decoded = [bytes(m.data) for i in range(0, len(data), 50) for m in decoder.feed(data[i:i + 50])]
+    assert decoded == [msg.data] * 10
+
+
+def test_frame_decoder_raises_on_invalid_checksum():
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` raises a :class:`~adbpy.message.MessageChecksumError`
+    when a data payload does not match the checksum in the message header.
+    """
+    msg = adb.open(1, 'shell:ls')
+    data = adb.to_bytes(msg) + b'X' * len(msg.data)
+    with pytest.raises(message.MessageChecksumError):
+        list(adb.FrameDecoder().feed(data))
+
+
+def test_frame_decoder_raises_on_invalid_magic():
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` raises a :class:`~adbpy.message.MessageUnpackError`
+    when the header magic does not match the command.
+    """
+    data = bytearray(adb.to_bytes(adb.ready(1, 2)))
+    data[-1] ^= 0xff
+    with pytest.raises(message.MessageUnpackError):
+        list(adb.FrameDecoder().feed(data))
+
+
+def test_frame_decoder_raises_on_data_length_exceeding_max_data():
+    """
+    Assert that :class:`~adbpy.message.adb.FrameDecoder` raises a :class:`~adbpy.message.MessageUnpackError`
+    when the header advertises a payload larger than the decoder can buffer.
+    """
+    msg = adb.open(1, 'shell:ls')
+    with pytest.raises(message.MessageUnpackError):
+        list(adb.FrameDecoder(max_data=len(msg.data) - 1).feed(_frame(msg)))
+
+
+def test_to_bytes_many_packs_headers_and_payloads_in_order():
+    """
+    Assert that :func:`~adbpy.message.adb.to_bytes_many` packs the header and data payload of every message
+    into a single buffer.
+    """
+    msgs = [adb.open(1, 'shell:ls'), adb.ready(1, 2), adb.auth(adb.AuthType.signature, b'foobar')]
+    assert adb.to_bytes_many(msgs) == b''.join(_frame(msg) for msg in msgs)
+
+
+def test_pack_into_returns_offset_after_message():
+    """
+    Assert that :func:`~adbpy.message.adb.pack_into` writes the message at the given offset and returns
+    the position immediately after it.
+    """
+    msg = adb.open(1, 'shell:ls')
+    buffer = bytearray(4 + adb.packed_size(msg))
+
+    assert adb.pack_into(buffer, 4, msg) == len(buffer)
+    assert buffer[4:] == _frame(msg)
+
+
+def test_pack_into_raises_on_buffer_too_small():
+    """
+    Assert that :func:`~adbpy.message.adb.pack_into` raises a :class:`~adbpy.message.MessagePackError` when the
+    buffer cannot hold the message.
+    """
+    msg = adb.open(1, 'shell:ls')
+    buffer = bytearray(adb.packed_size(msg) - 1)
+
+    with pytest.raises(message.MessagePackError):
+        adb.pack_into(buffer, 0, msg)
+    assert len(buffer) == adb.packed_size(msg) - 1
+
+
+def test_write_skip_checksum_uses_zero_checksum():
+    """
+    Assert that :func:`~adbpy.message.adb.write` does not compute a checksum when asked to skip it.
+    """
+    assert adb.write(1, 2, b'foo', skip_checksum=True).data_checksum == 0
+
+
+def test_attach_data_skip_checksum_ignores_header_checksum():
+    """
+    Assert that :func:`~adbpy.message.adb.attach_data` does not validate the checksum when asked to skip it.
+    """
+    msg = adb.from_bytes(adb.to_bytes(adb.write(1, 2, b'foo', skip_checksum=True)))
+    adb.attach_data(msg, b'foo', skip_checksum=True)
+    assert msg.data == b'foo'
+
+
+@pytest.mark.parametrize('version, expected', [
+    (adb.VERSION, False),
+    (adb.VERSION_SKIP_CHECKSUM, True)
+])
+def test_version_skips_checksum(version, expected):
+    """
+    Assert that :func:`~adbpy.message.adb.version_skips_checksum` only skips checksums for newer protocol versions.
+    """
+    assert adb.version_skips_checksum(version) is expected
+
+
+def test_ready_acked_bytes():
+    """
+    Assert that ready messages only carry an acknowledged byte count when using delayed acknowledgements.
+    """
+    assert adb.acked_bytes(adb.ready(1, 2)) is None
+    assert adb.acked_bytes(adb.ready(1, 2, 4096)) == 4096
+    assert adb.ready(1, 2, 4096).data_length == adb.ACKED_BYTES_STRUCT.size
+
+
+def test_open_window():
+    """
+    Assert that open messages advertise the receive window in arg1.
+    """
+    assert adb.open(1, 'shell:ls').arg1 == 0
+    assert adb.open(1, 'shell:ls', adb.DELAYED_ACK_WINDOW).arg1 == adb.DELAYED_ACK_WINDOW
+
+
+def test_connect_advertises_max_data_and_features():
+    """
+    Assert that :func:`~adbpy.message.adb.connect` advertises the maximum data payload size in arg1 and features in
+    its banner.
+    """
+    msg = adb.connect('0123456789ABCDEF', 'foo=bar', features=[adb.Feature.shell_v2, 'cmd'])
+    assert msg.arg1 == adb.MAXDATA
+    assert msg.data == b'host:0123456789ABCDEF:foo=bar;features=shell_v2,cmd\0'
+
+
+def test_parse_system_identity():
+    """
+    Assert that :func:`~adbpy.message.adb.parse_system_identity` splits the system type, serial and banner properties.
+    """
+    data = b'device::ro.product.name=foo;ro.product.model=bar;features=shell_v2,cmd\0'
+    system_type, serial, properties = adb.parse_system_identity(data)
+    assert system_type == 'device'
+    assert serial == ''
+    assert properties == {'ro.product.name': 'foo', 'ro.product.model': 'bar', 'features': 'shell_v2,cmd'}
@@ -0,0 +1,76 @@
+"""
+    tests/message/test_checksum
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.message.checksum` module.
+"""
+
+import array
+import os
+
+import pytest
+
+from adbpy.message import adb, checksum
+
+
+@pytest.fixture(scope='module', params=list(checksum.BACKENDS))
+def backend(request):
+    """
+    Fixture that yields every available checksum backend function.
+    """
+    return checksum.get_backend(request.param)
+
+
+@pytest.fixture(scope='module', params=[
+    b'',
+    b'foo',
+    b'\xff' * checksum.ADLER32_CHUNK_SIZE,
+    b'\xff' * (checksum.ADLER32_CHUNK_SIZE + 1),
+    b'\xff' * adb.MAXDATA,
+    os.urandom(12345),
+    os.urandom(adb.MAXDATA)
+])
+def payload(request):
+    """
+    Fixture that yields data payloads to checksum.
+    """
+    return request.param
+
+
+def test_backend_generates_expected_checksum(backend, payload):
+    """
+    Assert that every checksum backend generates the sum of all bytes in the payload.
+    """
+    assert backend(payload) == sum(payload) & checksum.CHECKSUM_MASK
+
+
+def test_backend_accepts_memoryview(backend, payload):
+    """
+    Assert that every checksum backend accepts a :class:`~memoryview` payload.
+    """
+    assert backend(memoryview(payload)) == sum(payload) & checksum.CHECKSUM_MASK
+
+
+def test_backend_sums_bytes_of_non_byte_buffers(backend, payload):
+    """
+    Assert that every checksum backend sums the bytes, not the items, of a buffer with a wider item format.
+    """
+    words = array.array('I', payload[:len(payload) // 4 * 4])
+
+    assert backend(words) == sum(words.tobytes()) & checksum.CHECKSUM_MASK
+
+
+def test_get_backend_returns_default_backend_without_name():
+    """
+    Assert that :func:`~adbpy.message.checksum.get_backend` returns the default backend when no name is given.
+    """
+    assert checksum.get_backend() is checksum.BACKENDS[checksum.DEFAULT_BACKEND]
+
+
+def test_get_backend_raises_on_unknown_name():
+    """
+    Assert that :func:`~adbpy.message.checksum.get_backend` raises a :class:`~ValueError` when given an unknown
+    backend name.
+    """
+    with pytest.raises(ValueError):
+        checksum.get_backend('foo')
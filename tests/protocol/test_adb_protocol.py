@@ -0,0 +1,265 @@
+"""
+    tests/protocol/test_adb_protocol
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.protocol.adb` module.
+"""
+
+import asyncio
+import socket
+
+import pytest
+
+from adbpy import message, protocol
+from adbpy.connection.sync import Connection
+from adbpy.message import adb
+from adbpy.protocol.adb import AsyncWireProtocol, WireProtocol
+from adbpy.transport.sync import tcp
+
+
+@pytest.fixture(scope='function')
+def socket_pair():
+    """
+    Fixture that yields a connected pair of sockets.
+    """
+    local, remote = socket.socketpair()
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+@pytest.fixture(scope='function')
+def wire(socket_pair):
+    """
+    Fixture that yields a :class:`~adbpy.protocol.adb.WireProtocol` over the local end of a socket pair.
+    """
+    local, _ = socket_pair
+    return WireProtocol(Connection.connect(tcp.Transport('localhost', 0), sock=local))
+
+
+class FakeAsyncConnection:
+    """
+    Asynchronous connection that reads from a fixed buffer and records writes.
+    """
+
+    def __init__(self, data=b''):
+        self.data = data
+        self.sent = []
+
+    @asyncio.coroutine
+    def send(self, data):
+        self.sent.append(bytes(data))
+
+    @asyncio.coroutine
+    def recv(self, num_bytes):
+        data, self.data = self.data[:num_bytes], self.data[num_bytes:]
+        return data
+
+
+def test_send_flushes_queued_messages_in_single_write(mocker, wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.send` writes all queued messages with one connection send.
+    """
+    _, remote = socket_pair
+    msgs = [adb.open(1, 'shell:ls'), adb.ready(1, 2), adb.write(1, 2, b'foo')]
+    send = mocker.spy(wire._connection, 'send')
+
+    for msg in msgs[:-1]:
+        wire.queue(msg)
+    wire.send(msgs[-1])
+
+    expected = adb.to_bytes_many(msgs)
+    assert send.call_count == 1
+    assert remote.recv(len(expected)) == expected
+
+
+def test_recv_reads_header_and_payload(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.recv` reads a message along with its data payload.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes_many([adb.write(2, 1, b'foobar'), adb.close(2, 1)]))
+
+    msg = wire.recv()
+    assert msg.is_write and (msg.arg0, msg.arg1, msg.data) == (2, 1, b'foobar')
+    assert wire.recv().is_close
+
+
+def test_recv_raises_on_invalid_checksum(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.recv` raises a :class:`~adbpy.message.MessageChecksumError`
+    when the data payload does not match the header checksum.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes(adb.write(2, 1, b'foobar')) + b'foobaz')
+
+    with pytest.raises(message.MessageChecksumError):
+        wire.recv()
+
+
+def test_recv_skips_checksum_validation(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.recv` does not validate checksums when told to skip them.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes(adb.write(2, 1, b'foobar', skip_checksum=True)) + b'foobar')
+
+    wire.skip_checksum = True
+    assert wire.recv().data == b'foobar'
+
+
+def test_recv_raises_on_data_length_exceeding_max_data(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.recv` raises a
+    :class:`~adbpy.protocol.ProtocolInvalidResponseError` when a message payload exceeds the max data length.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes(adb.write(2, 1, b'foobar')))
+
+    wire.max_data = 5
+    with pytest.raises(protocol.ProtocolInvalidResponseError):
+        wire.recv()
+
+
+def test_recv_raises_on_closed_connection(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.recv` raises a
+    :class:`~adbpy.protocol.ProtocolConnectionError` when the remote end closes the connection.
+    """
+    _, remote = socket_pair
+    remote.close()
+
+    with pytest.raises(protocol.ProtocolConnectionError):
+        wire.recv()
+
+
+def test_async_wire_protocol_sends_and_receives():
+    """
+    Assert that :class:`~adbpy.protocol.adb.AsyncWireProtocol` flushes queued messages in one write and reads
+    messages with their data payload.
+    """
+    conn = FakeAsyncConnection(adb.to_bytes_many([adb.write(2, 1, b'foobar')]))
+    wire = AsyncWireProtocol(conn)
+    msgs = [adb.open(1, 'shell:ls'), adb.ready(1, 2)]
+
+    @asyncio.coroutine
+    def run():
+        wire.queue(msgs[0])
+        yield from wire.send(msgs[1])
+        return (yield from wire.recv())
+
+    loop = asyncio.new_event_loop()
+    try:
+        msg = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert conn.sent == [bytes(adb.to_bytes_many(msgs))]
+    assert msg.data == b'foobar'
+
+
+def _device_connect(version=adb.VERSION, max_data=4096, features=('shell_v2', 'delayed_ack')):
+    """
+    Create the connect message a device replies to the handshake with.
+    """
+    return adb.connect('0123456789ABCDEF', 'ro.product.model=foo', system_type='device', version=version,
+                       max_data=max_data, features=features)
+
+
+def test_handshake_negotiates_session(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.handshake` applies the lower version and maximum data payload
+    size of both ends and only the features both ends support.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes_many([_device_connect()]))
+
+    session = wire.handshake(features=['delayed_ack', 'cmd'])
+
+    sent = adb.from_bytes(remote.recv(adb.MESSAGE_SIZE))
+    assert sent.is_connect
+    assert sent.arg0 == adb.VERSION_SKIP_CHECKSUM
+    assert sent.arg1 == adb.MAXDATA
+
+    assert session.version == adb.VERSION
+    assert session.max_data == 4096
+    assert session.serial == '0123456789ABCDEF'
+    assert session.properties['ro.product.model'] == 'foo'
+    assert session.features == {'delayed_ack'}
+    assert session.supports(adb.Feature.delayed_ack)
+    assert wire.session is session
+    assert wire.max_data == 4096
+    assert not wire.skip_checksum
+
+
+def test_handshake_skips_checksums_for_newer_versions(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.handshake` skips checksums when both ends support it.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes_many([_device_connect(version=adb.VERSION_SKIP_CHECKSUM)]))
+
+    assert wire.handshake().skip_checksum
+    assert wire.skip_checksum
+
+
+def test_handshake_signs_token_with_keys(mocker, wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.handshake` signs the authentication token with each key
+    until the remote system accepts one.
+    """
+    _, remote = socket_pair
+    sign = mocker.patch('adbpy.crypto.sign', return_value=b'signature')
+    token = adb.auth(adb.AuthType.token, b'token')
+    remote.sendall(adb.to_bytes_many([token, token, _device_connect()]))
+
+    session = wire.handshake(key_paths=['first', 'second'])
+
+    assert session.max_data == 4096
+    assert sign.call_args_list == [mocker.call('first', b'token'), mocker.call('second', b'token')]
+
+
+def test_handshake_raises_when_keys_rejected(wire, socket_pair):
+    """
+    Assert that :meth:`~adbpy.protocol.adb.WireProtocol.handshake` raises a
+    :class:`~adbpy.protocol.ProtocolAuthError` when authentication is required and no keys are given.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes_many([adb.auth(adb.AuthType.token, b'token')]))
+
+    with pytest.raises(protocol.ProtocolAuthError):
+        wire.handshake()
+
+
+def test_async_handshake_negotiates_session():
+    """
+    Assert that :meth:`~adbpy.protocol.adb.AsyncWireProtocol.handshake` applies the negotiated session.
+    """
+    wire = AsyncWireProtocol(FakeAsyncConnection(bytes(adb.to_bytes_many([_device_connect(max_data=8192)]))))
+
+    loop = asyncio.new_event_loop()
+    try:
+        session = loop.run_until_complete(wire.handshake())
+    finally:
+        loop.close()
+
+    assert session.max_data == 8192
+    assert wire.max_data == 8192
+    assert adb.from_bytes(wire._connection.sent[0][:adb.MESSAGE_SIZE]).is_connect
+
+
+def test_wire_protocol_reuses_connection_session(wire, socket_pair):
+    """
+    Assert that a :class:`~adbpy.protocol.adb.WireProtocol` created over an already handshaked connection applies
+    its session.
+    """
+    _, remote = socket_pair
+    remote.sendall(adb.to_bytes_many([_device_connect(version=adb.VERSION_SKIP_CHECKSUM)]))
+    session = wire.handshake()
+
+    assert wire.connection.session is session
+
+    reused = WireProtocol(wire.connection)
+    assert reused.session is session
+    assert reused.max_data == 4096
+    assert reused.skip_checksum
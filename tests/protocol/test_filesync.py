@@ -0,0 +1,305 @@
+"""
+    tests/protocol/test_filesync
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.protocol.filesync` module.
+"""
+
+import asyncio
+import io
+import mmap
+import os
+import stat
+
+import pytest
+
+from adbpy.protocol import filesync, stream
+from adbpy.testing import services
+
+
+#: Maximum data payload size of the fake device, small enough to split SYNC packets across payloads.
+DEVICE_MAX_DATA = 4096
+
+
+@pytest.fixture(scope='function')
+def device_kwargs():
+    """
+    Fixture that returns the keyword args of a fake device serving a few files.
+    """
+    return dict(max_data=DEVICE_MAX_DATA, files={
+        '/sdcard/foo.txt': services.File(stat.S_IFREG | 0o644, b'foo', 1000),
+        '/sdcard/dir/bar.bin': services.File(stat.S_IFREG | 0o600, os.urandom(200 * 1024), 2000)
+    })
+
+
+@pytest.fixture(scope='function', params=[False, True], ids=['stop_and_wait', 'delayed_ack'])
+def sync(request, connect, device_socket):
+    """
+    Fixture that yields a :class:`~adbpy.protocol.filesync.FileSync` with and without delayed acknowledgements.
+    """
+    wire = connect(device_socket)
+    wire.handshake()
+    manager = stream.StreamManager(wire, delayed_ack=request.param)
+    manager.start()
+    return filesync.FileSync.open(manager, timeout=1)
+
+
+@pytest.fixture(scope='function')
+def requests(sync, monkeypatch):
+    """
+    Fixture that returns the list of ids of every SYNC request and DATA packet written by `sync` from now on.
+    """
+    requests, write = [], sync._write
+
+    def record(data):
+        requests.append(filesync.SYNC_HEADER.unpack_from(data)[0])
+        return write(data)
+
+    monkeypatch.setattr(sync, '_write', record)
+    return requests
+
+
+def test_stat_returns_mode_size_and_mtime(sync):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.stat` returns the attributes of a remote file.
+    """
+    assert sync.stat('/sdcard/foo.txt') == (stat.S_IFREG | 0o644, 3, 1000)
+    assert stat.S_ISDIR(sync.stat('/sdcard/dir').mode)
+    assert not sync.stat('/sdcard/missing').exists
+
+
+def test_listdir_returns_entries(sync):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.listdir` returns every entry of a remote directory.
+    """
+    assert sync.listdir('/sdcard/dir') == [filesync.DirectoryEntry('bar.bin', stat.S_IFREG | 0o600, 200 * 1024, 2000)]
+    assert sync.listdir('/missing') == []
+
+
+def test_pull_writes_into_file_object(sync, device):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.pull` writes a file spanning many DATA packets into a
+    file object.
+    """
+    dest = io.BytesIO()
+    assert sync.pull('/sdcard/dir/bar.bin', dest) == 200 * 1024
+    assert dest.getvalue() == device.files['/sdcard/dir/bar.bin'][1]
+
+
+def test_pull_writes_into_path(sync, tmpdir):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.pull` writes to a local file path.
+    """
+    path = tmpdir.join('foo.txt')
+    sync.pull('/sdcard/foo.txt', str(path))
+    assert path.read_binary() == b'foo'
+
+
+def test_pull_raises_on_fail(sync):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.pull` raises a
+    :class:`~adbpy.protocol.filesync.FileSyncError` when the remote system fails the request, after which the
+    session cannot be used.
+    """
+    with pytest.raises(filesync.FileSyncError) as exc_info:
+        sync.pull('/sdcard/missing', io.BytesIO())
+    assert 'No such file' in str(exc_info.value)
+    assert sync.failed
+    with pytest.raises(filesync.FileSyncError):
+        sync.stat('/sdcard/foo.txt')
+    sync.close()
+
+
+def test_push_file_object_in_chunks(sync, device, requests):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.push` streams a file object in DATA packets that each fit
+    in a single stream write.
+    """
+    sync.stream._manager._wire_protocol.max_data = 1024
+    data = os.urandom(10000)
+
+    assert sync.push(io.BytesIO(data), '/sdcard/new.bin', mtime=1234) == len(data)
+    assert device.files['/sdcard/new.bin'] == (filesync.DEFAULT_PUSH_MODE, data, 1234)
+    assert requests.count(b'DATA') == -(-len(data) // sync.chunk_size)
+
+
+def test_push_path_uses_local_mtime(sync, device, tmpdir):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.push` of a local path defaults to the local file mtime.
+    """
+    path = tmpdir.join('local.txt')
+    path.write_binary(b'local')
+    os.utime(str(path), (5000, 5000))
+
+    sync.push(str(path), '/sdcard/local.txt', mode=stat.S_IFREG | 0o755)
+    assert device.files['/sdcard/local.txt'] == (stat.S_IFREG | 0o755, b'local', 5000)
+
+
+def test_push_memory_mapped_file(sync, device, tmpdir):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.push` accepts a memory-mapped file.
+    """
+    path = tmpdir.join('image.img')
+    data = os.urandom(300 * 1024)
+    path.write_binary(data)
+
+    with io.open(str(path), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        sync.push(mapped, '/sdcard/image.img', mtime=1)
+    assert device.files['/sdcard/image.img'][1] == data
+
+
+def test_push_raises_on_fail(sync):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.push` raises a
+    :class:`~adbpy.protocol.filesync.FileSyncError` when the remote system fails the request.
+    """
+    with pytest.raises(filesync.FileSyncError):
+        sync.push(b'foo', '/readonly/foo.txt')
+
+
+def test_close_sends_quit(sync, requests):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.close` ends the session and closes the stream.
+    """
+    sync.close()
+    assert requests[-1] == b'QUIT'
+    assert not sync.stream.is_open
+
+
+def test_async_push_and_pull(start_async_manager):
+    """
+    Assert that :class:`~adbpy.protocol.filesync.AsyncFileSync` pushes, stats and pulls a file.
+    """
+    loop = asyncio.new_event_loop()
+    data = os.urandom(100 * 1024)
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+
+        sync = yield from filesync.AsyncFileSync.open(manager, timeout=1)
+        yield from sync.push(data, '/sdcard/async.bin', mtime=42)
+        result = yield from sync.stat('/sdcard/async.bin')
+        entries = yield from sync.listdir('/sdcard')
+        dest = io.BytesIO()
+        yield from sync.pull('/sdcard/async.bin', dest)
+        yield from sync.close()
+        yield from manager.stop()
+        return result, entries, dest.getvalue()
+
+    try:
+        result, entries, pulled = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert result == (filesync.DEFAULT_PUSH_MODE, len(data), 42)
+    assert [entry.name for entry in entries] == ['async.bin', 'dir', 'foo.txt']
+    assert pulled == data
+
+
+@pytest.fixture(scope='function')
+def local_tree(tmpdir):
+    """
+    Fixture that returns a local directory containing files in nested directories.
+    """
+    root = tmpdir.mkdir('assets')
+    root.join('a.txt').write_binary(b'a')
+    root.mkdir('sub').join('b.txt').write_binary(b'bb')
+    root.join('sub').mkdir('deeper').join('c.txt').write_binary(b'ccc')
+    return root
+
+
+def test_sync_directory_pushes_missing_files(sync, device, requests, local_tree):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.sync_directory` lists every remote directory and pushes
+    every file missing on the remote system along with its local mode and mtime.
+    """
+    result = sync.sync_directory(str(local_tree), '/data/local/tmp/assets')
+
+    assert sorted(result.pushed) == ['a.txt', 'sub/b.txt', 'sub/deeper/c.txt']
+    assert result.unchanged == []
+    assert requests.count(b'LIST') == 3
+    mode, data, mtime = device.files['/data/local/tmp/assets/sub/deeper/c.txt']
+    assert stat.S_ISREG(mode) and data == b'ccc'
+    assert mtime == int(local_tree.join('sub', 'deeper', 'c.txt').mtime())
+
+
+def test_sync_directory_pushes_only_changed_files(sync, local_tree):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.sync_directory` skips files whose size and mtime match the
+    remote system.
+    """
+    sync.sync_directory(str(local_tree), '/sdcard/assets')
+    local_tree.join('sub', 'b.txt').write_binary(b'changed')
+    os.utime(str(local_tree.join('a.txt')), (1, 1))
+
+    result = sync.sync_directory(str(local_tree), '/sdcard/assets')
+
+    assert sorted(result.pushed) == ['a.txt', 'sub/b.txt']
+    assert result.unchanged == ['sub/deeper/c.txt']
+    assert sync.sync_directory(str(local_tree), '/sdcard/assets').pushed == []
+
+
+def test_sync_directory_dry_run_does_not_push(sync, requests, local_tree):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.sync_directory` only compares when `dry_run` is set.
+    """
+    result = sync.sync_directory(str(local_tree), '/sdcard/assets', dry_run=True)
+
+    assert len(result.pushed) == 3
+    assert b'SEND' not in requests
+
+
+def test_sync_directory_pipelines_requests(sync, local_tree, mocker):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.sync_directory` sends up to `pipeline_depth` requests
+    before reading their responses.
+    """
+    calls = mocker.Mock()
+    calls.attach_mock(mocker.patch.object(sync, '_write', wraps=sync._write), 'write')
+    calls.attach_mock(mocker.patch.object(sync, '_read_listing', wraps=sync._read_listing), 'read')
+
+    sync.sync_directory(str(local_tree), '/sdcard/assets', dry_run=True, pipeline_depth=2)
+
+    assert [name for name, _, _ in calls.mock_calls] == ['write', 'write', 'read', 'read', 'write', 'read']
+
+
+@pytest.mark.parametrize('pipeline_depth', [1, filesync.DEFAULT_PIPELINE_DEPTH])
+def test_sync_directory_stops_at_first_failed_push(sync, requests, local_tree, pipeline_depth):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.FileSync.sync_directory` raises a
+    :class:`~adbpy.protocol.filesync.FileSyncError` naming the first failed file once the remote system ends the
+    session, instead of waiting for responses to the pushes pipelined behind it.
+    """
+    with pytest.raises(filesync.FileSyncError) as exc_info:
+        sync.sync_directory(str(local_tree), '/readonly/assets', pipeline_depth=pipeline_depth)
+
+    assert str(exc_info.value).count('Read-only') == 1
+    assert requests.count(b'SEND') <= pipeline_depth
+    assert sync.failed
+
+
+def test_async_sync_directory(start_async_manager, local_tree):
+    """
+    Assert that :meth:`~adbpy.protocol.filesync.AsyncFileSync.sync_directory` pushes only changed files.
+    """
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+
+        sync = yield from filesync.AsyncFileSync.open(manager, timeout=1)
+        first = yield from sync.sync_directory(str(local_tree), '/sdcard/assets')
+        second = yield from sync.sync_directory(str(local_tree), '/sdcard/assets')
+        yield from sync.close()
+        yield from manager.stop()
+        return first, second
+
+    try:
+        first, second = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert len(first.pushed) == 3
+    assert second.pushed == [] and len(second.unchanged) == 3
@@ -0,0 +1,147 @@
+"""
+    tests/protocol/test_forward
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.protocol.forward` module.
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from adbpy.message import adb
+from adbpy.protocol import forward
+from adbpy.testing import services
+
+
+#: Number of clients forwarded at the same time.
+CONCURRENT_CLIENTS = 100
+
+
+@pytest.fixture(scope='function')
+def closed():
+    """
+    Fixture that returns the list of destinations of the streams closed by the host.
+    """
+    return []
+
+
+@pytest.fixture(scope='function')
+def device_kwargs(closed):
+    """
+    Fixture that returns the keyword args of a fake device that echoes streams to "tcp:localhost:7", recording those
+    closed by the host, and refuses streams to any other port.
+    """
+    @asyncio.coroutine
+    def echo(s, argument):
+        yield from services.echo(s, argument)
+        closed.append(s.destination)
+
+    return dict(services={'tcp:': None, 'tcp:localhost:7': echo})
+
+
+def _run(start_async_manager, test):
+    """
+    Run the given coroutine function with a started :class:`~adbpy.protocol.stream.AsyncStreamManager` connected to
+    the fake device on a new event loop.
+    """
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+        try:
+            return (yield from test(manager, loop))
+        finally:
+            yield from manager.stop()
+
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+@asyncio.coroutine
+def _echo(address, data, loop):
+    """
+    Connect to the given address, write the data and read back as many bytes.
+    """
+    reader, writer = yield from asyncio.open_connection(*address, loop=loop)
+    writer.write(data)
+    echoed = yield from reader.readexactly(len(data))
+    writer.close()
+    return echoed
+
+
+def test_forward_many_concurrent_clients(device, start_async_manager):
+    """
+    Assert that :func:`~adbpy.protocol.forward.forward` forwards many concurrent clients, each over its own stream.
+    """
+    payloads = [os.urandom(i * 97 + 1) for i in range(CONCURRENT_CLIENTS)]
+
+    @asyncio.coroutine
+    def test(manager, loop):
+        forwarder = yield from forward.forward(manager, 7, timeout=5)
+        echoed = yield from asyncio.gather(*[_echo(forwarder.address, data, loop) for data in payloads], loop=loop)
+        yield from forwarder.close()
+        return echoed, forwarder
+
+    echoed, forwarder = _run(start_async_manager, test)
+
+    assert echoed == payloads
+    assert device.destinations == ['tcp:localhost:7'] * CONCURRENT_CLIENTS
+    assert forwarder.connections == 0
+
+
+def test_forward_payloads_larger_than_max_data(start_async_manager):
+    """
+    Assert that client data larger than the maximum stream payload is forwarded intact.
+    """
+    data = os.urandom(adb.MAXDATA * 3 + 5)
+
+    @asyncio.coroutine
+    def test(manager, loop):
+        forwarder = forward.PortForwarder(manager, 'tcp:localhost:7', buffer_size=1024, timeout=5)
+        yield from forwarder.start()
+        echoed = yield from _echo(forwarder.address, data, loop)
+        yield from forwarder.close()
+        return echoed
+
+    assert _run(start_async_manager, test) == data
+
+
+def test_forward_closes_stream_when_client_disconnects(start_async_manager, closed):
+    """
+    Assert that the stream of a client is closed once the client disconnects.
+    """
+
+    @asyncio.coroutine
+    def test(manager, loop):
+        forwarder = yield from forward.forward(manager, 7, timeout=5)
+        yield from _echo(forwarder.address, b'ping', loop)
+        while forwarder.connections:
+            yield from asyncio.sleep(0.01, loop=loop)
+        yield from forwarder.close()
+        return manager.streams
+
+    assert not _run(start_async_manager, test)
+    assert closed == ['tcp:localhost:7']
+
+
+def test_forward_closes_client_when_refused(device, start_async_manager):
+    """
+    Assert that a client is disconnected when the remote system refuses its stream.
+    """
+
+    @asyncio.coroutine
+    def test(manager, loop):
+        forwarder = yield from forward.forward(manager, 9, remote_host='10.0.0.1', timeout=5)
+        reader, writer = yield from asyncio.open_connection(*forwarder.address, loop=loop)
+        data = yield from reader.read()
+        writer.close()
+        yield from forwarder.close()
+        return data
+
+    assert _run(start_async_manager, test) == b''
+    assert device.destinations == ['tcp:10.0.0.1:9']
@@ -0,0 +1,210 @@
+"""
+    tests/protocol/test_logcat
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.protocol.logcat` module.
+"""
+
+import asyncio
+import struct
+import threading
+
+import pytest
+
+from adbpy.protocol import logcat
+
+
+#: Size of the payloads the fake device splits log entries into, so entries span payloads.
+DEVICE_CHUNK_SIZE = 13
+
+
+def _entry(index, tag='tag', message=None, version=4):
+    """
+    Create a binary `logger_entry` of the given version.
+    """
+    payload = bytes([logcat.LogPriority.info]) + tag.encode() + b'\0'
+    payload += (message if message is not None else 'message {}\n'.format(index)).encode() + b'\0'
+    fields = struct.pack('<iIII', 100 + index, 200 + index, 1000 + index, 500)
+    if version == 1:
+        return struct.pack('<HH', len(payload), 0) + fields + payload
+    if version == 3:
+        return struct.pack('<HH', len(payload), 24) + fields + struct.pack('<I', 0) + payload
+    return struct.pack('<HH', len(payload), 28) + fields + struct.pack('<II', 0, 10000 + index) + payload
+
+
+@asyncio.coroutine
+def logcat_service(s, argument):
+    """
+    Service for "exec:logcat" that writes 50 log entries and closes the stream.
+    """
+    data = b''.join(_entry(i) for i in range(50))
+    for i in range(0, len(data), DEVICE_CHUNK_SIZE):
+        yield from s.write(data[i:i + DEVICE_CHUNK_SIZE])
+
+
+@pytest.fixture(scope='function')
+def device_kwargs():
+    """
+    Fixture that returns the keyword args of a fake device that also runs `logcat`.
+    """
+    return dict(services={'exec:logcat': logcat_service})
+
+
+@pytest.mark.parametrize('version,lid,uid', [
+    (1, None, None),
+    (3, 0, None),
+    (4, 0, 10007)
+])
+def test_decoder_parses_entry_versions(version, lid, uid):
+    """
+    Assert that :class:`~adbpy.protocol.logcat.LogEntryDecoder` parses every `logger_entry` version.
+    """
+    records = logcat.LogEntryDecoder().feed(_entry(7, version=version))
+
+    assert records == [logcat.LogRecord(107, 207, 1007, 500, lid, uid, logcat.LogPriority.info, 'tag', 'message 7')]
+    assert records[0].time == pytest.approx(1007.0000005)
+
+
+def test_decoder_keeps_unknown_priorities():
+    """
+    Assert that :class:`~adbpy.protocol.logcat.LogEntryDecoder` returns a :class:`~adbpy.protocol.logcat.LogPriority`
+    for known priorities and the raw value for unknown ones.
+    """
+    entry = bytearray(_entry(7))
+    records = logcat.LogEntryDecoder().feed(bytes(entry))
+    assert records[0].priority is logcat.LogPriority.info
+
+    entry[28] = 42
+    records = logcat.LogEntryDecoder().feed(bytes(entry))
+    assert records[0].priority == 42
+    assert not isinstance(records[0].priority, logcat.LogPriority)
+
+
+def test_decoder_reassembles_entries_across_payloads():
+    """
+    Assert that :class:`~adbpy.protocol.logcat.LogEntryDecoder` only returns entries once complete.
+    """
+    data = _entry(0) + _entry(1, tag='other', message='')
+    decoder = logcat.LogEntryDecoder()
+
+    records = []
+    for i in range(len(data)):
+        records.extend(decoder.feed(data[i:i + 1]))
+
+    assert [(record.tag, record.message) for record in records] == [('tag', 'message 0'), ('other', '')]
+    assert not decoder.buffer
+
+
+@pytest.mark.parametrize('policy,expected,dropped', [
+    (logcat.OverflowPolicy.drop_oldest, [6, 7, 8, 9], 6),
+    (logcat.OverflowPolicy.sample, [2, 3, 6, 9], 6)
+])
+def test_record_queue_overflow_policies(policy, expected, dropped):
+    """
+    Assert that a full :class:`~adbpy.protocol.logcat.RecordQueue` discards records according to its policy.
+    """
+    records = logcat.RecordQueue(maxsize=4, policy=policy, sample_every=3)
+    for i in range(10):
+        records.put(i)
+    records.close()
+
+    assert list(iter(records.get, None)) == expected
+    assert records.dropped == dropped
+
+
+def test_record_queue_block_policy_waits_for_consumer():
+    """
+    Assert that a full :class:`~adbpy.protocol.logcat.RecordQueue` with the `block` policy waits for room.
+    """
+    records = logcat.RecordQueue(maxsize=1, policy=logcat.OverflowPolicy.block)
+    records.put(0)
+    producer = threading.Thread(target=records.put, args=(1,), daemon=True)
+    producer.start()
+    producer.join(0.05)
+
+    assert producer.is_alive()
+    assert records.get(timeout=1) == 0
+    producer.join(1)
+    assert records.get(timeout=1) == 1
+    assert records.dropped == 0
+
+
+def test_record_queue_get_timeout():
+    """
+    Assert that :meth:`~adbpy.protocol.logcat.RecordQueue.get` raises a :class:`TimeoutError` when empty.
+    """
+    with pytest.raises(TimeoutError):
+        logcat.RecordQueue().get(timeout=0.01)
+
+
+def test_record_queue_rejects_invalid_maxsize():
+    """
+    Assert that a :class:`~adbpy.protocol.logcat.RecordQueue` requires room for at least one record.
+    """
+    with pytest.raises(ValueError):
+        logcat.RecordQueue(maxsize=0)
+
+
+def test_logcat_reader_streams_records(manager, device):
+    """
+    Assert that :class:`~adbpy.protocol.logcat.LogcatReader` opens an `exec:logcat -B` stream and yields its records.
+    """
+    with logcat.LogcatReader.open(manager, args='-b main', policy=logcat.OverflowPolicy.block, timeout=1) as reader:
+        records = list(reader)
+
+    assert device.destinations == ['exec:logcat -B -b main']
+    assert [record.pid for record in records] == list(range(100, 150))
+    assert records[-1].message == 'message 49'
+    assert reader.dropped == 0
+
+
+def test_logcat_reader_drops_oldest_records(manager):
+    """
+    Assert that :class:`~adbpy.protocol.logcat.LogcatReader` keeps reading and drops the oldest records when the
+    consumer falls behind.
+    """
+    reader = logcat.LogcatReader.open(manager, maxsize=5, timeout=1)
+    reader._thread.join(1)
+    records = list(reader)
+    reader.close()
+
+    assert [record.pid for record in records] == list(range(145, 150))
+    assert reader.dropped == 45
+
+
+def test_async_logcat_reader(device, start_async_manager):
+    """
+    Assert that :class:`~adbpy.protocol.logcat.AsyncLogcatReader` yields records and applies its overflow policy.
+    """
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+
+        reader = yield from logcat.AsyncLogcatReader.open(manager, policy=logcat.OverflowPolicy.block, timeout=1)
+        records = []
+        while True:
+            record = yield from reader.get()
+            if record is None:
+                break
+            records.append(record)
+        yield from reader.close()
+
+        sampled = yield from logcat.AsyncLogcatReader.open(manager, maxsize=5, policy=logcat.OverflowPolicy.sample,
+                                                           sample_every=5, timeout=1)
+        yield from sampled._task
+        yield from sampled.close()
+
+        yield from manager.stop()
+        return records, sampled
+
+    try:
+        records, sampled = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert device.destinations == ['exec:logcat -B', 'exec:logcat -B']
+    assert [record.pid for record in records] == list(range(100, 150))
+    assert len(sampled.queue) == 5
+    assert sampled.dropped == 45
@@ -0,0 +1,177 @@
+"""
+    tests/protocol/test_shell
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.protocol.shell` module.
+"""
+
+import asyncio
+
+import pytest
+
+from adbpy.message import adb
+from adbpy.protocol import shell
+from adbpy.testing import adbd
+
+
+#: Size of the payloads the fake device splits command output into, so lines and packets span payloads.
+DEVICE_CHUNK_SIZE = 7
+
+
+def _packet(packet_id, data):
+    return shell.SHELL_V2_HEADER.pack(packet_id, len(data)) + data
+
+
+def lines_service(v2):
+    """
+    Create a service for the "lines <count>" shell command that writes numbered lines and a trailing partial line,
+    followed by a line on stderr and exit code 3 with the shell v2 protocol.
+    """
+    @asyncio.coroutine
+    def lines(s, argument):
+        output = b''.join('line {}\n'.format(i).encode() for i in range(int(argument))) + b'partial'
+        if v2:
+            output = _packet(1, output) + _packet(2, b'warn\n') + _packet(3, b'\x03')
+        for i in range(0, len(output), DEVICE_CHUNK_SIZE):
+            yield from s.write(output[i:i + DEVICE_CHUNK_SIZE])
+
+    return lines
+
+
+@pytest.fixture(scope='function')
+def device_kwargs():
+    """
+    Fixture that returns the keyword args of a fake device that also runs the "lines" shell command.
+    """
+    return dict(services={'shell:lines ': lines_service(False), 'shell,v2,raw:lines ': lines_service(True)})
+
+
+@pytest.mark.parametrize('keepends,expected', [
+    (False, [b'foo', b'bar', b'baz']),
+    (True, [b'foo\n', b'bar\r\n', b'baz'])
+])
+def test_line_buffer_splits_lines_across_chunks(keepends, expected):
+    """
+    Assert that :class:`~adbpy.protocol.shell.LineBuffer` returns lines once complete, regardless of chunking.
+    """
+    buffer = shell.LineBuffer(keepends)
+    lines = []
+    for chunk in (b'fo', b'o\nbar\r', b'\nb', b'az'):
+        lines.extend(buffer.feed(chunk))
+    lines.extend(buffer.flush())
+
+    assert lines == expected
+    assert not buffer.buffer
+
+
+def test_shell_yields_chunks_as_they_arrive(manager, device):
+    """
+    Assert that iterating a :class:`~adbpy.protocol.shell.Shell` without shell v2 yields stdout chunks per payload.
+    """
+    with shell.shell(manager, 'lines 3', v2=False, timeout=1) as sh:
+        chunks = list(sh)
+
+    assert device.destinations == ['shell:lines 3']
+    assert all(chunk.fd == shell.ShellPacketId.stdout for chunk in chunks)
+    assert max(len(chunk.data) for chunk in chunks) == DEVICE_CHUNK_SIZE
+    assert b''.join(chunk.data for chunk in chunks) == b'line 0\nline 1\nline 2\npartial'
+    assert sh.exit_code is None
+
+
+def test_shell_lines(manager):
+    """
+    Assert that :meth:`~adbpy.protocol.shell.Shell.lines` splits output into lines, including a trailing partial
+    line.
+    """
+    with shell.Shell.open(manager, 'lines 2', v2=False, timeout=1) as sh:
+        lines = [output.data for output in sh.lines()]
+
+    assert lines == [b'line 0', b'line 1', b'partial']
+
+
+def test_shell_v2_separates_stderr_and_exit_code(manager, device):
+    """
+    Assert that the shell v2 protocol separates stdout from stderr and reports the exit code.
+    """
+    with shell.Shell.open(manager, 'lines 2', v2=True, timeout=1) as sh:
+        lines = list(sh.lines())
+
+    assert device.destinations == ['shell,v2,raw:lines 2']
+    assert [output.data for output in lines if not output.is_stderr] == [b'line 0', b'line 1', b'partial']
+    assert [output.data for output in lines if output.is_stderr] == [b'warn']
+    assert sh.exit_code == 3
+
+
+@pytest.mark.parametrize('device_kwargs, destination, exit_code', [
+    (dict(features=adbd.DEFAULT_FEATURES), 'shell,v2,raw:exit 3', 3),
+    (dict(features=(adb.Feature.delayed_ack.value,)), 'shell:exit 3', None)
+], ids=['shell_v2', 'legacy'])
+def test_shell_defaults_to_v2_when_negotiated(manager, device, destination, exit_code):
+    """
+    Assert that a default handshake negotiates the `shell_v2` feature with devices that support it, so the shell v2
+    protocol is used by default, and that the shell falls back to the legacy protocol otherwise.
+    """
+    with shell.shell(manager, 'exit 3', timeout=5) as sh:
+        assert sh.wait() == exit_code
+
+    assert device.destinations == [destination]
+
+
+def test_shell_v2_stdin(manager):
+    """
+    Assert that data written to stdin reaches the command and closing stdin completes it.
+    """
+    with shell.Shell.open(manager, 'cat', v2=True, timeout=1) as sh:
+        sh.write(b'hello\n')
+        sh.close_stdin()
+        assert [output.data for output in sh.lines()] == [b'hello']
+        assert sh.exit_code == 0
+
+
+def test_shell_close_stdin_requires_v2(manager):
+    """
+    Assert that closing stdin without the shell v2 protocol raises a :class:`~adbpy.protocol.ProtocolError`.
+    """
+    with shell.Shell.open(manager, 'cat', v2=False, timeout=1) as sh:
+        with pytest.raises(shell.protocol.ProtocolError):
+            sh.close_stdin()
+
+
+def test_async_shell_lines(start_async_manager):
+    """
+    Assert that :class:`~adbpy.protocol.shell.AsyncShell` yields chunks and lines as they arrive.
+    """
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+
+        sh = yield from shell.shell(manager, 'lines 2', v2=True, timeout=1)
+        lines, reader = [], sh.lines()
+        while True:
+            line = yield from reader.read()
+            if line is None:
+                break
+            lines.append(line)
+        exit_code = sh.exit_code
+
+        sh = yield from shell.AsyncShell.open(manager, 'lines 1', v2=False, timeout=1)
+        chunks = []
+        while True:
+            chunk = yield from sh.read()
+            if chunk is None:
+                break
+            chunks.append(chunk.data)
+
+        yield from manager.stop()
+        return lines, exit_code, b''.join(chunks)
+
+    try:
+        lines, exit_code, output = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert [line.data for line in lines] == [b'line 0', b'line 1', b'warn', b'partial']
+    assert exit_code == 3
+    assert output == b'line 0\npartial'
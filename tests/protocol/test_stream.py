@@ -0,0 +1,222 @@
+"""
+    tests/protocol/test_stream
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.protocol.stream` module.
+"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from adbpy.protocol import stream
+
+
+#: Receive window advertised by the fake device for streams opened with delayed acknowledgements.
+DEVICE_WINDOW = 16
+
+
+@asyncio.coroutine
+def hold(s, argument):
+    """
+    Service that never reads, so writes of the host are never acknowledged.
+    """
+    yield from asyncio.Future(loop=s.session.loop)
+
+
+@pytest.fixture(scope='function')
+def device_kwargs():
+    """
+    Fixture that returns the keyword args of a fake device with a small window that also serves "hold:" streams.
+    """
+    return dict(services={'hold:': hold}, window=DEVICE_WINDOW)
+
+
+@pytest.fixture(scope='function', params=[False, True], ids=['stop_and_wait', 'delayed_ack'])
+def manager(request, connect, device_socket):
+    """
+    Fixture that yields a started :class:`~adbpy.protocol.stream.StreamManager` with and without delayed
+    acknowledgements.
+    """
+    wire = connect(device_socket)
+    wire.handshake()
+    manager = stream.StreamManager(wire, delayed_ack=request.param)
+    manager.start()
+    return manager
+
+
+def test_write_window_stop_and_wait():
+    """
+    Assert that :class:`~adbpy.protocol.stream.WriteWindow` without a size allows a single outstanding write.
+    """
+    window = stream.WriteWindow()
+    assert window.is_open and window.is_drained
+    window.consume(4096)
+    assert not window.is_open and not window.is_drained
+    window.release()
+    assert window.is_open and window.is_drained
+
+
+def test_write_window_delayed_ack():
+    """
+    Assert that :class:`~adbpy.protocol.stream.WriteWindow` with a size allows writes until the window is full and
+    reopens as bytes are acknowledged.
+    """
+    window = stream.WriteWindow(8)
+    window.consume(4)
+    assert window.is_open
+    window.consume(4)
+    assert not window.is_open
+    window.release(6)
+    assert window.is_open and not window.is_drained
+    window.release(2)
+    assert window.is_drained
+
+
+def test_open_assigns_remote_id(manager):
+    """
+    Assert that :meth:`~adbpy.protocol.stream.StreamManager.open` returns an open stream with the remote id
+    assigned by the remote system.
+    """
+    s = manager.open('echo:', timeout=1)
+    assert s.is_open
+    assert s.remote_id == 1
+
+
+def test_open_raises_when_refused(manager):
+    """
+    Assert that :meth:`~adbpy.protocol.stream.StreamManager.open` raises a
+    :class:`~adbpy.protocol.stream.StreamOpenError` when the remote system closes the stream instead of accepting it.
+    """
+    with pytest.raises(stream.StreamOpenError):
+        manager.open('nope:', timeout=1)
+    assert not manager.streams
+
+
+def test_streams_are_multiplexed(manager):
+    """
+    Assert that many streams share one connection and receive only their own data.
+    """
+    streams = [manager.open('echo:', timeout=1) for _ in range(5)]
+    assert len({s.local_id for s in streams}) == 5
+
+    for i, s in enumerate(streams):
+        s.write('stream{}'.format(i).encode(), timeout=1)
+    for i, s in enumerate(reversed(streams)):
+        assert s.read(timeout=1) == 'stream{}'.format(4 - i).encode()
+
+
+def test_writes_are_pipelined(manager):
+    """
+    Assert that writes are sent without waiting for their own acknowledgement and drained together.
+    """
+    s = manager.open('echo:', timeout=1)
+    for i in range(10):
+        s.write('{}'.format(i).encode(), timeout=1)
+    s.drain(timeout=1)
+
+    assert b''.join(s.read(timeout=1) for _ in range(10)) == b'0123456789'
+
+
+def test_write_splits_into_max_data_payloads(manager):
+    """
+    Assert that writes larger than the negotiated maximum data payload size are split into several payloads.
+    """
+    manager._wire_protocol.max_data = 4
+    s = manager.open('echo:', timeout=1)
+    s.write(b'0123456789', timeout=1)
+
+    assert [s.read(timeout=1) for _ in range(3)] == [b'0123', b'4567', b'89']
+
+
+def test_write_waits_for_window(manager):
+    """
+    Assert that writes wait once the write window is full.
+    """
+    s = manager.open('hold:', timeout=1)
+    writes = 1 if not manager.delayed_ack else DEVICE_WINDOW // 4
+
+    for _ in range(writes):
+        s.write(b'xxxx', timeout=1)
+    with pytest.raises(stream.StreamTimeoutError):
+        s.write(b'xxxx', timeout=0.05)
+    with pytest.raises(stream.StreamTimeoutError):
+        s.drain(timeout=0.05)
+
+
+def test_concurrent_writers_keep_window_consistent(manager):
+    """
+    Assert that acknowledgements handled by the reader thread while several threads write to the same stream are
+    never lost, so the stream drains.
+    """
+    s = manager.open('echo:', timeout=1)
+
+    def writer():
+        for _ in range(200):
+            s.write(b'x', timeout=5)
+
+    writers = [threading.Thread(target=writer) for _ in range(4)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    s.drain(timeout=5)
+
+    assert s.window.unacked == 0
+
+
+def test_close_stops_routing(manager):
+    """
+    Assert that a closed stream reads end of stream and is no longer indexed by the manager.
+    """
+    s = manager.open('echo:', timeout=1)
+    s.close()
+
+    assert s.read(timeout=1) == b''
+    assert s not in manager.streams
+    with pytest.raises(stream.StreamClosedError):
+        s.write(b'foo')
+
+
+def test_connection_failure_closes_streams(manager, device_socket):
+    """
+    Assert that every stream reads end of stream once the wire protocol fails.
+    """
+    s = manager.open('echo:', timeout=1)
+    device_socket.shutdown(socket.SHUT_RDWR)
+
+    assert s.read(timeout=1) == b''
+    assert manager.error is not None
+
+
+def test_async_streams_are_multiplexed(start_async_manager):
+    """
+    Assert that :class:`~adbpy.protocol.stream.AsyncStreamManager` multiplexes streams over one connection.
+    """
+    loop = asyncio.new_event_loop()
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+
+        streams, data = [], []
+        for i in range(3):
+            s = yield from manager.open('echo:', timeout=1)
+            yield from s.write('stream{}'.format(i).encode(), timeout=1)
+            streams.append(s)
+        for s in streams:
+            data.append((yield from s.read(timeout=1)))
+
+        yield from streams[0].close()
+        yield from manager.stop()
+        return data, (yield from streams[1].read(timeout=1))
+
+    try:
+        data, eof = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert data == [b'stream0', b'stream1', b'stream2']
+    assert eof == b''
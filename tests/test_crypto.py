@@ -5,7 +5,15 @@
     Tests for the :mod:`~adbpy.crypto` module.
 """
 
+import hashlib
+import os
+
 import pytest
+import rsa
+
+from pyasn1.codec.der import encoder
+from pyasn1.type import univ
+from rsa import pem
 
 from adbpy import crypto
 
@@ -18,6 +26,43 @@ def adb_hash():
     return crypto.ADBHash()
 
 
+@pytest.fixture(scope='module')
+def rsa_key_pair():
+    """
+    Fixture that returns a newly generated :class:`~rsa.PublicKey` and :class:`~rsa.PrivateKey` pair.
+    """
+    return rsa.newkeys(1024)
+
+
+@pytest.fixture(scope='function')
+def pkcs8_key_path(tmpdir, rsa_key_pair):
+    """
+    Fixture that returns the path to a PKCS #8 PEM file of the generated private key.
+    """
+    _, private_key = rsa_key_pair
+
+    algorithm = univ.Sequence()
+    algorithm.setComponentByPosition(0, crypto.RSA_OID)
+    algorithm.setComponentByPosition(1, univ.Null(''))
+
+    private_key_info = univ.Sequence()
+    private_key_info.setComponentByPosition(0, univ.Integer(0))
+    private_key_info.setComponentByPosition(1, algorithm)
+    private_key_info.setComponentByPosition(2, univ.OctetString(private_key.save_pkcs1(format='DER')))
+
+    path = tmpdir.join('adbkey')
+    path.write_binary(pem.save_pem(encoder.encode(private_key_info), crypto.PKCS8_PRIVATE_KEY_MARKER))
+    return str(path)
+
+
+@pytest.fixture(scope='module', params=list(crypto.SIGNERS))
+def signer(request):
+    """
+    Fixture that yields every available :class:`~adbpy.crypto.Signer` backend.
+    """
+    return crypto.get_signer(request.param)
+
+
 @pytest.fixture(scope='module', params=[
     b'',
     b'foo',
@@ -199,3 +244,170 @@ def test_public_key_bytes_from_private_key_raises_on_empty_path():
     """
     with pytest.raises(ValueError):
         crypto.public_key_bytes_from_private_key_path('')
+
+
+@pytest.fixture(scope='function')
+def key_paths(tmpdir):
+    """
+    Fixture that returns the path to a private key file that has a corresponding public key file.
+    """
+    private_key = tmpdir.join('adbkey')
+    private_key.write_binary(b'private')
+    tmpdir.join('adbkey.pub').write_binary(b'public')
+    return str(private_key)
+
+
+@pytest.fixture(scope='function')
+def key_store(mocker):
+    """
+    Fixture that returns a :class:`~adbpy.crypto.KeyStore` instance whose private key loader is mocked.
+    """
+    mocker.patch('adbpy.crypto._private_key_from_path', side_effect=lambda path: object())
+    return crypto.KeyStore(maxsize=2, signer=crypto.get_signer('rsa'))
+
+
+def test_key_store_caches_private_key(key_store, key_paths):
+    """
+    Assert that :meth:`~adbpy.crypto.KeyStore.private_key` loads each key file once.
+    """
+    assert key_store.private_key(key_paths) is key_store.private_key(key_paths)
+    assert crypto._private_key_from_path.call_count == 1
+
+
+def test_key_store_reloads_private_key_on_mtime_change(key_store, key_paths):
+    """
+    Assert that :meth:`~adbpy.crypto.KeyStore.private_key` loads the key again once the file modification time
+    changes and drops the stale entry.
+    """
+    first = key_store.private_key(key_paths)
+    stat = os.stat(key_paths)
+    os.utime(key_paths, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert key_store.private_key(key_paths) is not first
+    assert len(key_store) == 1
+
+
+def test_key_store_caches_public_key_bytes(key_store, key_paths, mocker):
+    """
+    Assert that :meth:`~adbpy.crypto.KeyStore.public_key_bytes` reads the public key file once.
+    """
+    read_bytes = mocker.patch('adbpy.crypto._read_bytes', wraps=crypto._read_bytes)
+
+    assert key_store.public_key_bytes(key_paths) == b'public'
+    assert key_store.public_key_bytes(key_paths) == b'public'
+    assert read_bytes.call_count == 1
+
+
+def test_key_store_evicts_least_recently_used(key_store, tmpdir):
+    """
+    Assert that :class:`~adbpy.crypto.KeyStore` evicts the least recently used entry once `maxsize` is exceeded.
+    """
+    paths = []
+    for name in ('a', 'b', 'c'):
+        path = tmpdir.join(name)
+        path.write_binary(b'private')
+        paths.append(str(path))
+
+    first = key_store.private_key(paths[0])
+    key_store.private_key(paths[1])
+    key_store.private_key(paths[0])
+    key_store.private_key(paths[2])
+
+    assert len(key_store) == 2
+    assert key_store.private_key(paths[0]) is first
+    assert crypto._private_key_from_path.call_count == 3
+
+
+def test_key_store_invalidate_drops_entries_for_path(key_store, key_paths):
+    """
+    Assert that :meth:`~adbpy.crypto.KeyStore.invalidate` drops the private and public key entries for a path.
+    """
+    first = key_store.private_key(key_paths)
+    key_store.public_key_bytes(key_paths)
+
+    key_store.invalidate(key_paths)
+
+    assert len(key_store) == 0
+    assert key_store.private_key(key_paths) is not first
+
+
+def test_key_store_invalidate_drops_all_entries(key_store, key_paths):
+    """
+    Assert that :meth:`~adbpy.crypto.KeyStore.invalidate` without a path drops every entry.
+    """
+    key_store.private_key(key_paths)
+    key_store.public_key_bytes(key_paths)
+
+    key_store.invalidate()
+
+    assert len(key_store) == 0
+
+
+def test_public_key_bytes_from_private_key_uses_default_key_store(key_paths, mocker):
+    """
+    Assert that :func:`~adbpy.crypto.public_key_bytes_from_private_key_path` is served by the process-wide
+    :class:`~adbpy.crypto.KeyStore`.
+    """
+    public_key_bytes = mocker.patch.object(crypto.key_store(), 'public_key_bytes', return_value=b'public')
+
+    assert crypto.public_key_bytes_from_private_key_path(key_paths) == b'public'
+    public_key_bytes.assert_called_once_with(key_paths)
+
+
+def test_get_signer_returns_default_signer():
+    """
+    Assert that :func:`~adbpy.crypto.get_signer` returns the default backend when no name is given.
+    """
+    assert crypto.get_signer() is crypto.SIGNERS[crypto.DEFAULT_SIGNER]
+
+
+def test_get_signer_raises_on_unknown_name():
+    """
+    Assert that :func:`~adbpy.crypto.get_signer` raises a :class:`~ValueError` exception for an unknown backend.
+    """
+    with pytest.raises(ValueError):
+        crypto.get_signer('foo')
+
+
+def test_signer_signs_prehashed_token(signer, pkcs8_key_path, rsa_key_pair):
+    """
+    Assert that every :class:`~adbpy.crypto.Signer` backend signs the token as an already computed SHA-1 digest.
+    """
+    public_key, _ = rsa_key_pair
+    token = hashlib.sha1(b'token').digest()
+
+    signature = signer.sign(signer.load_private_key(pkcs8_key_path), token)
+
+    block = rsa.transform.int2bytes(pow(rsa.transform.bytes2int(signature), public_key.e, public_key.n))
+    assert block.endswith(rsa.pkcs1.HASH_ASN1['SHA-1'] + token)
+
+
+def test_signers_generate_identical_signatures(pkcs8_key_path):
+    """
+    Assert that every :class:`~adbpy.crypto.Signer` backend generates the same signature for the same token.
+    """
+    token = hashlib.sha1(b'token').digest()
+    signatures = {signer.sign(signer.load_private_key(pkcs8_key_path), token) for signer in crypto.SIGNERS.values()}
+    assert len(signatures) == 1
+
+
+def test_signer_raises_on_malformed_key(signer, key_paths):
+    """
+    Assert that every :class:`~adbpy.crypto.Signer` backend raises a :class:`~adbpy.crypto.KeyLoadError` exception
+    when given a file that does not contain a PKCS #8 PEM key.
+    """
+    with pytest.raises(crypto.KeyLoadError):
+        signer.load_private_key(key_paths)
+
+
+def test_key_store_sign_uses_store_signer(key_paths, mocker):
+    """
+    Assert that :meth:`~adbpy.crypto.KeyStore.sign` loads and signs with the signer of the store.
+    """
+    signer = mocker.Mock(spec=crypto.Signer)
+    signer.name = 'mock'
+    store = crypto.KeyStore(signer=signer)
+
+    assert store.sign(key_paths, b'token') is signer.sign.return_value
+    signer.load_private_key.assert_called_once_with(os.path.abspath(key_paths))
+    signer.sign.assert_called_once_with(signer.load_private_key.return_value, b'token')
@@ -0,0 +1,233 @@
+"""
+    tests/test_instrumentation
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.instrumentation` module.
+"""
+
+import socket
+
+import pytest
+
+from adbpy import instrumentation, message
+from adbpy.message import adb
+from adbpy.protocol import stream
+
+
+class RecordingSink(instrumentation.Sink):
+    """
+    Sink that records every event it is given.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def increment(self, name, value, tags):
+        self.events.append(('increment', name, value, tags))
+
+    def observe(self, name, value, tags):
+        self.events.append(('observe', name, value, tags))
+
+
+def test_histogram_counts_values_in_buckets():
+    """
+    Assert that :class:`~adbpy.instrumentation.Histogram` counts values in buckets and estimates percentiles.
+    """
+    histogram = instrumentation.Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.mean == pytest.approx(0.65)
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(75) == 1.0
+    assert histogram.percentile(100) == 2.0
+    assert list(histogram.snapshot()['buckets'].values()) == [2, 1, 1]
+
+
+def test_histogram_percentile_without_values():
+    """
+    Assert that the percentiles of an empty :class:`~adbpy.instrumentation.Histogram` are zero.
+    """
+    assert instrumentation.Histogram().percentile(99) == 0.0
+
+
+def test_command_name():
+    """
+    Assert that :func:`~adbpy.instrumentation.command_name` names known commands and falls back to hex.
+    """
+    assert instrumentation.command_name(adb.Command.wrte) == 'WRTE'
+    assert instrumentation.command_name(0x1234) == '0x1234'
+
+
+def test_wire_protocol_counts_messages_and_latencies(connect, device_socket):
+    """
+    Assert that a wire protocol with metrics counts the messages and bytes of both directions and that its streams
+    record open round trips and write acknowledgements.
+    """
+    metrics = instrumentation.ConnectionMetrics()
+    wire = connect(device_socket, metrics)
+    wire.handshake()
+    manager = stream.StreamManager(wire)
+    manager.start()
+
+    s = manager.open('echo:', timeout=5)
+    s.write(b'x' * 1000, timeout=5)
+    assert s.read(timeout=5) == b'x' * 1000
+    s.drain(timeout=5)
+    s.close()
+
+    assert metrics.messages_sent[adb.Command.cnxn] == 1
+    assert metrics.messages_received[adb.Command.cnxn] == 1
+    assert metrics.messages_sent[adb.Command.open] == 1
+    assert metrics.messages_sent[adb.Command.wrte] == 1
+    assert metrics.bytes_sent[adb.Command.wrte] == adb.MESSAGE_SIZE + 1000
+    assert metrics.messages_received[adb.Command.wrte] == 1
+    assert metrics.round_trips['echo'].count == 1
+    assert metrics.acks['echo'].count == 1
+    snapshot = metrics.snapshot()
+    assert snapshot['messages_sent']['WRTE'] == 1
+    assert snapshot['acks']['echo']['count'] == 1
+
+
+def test_ack_timer_with_delayed_acks():
+    """
+    Assert that :class:`~adbpy.instrumentation.AckTimer` matches delayed acknowledgements to the oldest writes they
+    cover.
+    """
+    metrics = instrumentation.ConnectionMetrics()
+    timer = metrics.stream_timer('sync:')
+    timer.sent(100)
+    timer.sent(100)
+    timer.sent(100)
+
+    timer.on_ack(150)
+    assert metrics.acks['sync'].count == 1
+    timer.on_ack(150)
+    assert metrics.acks['sync'].count == 3
+    assert not timer.pending
+
+
+def test_stream_timeouts_are_counted(connect, device_socket):
+    """
+    Assert that stream operations exceeding their timeout are counted by operation.
+    """
+    metrics = instrumentation.ConnectionMetrics()
+    wire = connect(device_socket, metrics)
+    wire.handshake()
+    manager = stream.StreamManager(wire)
+    manager.start()
+
+    s = manager.open('sink:', timeout=5)
+    with pytest.raises(stream.StreamTimeoutError):
+        s.read(timeout=0.01)
+
+    assert metrics.timeouts == {'stream.read': 1}
+
+
+def test_checksum_failures_are_counted(connect):
+    """
+    Assert that messages received with invalid checksums are counted.
+    """
+    metrics = instrumentation.ConnectionMetrics()
+    local, remote = socket.socketpair()
+    wire = connect(local, metrics)
+    remote.sendall(adb.to_bytes(adb.write(2, 1, b'foobar')) + b'foobaz')
+
+    with pytest.raises(message.MessageChecksumError):
+        wire.recv()
+
+    assert metrics.checksum_failures == 1
+    local.close()
+    remote.close()
+
+
+def test_metrics_forwarded_to_sink_with_tags(connect, device_socket):
+    """
+    Assert that every event is forwarded to the sink, tagged with the tags of the connection.
+    """
+    sink = RecordingSink()
+    metrics = instrumentation.ConnectionMetrics(sink=sink, tags={'serial': 'fake'})
+    wire = connect(device_socket, metrics)
+    wire.handshake()
+    manager = stream.StreamManager(wire)
+    manager.start()
+    s = manager.open('echo:', timeout=5)
+    s.close()
+
+    assert ('increment', 'adb.messages.sent', 1, {'serial': 'fake', 'command': 'CNXN'}) in sink.events
+    observed = [event for event in sink.events if event[0] == 'observe']
+    assert [(name, tags) for _, name, _, tags in observed] == [('adb.round_trip.seconds',
+                                                                {'serial': 'fake', 'service': 'echo'})]
+
+
+def test_disabled_metrics_skip_stream_timers(connect, device_socket):
+    """
+    Assert that streams of a wire protocol without metrics are not timed.
+    """
+    wire = connect(device_socket)
+    wire.handshake()
+    manager = stream.StreamManager(wire)
+    manager.start()
+
+    s = manager.open('echo:', timeout=5)
+
+    assert manager.metrics is None
+    assert s._timer is None
+
+
+def test_statsd_sink_sends_buffered_lines():
+    """
+    Assert that :class:`~adbpy.instrumentation.StatsdSink` sends buffered metrics in StatsD format with DogStatsD tags.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    sink = instrumentation.StatsdSink(*server.getsockname(), prefix='adbpy')
+
+    sink.increment('adb.messages.sent', 1, {'command': 'WRTE', 'serial': 'fake'})
+    sink.observe('adb.ack.seconds', 0.0125, {})
+    sink.close()
+
+    assert server.recv(4096).decode().split('\n') == ['adbpy.adb.messages.sent:1|c|#command:WRTE,serial:fake',
+                                                      'adbpy.adb.ack.seconds:12.500|ms']
+    server.close()
+
+
+def test_statsd_sink_sends_lines_buffered_too_long(mocker):
+    """
+    Assert that :class:`~adbpy.instrumentation.StatsdSink` sends a partial datagram once its oldest metric was
+    buffered for the flush interval.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    monotonic = mocker.patch('time.monotonic', return_value=100.0)
+    sink = instrumentation.StatsdSink(*server.getsockname(), flush_interval=1.0)
+
+    sink.increment('first', 1, {})
+    assert sink._buffer == ['first:1|c']
+
+    monotonic.return_value += 1.0
+    sink.increment('second', 1, {})
+
+    assert server.recv(4096) == b'first:1|c\nsecond:1|c'
+    assert not sink._buffer
+    sink.close()
+    server.close()
+
+
+def test_prometheus_sink_records_metrics():
+    """
+    Assert that :class:`~adbpy.instrumentation.PrometheusSink` records counters and histograms with tags as labels.
+    """
+    prometheus_client = pytest.importorskip('prometheus_client')
+    registry = prometheus_client.CollectorRegistry()
+    sink = instrumentation.PrometheusSink(registry=registry)
+
+    sink.increment('adb.messages.sent', 2, {'command': 'WRTE'})
+    sink.observe('adb.ack.seconds', 0.01, {'service': 'sync'})
+
+    assert registry.get_sample_value('adb_messages_sent_total', {'command': 'WRTE'}) == 2
+    assert registry.get_sample_value('adb_ack_seconds_count', {'service': 'sync'}) == 1
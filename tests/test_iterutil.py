@@ -104,3 +104,23 @@ def test_first_returns_first_item_on_non_empty_iterable(non_empty_iterable_funcs
     """
     iterable, expected_first_item = non_empty_iterable_funcs
     assert iterutil.first(iterable) == expected_first_item
+
+
+def test_chunks_splits_without_copying():
+    """
+    Assert that :func:`~adbpy.iterutil.chunks` yields views of at most the given size that cover the data.
+    """
+    data = bytearray(b'0123456789')
+    chunks = list(iterutil.chunks(data, 4))
+    assert [bytes(chunk) for chunk in chunks] == [b'0123', b'4567', b'89']
+
+    data[0:1] = b'x'
+    assert bytes(chunks[0]) == b'x123'
+
+
+def test_chunks_raises_on_invalid_size():
+    """
+    Assert that :func:`~adbpy.iterutil.chunks` raises a :class:`~ValueError` when size is less than one.
+    """
+    with pytest.raises(ValueError):
+        list(iterutil.chunks(b'foo', 0))
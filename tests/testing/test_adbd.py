@@ -0,0 +1,358 @@
+"""
+    tests/testing/test_adbd
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.testing.adbd` and :mod:`~adbpy.testing.services` modules.
+"""
+
+import asyncio
+import io
+import os
+import socket
+import stat
+import threading
+import time
+
+import pytest
+
+from adbpy.message import adb
+from adbpy.protocol import filesync, shell, stream
+from adbpy import protocol
+from adbpy.testing import adbd, services
+
+
+#: Number of streams opened at the same time by the load test.
+CONCURRENT_STREAMS = 1000
+
+
+@pytest.fixture(scope='function')
+def tcp(connect, device):
+    """
+    Fixture that returns a function creating a synchronous wire protocol connected to the fake device over TCP.
+    """
+    return lambda: connect(socket.create_connection(device.address))
+
+
+def _run_shell(manager, command, v2):
+    """
+    Run the given command to completion and return its exit code and output by file descriptor.
+    """
+    output = {shell.ShellPacketId.stdout: b'', shell.ShellPacketId.stderr: b''}
+    with shell.Shell.open(manager, command, v2=v2, timeout=5) as sh:
+        for chunk in sh:
+            output[chunk.fd] += chunk.data
+    return sh.exit_code, output
+
+
+def test_handshake_over_tcp(tcp):
+    """
+    Assert that the fake negotiates a session with a host connected over TCP.
+    """
+    session = tcp().handshake()
+
+    assert session.system_type == adb.SystemType.device.value
+    assert session.serial == 'fake'
+    assert session.skip_checksum
+    assert session.supports(adb.Feature.shell_v2)
+    assert session.supports(adb.Feature.delayed_ack)
+
+
+def test_handshake_over_socketpair(connect, device):
+    """
+    Assert that the fake serves host connections over socket pairs next to TCP ones.
+    """
+    first, second = connect(device.socketpair()), connect(device.socketpair())
+
+    assert first.handshake(max_data=4096).max_data == 4096
+    assert second.handshake().max_data == adb.MAXDATA
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(version=adb.VERSION)])
+def test_handshake_negotiates_legacy_version(tcp):
+    """
+    Assert that the fake validates checksums and withholds features the host does not advertise.
+    """
+    session = tcp().handshake(features=())
+
+    assert not session.skip_checksum
+    assert not session.features
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(auth=adbd.AuthMode.signature)])
+def test_auth_accepts_signature(tcp, mocker):
+    """
+    Assert that a fake in :attr:`~adbpy.testing.adbd.AuthMode.signature` mode accepts the first signature.
+    """
+    sign = mocker.patch('adbpy.crypto.sign', return_value=b'signature')
+    session = tcp().handshake(key_paths=['first', 'second'])
+
+    assert session.serial == 'fake'
+    assert sign.call_count == 1
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(auth=adbd.AuthMode.public_key)])
+def test_auth_accepts_public_key(device, tcp, mocker):
+    """
+    Assert that a fake in :attr:`~adbpy.testing.adbd.AuthMode.public_key` mode rejects every signature and accepts
+    the public key offered afterwards.
+    """
+    sign = mocker.patch('adbpy.crypto.sign', return_value=b'signature')
+    mocker.patch('adbpy.crypto.public_key_bytes_from_private_key_path', return_value=b'public key')
+    tcp().handshake(key_paths=['first', 'second'])
+
+    assert sign.call_count == 2
+    assert device.public_keys == [b'public key']
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(auth=adbd.AuthMode.reject)])
+def test_auth_reject_raises(tcp, mocker):
+    """
+    Assert that a fake in :attr:`~adbpy.testing.adbd.AuthMode.reject` mode fails the host handshake.
+    """
+    mocker.patch('adbpy.crypto.sign', return_value=b'signature')
+    mocker.patch('adbpy.crypto.public_key_bytes_from_private_key_path', return_value=b'public key')
+    with pytest.raises(protocol.ProtocolAuthError):
+        tcp().handshake(key_paths=['first'])
+
+
+def test_open_refuses_unknown_destination(device, manager):
+    """
+    Assert that streams to destinations without a service are refused and recorded.
+    """
+    with pytest.raises(stream.StreamOpenError):
+        manager.open('jdwp:1234', timeout=5)
+    assert device.destinations == ['jdwp:1234']
+
+
+def test_echo_service(manager):
+    """
+    Assert that the echo service writes every payload back, including payloads larger than the maximum data size.
+    """
+    data = os.urandom(adb.MAXDATA * 3 + 1)
+
+    s = manager.open('tcp:7', timeout=5)
+    s.write(data, timeout=5)
+    echoed = b''
+    while len(echoed) < len(data):
+        echoed += s.read(timeout=5)
+    s.close()
+
+    assert echoed == data
+
+
+def test_source_service(manager):
+    """
+    Assert that the source service writes the requested number of bytes and closes the stream.
+    """
+    s = manager.open('source:300000', timeout=5)
+
+    assert sum(len(data) for data in s) == 300000
+
+
+@pytest.mark.parametrize('v2', [False, True])
+def test_shell_echo(manager, v2):
+    """
+    Assert that the shell services run `echo` with and without the shell v2 protocol.
+    """
+    exit_code, output = _run_shell(manager, 'echo hello world', v2)
+
+    assert output[shell.ShellPacketId.stdout] == b'hello world\n'
+    assert exit_code == (0 if v2 else None)
+
+
+def test_shell_v2_reports_exit_code_and_stderr(manager):
+    """
+    Assert that the shell v2 service reports exit codes and writes errors for unknown commands to stderr.
+    """
+    assert _run_shell(manager, 'exit 3', True)[0] == 3
+    exit_code, output = _run_shell(manager, 'frobnicate', True)
+    assert exit_code == 127
+    assert output[shell.ShellPacketId.stderr] == b'sh: frobnicate: not found\n'
+
+
+def test_shell_v2_cat_until_stdin_closed(manager):
+    """
+    Assert that the shell v2 service copies stdin to stdout until stdin is closed.
+    """
+    with shell.Shell.open(manager, 'cat', v2=True, timeout=5) as sh:
+        sh.write(b'first\n')
+        sh.write(b'second\n')
+        sh.close_stdin()
+        lines = [output.data for output in sh.lines()]
+
+    assert lines == [b'first', b'second']
+    assert sh.exit_code == 0
+
+
+def test_filesync_push_pull_stat_and_list(device, manager):
+    """
+    Assert that the SYNC service stores pushed files and serves them back through STAT, LIST and RECV.
+    """
+    device.files['/sdcard/existing'] = b'existing'
+    data = os.urandom(filesync.SYNC_DATA_MAX * 2 + 5)
+
+    with filesync.FileSync.open(manager, timeout=5) as sync:
+        assert sync.push(data, '/sdcard/dir/pushed', mtime=1234) == len(data)
+        pulled = io.BytesIO()
+        sync.pull('/sdcard/dir/pushed', pulled)
+        result = sync.stat('/sdcard/dir/pushed')
+        entries = sync.listdir('/sdcard')
+        missing = sync.stat('/sdcard/missing')
+
+    assert pulled.getvalue() == data
+    assert result == (filesync.DEFAULT_PUSH_MODE, len(data), 1234)
+    assert [(entry.name, stat.S_ISDIR(entry.mode)) for entry in entries] == [('dir', True), ('existing', False)]
+    assert not missing.exists
+    assert device.files['/sdcard/dir/pushed'].data == data
+
+
+@pytest.mark.parametrize('request_failure', [
+    lambda sync: sync.pull('/sdcard/missing', io.BytesIO()),
+    lambda sync: sync.push(b'data', '/readonly/file')
+], ids=['pull_missing', 'push_readonly'])
+def test_filesync_failures_end_session(manager, request_failure):
+    """
+    Assert that the SYNC service fails pulls of missing files and pushes to read-only paths, then ends the session
+    like adbd.
+    """
+    with filesync.FileSync.open(manager, timeout=5) as sync:
+        with pytest.raises(filesync.FileSyncError):
+            request_failure(sync)
+        assert sync.stream.read(timeout=5) == b''
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(keep_pushed=False)])
+def test_filesync_discards_pushed_files(device, manager):
+    """
+    Assert that pushed files are discarded when the fake does not keep them.
+    """
+    with filesync.FileSync.open(manager, timeout=5) as sync:
+        sync.push(b'data', '/sdcard/file')
+
+    assert device.files == {}
+
+
+def test_filesync_ends_session_on_truncated_request():
+    """
+    Assert that the SYNC service ends the session quietly when the host closes the stream in the middle of a request.
+    """
+    class TruncatedStream:
+        adbd = None
+
+        def __init__(self):
+            self.payloads = [filesync.SYNC_HEADER.pack(filesync.SyncId.stat.value, 10) + b'/sd', b'']
+
+        @asyncio.coroutine
+        def read(self):
+            return self.payloads.pop(0)
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(services.sync(TruncatedStream(), '')) is None
+    finally:
+        loop.close()
+
+
+@asyncio.coroutine
+def upper(s, argument):
+    """
+    Service that writes its argument in upper case.
+    """
+    yield from s.write(argument.upper().encode())
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(services={'shell:upper ': upper})])
+def test_custom_service(manager):
+    """
+    Assert that custom services are served by the longest matching destination prefix.
+    """
+    _, output = _run_shell(manager, 'upper text', False)
+
+    assert output[shell.ShellPacketId.stdout] == b'TEXT'
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(features=(adb.Feature.shell_v2.value,))])
+def test_service_writes_ahead_of_acknowledgements(device, manager):
+    """
+    Assert that writes of a service are buffered until the host acknowledges them, like writes to the socket between
+    adbd and a service, and sent before the stream is closed.
+    """
+    written = threading.Event()
+
+    @asyncio.coroutine
+    def write_ahead(s, argument):
+        for i in range(3):
+            yield from s.write(str(i).encode())
+        written.set()
+
+    device.services['ahead:'] = write_ahead
+    s = manager.open('ahead:', timeout=5)
+
+    assert written.wait(5)
+    assert list(s) == [b'0', b'1', b'2']
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(link=adbd.LinkProfile(segment_size=5))])
+def test_link_segments_writes(manager):
+    """
+    Assert that a link with a small segment size splits messages across reads of the host without corrupting them.
+    """
+    exit_code, output = _run_shell(manager, 'source 10000', True)
+
+    assert exit_code == 0
+    assert len(output[shell.ShellPacketId.stdout]) == 10000
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(link=adbd.LinkProfile(latency=0.05))])
+def test_link_latency(manager):
+    """
+    Assert that a link delays every write by its latency.
+    """
+    start = time.monotonic()
+    _run_shell(manager, 'echo hello', True)
+
+    assert time.monotonic() - start >= 0.05
+
+
+@pytest.mark.parametrize('device_kwargs', [dict(link=adbd.LinkProfile(bandwidth=1024 * 1024))])
+def test_link_bandwidth(manager):
+    """
+    Assert that a link paces writes to its bandwidth.
+    """
+    start = time.monotonic()
+    s = manager.open('source:262144', timeout=5)
+
+    assert sum(len(data) for data in s) == 262144
+    assert time.monotonic() - start >= 0.2
+
+
+def test_many_concurrent_streams(device, start_async_manager):
+    """
+    Assert that the fake serves thousands of concurrent streams of a single host connection.
+    """
+    loop = asyncio.new_event_loop()
+    payloads = [os.urandom(i % 512 + 1) for i in range(CONCURRENT_STREAMS)]
+
+    @asyncio.coroutine
+    def echo(manager, data):
+        s = yield from manager.open('echo:', timeout=10)
+        yield from s.write(data, timeout=10)
+        echoed = b''
+        while len(echoed) < len(data):
+            echoed += yield from s.read(timeout=10)
+        yield from s.close()
+        return echoed
+
+    @asyncio.coroutine
+    def run():
+        manager = yield from start_async_manager(loop)
+        try:
+            return (yield from asyncio.gather(*[echo(manager, data) for data in payloads], loop=loop))
+        finally:
+            yield from manager.stop()
+
+    try:
+        assert loop.run_until_complete(run()) == payloads
+    finally:
+        loop.close()
+    assert device.destinations == ['echo:'] * CONCURRENT_STREAMS
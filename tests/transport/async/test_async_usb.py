@@ -0,0 +1,250 @@
+"""
+    tests/transport/async/test_async_usb
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.transport.async.usb` module.
+"""
+
+import asyncio
+import types
+
+import pytest
+import usb1
+
+from adbpy import transport
+from adbpy.transport.async import usb
+from adbpy.transport.sync import usb as sync_usb
+
+
+class FakeTransfer:
+    """
+    Transfer that records submissions and completes when told to.
+    """
+
+    def __init__(self):
+        self.buffer = None
+        self.callback = None
+        self.submitted = False
+        self.submissions = 0
+        self.status = None
+        self.actual_length = 0
+        self.doomed = False
+        self.closed = False
+
+    def setBulk(self, endpoint, buffer_or_len, callback=None):
+        self.buffer = bytearray(buffer_or_len)
+        self.callback = callback
+
+    def submit(self):
+        self.submitted = True
+        self.submissions += 1
+
+    def cancel(self):
+        self.complete(usb1.TRANSFER_CANCELLED)
+
+    def close(self):
+        self.closed = True
+
+    def doom(self):
+        self.doomed = True
+
+    def isSubmitted(self):
+        return self.submitted
+
+    def getStatus(self):
+        return self.status
+
+    def getActualLength(self):
+        return self.actual_length
+
+    def getBuffer(self):
+        return self.buffer
+
+    def complete(self, status, data=b''):
+        self.buffer[:len(data)] = data
+        self.status, self.actual_length, self.submitted = status, len(data), False
+        self.callback(self)
+        if self.doomed:
+            self.closed = True
+
+
+class FakeHandle:
+    """
+    Device handle that creates :class:`FakeTransfer` instances.
+    """
+
+    def __init__(self):
+        self.transfers = []
+
+    def getTransfer(self):
+        self.transfers.append(FakeTransfer())
+        return self.transfers[-1]
+
+
+@pytest.fixture(scope='function')
+def reader():
+    """
+    Fixture that yields a started :class:`~adbpy.transport.async.usb.BulkReader` over a fake handle.
+    """
+    data, errors = [], []
+    reader = usb.BulkReader(FakeHandle(), 0x81, data.append, errors.append, num_transfers=3, transfer_size=8)
+    reader.data, reader.errors = data, errors
+    reader.start()
+    return reader
+
+
+def test_bulk_reader_keeps_transfers_submitted(reader):
+    """
+    Assert that :class:`~adbpy.transport.async.usb.BulkReader` hands off completed data in order and resubmits each
+    transfer with the same buffer.
+    """
+    transfers = reader._handle.transfers
+    assert reader.pending == 3
+
+    for i, t in enumerate(transfers * 2):
+        buffer = t.buffer
+        t.complete(usb1.TRANSFER_COMPLETED, '{}'.format(i).encode())
+        assert t.buffer is buffer
+
+    assert reader.data == [b'0', b'1', b'2', b'3', b'4', b'5']
+    assert reader.pending == 3
+    assert all(t.submissions == 3 for t in transfers)
+
+
+def test_bulk_reader_stop_cancels_transfers(reader):
+    """
+    Assert that :meth:`~adbpy.transport.async.usb.BulkReader.stop` cancels every transfer without resubmitting them.
+    """
+    assert reader.stop(timeout=1)
+    assert reader.pending == 0
+    assert not reader.errors
+
+
+def test_bulk_reader_stops_on_error(reader):
+    """
+    Assert that :class:`~adbpy.transport.async.usb.BulkReader` reports a failed transfer once and stops resubmitting.
+    """
+    transfers = reader._handle.transfers
+    transfers[0].complete(usb1.TRANSFER_NO_DEVICE)
+    transfers[1].complete(usb1.TRANSFER_NO_DEVICE)
+
+    assert len(reader.errors) == 1
+    assert isinstance(reader.errors[0], sync_usb.USBDeviceNotFound)
+    assert reader.pending == 1
+
+
+def test_bulk_reader_holds_transfers_while_paused(reader):
+    """
+    Assert that :class:`~adbpy.transport.async.usb.BulkReader` holds back completed transfers while paused and
+    resubmits them once resumed.
+    """
+    transfers = reader._handle.transfers
+    reader.pause_reading()
+    transfers[0].complete(usb1.TRANSFER_COMPLETED, b'0')
+    transfers[1].complete(usb1.TRANSFER_COMPLETED, b'1')
+
+    assert reader.data == [b'0', b'1']
+    assert reader.pending == 1
+
+    reader.resume_reading()
+    assert reader.pending == 3
+
+
+@pytest.fixture(scope='function')
+def loop():
+    """
+    Fixture that yields a new event loop.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _context(loop, bulk_reader=None):
+    """
+    Create a transport context over a fake handle.
+    """
+    device = types.SimpleNamespace(handle=FakeHandle(), write_endpoint_address=0x01)
+    return usb.Context(device, None, bulk_reader, None, loop)
+
+
+def test_send_closes_transfer(loop):
+    """
+    Assert that :meth:`~adbpy.transport.async.usb.Transport.send` has each transfer closed once it completes.
+    """
+    context = _context(loop)
+    task = loop.create_task(usb.Transport().send(context, b'data', timeout=1))
+    loop.run_until_complete(asyncio.sleep(0, loop=loop))
+    t = context.usb.handle.transfers[0]
+    t.complete(usb1.TRANSFER_COMPLETED, b'data')
+    loop.run_until_complete(task)
+
+    assert t.closed
+
+
+@pytest.mark.parametrize('cancel', [False, True], ids=['timeout', 'cancelled'])
+def test_send_cancels_abandoned_transfer(loop, cancel):
+    """
+    Assert that a send that times out or is cancelled cancels its transfer, which is closed by its callback.
+    """
+    context = _context(loop)
+    task = loop.create_task(usb.Transport().send(context, b'data', timeout=0.01))
+    if cancel:
+        loop.call_soon(task.cancel)
+
+    with pytest.raises((asyncio.CancelledError, transport.TransportSendTimeout)):
+        loop.run_until_complete(task)
+
+    t = context.usb.handle.transfers[0]
+    assert t.status == usb1.TRANSFER_CANCELLED
+    assert t.closed
+
+
+def test_close_skips_freeing_transfers_still_submitted(mocker):
+    """
+    Assert that the transfers of a bulk reader that could not be stopped are not freed while `libusb` owns them.
+    """
+    bulk_reader = mocker.Mock(**{'stop.return_value': False})
+    usb_transport = usb.Transport()
+    mocker.patch.object(usb_transport, '_transport')
+    context = usb.Context(mocker.Mock(), None, bulk_reader, mocker.Mock(), None)
+
+    usb_transport._close(context)
+
+    assert not bulk_reader.close.called
+    assert usb_transport._transport.disconnect.called
+
+
+def test_stream_reader_pauses_bulk_reader(loop):
+    """
+    Assert that a :class:`~asyncio.StreamReader` using a :class:`~adbpy.transport.async.usb.BulkReader` as its
+    transport pauses it once its buffer is full and resumes it once drained.
+    """
+    stream_reader = asyncio.StreamReader(limit=3, loop=loop)
+    reader = usb.BulkReader(FakeHandle(), 0x81, stream_reader.feed_data, None, num_transfers=3, transfer_size=8)
+    stream_reader.set_transport(reader)
+    reader.start()
+
+    for t in reader._handle.transfers:
+        t.complete(usb1.TRANSFER_COMPLETED, b'x' * 8)
+    assert reader.pending == 0
+
+    loop.run_until_complete(stream_reader.read(24))
+    assert reader.pending == 3
+
+
+def test_connect_cleans_up_when_bulk_reader_fails(loop, mocker):
+    """
+    Assert that :meth:`~adbpy.transport.async.usb.Transport.connect` stops the event thread and releases the device
+    when the bulk reader cannot be started.
+    """
+    usb_transport = usb.Transport()
+    mocker.patch.object(usb_transport, '_transport')
+    events = mocker.patch.object(sync_usb, 'EventThread').return_value
+    mocker.patch.object(usb.BulkReader, 'start', side_effect=sync_usb.USBError())
+
+    with pytest.raises(sync_usb.USBError):
+        loop.run_until_complete(usb_transport.connect(loop=loop, timeout=1))
+
+    assert events.stop.called
+    assert usb_transport._transport.disconnect.called
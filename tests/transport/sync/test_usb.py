@@ -5,4 +5,329 @@
     Contains tests for the :mod:`~adbpy.transport.sync.usb` module.
 """
 
+import threading
+
+import pytest
+import usb1
+
 from adbpy.transport.sync import usb
+
+
+class FakeEndpoint:
+    """
+    Endpoint with a fixed address.
+    """
+
+    def __init__(self, address):
+        self.address = address
+
+    def getAddress(self):
+        return self.address
+
+
+class FakeHandle:
+    """
+    Device handle that records calls made to it.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.calls = []
+
+    def kernelDriverActive(self, interface):
+        return True
+
+    def detachKernelDriver(self, interface):
+        self.calls.append('detach')
+
+    def claimInterface(self, interface):
+        self.calls.append('claim')
+
+    def releaseInterface(self, interface):
+        self.calls.append('release')
+
+    def close(self):
+        self.calls.append('close')
+
+
+class FakeSetting:
+    """
+    Interface setting with a fixed class/subclass/protocol.
+    """
+
+    def __init__(self, usb_class, usb_subclass, usb_protocol):
+        self.values = usb_class, usb_subclass, usb_protocol
+
+    def getNumber(self):
+        return 0
+
+    def iterEndpoints(self):
+        return iter([FakeEndpoint(0x81), FakeEndpoint(0x01)])
+
+    def getClass(self):
+        return self.values[0]
+
+    def getSubClass(self):
+        return self.values[1]
+
+    def getProtocol(self):
+        return self.values[2]
+
+
+class FakeDevice:
+    """
+    Device that counts how often its serial number is read.
+    """
+
+    def __init__(self, address, serial, settings=None):
+        self.address = address
+        self.serial = serial
+        self.settings = settings or [FakeSetting(usb.ADB_CLASS, usb.ADB_SUBCLASS, usb.ADB_PROTOCOL)]
+        self.serial_reads = 0
+        self.handles = []
+
+    def open(self):
+        self.handles.append(FakeHandle(self))
+        return self.handles[-1]
+
+    def getBusNumber(self):
+        return 1
+
+    def getDeviceAddress(self):
+        return self.address
+
+    def getVendorID(self):
+        return 0x18d1
+
+    def getProductID(self):
+        return 0x4ee7
+
+    def getSerialNumber(self):
+        self.serial_reads += 1
+        return self.serial
+
+    def iterSettings(self):
+        return iter(self.settings)
+
+
+class FakeContext:
+    """
+    Context that enumerates the given devices through the hotplug callback.
+    """
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.callback = None
+
+    def hotplugRegisterCallback(self, callback, flags):
+        assert flags == usb1.HOTPLUG_ENUMERATE
+        self.callback = callback
+        for device in self.devices:
+            callback(self, device, usb1.HOTPLUG_EVENT_DEVICE_ARRIVED)
+        return 1
+
+    def hotplugDeregisterCallback(self, handle):
+        self.callback = None
+
+    def getDeviceList(self, skip_on_error=False):
+        return list(self.devices)
+
+
+@pytest.fixture(scope='function', params=[True, False], ids=['hotplug', 'no_hotplug'])
+def registry(request, mocker):
+    """
+    Fixture that yields a started :class:`~adbpy.transport.sync.usb.DeviceRegistry` over fake devices.
+    """
+    mocker.patch('usb1.hasCapability', return_value=request.param)
+    devices = [FakeDevice(1, 'first'), FakeDevice(2, 'second'), FakeDevice(3, 'mouse', [FakeSetting(3, 1, 2)])]
+    registry = usb.DeviceRegistry(FakeContext(devices))
+    registry.start(handle_events=False)
+    yield registry
+    registry.stop()
+
+
+def test_registry_indexes_matching_interfaces(registry):
+    """
+    Assert that :class:`~adbpy.transport.sync.usb.DeviceRegistry` only indexes ADB interfaces and reads the serial
+    of each device once.
+    """
+    assert [entry.serial for entry in registry.devices] == ['first', 'second']
+
+    for _ in range(3):
+        assert registry.find('second').device is registry.ctx.devices[1]
+        assert registry.find(vid=0x18d1).serial == 'first'
+
+    assert [device.serial_reads for device in registry.ctx.devices] == [1, 1, 0]
+
+
+def test_registry_find_raises_when_not_found(registry):
+    """
+    Assert that :meth:`~adbpy.transport.sync.usb.DeviceRegistry.find` raises a
+    :class:`~adbpy.transport.sync.usb.USBDeviceNotFound` when no device matches.
+    """
+    with pytest.raises(usb.USBDeviceNotFound):
+        registry.find('mouse')
+    with pytest.raises(usb.USBDeviceNotFound):
+        registry.find('first', pid=0x1234)
+
+
+def test_registry_tracks_hotplug_events(mocker):
+    """
+    Assert that :class:`~adbpy.transport.sync.usb.DeviceRegistry` adds and removes devices as they arrive and leave.
+    """
+    mocker.patch('usb1.hasCapability', return_value=True)
+    ctx = FakeContext([FakeDevice(1, 'first')])
+    registry = usb.DeviceRegistry(ctx)
+    registry.start(handle_events=False)
+
+    arrived = FakeDevice(2, 'second')
+    ctx.callback(ctx, arrived, usb1.HOTPLUG_EVENT_DEVICE_ARRIVED)
+    assert registry.find('second').device is arrived
+
+    ctx.callback(ctx, FakeDevice(1, None), usb1.HOTPLUG_EVENT_DEVICE_LEFT)
+    with pytest.raises(usb.USBDeviceNotFound):
+        registry.find('first')
+    assert len(registry) == 1
+
+
+class HotplugDuringReadDevice(FakeDevice):
+    """
+    Device whose serial number read waits for a hotplug event handled by another thread, like the control transfer
+    completed by the thread handling `libusb` events.
+    """
+
+    def __init__(self, address, serial, ctx, event_device, event):
+        super().__init__(address, serial)
+        self.ctx, self.event_device, self.event = ctx, event_device, event
+
+    def getSerialNumber(self):
+        events = threading.Thread(target=self.ctx.callback, args=(self.ctx, self.event_device, self.event))
+        events.start()
+        events.join(5)
+        assert not events.is_alive(), 'hotplug callback blocked on the registry lock'
+        return super().getSerialNumber()
+
+
+def test_registry_reads_serials_without_blocking_hotplug(mocker):
+    """
+    Assert that hotplug callbacks are not blocked while :class:`~adbpy.transport.sync.usb.DeviceRegistry` reads the
+    serial number of an arrived device.
+    """
+    mocker.patch('usb1.hasCapability', return_value=True)
+    ctx = FakeContext([])
+    registry = usb.DeviceRegistry(ctx)
+    registry.start(handle_events=False)
+
+    other = FakeDevice(2, 'second')
+    ctx.callback(ctx, HotplugDuringReadDevice(1, 'first', ctx, other, usb1.HOTPLUG_EVENT_DEVICE_ARRIVED),
+                 usb1.HOTPLUG_EVENT_DEVICE_ARRIVED)
+
+    assert [entry.serial for entry in registry.devices] == ['first', 'second']
+
+
+def test_registry_skips_devices_leaving_while_read(mocker):
+    """
+    Assert that a device that leaves while its serial number is read is not indexed.
+    """
+    mocker.patch('usb1.hasCapability', return_value=True)
+    ctx = FakeContext([])
+    registry = usb.DeviceRegistry(ctx)
+    registry.start(handle_events=False)
+
+    leaving = HotplugDuringReadDevice(1, 'first', ctx, FakeDevice(1, None), usb1.HOTPLUG_EVENT_DEVICE_LEFT)
+    ctx.callback(ctx, leaving, usb1.HOTPLUG_EVENT_DEVICE_ARRIVED)
+
+    with pytest.raises(usb.USBDeviceNotFound):
+        registry.find('first')
+    assert len(registry) == 0
+
+
+@pytest.fixture(scope='function')
+def pool(registry):
+    """
+    Fixture that yields a :class:`~adbpy.transport.sync.usb.HandlePool` over a registry of fake devices.
+    """
+    pool = usb.HandlePool(registry=registry)
+    yield pool
+    pool.close()
+
+
+def test_pool_reuses_claimed_handle(pool):
+    """
+    Assert that reconnecting through a :class:`~adbpy.transport.sync.usb.HandlePool` reuses the claimed handle
+    without detaching kernel drivers or claiming the interface again.
+    """
+    transport = usb.Transport(serial='first')
+
+    first = transport.connect(pool=pool)
+    transport.disconnect(first)
+    second = transport.connect(pool=pool)
+
+    assert second is first
+    assert first.handle.calls == ['detach', 'claim']
+    assert len(first.handle.device.handles) == 1
+
+
+def test_pool_rejects_device_in_use(pool):
+    """
+    Assert that :meth:`~adbpy.transport.sync.usb.HandlePool.acquire` raises a
+    :class:`~adbpy.transport.sync.usb.USBDeviceAccessDenied` when the device is already connected.
+    """
+    pool.acquire('first')
+    with pytest.raises(usb.USBDeviceAccessDenied):
+        pool.acquire('first')
+
+
+def test_pool_claims_device_without_lock(pool, mocker):
+    """
+    Assert that :meth:`~adbpy.transport.sync.usb.HandlePool.acquire` opens and claims a device without holding the
+    pool lock, so other devices can be acquired meanwhile.
+    """
+    claim = usb._claim_device
+
+    def claim_unlocked(*args, **kwargs):
+        assert not pool._lock.locked()
+        return claim(*args, **kwargs)
+
+    mocker.patch.object(usb, '_claim_device', side_effect=claim_unlocked)
+    assert pool.acquire('first').serial == 'first'
+
+
+def test_pool_releases_reservation_when_claim_fails(pool, mocker):
+    """
+    Assert that a device whose claim fails can be acquired again.
+    """
+    mocker.patch.object(usb, '_claim_device', side_effect=usb.USBError('claim failed'))
+    with pytest.raises(usb.USBError):
+        pool.acquire('first')
+
+    mocker.stopall()
+    assert pool.acquire('first').serial == 'first'
+
+
+def test_pool_close_releases_idle_handles(pool):
+    """
+    Assert that :meth:`~adbpy.transport.sync.usb.HandlePool.close` releases and closes every idle handle.
+    """
+    context = pool.acquire(vid=0x18d1)
+    assert context.serial == 'first'
+    pool.release(context)
+    pool.close()
+
+    assert context.handle.calls == ['detach', 'claim', 'release', 'close']
+
+
+def test_shared_context_is_reference_counted(mocker):
+    """
+    Assert that :class:`~adbpy.transport.sync.usb.SharedContext` opens a single context and exits it once the last
+    reference is released.
+    """
+    ctx = mocker.Mock()
+    mocker.patch('usb1.USBContext', return_value=mocker.Mock(open=mocker.Mock(return_value=ctx)))
+    shared = usb.SharedContext()
+
+    with shared as first:
+        with shared as second:
+            assert first is second is ctx
+        assert not ctx.exit.called
+    assert ctx.exit.call_count == 1
@@ -0,0 +1,129 @@
+"""
+    tests/transport/test_trace
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Contains tests for the :mod:`~adbpy.transport.trace` module.
+"""
+
+import io
+import logging
+import socket
+
+import pytest
+
+from adbpy.connection import sync as sync_connection
+from adbpy.transport import trace
+from adbpy.transport.sync import tcp as sync_tcp
+
+
+@pytest.fixture(scope='function')
+def logger():
+    """
+    Fixture that yields a logger with debug messages disabled.
+    """
+    logger = logging.getLogger('tests.transport.trace')
+    logger.setLevel(logging.INFO)
+    yield logger
+    logger.setLevel(logging.NOTSET)
+
+
+@pytest.fixture(scope='function')
+def stop_capture():
+    """
+    Fixture that stops any capture started by the test.
+    """
+    yield
+    trace.stop_capture()
+
+
+def test_tracer_caches_debug_enabled(logger):
+    """
+    Assert that :class:`~adbpy.transport.trace.Tracer` only checks the logger again when refreshed.
+    """
+    tracer = trace.Tracer(logger)
+    assert not tracer.debug
+
+    logger.setLevel(logging.DEBUG)
+    assert not tracer.debug
+
+    tracer.refresh()
+    assert tracer.debug
+
+
+def test_refresh_checks_every_tracer(logger):
+    """
+    Assert that :func:`~adbpy.transport.trace.refresh` picks up log level changes right away.
+    """
+    tracer = trace.Tracer(logger)
+    logger.setLevel(logging.DEBUG)
+
+    trace.refresh()
+
+    assert tracer.debug
+
+
+def test_wire_capture_round_trip():
+    """
+    Assert that records written by :class:`~adbpy.transport.trace.WireCapture` are read back by
+    :func:`~adbpy.transport.trace.read_capture`, truncated to the snaplen.
+    """
+    f = io.BytesIO()
+    with trace.WireCapture(f, snaplen=4) as capture:
+        capture.write(trace.Direction.sent, 3, b'CNXN')
+        capture.write(trace.Direction.received, -1, bytearray(b'foobar'))
+    f.seek(0)
+
+    records = list(trace.read_capture(f))
+
+    assert capture.records == 2
+    assert [(r.direction, r.channel, r.data, r.original_length) for r in records] == [
+        (trace.Direction.sent, 3, b'CNXN', 4),
+        (trace.Direction.received, trace.CHANNEL_MASK, b'foob', 6)
+    ]
+    assert records[0].timestamp <= records[1].timestamp
+
+
+def test_wire_capture_ignores_writes_after_close():
+    """
+    Assert that writes racing with :meth:`~adbpy.transport.trace.WireCapture.close` are dropped.
+    """
+    f = io.BytesIO()
+    capture = trace.WireCapture(f)
+    capture.close()
+
+    capture.write(trace.Direction.sent, 0, b'data')
+
+    assert capture.records == 0
+    assert len(f.getvalue()) == trace.PCAP_FILE_HEADER.size
+
+
+def test_read_capture_rejects_other_files():
+    """
+    Assert that :func:`~adbpy.transport.trace.read_capture` raises for files that are not wire captures.
+    """
+    with pytest.raises(ValueError):
+        list(trace.read_capture(io.BytesIO(bytes(trace.PCAP_FILE_HEADER.size))))
+
+
+def test_capture_tcp_transport(tmpdir, stop_capture):
+    """
+    Assert that a started capture records the buffers sent and received by the TCP transport.
+    """
+    path = str(tmpdir.join('adb.pcap'))
+    local, remote = socket.socketpair()
+    conn = sync_connection.Connection.connect(sync_tcp.Transport('localhost', 0), sock=local)
+
+    trace.start_capture(path)
+    conn.send(b'ping')
+    assert remote.recv(4) == b'ping'
+    remote.sendall(b'pong')
+    assert conn.recv_exactly(4) == b'pong'
+    trace.stop_capture()
+    conn.send(b'after')
+
+    records = list(trace.read_capture(path))
+    assert [(r.direction, r.data) for r in records] == [(trace.Direction.sent, b'ping'),
+                                                        (trace.Direction.received, b'pong')]
+    assert {r.channel for r in records} == {local.fileno()}
+    local.close()
+    remote.close()